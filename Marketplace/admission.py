@@ -0,0 +1,278 @@
+"""
+Admission control and load shedding for the gRPC DB servers.
+
+A plain grpc.server queues every RPC it cannot start yet behind its worker
+pool, however long that takes: under overload clients give up after their
+10-15 s timeout while the server is still working through requests nobody is
+waiting for any more. The servers built here put an explicit queue in front
+of the servicer instead (AdmissionController, applied by a server
+interceptor):
+
+- at most max_active RPCs run at once, and at most limits[method] (a fraction
+  of max_active) of any one method, so a flood of one kind cannot take every
+  slot;
+- waiting RPCs start by priority (HIGH before NORMAL before LOW), then in
+  arrival order;
+- an RPC that has waited longer than its priority's share of max_queue_age,
+  or past its client deadline, is rejected with RESOURCE_EXHAUSTED instead
+  of run late, and when max_queued RPCs are already waiting a newcomer is
+  rejected at once (or bumps the newest waiter of a lower priority).
+
+A rejected client hears within a second that the replica is busy and
+StubPool moves on to the next one, instead of timing out.
+
+    server = threaded_server(10, PRODUCT_DB_PRIORITIES, PRODUCT_DB_LIMITS)
+    server = aio_server(1000, CUSTOMER_DB_PRIORITIES, CUSTOMER_DB_LIMITS)
+"""
+
+import asyncio
+import bisect
+import itertools
+import threading
+from collections import Counter
+from concurrent import futures
+
+import grpc
+
+from async_rpc import resolve_future
+
+HIGH, NORMAL, LOW = 0, 1, 2
+
+# Longest wait in the queue, as a multiple of max_queue_age, per priority
+QUEUE_AGE_FACTOR = {HIGH: 2.0, NORMAL: 1.0, LOW: 0.5}
+
+MAX_QUEUED = 100        # RPCs waiting for a slot, beyond the running ones
+MAX_QUEUE_AGE = 1.0     # seconds a NORMAL RPC may wait for a slot
+
+# Reads and purchases first; every other product DB write is NORMAL.
+PRODUCT_DB_PRIORITIES = {
+    "GetItem": HIGH, "GetItems": HIGH, "GetSellerItems": HIGH, "SearchItems": HIGH,
+    "GetCart": HIGH, "GetSellerRating": HIGH, "GetBuyerPurchases": HIGH,
+    "ReadIndex": HIGH, "GetCatalogVersion": HIGH, "MakePurchase": HIGH, "CheckoutCart": HIGH,
+    "Check": HIGH,      # health probes (health.py)
+    "GetArchiveSegment": LOW,   # a peer filling its purchase archive in the background
+}
+# Full scans and bulk writes may not take more than this share of the slots
+PRODUCT_DB_LIMITS = {
+    "SearchItems": 0.5, "GetSellerItems": 0.5,
+    "RegisterItems": 0.3, "UpdateItems": 0.3, "AddFeedbackBatch": 0.3,
+}
+
+# Logins and session checks first; session touches (one per request) last.
+CUSTOMER_DB_PRIORITIES = {
+    "GetUser": HIGH, "GetSession": HIGH, "Check": HIGH,
+    "UpdateSessionActivity": LOW,
+}
+CUSTOMER_DB_LIMITS = {"UpdateSessionActivity": 0.5}
+
+
+class _Waiter:
+    __slots__ = ("method", "priority", "wake", "granted", "rejected")
+
+    def __init__(self, method, priority, wake):
+        self.method = method
+        self.priority = priority
+        self.wake = wake
+        self.granted = False
+        self.rejected = False
+
+
+class AdmissionController:
+    """Concurrency slots, priority queue and queue-age shedding (see module docstring)."""
+
+    def __init__(self, max_active, priorities=None, limits=None,
+                 max_queued=MAX_QUEUED, max_queue_age=MAX_QUEUE_AGE):
+        self.max_active = max_active
+        self.priorities = priorities or {}
+        self.limits = {m: max(1, int(share * max_active)) for m, share in (limits or {}).items()}
+        self.max_queued = max_queued
+        self.max_queue_age = max_queue_age
+        self.shed = Counter()           # method -> RPCs rejected
+        self._lock = threading.Lock()
+        self._active = 0
+        self._running = Counter()       # method -> RPCs running
+        self._queue = []                # [(priority, seq, waiter)], best first
+        self._seq = itertools.count()
+
+    @property
+    def capacity(self):
+        """
+        RPCs the server should accept at once: running, queued, and a
+        max_active of headroom for arrivals that the controller rather than
+        gRPC's blind maximum_concurrent_rpcs should turn away (or let bump a
+        lower-priority waiter).
+        """
+        return 2 * self.max_active + self.max_queued
+
+    def acquire(self, method, time_remaining=None):
+        """Wait for a slot for method; False if the RPC is shed instead."""
+        event = threading.Event()
+        waiter = self._admit(method, event.set)
+        if not (waiter.granted or waiter.rejected):
+            event.wait(self._max_wait(waiter, time_remaining))
+        return self._settle(waiter)
+
+    async def acquire_async(self, method, time_remaining=None):
+        """acquire() for a grpc.aio server: awaits the slot."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._admit(
+            method, lambda: loop.call_soon_threadsafe(resolve_future, future, True))
+        if not (waiter.granted or waiter.rejected):
+            try:
+                await asyncio.wait_for(future, self._max_wait(waiter, time_remaining))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if self._settle(waiter):
+                    self.release(method)
+                raise
+        return self._settle(waiter)
+
+    def release(self, method):
+        """Free method's slot and start the best waiters that now fit."""
+        with self._lock:
+            self._active -= 1
+            self._running[method] -= 1
+            waiting = []
+            for entry in self._queue:
+                waiter = entry[2]
+                if self._active < self.max_active and self._try_start(waiter.method):
+                    waiter.granted = True
+                    waiter.wake()
+                else:
+                    waiting.append(entry)
+            self._queue = waiting
+
+    def _admit(self, method, wake):
+        priority = self.priorities.get(method, NORMAL)
+        waiter = _Waiter(method, priority, wake)
+        with self._lock:
+            if self._try_start(method):
+                waiter.granted = True
+            elif len(self._queue) < self.max_queued:
+                bisect.insort(self._queue, (priority, next(self._seq), waiter))
+            elif self._queue and self._queue[-1][0] > priority:
+                # Full: bump the newest of the lowest-priority waiters
+                bumped = self._queue.pop()[2]
+                bumped.rejected = True
+                bumped.wake()
+                bisect.insort(self._queue, (priority, next(self._seq), waiter))
+            else:
+                waiter.rejected = True
+        return waiter
+
+    def _max_wait(self, waiter, time_remaining):
+        wait = self.max_queue_age * QUEUE_AGE_FACTOR[waiter.priority]
+        if time_remaining is not None:
+            wait = min(wait, time_remaining)
+        return max(wait, 0)
+
+    def _settle(self, waiter):
+        """True if waiter got a slot; otherwise take it off the queue and count it shed."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            for i, entry in enumerate(self._queue):
+                if entry[2] is waiter:
+                    del self._queue[i]
+                    break
+            self.shed[waiter.method] += 1
+            return False
+
+    def _try_start(self, method):
+        if self._active >= self.max_active:
+            return False
+        if self._running[method] >= self.limits.get(method, self.max_active):
+            return False
+        self._active += 1
+        self._running[method] += 1
+        return True
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit("/", 1)[-1]
+
+
+def _overloaded(method):
+    return f"{method}: server overloaded, retry later or on another replica"
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """Runs every unary RPC of a threaded grpc.server through an AdmissionController."""
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        method = _method_name(handler_call_details)
+        behavior = handler.unary_unary
+        controller = self.controller
+
+        def admitted(request, context):
+            if not controller.acquire(method, context.time_remaining()):
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, _overloaded(method))
+            try:
+                return behavior(request, context)
+            finally:
+                controller.release(method)
+
+        return handler._replace(unary_unary=admitted)
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """AdmissionInterceptor for a grpc.aio server."""
+
+    def __init__(self, controller):
+        self.controller = controller
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        method = _method_name(handler_call_details)
+        behavior = handler.unary_unary
+        controller = self.controller
+
+        async def admitted(request, context):
+            if not await controller.acquire_async(method, context.time_remaining()):
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, _overloaded(method))
+            try:
+                return await behavior(request, context)
+            finally:
+                controller.release(method)
+
+        return handler._replace(unary_unary=admitted)
+
+
+def threaded_server(max_active, priorities=None, limits=None,
+                    max_queued=MAX_QUEUED, max_queue_age=MAX_QUEUE_AGE):
+    """
+    grpc.server running at most max_active RPCs at once. The pool has a
+    thread per queue slot too, so waiting RPCs sit in the admission queue,
+    not unseen in the executor's. max_queue_age <= 0 disables admission
+    control.
+    """
+    if max_queue_age <= 0:
+        return grpc.server(futures.ThreadPoolExecutor(max_workers=max_active))
+    controller = AdmissionController(max_active, priorities, limits, max_queued, max_queue_age)
+    return grpc.server(
+        futures.ThreadPoolExecutor(max_workers=controller.capacity),
+        interceptors=[AdmissionInterceptor(controller)],
+        maximum_concurrent_rpcs=controller.capacity,
+    )
+
+
+def aio_server(max_active, priorities=None, limits=None,
+               max_queued=MAX_QUEUED, max_queue_age=MAX_QUEUE_AGE):
+    """grpc.aio counterpart of threaded_server(); call from the event loop."""
+    if max_queue_age <= 0:
+        return grpc.aio.server(maximum_concurrent_rpcs=max_active)
+    controller = AdmissionController(max_active, priorities, limits, max_queued, max_queue_age)
+    return grpc.aio.server(
+        interceptors=[AsyncAdmissionInterceptor(controller)],
+        maximum_concurrent_rpcs=controller.capacity,
+    )
@@ -0,0 +1,94 @@
+"""
+Servicer methods written once for both the threaded grpc.server and grpc.aio.
+
+An RPC handler decorated with @rpc_handler is a generator: it yields a step
+for everything that may block (a replicated write, a leader wait, a SQLite
+read) and gets the step's value back, then returns its response:
+
+    @rpc_handler
+    def StoreCart(self, request, context):
+        result = yield from self._replicate(context, self.raft.store_cart, ...)
+        return product_db_pb2.StatusResponse(...)
+
+Called as usual, the handler runs each step inline (step.run()) on the gRPC
+worker thread. async_servicer() derives a class whose handlers are coroutines
+that await each step instead (step.run_async()), so a grpc.aio server can keep
+thousands of replication waits in flight without a thread for each.
+
+A step is any object with run() and async run_async(). Call is the generic
+one: run_async() sends a blocking call to the loop's default executor. The DB
+modules add steps that await their replication callbacks directly.
+"""
+
+import asyncio
+import functools
+import inspect
+
+
+class Call:
+    """Step: fn(*args), run in an executor thread under asyncio."""
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def run(self):
+        return self.fn(*self.args)
+
+    async def run_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self.fn, *self.args)
+
+
+def resolve_future(future, value):
+    """Set future's result unless it already has one (e.g. it timed out)."""
+    if not future.done():
+        future.set_result(value)
+
+
+def rpc_handler(steps):
+    """Turn a step generator into a blocking gRPC method (see module docstring)."""
+
+    @functools.wraps(steps)
+    def handler(self, request, context):
+        gen = steps(self, request, context)
+        value = None
+        try:
+            while True:
+                value = gen.send(value).run()
+        except StopIteration as stop:
+            return stop.value
+
+    handler.steps = steps
+    return handler
+
+
+def _async_handler(method):
+    steps = getattr(method, "steps", None)
+    if steps is None:
+        # Plain (non-blocking) handler
+        async def handler(self, request, context):
+            return method(self, request, context)
+    else:
+        async def handler(self, request, context):
+            gen = steps(self, request, context)
+            value = None
+            try:
+                while True:
+                    value = await gen.send(value).run_async()
+            except StopIteration as stop:
+                return stop.value
+    functools.update_wrapper(handler, method)
+    return handler
+
+
+def async_servicer(cls, service_descriptor):
+    """
+    Subclass of servicer class cls whose RPC methods (those named in
+    service_descriptor) are coroutines, for a grpc.aio server.
+    """
+    namespace = {
+        m.name: _async_handler(getattr(cls, m.name))
+        for m in service_descriptor.methods
+        if inspect.isfunction(getattr(cls, m.name, None))
+    }
+    return type(f"Async{cls.__name__}", (cls,), namespace)
@@ -11,6 +11,7 @@ Message types:
   RETRANSMIT - unicast negative acknowledgement for missing messages
 """
 
+import asyncio
 import json
 import socket
 import struct
@@ -38,6 +39,21 @@ REDUNDANT_SENDS = 2
 REDUNDANT_DELAY = 0.002
 
 
+class _FutureEvent:
+    """threading.Event stand-in that resolves an asyncio future on set()."""
+
+    def __init__(self, loop, future):
+        self.loop = loop
+        self.future = future
+
+    def set(self):
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
 class AtomicBroadcastNode:
     """
     A single member of a rotating-sequencer atomic broadcast group.
@@ -135,6 +151,10 @@ class AtomicBroadcastNode:
         self.sock.close()
         logger.info("Node %d stopped", self.node_id)
 
+    @property
+    def running(self):
+        return self._running
+
     def broadcast_request(self, payload: dict, timeout: float = 15.0):
         """
         Submit a client request for atomic broadcast.
@@ -157,14 +177,37 @@ class AtomicBroadcastNode:
         ------
         TimeoutError if delivery does not happen within *timeout* seconds.
         """
+        # Create an event so we can block until delivery
+        event = threading.Event()
+        msg_id = self._submit(payload, event)
+
+        # Block until delivered
+        delivered = event.wait(timeout=timeout)
+        return self._take_result(msg_id, delivered, timeout)
+
+    async def broadcast_request_async(self, payload: dict, timeout: float = 15.0):
+        """
+        broadcast_request for asyncio callers: awaits delivery instead of
+        blocking a thread. Same result and TimeoutError.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        msg_id = self._submit(payload, _FutureEvent(loop, future),
+                              lambda msg: self._broadcast_on_loop(msg, loop))
+        try:
+            await asyncio.wait_for(future, timeout)
+            delivered = True
+        except asyncio.TimeoutError:
+            delivered = False
+        return self._take_result(msg_id, delivered, timeout)
+
+    def _submit(self, payload, event, broadcast=None):
+        """Broadcast a Request for payload; event.set() is called on delivery."""
         with self.local_seq_lock:
             local_seq = self.next_local_seq
             self.next_local_seq += 1
 
         msg_id = (self.node_id, local_seq)
-
-        # Create an event so we can block until delivery
-        event = threading.Event()
         with self.pending_lock:
             self.pending_events[msg_id] = event
 
@@ -176,18 +219,18 @@ class AtomicBroadcastNode:
             "payload": payload,
         }
 
-        self._broadcast(req_msg)
-
-        # Block until delivered
-        if not event.wait(timeout=timeout):
-            raise TimeoutError(
-                f"Node {self.node_id}: request {msg_id} not delivered within {timeout}s"
-            )
+        (broadcast or self._broadcast)(req_msg)
+        return msg_id
 
+    def _take_result(self, msg_id, delivered, timeout):
         with self.pending_lock:
             result = self.pending_results.pop(msg_id, None)
             self.pending_events.pop(msg_id, None)
 
+        if not delivered:
+            raise TimeoutError(
+                f"Node {self.node_id}: request {msg_id} not delivered within {timeout}s"
+            )
         return result
 
     # -----------------------------------------------------------------------
@@ -208,11 +251,19 @@ class AtomicBroadcastNode:
     def _broadcast(self, msg: dict):
         """Send msg to every group member (including self), with redundancy."""
         for _ in range(REDUNDANT_SENDS):
-            for member in self.members:
-                self._send(msg, member)
+            self._send_all(msg)
             if REDUNDANT_SENDS > 1:
                 time.sleep(REDUNDANT_DELAY)
 
+    def _broadcast_on_loop(self, msg: dict, loop):
+        """_broadcast without sleeping: the redundant copies are scheduled on loop."""
+        for i in range(REDUNDANT_SENDS):
+            loop.call_later(i * REDUNDANT_DELAY, self._send_all, msg)
+
+    def _send_all(self, msg: dict):
+        for member in self.members:
+            self._send(msg, member)
+
     def _udp_listener(self):
         """Main receive loop."""
         while self._running:
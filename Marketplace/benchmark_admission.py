@@ -0,0 +1,141 @@
+"""
+Overload benchmark for admission control on the replicated databases.
+
+Starts the same 3-node product DB and customer DB clusters as
+benchmark_aio.py (threaded servers), first with admission control disabled
+(--max-queue-age 0) and then with the defaults, and overloads them with 100
+product DB clients and 100 customer DB clients. Each product client alternates
+GetItem reads and StoreCart writes; each customer client alternates GetSession
+reads and UpdateSessionActivity touches. Clients use the frontends' 10 s
+timeout and move on to the next replica when a call fails, as StubPool does.
+
+Reports, per RPC, calls served per second, p50/p99 latency of the served
+calls, and how many were shed (RESOURCE_EXHAUSTED) or timed out.
+
+Usage:
+  python benchmark_admission.py --product-clients 100 --customer-clients 100 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+import grpc
+
+import customer_db_pb2
+import customer_db_pb2_grpc
+import product_db_pb2
+import product_db_pb2_grpc
+from benchmark_aio import CUSTOMER_GRPC_BASE, NODES, PRODUCT_GRPC_BASE, start_servers
+
+TIMEOUT = 10
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(args, admission):
+    procs = start_servers([] if admission else ["--max-queue-age", "0"])
+    channels = [grpc.aio.insecure_channel(f"127.0.0.1:{base + i}")
+                for base in (PRODUCT_GRPC_BASE, CUSTOMER_GRPC_BASE) for i in range(NODES)]
+    try:
+        for ch in channels:
+            await asyncio.wait_for(ch.channel_ready(), 60)
+        products = [product_db_pb2_grpc.ProductDBStub(ch) for ch in channels[:NODES]]
+        customers = [customer_db_pb2_grpc.CustomerDBStub(ch) for ch in channels[NODES:]]
+
+        # Wait for a Raft leader, then create the item to read and the sessions
+        while (await products[0].RegisterItem(product_db_pb2.RegisterItemRequest(
+                seller_id=1, name="bench", category=1, keywords=["bench"],
+                condition="New", price=1.0, quantity=10), timeout=15)).status != "success":
+            await asyncio.sleep(0.5)
+        sessions = []
+        for c in range(args.customer_clients):
+            resp = await customers[c % NODES].StoreSession(
+                customer_db_pb2.StoreSessionRequest(user_id=c + 1, user_type="buyer"), timeout=30)
+            sessions.append(resp.session_id)
+        await asyncio.sleep(1)
+
+        latencies = defaultdict(list)
+        failures = defaultdict(Counter)
+        stop = time.perf_counter() + args.duration
+
+        async def call(stubs, c, method, request):
+            """One call, trying each replica in turn like StubPool."""
+            t0 = time.perf_counter()
+            for i in range(NODES):
+                try:
+                    await getattr(stubs[(c + i) % NODES], method)(request, timeout=TIMEOUT)
+                    latencies[method].append(time.perf_counter() - t0)
+                    return
+                except grpc.RpcError as e:
+                    code = e.code()
+            failures[method][code.name] += 1
+
+        async def product_client(c):
+            read = product_db_pb2.ItemIdRequest(
+                item_id=product_db_pb2.ItemId(category=1, item_id=1))
+            write = product_db_pb2.StoreCartRequest(buyer_id=c + 1, cart=[product_db_pb2.CartItem(
+                item_id=product_db_pb2.ItemId(category=1, item_id=1), quantity=1)])
+            while time.perf_counter() < stop:
+                await call(products, c, "GetItem", read)
+                await call(products, c, "StoreCart", write)
+
+        async def customer_client(c):
+            read = customer_db_pb2.GetSessionRequest(session_id=sessions[c])
+            touch = customer_db_pb2.SessionRequest(session_id=sessions[c])
+            while time.perf_counter() < stop:
+                await call(customers, c, "GetSession", read)
+                await call(customers, c, "UpdateSessionActivity", touch)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(product_client(c) for c in range(args.product_clients)),
+            *(customer_client(c) for c in range(args.customer_clients)),
+        )
+        elapsed = time.perf_counter() - t0
+        return {
+            method: {
+                "served_per_s": round(len(latencies[method]) / elapsed, 1),
+                "p50_ms": round(percentile(latencies[method], 0.5) * 1000, 1)
+                          if latencies[method] else None,
+                "p99_ms": round(percentile(latencies[method], 0.99) * 1000, 1)
+                          if latencies[method] else None,
+                "failed": dict(failures[method]),
+            }
+            for method in ("GetItem", "StoreCart", "GetSession", "UpdateSessionActivity")
+        }
+    finally:
+        for ch in channels:
+            await ch.close()
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DB servers under overload, with and "
+                                                 "without admission control")
+    parser.add_argument("--product-clients", type=int, default=100)
+    parser.add_argument("--customer-clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--output", default="benchmark_admission_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("unbounded", "admission"):
+        print(f"{mode}: {args.product_clients} product + {args.customer_clients} customer "
+              f"clients for {args.duration:.0f} s...")
+        results[mode] = asyncio.run(run(args, mode == "admission"))
+        for method, r in results[mode].items():
+            print(f"  {method:<22s} {r['served_per_s']:7.1f}/s   p50 {r['p50_ms']} ms   "
+                  f"p99 {r['p99_ms']} ms   failed {r['failed']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
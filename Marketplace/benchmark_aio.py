@@ -0,0 +1,151 @@
+"""
+Threaded vs grpc.aio serving benchmark for the replicated databases.
+
+Starts a 3-node Raft product DB and a 3-node customer DB broadcast group on
+localhost (one process per replica), first with the default threaded
+servers and then with --aio, and drives 100 concurrent product DB writers
+(StoreCart) plus 100 concurrent customer DB writers (UpdateSessionActivity)
+spread over the replicas. Reports writes per second and median latency.
+
+Usage:
+  python benchmark_aio.py --product-clients 100 --customer-clients 100 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import grpc
+
+import customer_db_pb2
+import customer_db_pb2_grpc
+import product_db_pb2
+import product_db_pb2_grpc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NODES = 3
+RAFT_BASE = 15400
+UDP_BASE = 18600
+PRODUCT_GRPC_BASE = 51800
+CUSTOMER_GRPC_BASE = 51900
+
+
+def start_servers(extra=()):
+    """Start the replicas with extra server arguments; returns the processes."""
+    workdir = tempfile.mkdtemp()
+    extra = list(extra)
+    raft = [f"127.0.0.1:{RAFT_BASE + i}" for i in range(NODES)]
+    members = ",".join(f"127.0.0.1:{UDP_BASE + i}" for i in range(NODES))
+    procs = []
+    for i in range(NODES):
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "product_database_replicated.py"),
+             "--raft-addr", raft[i], "--raft-partners", ",".join(a for a in raft if a != raft[i]),
+             "--grpc-host", "127.0.0.1", "--grpc-port", str(PRODUCT_GRPC_BASE + i)] + extra,
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "customer_database_replicated.py"),
+             "--node-id", str(i), "--members", members,
+             "--grpc-host", "127.0.0.1", "--grpc-port", str(CUSTOMER_GRPC_BASE + i)] + extra,
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    return procs
+
+
+async def run(args, aio):
+    procs = start_servers(["--aio"] if aio else [])
+    channels = [grpc.aio.insecure_channel(f"127.0.0.1:{base + i}")
+                for base in (PRODUCT_GRPC_BASE, CUSTOMER_GRPC_BASE) for i in range(NODES)]
+    try:
+        for ch in channels:
+            await asyncio.wait_for(ch.channel_ready(), 60)
+        products = [product_db_pb2_grpc.ProductDBStub(ch) for ch in channels[:NODES]]
+        customers = [customer_db_pb2_grpc.CustomerDBStub(ch) for ch in channels[NODES:]]
+
+        # Wait for a Raft leader, then create the customer sessions to touch
+        while (await products[0].ClearCart(product_db_pb2.BuyerIdRequest(buyer_id=0),
+                                           timeout=15)).status != "success":
+            await asyncio.sleep(0.5)
+        sessions = []
+        for c in range(args.customer_clients):
+            resp = await customers[c % NODES].StoreSession(
+                customer_db_pb2.StoreSessionRequest(user_id=c + 1, user_type="buyer"), timeout=30)
+            sessions.append(resp.session_id)
+        await asyncio.sleep(1)
+
+        latencies = {"product": [], "customer": []}
+        stop = time.perf_counter() + args.duration
+
+        async def product_client(c):
+            stub = products[c % NODES]
+            request = product_db_pb2.StoreCartRequest(buyer_id=c + 1, cart=[product_db_pb2.CartItem(
+                item_id=product_db_pb2.ItemId(category=1, item_id=1), quantity=1)])
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                try:
+                    resp = await stub.StoreCart(request, timeout=30)
+                except grpc.RpcError:
+                    continue
+                if resp.status == "success":
+                    latencies["product"].append(time.perf_counter() - t0)
+
+        async def customer_client(c):
+            stub = customers[c % NODES]
+            request = customer_db_pb2.SessionRequest(session_id=sessions[c])
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                try:
+                    resp = await stub.UpdateSessionActivity(request, timeout=30)
+                except grpc.RpcError:
+                    continue
+                if resp.status == "success":
+                    latencies["customer"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(
+            *(product_client(c) for c in range(args.product_clients)),
+            *(customer_client(c) for c in range(args.customer_clients)),
+        )
+        elapsed = time.perf_counter() - t0
+        return {
+            db: {
+                "writes_per_s": round(len(lat) / elapsed, 1),
+                "p50_ms": round(statistics.median(lat) * 1000, 1) if lat else None,
+            }
+            for db, lat in latencies.items()
+        }
+    finally:
+        for ch in channels:
+            await ch.close()
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threaded vs grpc.aio DB servers")
+    parser.add_argument("--product-clients", type=int, default=100)
+    parser.add_argument("--customer-clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark_aio_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("threaded", "aio"):
+        print(f"{mode}: {args.product_clients} product + {args.customer_clients} customer "
+              f"writers for {args.duration:.0f} s...")
+        results[mode] = asyncio.run(run(args, mode == "aio"))
+        for db, r in results[mode].items():
+            print(f"  {db:<8s} {r['writes_per_s']:8.1f} writes/s   p50 {r['p50_ms']} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,110 @@
+"""
+Ordered-write benchmark for the hash-sharded customer DB.
+
+Starts 1 and then 2 (or --groups) independent broadcast groups of --nodes
+customer DB replicas on localhost, one process per replica, registers users through
+UserShardedStubPool, and drives session writes (StoreSession followed by
+UpdateSessionActivity), which are the writes every login and request makes.
+Reports ordered writes per second for each group count.
+
+Usage:
+  python benchmark_customer_shards.py --groups 1 2 --nodes 3 --threads 16 --duration 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import grpc
+
+import customer_db_pb2
+import customer_db_pb2_grpc
+from stub_pool import UserShardedStubPool
+
+UDP_BASE = 18500
+GRPC_BASE = 51700
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "customer_database_replicated.py")
+
+
+def start_groups(groups, nodes):
+    """Start every replica as its own process, as in a deployment; returns (procs, addrs)."""
+    workdir = tempfile.mkdtemp()
+    procs, addrs = [], []
+    for g in range(groups):
+        members = ",".join(f"127.0.0.1:{UDP_BASE + 10 * g + i}" for i in range(nodes))
+        group_addrs = []
+        for i in range(nodes):
+            port = GRPC_BASE + 10 * g + i
+            procs.append(subprocess.Popen(
+                [sys.executable, SERVER, "--node-id", str(i), "--members", members,
+                 "--grpc-host", "127.0.0.1", "--grpc-port", str(port),
+                 "--shard-index", str(g), "--shard-count", str(groups)],
+                cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            ))
+            group_addrs.append(f"127.0.0.1:{port}")
+        addrs.append(group_addrs)
+    for addr in sum(addrs, []):
+        with grpc.insecure_channel(addr) as channel:
+            grpc.channel_ready_future(channel).result(timeout=60)
+    return procs, addrs
+
+
+def run(groups, args):
+    procs, addrs = start_groups(groups, args.nodes)
+    pool = UserShardedStubPool(addrs, customer_db_pb2_grpc.CustomerDBStub)
+    try:
+        user_ids = []
+        for t in range(args.threads):
+            resp = pool.call("StoreUser", customer_db_pb2.StoreUserRequest(
+                username=f"bench_{t}", password="pw", name=f"bench {t}", user_type="buyer"))
+            user_ids.append(resp.user_id)
+
+        counts = [0] * args.threads
+        stop = time.perf_counter() + args.duration
+
+        def worker(t):
+            while time.perf_counter() < stop:
+                sess = pool.call("StoreSession", customer_db_pb2.StoreSessionRequest(
+                    user_id=user_ids[t], user_type="buyer"))
+                pool.call("UpdateSessionActivity", customer_db_pb2.SessionRequest(
+                    session_id=sess.session_id))
+                counts[t] += 2
+
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        return {"writes": sum(counts), "writes_per_s": round(sum(counts) / elapsed, 1)}
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Customer DB sharding benchmark")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark_customer_shards_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for groups in args.groups:
+        print(f"{groups} group(s) x {args.nodes} nodes, {args.threads} threads...")
+        results[groups] = run(groups, args)
+        print(f"  {results[groups]['writes']} writes, {results[groups]['writes_per_s']:.1f}/s")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,138 @@
+"""
+Hot-item purchase benchmark for the Raft product DB.
+
+Starts a localhost cluster (Raft + gRPC per node, configured like serve())
+with one item of large stock, and drives concurrent MakePurchase calls for
+that single SKU, spread over all replicas, in two modes:
+
+  normal — every purchase is its own make_purchase Raft entry
+  escrow — each replica sells from its escrow slice, acknowledges a sale
+           once it is in the local journal and settles sales in batches
+           (EscrowSeller)
+
+Reports successful purchases per second and the Raft entries they took
+(escrow sales are counted once settled).
+
+Usage:
+  python benchmark_escrow.py --nodes 3 --threads 32 --duration 10
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+import grpc
+from pysyncobj import SyncObjConf
+
+import product_db_pb2
+import product_db_pb2_grpc
+from product_database_replicated import (
+    ESCROW_SLICE,
+    EscrowSeller,
+    RaftProductDB,
+    ReplicatedProductDBServicer,
+    add_servicer_to_server,
+)
+
+RAFT_BASE_PORT = 15300
+GRPC_BASE_PORT = 51500
+
+
+def start_cluster(n, escrow_slice, port_offset):
+    raft_addrs = [f"127.0.0.1:{RAFT_BASE_PORT + port_offset + i}" for i in range(n)]
+    grpc_addrs = [f"127.0.0.1:{GRPC_BASE_PORT + port_offset + i}" for i in range(n)]
+    nodes, servers, sellers = [], [], []
+    journal_dir = tempfile.mkdtemp()
+    for addr, grpc_addr in zip(raft_addrs, grpc_addrs):
+        conf = SyncObjConf(
+            autoTick=True,
+            appendEntriesUseBatch=True,
+            dynamicMembershipChange=False,
+            commandsWaitLeader=True,
+            connectionTimeout=5.0,
+            raftMinTimeout=0.4,
+            raftMaxTimeout=1.4,
+        )
+        node = RaftProductDB(addr, [a for a in raft_addrs if a != addr], conf)
+        escrow = None
+        if escrow_slice:
+            escrow = EscrowSeller(node, addr, escrow_slice,
+                                  os.path.join(journal_dir, f"escrow_{len(nodes)}.log"))
+            sellers.append(escrow)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=64))
+        add_servicer_to_server(ReplicatedProductDBServicer(node, escrow=escrow), server)
+        server.add_insecure_port(grpc_addr)
+        server.start()
+        nodes.append(node)
+        servers.append(server)
+    if nodes[0].wait_for_leader(15) is None:
+        raise RuntimeError("Raft leader election timed out")
+    time.sleep(1)
+    return nodes, servers, sellers, grpc_addrs
+
+
+def run_mode(args, escrow_slice, port_offset):
+    nodes, servers, sellers, addrs = start_cluster(args.nodes, escrow_slice, port_offset)
+    channels = [grpc.insecure_channel(a) for a in addrs]
+    stubs = [product_db_pb2_grpc.ProductDBStub(ch) for ch in channels]
+    try:
+        item = stubs[0].RegisterItem(product_db_pb2.RegisterItemRequest(
+            seller_id=1, name="hot", category=0, keywords=["hot"],
+            condition="New", price=1.0, quantity=10 ** 7,
+        ), timeout=15).item_id
+        request = product_db_pb2.MakePurchaseRequest(buyer_id=1, item_id=item, quantity=1)
+
+        counts = [0] * args.threads
+        stop = time.perf_counter() + args.duration
+
+        def worker(t):
+            stub = stubs[t % len(stubs)]
+            while time.perf_counter() < stop:
+                if stub.MakePurchase(request, timeout=15).status == "success":
+                    counts[t] += 1
+
+        workers = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        for seller in sellers:
+            seller.flush(30)
+        return {"purchases": sum(counts), "purchases_per_s": round(sum(counts) / elapsed, 1),
+                "raft_entries": nodes[0].raftLastApplied}
+    finally:
+        for ch in channels:
+            ch.close()
+        for s in servers:
+            s.stop(0)
+        for n in nodes:
+            n.destroy()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-item escrow benchmark")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--escrow-slice", type=int, default=ESCROW_SLICE)
+    parser.add_argument("--output", default="benchmark_escrow_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for offset, (name, escrow_slice) in enumerate((("normal", 0), ("escrow", args.escrow_slice))):
+        print(f"{name}: {args.threads} threads on one SKU for {args.duration:.0f} s...")
+        results[name] = run_mode(args, escrow_slice, offset * 10)
+        r = results[name]
+        print(f"  {r['purchases']} purchases, {r['purchases_per_s']:.1f}/s, "
+              f"{r['raft_entries']} Raft entries")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
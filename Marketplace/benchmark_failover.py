@@ -0,0 +1,122 @@
+"""
+Replica failover benchmark for StubPool's circuit breakers.
+
+Starts a 3-replica Raft product DB (benchmark_read_balancing.start_cluster),
+drives concurrent GetItem readers through a balanced StubPool (hedging off,
+so only the breakers help) and takes one follower down --fail-at seconds in:
+
+  kill  — SIGKILL: connections are refused
+  stall — SIGSTOP: the replica accepts nothing and answers nothing, like a
+          host that dropped off the network; calls wait for their deadline
+
+once with the background health probe off (probe_interval=0: breakers open
+only on failed calls) and once with the default probe. Reports reads per
+second, p99/max latency, reads slower than a second and failed reads.
+
+Usage:
+  python benchmark_failover.py --threads 16 --duration 20 --timeout 10
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+
+import grpc
+
+import product_db_pb2
+import product_db_pb2_grpc
+from benchmark_read_balancing import start_cluster
+from stub_pool import PRODUCT_DB_WRITE_METHODS, PROBE_INTERVAL, StubPool
+
+
+def run(args, failure, probe_interval):
+    procs, addrs = start_cluster(3)
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS, hedge_budget=0,
+                    probe_interval=probe_interval)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                item = pool.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+                    seller_id=1, name="bench", category=1, keywords=["bench"],
+                    condition="New", price=1.0, quantity=10))
+                if item.status == "success":
+                    break
+            except grpc.RpcError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("no Raft leader")
+            time.sleep(0.5)
+        time.sleep(1)
+        request = product_db_pb2.ItemIdRequest(item_id=item.item_id)
+        follower = procs[next(i for i in range(3) if i != pool.leader)]
+
+        latencies = [[] for _ in range(args.threads)]
+        failed = [0] * args.threads
+        stop = time.perf_counter() + args.duration
+
+        def reader(t):
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                try:
+                    pool.call("GetItem", request, timeout=args.timeout)
+                except grpc.RpcError:
+                    failed[t] += 1
+                    continue
+                latencies[t].append(time.perf_counter() - t0)
+
+        def fail():
+            os.kill(follower.pid, signal.SIGKILL if failure == "kill" else signal.SIGSTOP)
+
+        threads = [threading.Thread(target=reader, args=(t,)) for t in range(args.threads)]
+        injector = threading.Timer(args.fail_at, fail)
+        t0 = time.perf_counter()
+        injector.start()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t0
+        lat = sorted(sum(latencies, []))
+        return {
+            "reads_per_s": round(len(lat) / elapsed, 1),
+            "p99_ms": round(lat[int(0.99 * (len(lat) - 1))] * 1000, 1),
+            "max_ms": round(lat[-1] * 1000, 1),
+            "reads_over_1s": sum(1 for x in lat if x > 1.0),
+            "failed": sum(failed),
+        }
+    finally:
+        pool.close()
+        for proc in procs:
+            if proc.poll() is None:
+                os.kill(proc.pid, signal.SIGCONT)
+                proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StubPool failover benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--fail-at", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark_failover_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for failure in ("kill", "stall"):
+        print(f"{failure} a follower after {args.fail_at:.0f} s, {args.threads} reader threads...")
+        results[failure] = {}
+        for name, interval in (("no_probe", 0), ("probe", PROBE_INTERVAL)):
+            r = results[failure][name] = run(args, failure, interval)
+            print(f"  {name:<8s} {r['reads_per_s']:8.1f} reads/s   p99 {r['p99_ms']} ms   "
+                  f"max {r['max_ms']} ms   over 1 s {r['reads_over_1s']}   failed {r['failed']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,142 @@
+"""
+Frontend worker scaling benchmark for prefork serving (--workers).
+
+Starts a customer DB, a SQLite product DB and the financial service on
+localhost, registers --items items in one category, then for each count in
+--workers starts buyer_server.py with that many workers and has --threads
+client threads search the category (GET /buyer/items, full response each
+time) for --duration seconds. Reports searches per second and p99 latency.
+
+Each search returns every item, so the frontend's JSON encoding dominates
+its cost and one worker is bound by one interpreter. Throughput can only
+grow with the worker count while there are idle cores: the backends and the
+client threads run on the same host and take their share.
+
+Usage:
+  python benchmark_frontend_workers.py --workers 1 2 4 --threads 32 --duration 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import grpc
+import requests
+
+import product_db_pb2
+import product_db_pb2_grpc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CUSTOMER_PORT = 53051
+PRODUCT_PORT = 53052
+FINANCIAL_PORT = 53080
+BUYER_PORT = 53004
+
+
+def start(script, *args, cwd):
+    return subprocess.Popen([sys.executable, os.path.join(HERE, script), *map(str, args)],
+                            cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_http(url, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return requests.get(url, timeout=1)
+        except requests.ConnectionError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def start_backends(items):
+    workdir = tempfile.mkdtemp()
+    procs = [start("customer_database.py", "--port", CUSTOMER_PORT, cwd=workdir),
+             start("product_database.py", "--port", PRODUCT_PORT, cwd=workdir),
+             start("financial_service.py", "--port", FINANCIAL_PORT, cwd=workdir)]
+    with grpc.insecure_channel(f"127.0.0.1:{PRODUCT_PORT}") as channel:
+        grpc.channel_ready_future(channel).result(timeout=30)
+        stub = product_db_pb2_grpc.ProductDBStub(channel)
+        for i in range(items):
+            stub.RegisterItem(product_db_pb2.RegisterItemRequest(
+                seller_id=1, name=f"item{i}", category=1, keywords=["bench"],
+                condition="New", price=1.0 + i, quantity=10))
+    wait_http(f"http://127.0.0.1:{FINANCIAL_PORT}/?wsdl")
+    return procs
+
+
+def run(args, workers):
+    buyer = start("buyer_server.py", "--host", "127.0.0.1", "--port", BUYER_PORT,
+                  "--workers", workers,
+                  "--customer-db-addrs", f"127.0.0.1:{CUSTOMER_PORT}",
+                  "--product-db-addrs", f"127.0.0.1:{PRODUCT_PORT}",
+                  "--financial-host", "127.0.0.1", "--financial-port", FINANCIAL_PORT,
+                  cwd=HERE)
+    base = f"http://127.0.0.1:{BUYER_PORT}/buyer"
+    try:
+        wait_http(f"{base}/backends")
+        name = f"bench{workers}_{time.time_ns()}"
+        requests.post(f"{base}/account", json={"username": name, "password": "pw", "name": name})
+        session = requests.post(f"{base}/login",
+                                json={"username": name, "password": "pw"}).json()["session_id"]
+
+        latencies = [[] for _ in range(args.threads)]
+        stop = time.perf_counter() + args.duration
+
+        def client(t):
+            http = requests.Session()
+            http.headers["X-Session-ID"] = session
+            while time.perf_counter() < stop:
+                t0 = time.perf_counter()
+                resp = http.get(f"{base}/items", params={"category": 1})
+                if resp.status_code == 200:
+                    latencies[t].append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=client, args=(t,)) for t in range(args.threads)]
+        t0 = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t0
+        lat = sorted(sum(latencies, []))
+        return {
+            "searches_per_s": round(len(lat) / elapsed, 1),
+            "p99_ms": round(lat[int(0.99 * (len(lat) - 1))] * 1000, 1),
+        }
+    finally:
+        buyer.terminate()
+        buyer.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frontend worker scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--output", default="benchmark_frontend_workers_results.json")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.items} items per search, {args.threads} client threads")
+    procs = start_backends(args.items)
+    results = {"cpus": os.cpu_count()}
+    try:
+        for workers in args.workers:
+            r = results[workers] = run(args, workers)
+            print(f"  {workers:2d} workers  {r['searches_per_s']:8.1f} searches/s   "
+                  f"p99 {r['p99_ms']} ms")
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,124 @@
+"""
+Hedged read benchmark for StubPool.
+
+Starts a 3-replica Raft product DB (benchmark_read_balancing.start_cluster)
+and pauses one follower for --stall-ms out of every second (SIGSTOP/SIGCONT),
+the way a snapshot or SQLite checkpoint stalls a replica. Concurrent GetItem
+readers go through a balanced StubPool without hedging (hedge_budget=0) and
+then with the default budget. Reports reads per second, p50/p99/max latency
+and the share of reads that were hedged.
+
+Usage:
+  python benchmark_hedging.py --threads 16 --duration 10 --stall-ms 200
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+
+import product_db_pb2
+import product_db_pb2_grpc
+from benchmark_read_balancing import start_cluster
+from stub_pool import HEDGE_BUDGET, PRODUCT_DB_WRITE_METHODS, StubPool
+
+
+def stall(proc, stall_s, stop):
+    while not stop.is_set():
+        os.kill(proc.pid, signal.SIGSTOP)
+        time.sleep(stall_s)
+        os.kill(proc.pid, signal.SIGCONT)
+        stop.wait(1.0 - stall_s)
+
+
+def run(args):
+    procs, addrs = start_cluster(3)
+    writer = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                      write_methods=PRODUCT_DB_WRITE_METHODS)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                item = writer.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+                    seller_id=1, name="bench", category=1, keywords=["bench"],
+                    condition="New", price=1.0, quantity=10))
+                if item.status == "success":
+                    break
+            except Exception:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("no Raft leader")
+            time.sleep(0.5)
+        time.sleep(1)
+        request = product_db_pb2.ItemIdRequest(item_id=item.item_id)
+        follower = next(i for i in range(3) if i != writer.leader)
+
+        results = {}
+        for name, budget in (("no_hedging", 0), ("hedging", HEDGE_BUDGET)):
+            pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                            write_methods=PRODUCT_DB_WRITE_METHODS, hedge_budget=budget)
+            for _ in range(50):     # learn the read latency first
+                pool.call("GetItem", request)
+            pool.hedges = 0
+            latencies = [[] for _ in range(args.threads)]
+            stop_at = time.perf_counter() + args.duration
+            stop_stall = threading.Event()
+            staller = threading.Thread(target=stall, args=(procs[follower],
+                                                           args.stall_ms / 1000, stop_stall))
+
+            def reader(t):
+                while time.perf_counter() < stop_at:
+                    t0 = time.perf_counter()
+                    pool.call("GetItem", request)
+                    latencies[t].append(time.perf_counter() - t0)
+
+            threads = [threading.Thread(target=reader, args=(t,)) for t in range(args.threads)]
+            staller.start()
+            t0 = time.perf_counter()
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            elapsed = time.perf_counter() - t0
+            stop_stall.set()
+            staller.join()
+            lat = sorted(sum(latencies, []))
+            results[name] = {
+                "reads_per_s": round(len(lat) / elapsed, 1),
+                "p50_ms": round(lat[len(lat) // 2] * 1000, 1),
+                "p99_ms": round(lat[int(0.99 * (len(lat) - 1))] * 1000, 1),
+                "max_ms": round(lat[-1] * 1000, 1),
+                "hedged_pct": round(100 * pool.hedges / len(lat), 1),
+            }
+            for ch in pool.channels:
+                ch.close()
+        return results
+    finally:
+        for ch in writer.channels:
+            ch.close()
+        for proc in procs:
+            os.kill(proc.pid, signal.SIGCONT)
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StubPool hedged read benchmark")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--stall-ms", type=float, default=200.0)
+    parser.add_argument("--output", default="benchmark_hedging_results.json")
+    args = parser.parse_args()
+
+    print(f"3 replicas, one stalled {args.stall_ms:.0f} ms/s, {args.threads} reader threads...")
+    results = run(args)
+    for name, r in results.items():
+        print(f"  {name:<10s} {r['reads_per_s']:8.1f} reads/s   p50 {r['p50_ms']} ms   "
+              f"p99 {r['p99_ms']} ms   max {r['max_ms']} ms   hedged {r['hedged_pct']}%")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,131 @@
+"""
+Read-heavy microbenchmark for the cached ItemData bytes in the replicated
+product DB.
+
+Runs a single-node Raft product DB behind a local gRPC server and measures
+GetItem and SearchItems throughput twice:
+
+  uncached — the previous read path: build ItemData protos on every call
+  cached   — the current path: splice cached ItemData bytes into the response
+
+Usage:
+  python benchmark_item_cache.py --items 2000 --calls 5000 --threads 8
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent import futures
+
+import grpc
+from pysyncobj import SyncObjConf
+
+import product_db_pb2
+import product_db_pb2_grpc
+from product_database_replicated import (
+    RaftProductDB,
+    ReplicatedProductDBServicer,
+    _item_dict_to_proto,
+    add_servicer_to_server,
+)
+
+RAFT_ADDR = "127.0.0.1:15100"
+GRPC_PORT = 51300
+
+
+class UncachedServicer(ReplicatedProductDBServicer):
+    """Read RPCs as they were before the ItemData cache."""
+
+    def GetItem(self, request, context):
+        item = self.raft.get_item(request.item_id.category, request.item_id.item_id)
+        if item is None:
+            return product_db_pb2.GetItemResponse(status='error', message='Item not found')
+        return product_db_pb2.GetItemResponse(
+            status='success', message='',
+            item=_item_dict_to_proto(request.item_id.category, request.item_id.item_id, item)
+        )
+
+    def SearchItems(self, request, context):
+        results = self.raft.search_items(
+            request.category, request.has_category, list(request.keywords)
+        )
+        items = [_item_dict_to_proto(cat, iid, item) for cat, iid, item in results]
+        return product_db_pb2.GetItemsResponse(status='success', message='', items=items)
+
+
+def run_calls(stub, method, requests_, calls, threads):
+    """Issue `calls` RPCs split across `threads` threads; return ops/s."""
+    per_thread = calls // threads
+
+    def worker(offset):
+        fn = getattr(stub, method)
+        for i in range(per_thread):
+            fn(requests_[(offset + i) % len(requests_)], timeout=10)
+
+    workers = [threading.Thread(target=worker, args=(t * 7,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - t0)
+
+
+def bench(servicer_class, raft_node, args):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=args.threads))
+    add_servicer_to_server(servicer_class(raft_node), server)
+    server.add_insecure_port(f"127.0.0.1:{GRPC_PORT}")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{GRPC_PORT}")
+    stub = product_db_pb2_grpc.ProductDBStub(channel)
+    try:
+        get_reqs = [
+            product_db_pb2.ItemIdRequest(item_id=product_db_pb2.ItemId(category=i % 10, item_id=i))
+            for i in range(1, args.items + 1)
+        ]
+        search_reqs = [
+            product_db_pb2.SearchItemsRequest(category=c, has_category=True, keywords=["bench"])
+            for c in range(10)
+        ]
+        run_calls(stub, "GetItem", get_reqs, min(args.calls, 500), args.threads)   # warm up
+        return {
+            "get_item_ops_s": round(run_calls(stub, "GetItem", get_reqs, args.calls, args.threads), 1),
+            "search_items_ops_s": round(
+                run_calls(stub, "SearchItems", search_reqs, args.calls // 10, args.threads), 1),
+        }
+    finally:
+        channel.close()
+        server.stop(0)
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ItemData cache microbenchmark")
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--output", default="benchmark_item_cache_results.json")
+    args = parser.parse_args()
+
+    raft_node = RaftProductDB(RAFT_ADDR, [], SyncObjConf(autoTick=True, dynamicMembershipChange=False))
+    try:
+        while raft_node._getLeader() is None:
+            time.sleep(0.1)
+        # Item ids are assigned sequentially; category = item_id % 10 as in bench()
+        raft_node.register_items([
+            (i % 50, f"item_{i}", i % 10, ["bench", f"kw{i % 20}"], "New", 9.99, 100)
+            for i in range(1, args.items + 1)
+        ], sync=True, timeout=60)
+
+        results = {}
+        for name, cls in (("uncached", UncachedServicer), ("cached", ReplicatedProductDBServicer)):
+            results[name] = bench(cls, raft_node, args)
+            print(f"{name:<9s} GetItem {results[name]['get_item_ops_s']:9.1f} ops/s   "
+                  f"SearchItems {results[name]['search_items_ops_s']:9.1f} ops/s")
+    finally:
+        raft_node.destroy()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,123 @@
+"""
+Write-routing benchmark for the Raft product DB.
+
+Starts a localhost cluster (Raft + gRPC per node, configured like serve())
+and compares write latency through two StubPools:
+
+  sticky — the old behaviour: every call goes to one replica, here a
+           follower, which forwards the write to the leader
+  leader — write_methods set: writes go to the leader named by the hint
+
+Usage:
+  python benchmark_leader_routing.py --nodes 5 --calls 300
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent import futures
+
+import grpc
+from pysyncobj import SyncObjConf
+
+import product_db_pb2
+import product_db_pb2_grpc
+from product_database_replicated import (
+    RaftProductDB,
+    ReplicatedProductDBServicer,
+    add_servicer_to_server,
+)
+from stub_pool import StubPool, PRODUCT_DB_WRITE_METHODS
+
+RAFT_BASE_PORT = 15200
+GRPC_BASE_PORT = 51400
+
+
+def start_cluster(n):
+    raft_addrs = [f"127.0.0.1:{RAFT_BASE_PORT + i}" for i in range(n)]
+    grpc_addrs = {a: f"127.0.0.1:{GRPC_BASE_PORT + i}" for i, a in enumerate(raft_addrs)}
+    nodes, servers = [], []
+    for addr in raft_addrs:
+        conf = SyncObjConf(
+            autoTick=True,
+            appendEntriesUseBatch=True,
+            dynamicMembershipChange=False,
+            commandsWaitLeader=True,
+            connectionTimeout=5.0,
+            raftMinTimeout=0.4,
+            raftMaxTimeout=1.4,
+        )
+        node = RaftProductDB(addr, [a for a in raft_addrs if a != addr], conf)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        add_servicer_to_server(ReplicatedProductDBServicer(node, grpc_addrs), server)
+        server.add_insecure_port(grpc_addrs[addr])
+        server.start()
+        nodes.append(node)
+        servers.append(server)
+    if nodes[0].wait_for_leader(15) is None:
+        raise RuntimeError("Raft leader election timed out")
+    time.sleep(1)
+    return nodes, servers, [grpc_addrs[a] for a in raft_addrs]
+
+
+def timed_writes(pool, calls):
+    """Register then buy one item per iteration; return per-method latencies (ms)."""
+    latencies = {"RegisterItem": [], "MakePurchase": []}
+    for i in range(calls):
+        t0 = time.perf_counter()
+        resp = pool.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+            seller_id=1, name=f"bench_{i}", category=i % 10, keywords=["bench"],
+            condition="New", price=9.99, quantity=10,
+        ))
+        latencies["RegisterItem"].append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        pool.call("MakePurchase", product_db_pb2.MakePurchaseRequest(
+            buyer_id=1, item_id=resp.item_id, quantity=1,
+        ))
+        latencies["MakePurchase"].append((time.perf_counter() - t0) * 1000)
+    return latencies
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples), 2),
+        "p50_ms": round(samples[len(samples) // 2], 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95)], 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leader-aware write routing benchmark")
+    parser.add_argument("--nodes", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--output", default="benchmark_leader_routing_results.json")
+    args = parser.parse_args()
+
+    nodes, servers, addrs = start_cluster(args.nodes)
+    try:
+        leader = next(i for i, n in enumerate(nodes) if n._isLeader())
+        follower = (leader + 1) % len(addrs)
+        # Sticky pool pinned to a follower, as after a failover
+        sticky = StubPool(addrs[follower:] + addrs[:follower], product_db_pb2_grpc.ProductDBStub)
+        aware = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                         write_methods=PRODUCT_DB_WRITE_METHODS)
+
+        results = {}
+        for name, pool in (("sticky", sticky), ("leader", aware)):
+            timed_writes(pool, 10)   # warm up (and learn the leader)
+            latencies = timed_writes(pool, args.calls)
+            results[name] = {m: summarize(v) for m, v in latencies.items()}
+            for method, r in results[name].items():
+                print(f"{name:<7s} {method:<13s} mean={r['mean_ms']:7.2f} ms  "
+                      f"p50={r['p50_ms']:7.2f} ms  p95={r['p95_ms']:7.2f} ms")
+    finally:
+        for s in servers:
+            s.stop(0)
+        for n in nodes:
+            n.destroy()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
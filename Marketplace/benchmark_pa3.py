@@ -16,6 +16,10 @@ Concurrency scenarios:
   Scenario 3: 100 sellers + 100 buyers
 
 Each client makes CALLS_PER_RUN API calls per run, averaged over NUM_RUNS.
+
+With --buyer-batch, buyers send the four calls that follow each search
+(get item, validate cart, save cart, seller rating) as one /buyer/batch
+request, recorded as buyer.batch and counted as four calls.
 """
 
 import requests
@@ -32,6 +36,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # ── Defaults ─────────────────────────────────────────────────────────────────
 CALLS_PER_RUN = 1000
 NUM_RUNS      = 10
+BUYER_BATCH   = False
 
 # Seller and buyer server URLs (multiple for failover)
 SELLER_URLS = ["http://localhost:5003"]
@@ -194,9 +199,10 @@ def run_seller(seller_urls, calls_per_run, client_idx=0):
 
 
 # ── Buyer workload ───────────────────────────────────────────────────────────
-def run_buyer(buyer_urls, calls_per_run, client_idx=0):
+def run_buyer(buyer_urls, calls_per_run, client_idx=0, batch=False):
     """
     One buyer session: create account, login, cycle through operations.
+    With batch, the calls after each search go out as one /buyer/batch.
     Returns dict of {operation_name: [latencies]}.
     """
     session = requests.Session()
@@ -242,7 +248,20 @@ def run_buyer(buyer_urls, calls_per_run, client_idx=0):
         op = i % 5
         i += 1
 
-        if op == 0:
+        if batch and op == 1 and found_item:
+            cat, iid = found_item
+            call("batch", "POST", "/buyer/batch", json={"requests": [
+                {"method": "GET", "path": f"/buyer/items/{cat}/{iid}"},
+                {"method": "POST", "path": "/buyer/cart/validate",
+                 "body": {"item_id": found_item, "quantity": 1}},
+                {"method": "PUT", "path": "/buyer/cart",
+                 "body": {"cart": [{"item_id": found_item, "quantity": 1}]}},
+                {"method": "GET", "path": f"/buyer/seller/{found_seller}/rating"},
+            ]})
+            total_calls += 3
+            i += 3
+
+        elif op == 0:
             r = call("search_items", "GET", "/buyer/items", params={"keywords": "bench"})
             if r.get("status") == "success" and r.get("items"):
                 item = r["items"][0]
@@ -289,7 +308,7 @@ def run_once(num_sellers, num_buyers, failure_name="no_failure", inject_at_pct=3
                 all_latencies[f"seller.{op}"].extend(times)
 
     def buyer_task(idx):
-        lats = run_buyer(BUYER_URLS, CALLS_PER_RUN, client_idx=idx)
+        lats = run_buyer(BUYER_URLS, CALLS_PER_RUN, client_idx=idx, batch=BUYER_BATCH)
         with lock:
             for op, times in lats.items():
                 all_latencies[f"buyer.{op}"].extend(times)
@@ -428,6 +447,8 @@ if __name__ == "__main__":
                         help="VM:pattern for killing a product DB follower")
     parser.add_argument("--kill-leader", type=str, default="",
                         help="VM:pattern for killing the product DB leader")
+    parser.add_argument("--buyer-batch", action="store_true",
+                        help="Buyers send the calls after each search as one /buyer/batch")
     parser.add_argument("--output", default="benchmark_pa3_results.json",
                         help="JSON file to save results")
     args = parser.parse_args()
@@ -436,6 +457,7 @@ if __name__ == "__main__":
     BUYER_URLS = [u.strip() for u in args.buyer_urls.split(",")]
     CALLS_PER_RUN = args.calls
     NUM_RUNS = args.runs
+    BUYER_BATCH = args.buyer_batch
     GCP_PROJECT = args.gcp_project
     GCP_ZONE = args.gcp_zone
 
@@ -0,0 +1,162 @@
+"""
+Read balancing benchmark for StubPool.
+
+Starts a Raft product DB cluster on localhost (one process per replica) for
+each replica count in --replicas and drives concurrent GetItem/SearchItems
+reads through three StubPools:
+
+  sticky     — no write methods: every call goes to one replica until it fails
+  balanced-1 — write_methods set, over the first replica only: what the
+               balanced read path costs the client, without spreading
+  balanced   — write_methods set: reads by power of two choices over
+               latency EWMA x in-flight calls
+
+The sticky pool is the one-replica baseline: whatever the replica count,
+one replica serves every read. Reports reads per second, p99 latency and how
+the reads were spread (StubPool.stats()). Read throughput can only scale
+with the replica count when the replicas have CPUs of their own: with more
+CPUs than replicas, each replica is pinned to a CPU of its own and the
+client gets the rest.
+
+Usage:
+  python benchmark_read_balancing.py --replicas 3 5 --threads 32 --duration 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import grpc
+
+import product_db_pb2
+import product_db_pb2_grpc
+from stub_pool import PRODUCT_DB_WRITE_METHODS, StubPool
+
+RAFT_BASE = 15500
+GRPC_BASE = 52000
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "product_database_replicated.py")
+CPUS = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+
+
+def start_cluster(n):
+    workdir = tempfile.mkdtemp()
+    raft = [f"127.0.0.1:{RAFT_BASE + i}" for i in range(n)]
+    addrs = [f"127.0.0.1:{GRPC_BASE + i}" for i in range(n)]
+    procs = []
+    for i in range(n):
+        partners = [a for a in raft if a != raft[i]]
+        procs.append(subprocess.Popen(
+            [sys.executable, SERVER, "--raft-addr", raft[i],
+             "--raft-partners", ",".join(partners),
+             "--grpc-host", "127.0.0.1", "--grpc-port", str(GRPC_BASE + i),
+             "--grpc-peers", ",".join(a for a in addrs if a != addrs[i])],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        if len(CPUS) > n:
+            os.sched_setaffinity(procs[-1].pid, {CPUS[i]})
+    if len(CPUS) > n:
+        os.sched_setaffinity(0, set(CPUS[n:]))
+    for addr in addrs:
+        with grpc.insecure_channel(addr) as channel:
+            grpc.channel_ready_future(channel).result(timeout=60)
+    return procs, addrs
+
+
+def run(n, args):
+    procs, addrs = start_cluster(n)
+    pools = {
+        "sticky": StubPool(addrs, product_db_pb2_grpc.ProductDBStub),
+        "balanced-1": StubPool(addrs[:1], product_db_pb2_grpc.ProductDBStub,
+                               write_methods=PRODUCT_DB_WRITE_METHODS),
+        "balanced": StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                             write_methods=PRODUCT_DB_WRITE_METHODS),
+    }
+    try:
+        # Wait for a leader, then register the items to read
+        writer = pools["balanced"]
+        deadline = time.time() + 30
+        while True:
+            try:
+                resp = writer.call("RegisterItems", product_db_pb2.RegisterItemsRequest(items=[
+                    product_db_pb2.RegisterItemRequest(
+                        seller_id=1, name=f"item {k}", category=k % 4, keywords=["bench"],
+                        condition="New", price=1.0, quantity=100)
+                    for k in range(40)
+                ]))
+                if resp.status == "success":
+                    break
+            except grpc.RpcError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("no Raft leader")
+            time.sleep(0.5)
+        time.sleep(1)
+
+        results = {}
+        for name, pool in pools.items():
+            latencies = [[] for _ in range(args.threads)]
+            stop = time.perf_counter() + args.duration
+
+            def reader(t):
+                k = t
+                while time.perf_counter() < stop:
+                    t0 = time.perf_counter()
+                    if k % 2:
+                        pool.call("GetItem", product_db_pb2.ItemIdRequest(
+                            item_id=resp.results[k % 40].item_id))
+                    else:
+                        pool.call("SearchItems", product_db_pb2.SearchItemsRequest(
+                            category=k % 4, has_category=True, keywords=["bench"]))
+                    latencies[t].append(time.perf_counter() - t0)
+                    k += 1
+
+            threads = [threading.Thread(target=reader, args=(t,)) for t in range(args.threads)]
+            t0 = time.perf_counter()
+            for th in threads:
+                th.start()
+            for th in threads:
+                th.join()
+            elapsed = time.perf_counter() - t0
+            lat = sorted(sum(latencies, []))
+            results[name] = {
+                "reads_per_s": round(len(lat) / elapsed, 1),
+                "p99_ms": round(lat[int(0.99 * (len(lat) - 1))] * 1000, 1),
+                "calls_per_replica": [s["calls"] for s in pool.stats()],
+            }
+        return results
+    finally:
+        for pool in pools.values():
+            for ch in pool.channels:
+                ch.close()
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StubPool read balancing benchmark")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", default="benchmark_read_balancing_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    for n in args.replicas:
+        print(f"{n} replica(s), {args.threads} reader threads, {args.duration:.0f} s per pool, "
+              f"{len(CPUS) or os.cpu_count()} CPU(s)...")
+        results[n] = run(n, args)
+        for name, r in results[n].items():
+            print(f"  {name:<10s} {r['reads_per_s']:8.1f} reads/s   p99 {r['p99_ms']} ms   "
+                  f"per replica {r['calls_per_replica']}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
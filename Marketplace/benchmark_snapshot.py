@@ -0,0 +1,211 @@
+"""
+Raft snapshot benchmark for the replicated product DB.
+
+Compares PySyncObj's default snapshot (gzip-pickle of the whole object) with
+the compact format written by RaftProductDB, on two measurements:
+
+  1. snapshot  — time to write / load one snapshot of N items, and its size;
+                 for the compact format also how long the Raft thread is
+                 held (it forks and the child writes the file)
+  2. catch_up  — time for a freshly started follower to receive the leader's
+                 snapshot and hold all N items (3-node localhost cluster)
+
+Usage:
+  python benchmark_snapshot.py --items 1000000
+  python benchmark_snapshot.py --items 100000 --tests catch_up
+"""
+
+import argparse
+import gzip
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from pysyncobj import SERIALIZER_STATE, SyncObjConf
+
+from product_database_replicated import RaftProductDB, SNAPSHOT_TRANSFER_CHUNK
+
+RAFT_BASE_PORT = 15000
+
+
+def make_conf(dump_file):
+    return SyncObjConf(
+        autoTick=True,
+        appendEntriesUseBatch=True,
+        dynamicMembershipChange=False,
+        commandsWaitLeader=True,
+        connectionTimeout=5.0,
+        raftMinTimeout=0.4,
+        raftMaxTimeout=1.4,
+        fullDumpFile=dump_file,
+        logCompactionBatchSize=SNAPSHOT_TRANSFER_CHUNK,
+        logCompactionMinEntries=10 ** 9,   # only compact when forced
+        logCompactionMinTime=10 ** 6,
+    )
+
+
+def fill_state(node, num_items):
+    """Populate node state directly (bypassing Raft) with num_items items."""
+    for i in range(1, num_items + 1):
+        node._items[(i % 10, i)] = {
+            "seller_id": i % 1000,
+            "name": f"item_{i}",
+            "category": i % 10,
+            "keywords": ["bench", f"kw{i % 50}"],
+            "condition": "New",
+            "price": 9.99,
+            "quantity": 100,
+            "thumbs_up": 0,
+            "thumbs_down": 0,
+            "version": 0,
+        }
+        node._purchases.append({
+            "buyer_id": i % 5000, "category": i % 10, "item_id": i,
+            "quantity": 1, "timestamp": "2026-01-01T00:00:00",
+        })
+    node._item_counter = num_items
+
+
+# ── Snapshot write / load ───────────────────────────────────────────────────
+def bench_snapshot(num_items):
+    tmp = tempfile.mkdtemp()
+    node = RaftProductDB(f"127.0.0.1:{RAFT_BASE_PORT}", [], make_conf(os.path.join(tmp, "live.bin")))
+    try:
+        fill_state(node, num_items)
+        raft_data = (None, None, set())
+
+        # Default PySyncObj path: gzip-pickle every non-internal attribute
+        default_file = os.path.join(tmp, "default.bin")
+        state = {k: getattr(node, k) for k in
+                 ("_items", "_item_counter", "_carts", "_seller_feedback", "_purchases")}
+        t0 = time.perf_counter()
+        with open(default_file, "wb") as f:
+            with gzip.GzipFile(fileobj=f, mode="wb") as g:
+                pickle.dump((state,) + raft_data, g)
+        default_write = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        with open(default_file, "rb") as f:
+            with gzip.GzipFile(fileobj=f) as g:
+                pickle.load(g)
+        default_load = time.perf_counter() - t0
+
+        compact_file = os.path.join(tmp, "compact.bin")
+        t0 = time.perf_counter()
+        node._write_snapshot(compact_file, raft_data)
+        compact_write = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        node._start_snapshot(os.path.join(tmp, "live.bin.tmp"), raft_data)
+        compact_blocked = time.perf_counter() - t0
+        while node._snapshot_status() == SERIALIZER_STATE.SERIALIZING:
+            time.sleep(0.05)
+        t0 = time.perf_counter()
+        node._read_snapshot(compact_file)
+        compact_load = time.perf_counter() - t0
+
+        return {
+            "items": num_items,
+            "default": {"write_s": round(default_write, 3), "load_s": round(default_load, 3),
+                        "bytes": os.path.getsize(default_file)},
+            "compact": {"write_s": round(compact_write, 3), "load_s": round(compact_load, 3),
+                        "raft_thread_s": round(compact_blocked, 3),
+                        "bytes": os.path.getsize(compact_file)},
+        }
+    finally:
+        node.destroy()
+        time.sleep(0.5)
+
+
+# ── Follower catch-up ───────────────────────────────────────────────────────
+def load_items(node, num_items, max_in_flight=5000):
+    """Register num_items items through Raft, keeping max_in_flight commands queued."""
+    slots = threading.Semaphore(max_in_flight)
+    done = threading.Event()
+    remaining = [num_items]
+    lock = threading.Lock()
+
+    def on_result(result, err):
+        slots.release()
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    for i in range(num_items):
+        slots.acquire()
+        node.register_item(i % 1000, f"item_{i}", i % 10, ["bench"], "New",
+                           9.99, 100, callback=on_result)
+    done.wait()
+
+
+def bench_catch_up(num_items, mode, port_offset):
+    tmp = tempfile.mkdtemp()
+    addrs = [f"127.0.0.1:{RAFT_BASE_PORT + port_offset + i}" for i in range(3)]
+
+    def start(i):
+        dump = os.path.join(tmp, f"node{i}.bin") if mode == "compact" else None
+        conf = make_conf(dump)
+        return RaftProductDB(addrs[i], [a for a in addrs if a != addrs[i]], conf)
+
+    nodes = [start(0), start(1)]
+    try:
+        while nodes[0]._getLeader() is None:
+            time.sleep(0.1)
+        t0 = time.perf_counter()
+        load_items(nodes[0], num_items)
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for n in nodes:
+            n._forceLogCompaction()
+        while any(n._getRaftLogSize() > 10 for n in nodes):
+            time.sleep(0.05)
+        compact_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        nodes.append(start(2))
+        while len(nodes[2]._items) < num_items:
+            time.sleep(0.05)
+        catch_up_s = time.perf_counter() - t0
+
+        return {"items": num_items, "mode": mode, "load_s": round(load_s, 3),
+                "compaction_s": round(compact_s, 3), "catch_up_s": round(catch_up_s, 3)}
+    finally:
+        for n in nodes:
+            n.destroy()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raft snapshot benchmark")
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--tests", nargs="+", default=["snapshot", "catch_up"],
+                        help="snapshot, catch_up")
+    parser.add_argument("--output", default="benchmark_snapshot_results.json")
+    args = parser.parse_args()
+
+    results = {}
+    if "snapshot" in args.tests:
+        print(f"Snapshot write/load with {args.items} items...")
+        results["snapshot"] = bench_snapshot(args.items)
+        for mode in ("default", "compact"):
+            r = results["snapshot"][mode]
+            print(f"  {mode:<8s} write={r['write_s']:8.3f} s  load={r['load_s']:8.3f} s  "
+                  f"size={r['bytes'] / 1e6:8.1f} MB")
+        print(f"  compact snapshot holds the Raft thread "
+              f"{results['snapshot']['compact']['raft_thread_s'] * 1000:.1f} ms")
+
+    if "catch_up" in args.tests:
+        results["catch_up"] = []
+        for offset, mode in ((10, "default"), (20, "compact")):
+            print(f"Follower catch-up ({mode}) with {args.items} items...")
+            r = bench_catch_up(args.items, mode, offset)
+            results["catch_up"].append(r)
+            print(f"  load={r['load_s']:.1f} s  compaction={r['compaction_s']:.3f} s  "
+                  f"catch_up={r['catch_up_s']:.3f} s")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
@@ -0,0 +1,224 @@
+"""
+The /buyer API pieces shared by buyer_server.py (Flask, a thread per
+request) and buyer_server_aio.py (Quart, one event loop).
+
+Both frontends serve the same endpoints over the same backends and differ
+only in how a view waits for them. Everything that does not wait lives
+here: JSON bodies to backend requests and backend responses to JSON, the
+conditional GET answer, the command line and the backend pools. The
+servers keep their routes and the calls made from them.
+"""
+
+import customer_db_pb2_grpc
+import product_db_pb2
+import product_db_pb2_grpc
+from stub_pool import (StubPool, ShardedStubPool, UserShardedStubPool,
+                       PRODUCT_DB_WRITE_METHODS, LINEARIZABLE_READS,
+                       parse_groups, parse_shard_spec)
+from single_flight import PRODUCT_DB_SHARED_READS
+from catalog_cache import CATALOG_CACHE_BYTES, CATALOG_STALENESS, CatalogCache
+from payment_client import PAYMENT_CONCURRENCY, PAYMENT_QUEUE, PAYMENT_TIMEOUT, PAYMENT_WSDL
+
+
+def item_id(pair):
+    """ItemId for the [category, item_id] pair the API uses."""
+    cat, iid = pair
+    return product_db_pb2.ItemId(category=cat, item_id=iid)
+
+
+def item_to_dict(item):
+    return {
+        'item_id': [item.item_id.category, item.item_id.item_id],
+        'seller_id': item.seller_id,
+        'name': item.name,
+        'category': item.category,
+        'keywords': list(item.keywords),
+        'condition': item.condition,
+        'price': item.price,
+        'quantity': item.quantity,
+        'thumbs_up': item.thumbs_up,
+        'thumbs_down': item.thumbs_down
+    }
+
+
+def search_request(args):
+    """SearchItemsRequest for the ?category=&keywords=a,b query string."""
+    category_str = args.get('category', '')
+    keywords_str = args.get('keywords', '')
+    has_category = bool(category_str)
+    category = int(category_str) if has_category else 0
+    keywords = [k.strip() for k in keywords_str.split(',') if k.strip()] if keywords_str else []
+    return product_db_pb2.SearchItemsRequest(
+        category=category,
+        has_category=has_category,
+        keywords=keywords
+    )
+
+
+def cart_items(lines):
+    """CartItems for a list of {"item_id": [...], "quantity": n}."""
+    return [product_db_pb2.CartItem(item_id=item_id(ci['item_id']), quantity=ci['quantity'])
+            for ci in lines]
+
+
+def cart_to_list(cart):
+    return [
+        {'item_id': [ci.item_id.category, ci.item_id.item_id], 'quantity': ci.quantity}
+        for ci in cart
+    ]
+
+
+def stock_results(lines, resp):
+    """One result per cart line from the GetItems response for their items."""
+    stock = {(item.item_id.category, item.item_id.item_id): item.quantity for item in resp.items}
+    results = []
+    for line in lines:
+        quantity = stock.get(tuple(line['item_id']))
+        if quantity is None:
+            results.append({'status': 'error', 'message': 'Item not found'})
+        elif quantity < line['quantity']:
+            results.append({'status': 'error', 'message': 'Not enough stock'})
+        else:
+            results.append({'status': 'success', 'message': ''})
+    return results
+
+
+def unavailable_items(lines, resp):
+    """
+    [category, item_id] of the cart items the GetItems response for them
+    cannot fill, adding up repeated lines as CheckoutCart does.
+    """
+    stock = {(item.item_id.category, item.item_id.item_id): item.quantity for item in resp.items}
+    wanted = {}
+    for line in lines:
+        key = tuple(line['item_id'])
+        wanted[key] = wanted.get(key, 0) + line['quantity']
+    return [list(key) for key, quantity in wanted.items()
+            if quantity <= 0 or stock.get(key, 0) < quantity]
+
+
+def feedback_batch_request(entries):
+    """AddFeedbackBatchRequest for a list of {"item_id": [...], "feedback_type": ...}."""
+    return product_db_pb2.AddFeedbackBatchRequest(feedback=[
+        product_db_pb2.AddItemFeedbackRequest(item_id=item_id(f['item_id']),
+                                              feedback_type=f['feedback_type'])
+        for f in entries
+    ])
+
+
+def purchases_to_list(purchases):
+    return [
+        {
+            'item_id': [p.item_id.category, p.item_id.item_id],
+            'quantity': p.quantity,
+            'timestamp': p.timestamp
+        }
+        for p in purchases
+    ]
+
+
+def etag_response(app, req, etag, body):
+    """
+    JSON response from body() tagged with etag, or an empty 304 if the
+    client's If-None-Match already names it (body() is then never built).
+    """
+    if req.if_none_match.contains(etag):
+        resp = app.response_class('', status=304)
+    else:
+        resp = app.json.response(body())
+    resp.set_etag(etag)
+    return resp
+
+
+def backend_stats(customer_pool, product_pool, catalog, payments):
+    """Body of GET /buyer/backends."""
+    return {'status': 'success', 'customer_db': customer_pool.stats(),
+            'product_db': product_pool.stats(),
+            'coalesced_reads': product_pool.flight.stats(),
+            'catalog_cache': catalog.stats(),
+            'payments': payments.stats()}
+
+
+def add_arguments(parser):
+    """The command line options both buyer servers take."""
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5004)
+    parser.add_argument('--customer-db-addrs', type=str, default='localhost:50051',
+                        help='Comma-separated customer DB replica addresses (host:port)')
+    parser.add_argument('--customer-db-shards', type=str, default=None,
+                        help='Hash-sharded customer DB: "host:port,...;host:port,..." with the '
+                             'groups in --shard-index order (overrides --customer-db-addrs)')
+    parser.add_argument('--product-db-addrs', type=str, default='localhost:50052',
+                        help='Comma-separated product DB replica addresses (host:port)')
+    parser.add_argument('--product-db-shards', type=str, default=None,
+                        help='Category-sharded product DB: "first_category=host:port,...;'
+                             'first_category=host:port,..." (overrides --product-db-addrs)')
+    parser.add_argument('--financial-host', default='localhost')
+    parser.add_argument('--financial-port', type=int, default=8000)
+    parser.add_argument('--payment-wsdl', default=PAYMENT_WSDL,
+                        help='WSDL of the financial service (a file: not fetched at startup)')
+    parser.add_argument('--payment-concurrency', type=int, default=PAYMENT_CONCURRENCY,
+                        help='Payments in flight to the financial service (pooled connections)')
+    parser.add_argument('--payment-queue', type=int, default=PAYMENT_QUEUE,
+                        help='Payments waiting for a slot before new ones get 503')
+    parser.add_argument('--payment-timeout', type=float, default=PAYMENT_TIMEOUT,
+                        help='Seconds one payment call may take')
+    parser.add_argument('--linearizable-reads', action='store_true',
+                        help='Ask the product DB for linearizable (ReadIndex) reads')
+    parser.add_argument('--catalog-cache-mb', type=float, default=CATALOG_CACHE_BYTES / (1 << 20),
+                        help='Memory for cached search and item responses (0 disables the cache)')
+    parser.add_argument('--catalog-staleness', type=float, default=CATALOG_STALENESS,
+                        help='Seconds cached responses are served without checking the catalog '
+                             'version (always 0 with --linearizable-reads)')
+
+
+def backend_addrs(args):
+    """(customer DB, product DB) replica addresses from the command line."""
+    if args.customer_db_shards:
+        customer_addrs = parse_groups(args.customer_db_shards)
+    else:
+        customer_addrs = [a.strip() for a in args.customer_db_addrs.split(',')]
+    if args.product_db_shards:
+        product_addrs = parse_shard_spec(args.product_db_shards)
+    else:
+        product_addrs = [a.strip() for a in args.product_db_addrs.split(',')]
+    return customer_addrs, product_addrs
+
+
+def backend_pools(args, customer_addrs, product_addrs):
+    """The blocking (customer DB, product DB) pools the command line asks for."""
+    if args.customer_db_shards:
+        customer_pool = UserShardedStubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
+    else:
+        customer_pool = StubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
+    read_metadata = LINEARIZABLE_READS if args.linearizable_reads else None
+    if args.product_db_shards:
+        product_pool = ShardedStubPool(product_addrs, product_db_pb2_grpc.ProductDBStub,
+                                       write_methods=PRODUCT_DB_WRITE_METHODS,
+                                       read_metadata=read_metadata)
+    else:
+        product_pool = StubPool(product_addrs, product_db_pb2_grpc.ProductDBStub,
+                                write_methods=PRODUCT_DB_WRITE_METHODS,
+                                read_metadata=read_metadata)
+    return customer_pool, product_pool
+
+
+def shared_reads(args):
+    """
+    Reads identical concurrent calls may share. None with linearizable
+    reads: a read joining a call already in flight could miss a write that
+    finished before it arrived.
+    """
+    return () if args.linearizable_reads else PRODUCT_DB_SHARED_READS
+
+
+def catalog_cache(args, product_pool):
+    """CatalogCache over product_pool as the command line sizes it."""
+    return CatalogCache(product_pool, int(args.catalog_cache_mb * (1 << 20)),
+                        0.0 if args.linearizable_reads else args.catalog_staleness)
+
+
+def payment_options(args):
+    """Keyword arguments of PaymentClient / AioPaymentClient from the command line."""
+    return {'wsdl': args.payment_wsdl, 'concurrency': args.payment_concurrency,
+            'queue': args.payment_queue, 'timeout': args.payment_timeout}
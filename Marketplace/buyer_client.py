@@ -6,6 +6,11 @@ import argparse
 SERVER_ADDRS = [('localhost', 5004)]
 current_server = 0
 
+# GET responses the server tagged with an ETag, revalidated with If-None-Match:
+# (path, params, session) -> (etag, result). Oldest dropped beyond the limit.
+ETAG_CACHE_SIZE = 200
+_etag_cache = {}
+
 session_id = None
 buyer_id = None
 pending_cart = []
@@ -14,6 +19,10 @@ pending_cart = []
 def send(method, path, data=None, params=None):
     global session_id, buyer_id, pending_cart, current_server
     headers = {'X-Session-ID': session_id} if session_id else {}
+    cache_key = (path, tuple(sorted((params or {}).items())), session_id)
+    cached = _etag_cache.get(cache_key) if method == 'GET' else None
+    if cached is not None:
+        headers['If-None-Match'] = cached[0]
 
     for i in range(len(SERVER_ADDRS)):
         idx = (current_server + i) % len(SERVER_ADDRS)
@@ -28,7 +37,16 @@ def send(method, path, data=None, params=None):
                 resp = requests.put(url, headers=headers, json=data, timeout=5)
             elif method == 'DELETE':
                 resp = requests.delete(url, headers=headers, timeout=5)
-            result = resp.json()
+            if resp.status_code == 304 and cached is not None:
+                result = cached[1]
+            else:
+                result = resp.json()
+                etag = resp.headers.get('ETag')
+                if method == 'GET' and etag and result.get('status') == 'success':
+                    _etag_cache.pop(cache_key, None)
+                    _etag_cache[cache_key] = (etag, result)
+                    if len(_etag_cache) > ETAG_CACHE_SIZE:
+                        del _etag_cache[next(iter(_etag_cache))]
 
             current_server = idx  # sticky to working server
 
@@ -195,8 +213,12 @@ def display_cart():
         print("\nYour cart is empty.")
     else:
         print("\n=== Your Shopping Cart ===")
-        for cart_item in pending_cart:
-            print(f"Item ID: {cart_item['item_id']} - Quantity: {cart_item['quantity']}")
+        # Current stock of every line, in one request
+        result = send('POST', '/buyer/cart/validate', {'items': pending_cart})
+        checks = result['results'] if result['status'] == 'success' else [None] * len(pending_cart)
+        for cart_item, check in zip(pending_cart, checks):
+            note = f" ({check['message']})" if check and check['status'] != 'success' else ""
+            print(f"Item ID: {cart_item['item_id']} - Quantity: {cart_item['quantity']}{note}")
 
 
 def save_cart():
@@ -261,6 +283,38 @@ def make_purchase():
         print(f"Error: {result['message']}")
 
 
+def checkout_cart():
+    global pending_cart
+    print("\n=== Checkout Cart ===")
+    if not pending_cart:
+        print("Your cart is empty.")
+        return
+    display_cart()
+    print("Enter payment details:")
+    name = input("Cardholder name: ")
+    card_number = input("Card number: ")
+    expiration_date = input("Expiration date (MM/YY): ")
+    security_code = input("Security code: ")
+    # Check out the saved cart; the server clears it in the same command
+    saved = send('PUT', '/buyer/cart', {'cart': pending_cart})
+    if saved['status'] != 'success':
+        print(f"Error: {saved['message']}")
+        return
+    result = send('POST', '/buyer/checkout', {
+        'name': name,
+        'card_number': card_number,
+        'expiration_date': expiration_date,
+        'security_code': security_code
+    })
+    if result['status'] == 'success':
+        pending_cart = []
+        print(f"Checkout successful! Total: ${result['total']:.2f}")
+    else:
+        print(f"Error: {result['message']}")
+        for item_id in result.get('failed_items', []):
+            print(f"  Unavailable: {item_id}")
+
+
 def get_purchase_history():
     result = send('GET', '/buyer/purchases')
     if result['status'] == 'success':
@@ -299,6 +353,7 @@ def main():
             print("10. Get Seller Rating")
             print("11. Make Purchase")
             print("12. View Purchase History")
+            print("13. Checkout Cart")
             print("0.  Exit")
         else:
             print("Not logged in")
@@ -344,6 +399,8 @@ def main():
                 make_purchase()
             elif choice == '12':
                 get_purchase_history()
+            elif choice == '13':
+                checkout_cart()
             else:
                 print("Invalid choice!")
 
@@ -1,25 +1,32 @@
 import argparse
 from flask import Flask, request, jsonify
-import zeep
 
 import sys
 import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 import customer_db_pb2
-import customer_db_pb2_grpc
 import product_db_pb2
-import product_db_pb2_grpc
-from stub_pool import StubPool
+import buyer_api
+from buyer_api import item_id, item_to_dict
+from single_flight import CoalescingPool
+from rest_batch import add_batch_route, batch_session
+import prefork
+from catalog_cache import item_etag, items_etag
+from payment_client import PaymentClient, PaymentError
 
 app = Flask(__name__)
 
 _customer_pool = None    # StubPool for customer DB replicas
 _product_pool = None     # StubPool for product DB replicas
-_financial_client = None
+_catalog = None          # CatalogCache over _product_pool for searches and item reads
+_payments = None         # PaymentClient for the financial service
 
 
 def validate_session(req):
+    batched = batch_session()
+    if batched is not None:
+        return batched, None
     session_id = req.headers.get('X-Session-ID', '')
     if not session_id:
         return None, ('Missing session', 401)
@@ -30,19 +37,8 @@ def validate_session(req):
     return resp, None
 
 
-def _item_to_dict(item):
-    return {
-        'item_id': [item.item_id.category, item.item_id.item_id],
-        'seller_id': item.seller_id,
-        'name': item.name,
-        'category': item.category,
-        'keywords': list(item.keywords),
-        'condition': item.condition,
-        'price': item.price,
-        'quantity': item.quantity,
-        'thumbs_up': item.thumbs_up,
-        'thumbs_down': item.thumbs_down
-    }
+def _etag_response(etag, body):
+    return buyer_api.etag_response(app, request, etag, body)
 
 
 @app.route('/buyer/account', methods=['POST'])
@@ -94,18 +90,9 @@ def search_items():
     session_resp, err = validate_session(request)
     if err:
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
-    category_str = request.args.get('category', '')
-    keywords_str = request.args.get('keywords', '')
-    has_category = bool(category_str)
-    category = int(category_str) if has_category else 0
-    keywords = [k.strip() for k in keywords_str.split(',') if k.strip()] if keywords_str else []
-    resp = _product_pool.call('SearchItems', product_db_pb2.SearchItemsRequest(
-        category=category,
-        has_category=has_category,
-        keywords=keywords
-    ))
-    items = [_item_to_dict(item) for item in resp.items]
-    return jsonify({'status': 'success', 'items': items})
+    resp = _catalog.call('SearchItems', buyer_api.search_request(request.args))
+    return _etag_response(items_etag(resp.items), lambda: {
+        'status': 'success', 'items': [item_to_dict(item) for item in resp.items]})
 
 
 @app.route('/buyer/items/<int:cat>/<int:iid>', methods=['GET'])
@@ -113,22 +100,33 @@ def get_item(cat, iid):
     session_resp, err = validate_session(request)
     if err:
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
-    item_id = product_db_pb2.ItemId(category=cat, item_id=iid)
-    resp = _product_pool.call('GetItem', product_db_pb2.ItemIdRequest(item_id=item_id))
+    item = product_db_pb2.ItemId(category=cat, item_id=iid)
+    resp = _catalog.call('GetItem', product_db_pb2.ItemIdRequest(item_id=item))
     if resp.status != 'success':
         return jsonify({'status': 'error', 'message': resp.message}), 404
-    return jsonify({'status': 'success', 'item': _item_to_dict(resp.item)})
+    return _etag_response(item_etag(resp.item), lambda: {
+        'status': 'success', 'item': item_to_dict(resp.item)})
 
 
 @app.route('/buyer/cart/validate', methods=['POST'])
-def validate_cart_item():
+def validate_cart():
+    """
+    Check that the stock covers one cart line, {"item_id": [...], "quantity": n}.
+    Given {"items": [line, ...]} instead, check them all with one GetItems
+    call and answer one result per line.
+    """
     session_resp, err = validate_session(request)
     if err:
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     data = request.json
-    cat, iid = data['item_id']
-    item_id = product_db_pb2.ItemId(category=cat, item_id=iid)
-    resp = _product_pool.call('GetItem', product_db_pb2.ItemIdRequest(item_id=item_id))
+    if 'items' in data:
+        lines = data['items']
+        resp = _product_pool.call('GetItems', product_db_pb2.ItemIdsRequest(
+            item_ids=[item_id(line['item_id']) for line in lines]))
+        if resp.status != 'success':
+            return jsonify({'status': 'error', 'message': resp.message}), 400
+        return jsonify({'status': 'success', 'results': buyer_api.stock_results(lines, resp)})
+    resp = _catalog.call('GetItem', product_db_pb2.ItemIdRequest(item_id=item_id(data['item_id'])))
     if resp.status != 'success':
         return jsonify({'status': 'error', 'message': 'Item not found'}), 404
     if resp.item.quantity < data['quantity']:
@@ -142,14 +140,7 @@ def save_cart():
     if err:
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     buyer_id = session_resp.user_id
-    data = request.json
-    cart_items = []
-    for ci in data.get('cart', []):
-        cat, iid = ci['item_id']
-        cart_items.append(product_db_pb2.CartItem(
-            item_id=product_db_pb2.ItemId(category=cat, item_id=iid),
-            quantity=ci['quantity']
-        ))
+    cart_items = buyer_api.cart_items(request.json.get('cart', []))
     _product_pool.call('StoreCart', product_db_pb2.StoreCartRequest(buyer_id=buyer_id, cart=cart_items))
     return jsonify({'status': 'success'})
 
@@ -161,11 +152,7 @@ def get_cart():
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     buyer_id = session_resp.user_id
     resp = _product_pool.call('GetCart', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
-    cart = [
-        {'item_id': [ci.item_id.category, ci.item_id.item_id], 'quantity': ci.quantity}
-        for ci in resp.cart
-    ]
-    return jsonify({'status': 'success', 'cart': cart})
+    return jsonify({'status': 'success', 'cart': buyer_api.cart_to_list(resp.cart)})
 
 
 @app.route('/buyer/cart', methods=['DELETE'])
@@ -184,10 +171,8 @@ def provide_feedback():
     if err:
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     data = request.json
-    cat, iid = data['item_id']
-    item_id = product_db_pb2.ItemId(category=cat, item_id=iid)
     resp = _product_pool.call('AddItemFeedback', product_db_pb2.AddItemFeedbackRequest(
-        item_id=item_id,
+        item_id=item_id(data['item_id']),
         feedback_type=data['feedback_type']
     ))
     if resp.status != 'success':
@@ -195,6 +180,19 @@ def provide_feedback():
     return jsonify({'status': 'success'})
 
 
+@app.route('/buyer/feedback/batch', methods=['POST'])
+def provide_feedback_batch():
+    session_resp, err = validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    resp = _product_pool.call('AddFeedbackBatch',
+                              buyer_api.feedback_batch_request(request.json.get('feedback', [])))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    results = [{'status': r.status, 'message': r.message} for r in resp.results]
+    return jsonify({'status': 'success', 'results': results})
+
+
 @app.route('/buyer/seller/<int:seller_id>/rating', methods=['GET'])
 def get_seller_rating(seller_id):
     session_resp, err = validate_session(request)
@@ -211,26 +209,102 @@ def make_purchase():
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     buyer_id = session_resp.user_id
     data = request.json
-    approved = _financial_client.service.ProcessPayment(
-        data['name'],
-        data['card_number'],
-        data['expiration_date'],
-        data['security_code']
-    )
-    if not approved:
-        return jsonify({'status': 'error', 'message': 'Payment declined'}), 402
-    cat, iid = data['item_id']
-    item_id = product_db_pb2.ItemId(category=cat, item_id=iid)
-    resp = _product_pool.call('MakePurchase', product_db_pb2.MakePurchaseRequest(
-        buyer_id=buyer_id,
-        item_id=item_id,
-        quantity=data['quantity']
-    ))
-    if resp.status != 'success':
-        return jsonify({'status': 'error', 'message': resp.message}), 400
+    purchase_item = item_id(data['item_id'])
+    # The payment is authorized while the stock is checked, and only
+    # captured once the purchase is recorded; otherwise its hold is voided.
+    try:
+        payment = _payments.authorize(
+            data['name'],
+            data['card_number'],
+            data['expiration_date'],
+            data['security_code']
+        )
+    except PaymentError as e:
+        return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+    bought = False
+    try:
+        stock = _catalog.call('GetItem', product_db_pb2.ItemIdRequest(item_id=purchase_item))
+        if stock.status != 'success' or stock.item.quantity < data['quantity']:
+            message = stock.message if stock.status != 'success' else 'Not enough stock'
+            return jsonify({'status': 'error', 'message': message}), 400
+        try:
+            hold = payment.result()
+        except PaymentError as e:
+            return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+        if hold is None:
+            return jsonify({'status': 'error', 'message': 'Payment declined'}), 402
+        resp = _product_pool.call('MakePurchase', product_db_pb2.MakePurchaseRequest(
+            buyer_id=buyer_id,
+            item_id=purchase_item,
+            quantity=data['quantity']
+        ))
+        if resp.status != 'success':
+            return jsonify({'status': 'error', 'message': resp.message}), 400
+        bought = True
+        _payments.capture(hold)
+    finally:
+        if not bought:
+            _payments.release(payment)
     return jsonify({'status': 'success'})
 
 
+@app.route('/buyer/checkout', methods=['POST'])
+def checkout_cart():
+    """Buy a whole cart in one replicated command: all lines or none."""
+    session_resp, err = validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    data = request.json
+    # No 'cart' in the body: check out (and clear) the saved cart
+    lines = data.get('cart', [])
+    if not lines:
+        cart = _product_pool.call('GetCart', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
+        lines = buyer_api.cart_to_list(cart.cart)
+    if not lines:
+        return jsonify({'status': 'error', 'message': 'Cart is empty'}), 400
+    # The buyer is only charged for a cart the stock can fill. CheckoutCart
+    # still checks it again: another buyer may take the last units meanwhile.
+    stock = _product_pool.call('GetItems', product_db_pb2.ItemIdsRequest(
+        item_ids=[item_id(line['item_id']) for line in lines]))
+    if stock.status != 'success':
+        return jsonify({'status': 'error', 'message': stock.message}), 400
+    failed = buyer_api.unavailable_items(lines, stock)
+    if failed:
+        return jsonify({'status': 'error', 'message': 'Item not found or not enough stock',
+                        'failed_items': failed}), 400
+    try:
+        payment = _payments.authorize(
+            data['name'],
+            data['card_number'],
+            data['expiration_date'],
+            data['security_code']
+        )
+    except PaymentError as e:
+        return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+    bought = False
+    try:
+        try:
+            hold = payment.result()
+        except PaymentError as e:
+            return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+        if hold is None:
+            return jsonify({'status': 'error', 'message': 'Payment declined'}), 402
+        resp = _product_pool.call('CheckoutCart', product_db_pb2.CheckoutCartRequest(
+            buyer_id=buyer_id,
+            items=buyer_api.cart_items(data.get('cart', []))
+        ))
+        if resp.status != 'success':
+            failed = [[i.category, i.item_id] for i in resp.failed_items]
+            return jsonify({'status': 'error', 'message': resp.message, 'failed_items': failed}), 400
+        bought = True
+        _payments.capture(hold)
+    finally:
+        if not bought:
+            _payments.release(payment)
+    return jsonify({'status': 'success', 'total': resp.total})
+
+
 @app.route('/buyer/purchases', methods=['GET'])
 def get_purchases():
     session_resp, err = validate_session(request)
@@ -238,39 +312,47 @@ def get_purchases():
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     buyer_id = session_resp.user_id
     resp = _product_pool.call('GetBuyerPurchases', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
-    purchases = [
-        {
-            'item_id': [p.item_id.category, p.item_id.item_id],
-            'quantity': p.quantity,
-            'timestamp': p.timestamp
-        }
-        for p in resp.purchases
-    ]
-    return jsonify({'status': 'success', 'purchases': purchases})
+    return jsonify({'status': 'success', 'purchases': buyer_api.purchases_to_list(resp.purchases)})
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Buyer REST Server')
-    parser.add_argument('--host', default='0.0.0.0')
-    parser.add_argument('--port', type=int, default=5004)
-    parser.add_argument('--customer-db-addrs', type=str, default='localhost:50051',
-                        help='Comma-separated customer DB replica addresses (host:port)')
-    parser.add_argument('--product-db-addrs', type=str, default='localhost:50052',
-                        help='Comma-separated product DB replica addresses (host:port)')
-    parser.add_argument('--financial-host', default='localhost')
-    parser.add_argument('--financial-port', type=int, default=8000)
-    args = parser.parse_args()
+@app.route('/buyer/backends', methods=['GET'])
+def backend_stats():
+    """Per-replica in-flight calls and latency, as seen by this frontend."""
+    return jsonify(buyer_api.backend_stats(_customer_pool, _product_pool, _catalog, _payments))
+
+
+add_batch_route(app, '/buyer', validate_session)
+
 
-    customer_addrs = [a.strip() for a in args.customer_db_addrs.split(',')]
-    product_addrs = [a.strip() for a in args.product_db_addrs.split(',')]
+def init_backends(args, customer_addrs, product_addrs):
+    """
+    Connect to the backends named on the command line. With --workers each
+    worker process calls this after the fork: gRPC channels do not survive one.
+    """
+    global _customer_pool, _product_pool, _catalog, _payments
+    _customer_pool, product_pool = buyer_api.backend_pools(args, customer_addrs, product_addrs)
+    _product_pool = CoalescingPool(product_pool, buyer_api.shared_reads(args))
+    _catalog = buyer_api.catalog_cache(args, _product_pool)
+    _payments = PaymentClient(args.financial_host, args.financial_port,
+                              **buyer_api.payment_options(args))
 
-    _customer_pool = StubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
-    _product_pool = StubPool(product_addrs, product_db_pb2_grpc.ProductDBStub)
 
-    wsdl = f'http://{args.financial_host}:{args.financial_port}/?wsdl'
-    _financial_client = zeep.Client(wsdl=wsdl)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Buyer REST Server')
+    buyer_api.add_arguments(parser)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Serve from this many forked worker processes sharing the port '
+                             '(SIGHUP reloads them gracefully)')
+    args = parser.parse_args()
+    customer_addrs, product_addrs = buyer_api.backend_addrs(args)
 
     print(f'Buyer REST server on {args.host}:{args.port}')
     print(f'  Customer DB replicas: {customer_addrs}')
     print(f'  Product DB replicas: {product_addrs}')
-    app.run(host=args.host, port=args.port)
+    if args.workers > 1:
+        print(f'  Workers: {args.workers}')
+        prefork.serve(app, args.host, args.port, args.workers,
+                      lambda: init_backends(args, customer_addrs, product_addrs))
+    else:
+        init_backends(args, customer_addrs, product_addrs)
+        app.run(host=args.host, port=args.port)
@@ -0,0 +1,397 @@
+"""
+asyncio (ASGI) variant of buyer_server.py.
+
+Serves the same /buyer API from one event loop: Quart on Hypercorn, the
+backends over grpc.aio (stub_pool.aio_pool()) and payments through
+payment_client.AioPaymentClient (zeep's async client on httpx). A request
+waiting on a backend and an idle keep-alive connection are each a
+coroutine, not a thread.
+
+The routes are buyer_server.py's; what they share with it (request and
+response building, the command line, the backend pools) is in buyer_api.py.
+Independent backend calls are made concurrently: a purchase's payment is
+out while its stock is checked, and the session's activity update does not
+hold up the response. A read waits for its session check, so a request
+without a valid session never reaches the product DB.
+
+Not served here: POST /buyer/batch (rest_batch.py runs on Flask) and
+--workers; start one process per core on its own port instead and give the
+clients every address.
+
+    python buyer_server_aio.py --port 5004 --customer-db-addrs ... --product-db-addrs ...
+"""
+
+import argparse
+import asyncio
+import logging
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from quart import Quart, request, jsonify
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import customer_db_pb2
+import product_db_pb2
+import buyer_api
+from buyer_api import item_id, item_to_dict
+from stub_pool import aio_pool
+from single_flight import AioCoalescingPool
+from catalog_cache import item_etag, items_etag
+from payment_client import AioPaymentClient, PaymentError
+
+logger = logging.getLogger(__name__)
+
+KEEP_ALIVE_TIMEOUT = 75.0   # seconds an idle client connection is kept open
+
+app = Quart(__name__)
+
+_customer_pool = None    # aio_pool() over the customer DB replicas
+_product_pool = None     # AioCoalescingPool over the product DB replicas
+_catalog = None          # CatalogCache over _product_pool for searches and item reads
+_payments = None         # AioPaymentClient for the financial service
+_background = set()      # tasks nobody awaits, kept until they finish
+
+
+def _in_background(coro):
+    """Run coro without waiting for it; a failure is logged. Returns its task."""
+    task = asyncio.ensure_future(coro)
+    _background.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background call failed: %s", task.exception())
+
+
+async def validate_session(req):
+    session_id = req.headers.get('X-Session-ID', '')
+    if not session_id:
+        return None, ('Missing session', 401)
+    resp = await _customer_pool.call('GetSession', customer_db_pb2.GetSessionRequest(session_id=session_id))
+    if resp.status != 'success':
+        return None, (resp.message, 401)
+    _in_background(_customer_pool.call('UpdateSessionActivity',
+                                       customer_db_pb2.SessionRequest(session_id=session_id)))
+    return resp, None
+
+
+def _etag_response(etag, body):
+    return buyer_api.etag_response(app, request, etag, body)
+
+
+@app.route('/buyer/account', methods=['POST'])
+async def create_account():
+    data = await request.get_json()
+    resp = await _customer_pool.call('StoreUser', customer_db_pb2.StoreUserRequest(
+        username=data['username'],
+        password=data['password'],
+        name=data['name'],
+        user_type='buyer'
+    ))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    return jsonify({'status': 'success', 'user_id': resp.user_id})
+
+
+@app.route('/buyer/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    user_resp = await _customer_pool.call('GetUser', customer_db_pb2.GetUserRequest(username=data['username']))
+    if user_resp.status != 'success':
+        return jsonify({'status': 'error', 'message': 'User not found'}), 401
+    if user_resp.password != data['password']:
+        return jsonify({'status': 'error', 'message': 'Invalid password'}), 401
+    if user_resp.user_type != 'buyer':
+        return jsonify({'status': 'error', 'message': 'Not a buyer account'}), 401
+    sess_resp = await _customer_pool.call('StoreSession', customer_db_pb2.StoreSessionRequest(
+        user_id=user_resp.user_id, user_type='buyer'
+    ))
+    return jsonify({
+        'status': 'success',
+        'session_id': sess_resp.session_id,
+        'buyer_id': user_resp.user_id
+    })
+
+
+@app.route('/buyer/logout', methods=['POST'])
+async def logout():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    session_id = request.headers.get('X-Session-ID')
+    await _customer_pool.call('DeleteSession', customer_db_pb2.SessionRequest(session_id=session_id))
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/items', methods=['GET'])
+async def search_items():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    resp = await _catalog.call_async('SearchItems', buyer_api.search_request(request.args))
+    return _etag_response(items_etag(resp.items), lambda: {
+        'status': 'success', 'items': [item_to_dict(item) for item in resp.items]})
+
+
+@app.route('/buyer/items/<int:cat>/<int:iid>', methods=['GET'])
+async def get_item(cat, iid):
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    item = product_db_pb2.ItemId(category=cat, item_id=iid)
+    resp = await _catalog.call_async('GetItem', product_db_pb2.ItemIdRequest(item_id=item))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 404
+    return _etag_response(item_etag(resp.item), lambda: {
+        'status': 'success', 'item': item_to_dict(resp.item)})
+
+
+@app.route('/buyer/cart/validate', methods=['POST'])
+async def validate_cart():
+    """
+    Check that the stock covers one cart line, {"item_id": [...], "quantity": n}.
+    Given {"items": [line, ...]} instead, check them all with one GetItems
+    call and answer one result per line.
+    """
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    data = await request.get_json()
+    if 'items' in data:
+        lines = data['items']
+        resp = await _product_pool.call('GetItems', product_db_pb2.ItemIdsRequest(
+            item_ids=[item_id(line['item_id']) for line in lines]))
+        if resp.status != 'success':
+            return jsonify({'status': 'error', 'message': resp.message}), 400
+        return jsonify({'status': 'success', 'results': buyer_api.stock_results(lines, resp)})
+    resp = await _catalog.call_async(
+        'GetItem', product_db_pb2.ItemIdRequest(item_id=item_id(data['item_id'])))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': 'Item not found'}), 404
+    if resp.item.quantity < data['quantity']:
+        return jsonify({'status': 'error', 'message': 'Not enough stock'}), 400
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/cart', methods=['PUT'])
+async def save_cart():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    cart_items = buyer_api.cart_items((await request.get_json()).get('cart', []))
+    await _product_pool.call('StoreCart', product_db_pb2.StoreCartRequest(buyer_id=buyer_id, cart=cart_items))
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/cart', methods=['GET'])
+async def get_cart():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    resp = await _product_pool.call('GetCart', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
+    return jsonify({'status': 'success', 'cart': buyer_api.cart_to_list(resp.cart)})
+
+
+@app.route('/buyer/cart', methods=['DELETE'])
+async def clear_cart():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    await _product_pool.call('ClearCart', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/feedback', methods=['POST'])
+async def provide_feedback():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    data = await request.get_json()
+    resp = await _product_pool.call('AddItemFeedback', product_db_pb2.AddItemFeedbackRequest(
+        item_id=item_id(data['item_id']),
+        feedback_type=data['feedback_type']
+    ))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/feedback/batch', methods=['POST'])
+async def provide_feedback_batch():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    data = await request.get_json()
+    resp = await _product_pool.call('AddFeedbackBatch',
+                                    buyer_api.feedback_batch_request(data.get('feedback', [])))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    results = [{'status': r.status, 'message': r.message} for r in resp.results]
+    return jsonify({'status': 'success', 'results': results})
+
+
+@app.route('/buyer/seller/<int:seller_id>/rating', methods=['GET'])
+async def get_seller_rating(seller_id):
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    resp = await _product_pool.call(
+        'GetSellerRating', product_db_pb2.GetSellerRatingRequest(seller_id=seller_id))
+    return jsonify({'status': 'success', 'thumbs_up': resp.thumbs_up, 'thumbs_down': resp.thumbs_down})
+
+
+@app.route('/buyer/purchase', methods=['POST'])
+async def make_purchase():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    data = await request.get_json()
+    purchase_item = item_id(data['item_id'])
+    # The payment is authorized while the stock is checked, and only
+    # captured once the purchase is recorded; otherwise its hold is voided.
+    # The authorization is shielded: a request cancelled while it waits
+    # still gets to void the hold.
+    payment = _in_background(_payments.authorize(
+        data['name'],
+        data['card_number'],
+        data['expiration_date'],
+        data['security_code']
+    ))
+    bought = False
+    try:
+        stock = await _catalog.call_async('GetItem', product_db_pb2.ItemIdRequest(item_id=purchase_item))
+        if stock.status != 'success' or stock.item.quantity < data['quantity']:
+            message = stock.message if stock.status != 'success' else 'Not enough stock'
+            return jsonify({'status': 'error', 'message': message}), 400
+        try:
+            hold = await asyncio.shield(payment)
+        except PaymentError as e:
+            return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+        if hold is None:
+            return jsonify({'status': 'error', 'message': 'Payment declined'}), 402
+        resp = await _product_pool.call('MakePurchase', product_db_pb2.MakePurchaseRequest(
+            buyer_id=buyer_id,
+            item_id=purchase_item,
+            quantity=data['quantity']
+        ))
+        if resp.status != 'success':
+            return jsonify({'status': 'error', 'message': resp.message}), 400
+        bought = True
+        await _payments.capture(hold)
+    finally:
+        if not bought:
+            _payments.release(payment)
+    return jsonify({'status': 'success'})
+
+
+@app.route('/buyer/checkout', methods=['POST'])
+async def checkout_cart():
+    """Buy a whole cart in one replicated command: all lines or none."""
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    data = await request.get_json()
+    # No 'cart' in the body: check out (and clear) the saved cart
+    lines = data.get('cart', [])
+    if not lines:
+        cart = await _product_pool.call('GetCart', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
+        lines = buyer_api.cart_to_list(cart.cart)
+    if not lines:
+        return jsonify({'status': 'error', 'message': 'Cart is empty'}), 400
+    # The buyer is only charged for a cart the stock can fill. CheckoutCart
+    # still checks it again: another buyer may take the last units meanwhile.
+    stock = await _product_pool.call('GetItems', product_db_pb2.ItemIdsRequest(
+        item_ids=[item_id(line['item_id']) for line in lines]))
+    if stock.status != 'success':
+        return jsonify({'status': 'error', 'message': stock.message}), 400
+    failed = buyer_api.unavailable_items(lines, stock)
+    if failed:
+        return jsonify({'status': 'error', 'message': 'Item not found or not enough stock',
+                        'failed_items': failed}), 400
+    payment = _in_background(_payments.authorize(
+        data['name'],
+        data['card_number'],
+        data['expiration_date'],
+        data['security_code']
+    ))
+    bought = False
+    try:
+        try:
+            hold = await asyncio.shield(payment)
+        except PaymentError as e:
+            return jsonify({'status': 'error', 'message': f'Payment failed: {e}'}), 503
+        if hold is None:
+            return jsonify({'status': 'error', 'message': 'Payment declined'}), 402
+        resp = await _product_pool.call('CheckoutCart', product_db_pb2.CheckoutCartRequest(
+            buyer_id=buyer_id,
+            items=buyer_api.cart_items(data.get('cart', []))
+        ))
+        if resp.status != 'success':
+            failed = [[i.category, i.item_id] for i in resp.failed_items]
+            return jsonify({'status': 'error', 'message': resp.message, 'failed_items': failed}), 400
+        bought = True
+        await _payments.capture(hold)
+    finally:
+        if not bought:
+            _payments.release(payment)
+    return jsonify({'status': 'success', 'total': resp.total})
+
+
+@app.route('/buyer/purchases', methods=['GET'])
+async def get_purchases():
+    session_resp, err = await validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    buyer_id = session_resp.user_id
+    resp = await _product_pool.call('GetBuyerPurchases', product_db_pb2.BuyerIdRequest(buyer_id=buyer_id))
+    return jsonify({'status': 'success', 'purchases': buyer_api.purchases_to_list(resp.purchases)})
+
+
+@app.route('/buyer/backends', methods=['GET'])
+async def backend_stats():
+    """Per-replica in-flight calls and latency, as seen by this frontend."""
+    return jsonify(buyer_api.backend_stats(_customer_pool, _product_pool, _catalog, _payments))
+
+
+def init_backends(args, customer_addrs, product_addrs):
+    """Connect to the backends named on the command line; runs on the serving loop."""
+    global _customer_pool, _product_pool, _catalog, _payments
+    customer_pool, product_pool = buyer_api.backend_pools(args, customer_addrs, product_addrs)
+    _customer_pool = aio_pool(customer_pool)
+    _product_pool = AioCoalescingPool(aio_pool(product_pool), buyer_api.shared_reads(args))
+    _catalog = buyer_api.catalog_cache(args, _product_pool)
+    _payments = AioPaymentClient(args.financial_host, args.financial_port,
+                                 **buyer_api.payment_options(args))
+
+
+async def main(args, customer_addrs, product_addrs):
+    init_backends(args, customer_addrs, product_addrs)
+    config = Config()
+    config.bind = [f'{args.host}:{args.port}']
+    config.keep_alive_timeout = args.keep_alive_timeout
+    await serve(app, config)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Buyer REST Server (asyncio)')
+    buyer_api.add_arguments(parser)
+    parser.add_argument('--keep-alive-timeout', type=float, default=KEEP_ALIVE_TIMEOUT,
+                        help='Seconds an idle client connection is kept open')
+    args = parser.parse_args()
+    customer_addrs, product_addrs = buyer_api.backend_addrs(args)
+
+    print(f'Buyer REST server (asyncio) on {args.host}:{args.port}')
+    print(f'  Customer DB replicas: {customer_addrs}')
+    print(f'  Product DB replicas: {product_addrs}')
+    asyncio.run(main(args, customer_addrs, product_addrs))
@@ -0,0 +1,168 @@
+"""
+Catalog read cache for the buyer frontend.
+
+The catalog changes far less often than buyers search it. The product DB
+stamps every item read with a catalog version (GetCatalogVersion: per
+category, or for the whole catalog) that moves whenever an item in that
+scope changes. CatalogCache keeps SearchItems and GetItem responses with the
+version they were read at, least recently used first, up to max_bytes of
+encoded responses. A read asks for the current version of its scope and is
+answered from the cache when the entry was read at exactly that version;
+within `staleness` seconds of the last check for a scope it is answered
+without asking at all.
+
+    cache = CatalogCache(pool, max_bytes=64 << 20, staleness=0.5)
+    resp = cache.call("SearchItems", request)   # same interface as StubPool
+    cache.stats()  # {"entries": 120, "bytes": 81234, "hits": 950, ...}
+
+Cached responses are shared between callers and must not be modified.
+Over an asyncio pool (buyer_server_aio.py), await cache.call_async() instead.
+
+item_etag() and items_etag() derive the frontends' HTTP ETags from item
+versions (ItemData.version), which every product DB replica agrees on.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import product_db_pb2
+
+CATALOG_CACHE_BYTES = 64 << 20  # encoded responses kept
+CATALOG_STALENESS = 0.5         # seconds a scope's version is trusted without a check
+ENTRY_OVERHEAD = 200            # bytes charged per entry on top of its encoding
+
+# Cached methods -> (category, has_category) scope of the request
+_SCOPES = {
+    "SearchItems": lambda r: (r.category, r.has_category),
+    "GetItem": lambda r: (r.item_id.category, True),
+}
+
+
+def _version_request(scope):
+    category, has_category = scope
+    return product_db_pb2.CatalogVersionRequest(category=category, has_category=has_category)
+
+
+def item_etag(item):
+    """ETag of one item: changes whenever the item does."""
+    return f"{item.item_id.category}.{item.item_id.item_id}.{item.version}"
+
+
+def items_etag(items):
+    """ETag of a list of items: changes when any item, or the list, does."""
+    digest = hashlib.blake2b(digest_size=16)
+    for item in items:
+        digest.update(f"{item_etag(item)};".encode())
+    return digest.hexdigest()
+
+
+class CatalogCache:
+    """Version-checked LRU of catalog read responses (see module docstring)."""
+
+    def __init__(self, pool, max_bytes=CATALOG_CACHE_BYTES, staleness=CATALOG_STALENESS):
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self.staleness = staleness
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (method, request bytes) -> (version, response, size)
+        self._versions = {}             # scope -> (version, monotonic time checked)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+        self.evictions = 0
+
+    def call(self, method_name: str, request, timeout=10):
+        scope_of = _SCOPES.get(method_name)
+        if scope_of is None or self.max_bytes <= 0:
+            return self.pool.call(method_name, request, timeout)
+        key, scope = self._key(method_name, request), scope_of(request)
+        version, now = self._trusted_version(scope)
+        if version is None:
+            version = self._checked_version(scope, now, self.pool.call(
+                "GetCatalogVersion", _version_request(scope), timeout))
+        cached = self._lookup(key, version)
+        if cached is not None:
+            return cached
+        resp = self.pool.call(method_name, request, timeout)
+        self._store(key, scope, resp)
+        return resp
+
+    async def call_async(self, method_name: str, request, timeout=10):
+        """call() over an asyncio pool (stub_pool.aio_pool())."""
+        scope_of = _SCOPES.get(method_name)
+        if scope_of is None or self.max_bytes <= 0:
+            return await self.pool.call(method_name, request, timeout)
+        key, scope = self._key(method_name, request), scope_of(request)
+        version, now = self._trusted_version(scope)
+        if version is None:
+            version = self._checked_version(scope, now, await self.pool.call(
+                "GetCatalogVersion", _version_request(scope), timeout))
+        cached = self._lookup(key, version)
+        if cached is not None:
+            return cached
+        resp = await self.pool.call(method_name, request, timeout)
+        self._store(key, scope, resp)
+        return resp
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "version_checks": self.version_checks, "evictions": self.evictions}
+
+    @staticmethod
+    def _key(method_name, request):
+        return method_name, request.SerializeToString(deterministic=True)
+
+    def _trusted_version(self, scope):
+        """(version of scope checked within the staleness window or None, now)."""
+        now = time.monotonic()
+        with self._lock:
+            known = self._versions.get(scope)
+            if known is not None and now - known[1] < self.staleness:
+                return known[0], now
+            self.version_checks += 1
+        return None, now
+
+    def _checked_version(self, scope, checked_at, resp):
+        """Record a GetCatalogVersion answer; the version, or None if the product DB has none."""
+        if resp.status != 'success':
+            return None
+        with self._lock:
+            self._versions[scope] = (resp.version, checked_at)
+        return resp.version
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and version is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def _store(self, key, scope, resp):
+        if resp.status != 'success' or not resp.catalog_version:
+            return
+        size = resp.ByteSize() + len(key[1]) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # A replica ahead of the one that answered the version check
+            # served this read: its version is the newer one to check against.
+            known = self._versions.get(scope)
+            if known is not None and known[0] < resp.catalog_version:
+                self._versions[scope] = (resp.catalog_version, known[1])
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (resp.catalog_version, resp, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
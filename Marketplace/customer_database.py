@@ -1,10 +1,8 @@
-import grpc
 import sqlite3
 import threading
 import time
 import uuid
 import argparse
-from concurrent import futures
 
 import sys
 import os
@@ -12,6 +10,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 import customer_db_pb2
 import customer_db_pb2_grpc
+from admission import CUSTOMER_DB_LIMITS, CUSTOMER_DB_PRIORITIES, threaded_server
+from health import add_health_servicer
 
 DB_FILE = 'customer_data.db'
 db_lock = threading.Lock()
@@ -149,8 +149,9 @@ class CustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
 
 def serve(host='0.0.0.0', port=50051):
     init_db()
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = threaded_server(10, CUSTOMER_DB_PRIORITIES, CUSTOMER_DB_LIMITS)
     customer_db_pb2_grpc.add_CustomerDBServicer_to_server(CustomerDBServicer(), server)
+    add_health_servicer(server)
     server.add_insecure_port(f'{host}:{port}')
     server.start()
     print(f'Customer Database gRPC server listening on {host}:{port}')
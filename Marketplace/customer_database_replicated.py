@@ -7,16 +7,31 @@ Each replica runs:
 
 Read operations go directly to local SQLite.
 Write operations are broadcast and applied in identical order on all replicas.
+StoreUser and StoreSession carry a client-generated request_id: the deliver
+callback applies each id once and answers a retry, broadcast again through
+another replica, with the first result (applied_requests table).
+
+The customer data can be split over several independent broadcast groups
+(--shard-index/--shard-count). Users are placed by a hash of the username and
+sessions by the user's group; the frontends route with UserShardedStubPool
+(stub_pool.py). So that user ids stay unique across groups, group i assigns
+only ids with id % shard_count == i, and its session ids carry an "i:" tag.
+
+With --aio the node serves grpc.aio: RPCs await delivery of their broadcast
+instead of holding one of the threaded server's workers. Either way RPCs
+that cannot start yet wait in admission.py's priority queue, where session
+touches (UpdateSessionActivity) come last and are the first to be shed.
 """
 
+import asyncio
 import grpc
+import json
 import sqlite3
 import threading
 import time
 import uuid
 import argparse
 import logging
-from concurrent import futures
 
 import sys
 import os
@@ -24,6 +39,10 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 import customer_db_pb2
 import customer_db_pb2_grpc
+from admission import (CUSTOMER_DB_LIMITS, CUSTOMER_DB_PRIORITIES, MAX_QUEUE_AGE, MAX_QUEUED,
+                       aio_server, threaded_server)
+from async_rpc import Call, async_servicer, rpc_handler
+from health import add_health_servicer
 from atomic_broadcast import AtomicBroadcastNode
 
 logging.basicConfig(
@@ -34,6 +53,22 @@ logger = logging.getLogger(__name__)
 
 db_lock = threading.Lock()
 
+# Results of this many recent write request_ids are kept to answer retries;
+# older ones are pruned every DEDUP_PRUNE_EVERY writes.
+DEDUP_WINDOW = 50000
+DEDUP_PRUNE_EVERY = 1000
+
+# gRPC serving: RPCs run at once by the threaded server and by the grpc.aio
+# server (--aio); more wait in admission.py's priority queue
+GRPC_WORKERS = 10
+AIO_MAX_CONCURRENCY = 1000
+
+
+def next_user_id(max_id, shard_index=0, shard_count=1):
+    """Smallest user id above max_id that belongs to this shard."""
+    next_id = (max_id or 0) + 1
+    return next_id + (shard_index - next_id) % shard_count
+
 
 def get_connection(db_file):
     return sqlite3.connect(db_file, check_same_thread=False)
@@ -59,45 +94,93 @@ def init_db(db_file):
                 last_activity REAL NOT NULL
             )
         ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS applied_requests (
+                seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+                request_id TEXT UNIQUE NOT NULL,
+                result     TEXT NOT NULL
+            )
+        ''')
         conn.commit()
         conn.close()
 
 
+class _Broadcast:
+    """
+    Step (async_rpc.py): atomically broadcast a write and wait for its
+    delivery here. Its value is the delivery result, or None on timeout.
+    """
+
+    def __init__(self, broadcast_node, payload, timeout=15):
+        self.broadcast_node = broadcast_node
+        self.payload = payload
+        self.timeout = timeout
+
+    def run(self):
+        try:
+            return self.broadcast_node.broadcast_request(self.payload, timeout=self.timeout)
+        except TimeoutError:
+            return None
+
+    async def run_async(self):
+        try:
+            return await self.broadcast_node.broadcast_request_async(self.payload, timeout=self.timeout)
+        except TimeoutError:
+            return None
+
+
 class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
     """
     gRPC servicer that replicates writes via atomic broadcast.
+
+    RPCs are step generators (async_rpc.py): the same code serves the
+    threaded server and, as AsyncReplicatedCustomerDBServicer, grpc.aio.
     """
 
-    def __init__(self, db_file, broadcast_node):
+    def __init__(self, db_file, broadcast_node, shard_index=0, shard_count=1):
         self.db_file = db_file
         self.broadcast_node = broadcast_node
+        self.shard_index = shard_index
+        self.shard_count = shard_count
 
     # -------------------------------------------------------------------
     # Write operations — go through atomic broadcast
     # -------------------------------------------------------------------
 
-    def StoreUser(self, request, context):
-        # Pre-compute user_id so all replicas use the same value
+    def _next_user_id(self):
         with db_lock:
             conn = get_connection(self.db_file)
             try:
                 row = conn.execute('SELECT MAX(user_id) FROM users').fetchone()
-                next_id = (row[0] or 0) + 1
+                return next_user_id(row[0], self.shard_index, self.shard_count)
             finally:
                 conn.close()
 
-        payload = {
-            "op": "StoreUser",
-            "user_id": next_id,
-            "username": request.username,
-            "password": request.password,
-            "name": request.name,
-            "user_type": request.user_type,
-        }
+    def _applied(self, request_id):
+        """Step helper: the result of a write already delivered here, else None."""
+        if not request_id:
+            return None
+        return (yield Call(applied_result, self.db_file, request_id))
 
-        try:
-            result = self.broadcast_node.broadcast_request(payload, timeout=15)
-        except TimeoutError:
+    @rpc_handler
+    def StoreUser(self, request, context):
+        result = yield from self._applied(request.request_id)
+        if result is None:
+            # Pre-compute user_id so all replicas use the same value
+            next_id = yield Call(self._next_user_id)
+
+            payload = {
+                "op": "StoreUser",
+                "user_id": next_id,
+                "username": request.username,
+                "password": request.password,
+                "name": request.name,
+                "user_type": request.user_type,
+                "request_id": request.request_id,
+            }
+
+            result = yield _Broadcast(self.broadcast_node, payload)
+        if result is None:
             return customer_db_pb2.StoreUserResponse(
                 status='error', message='Replication timeout', user_id=0
             )
@@ -108,22 +191,27 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
             user_id=result.get("user_id", 0),
         )
 
+    @rpc_handler
     def StoreSession(self, request, context):
-        # Pre-compute session_id and timestamp for determinism
-        session_id = str(uuid.uuid4())
-        now = time.time()
-
-        payload = {
-            "op": "StoreSession",
-            "session_id": session_id,
-            "user_id": request.user_id,
-            "user_type": request.user_type,
-            "timestamp": now,
-        }
-
-        try:
-            result = self.broadcast_node.broadcast_request(payload, timeout=15)
-        except TimeoutError:
+        result = yield from self._applied(request.request_id)
+        if result is None:
+            # Pre-compute session_id and timestamp for determinism
+            session_id = str(uuid.uuid4())
+            if self.shard_count > 1:
+                session_id = f"{self.shard_index}:{session_id}"
+            now = time.time()
+
+            payload = {
+                "op": "StoreSession",
+                "session_id": session_id,
+                "user_id": request.user_id,
+                "user_type": request.user_type,
+                "timestamp": now,
+                "request_id": request.request_id,
+            }
+
+            result = yield _Broadcast(self.broadcast_node, payload)
+        if result is None:
             return customer_db_pb2.StoreSessionResponse(
                 status='error', message='Replication timeout', session_id=''
             )
@@ -134,6 +222,7 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
             session_id=result.get("session_id", ""),
         )
 
+    @rpc_handler
     def UpdateSessionActivity(self, request, context):
         now = time.time()
 
@@ -143,9 +232,8 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
             "timestamp": now,
         }
 
-        try:
-            result = self.broadcast_node.broadcast_request(payload, timeout=15)
-        except TimeoutError:
+        result = yield _Broadcast(self.broadcast_node, payload)
+        if result is None:
             return customer_db_pb2.StatusResponse(
                 status='error', message='Replication timeout'
             )
@@ -154,15 +242,15 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
             status=result["status"], message=result["message"]
         )
 
+    @rpc_handler
     def DeleteSession(self, request, context):
         payload = {
             "op": "DeleteSession",
             "session_id": request.session_id,
         }
 
-        try:
-            result = self.broadcast_node.broadcast_request(payload, timeout=15)
-        except TimeoutError:
+        result = yield _Broadcast(self.broadcast_node, payload)
+        if result is None:
             return customer_db_pb2.StatusResponse(
                 status='error', message='Replication timeout'
             )
@@ -175,7 +263,11 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
     # Read operations — go directly to local SQLite
     # -------------------------------------------------------------------
 
+    @rpc_handler
     def GetUser(self, request, context):
+        return (yield Call(self._get_user, request))
+
+    def _get_user(self, request):
         with db_lock:
             conn = get_connection(self.db_file)
             try:
@@ -195,7 +287,11 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
             finally:
                 conn.close()
 
+    @rpc_handler
     def GetSession(self, request, context):
+        return (yield Call(self._get_session, request))
+
+    def _get_session(self, request):
         with db_lock:
             conn = get_connection(self.db_file)
             try:
@@ -226,121 +322,149 @@ class ReplicatedCustomerDBServicer(customer_db_pb2_grpc.CustomerDBServicer):
                 conn.close()
 
 
+# Same RPCs as coroutines, for the grpc.aio server (--aio)
+AsyncReplicatedCustomerDBServicer = async_servicer(
+    ReplicatedCustomerDBServicer, customer_db_pb2.DESCRIPTOR.services_by_name["CustomerDB"]
+)
+
+
 # -----------------------------------------------------------------------
 # Delivery callback — executed in total order on every replica
 # -----------------------------------------------------------------------
 
-def make_deliver_callback(db_file):
+def make_deliver_callback(db_file, shard_index=0, shard_count=1):
     """
     Returns a callback that applies write operations to local SQLite.
     Called by the atomic broadcast node when a request is delivered.
+
+    A write with a request_id is applied once: its result is stored in the
+    applied_requests table in the same transaction, and a later delivery of
+    the same id (a client retry) returns that result instead.
     """
 
     def on_deliver(payload):
         op = payload["op"]
-
         if op == "StoreUser":
-            return _deliver_store_user(db_file, payload)
+            apply = lambda conn: _deliver_store_user(conn, payload, shard_index, shard_count)
         elif op == "StoreSession":
-            return _deliver_store_session(db_file, payload)
+            apply = lambda conn: _deliver_store_session(conn, payload)
         elif op == "UpdateSessionActivity":
-            return _deliver_update_session(db_file, payload)
+            apply = lambda conn: _deliver_update_session(conn, payload)
         elif op == "DeleteSession":
-            return _deliver_delete_session(db_file, payload)
+            apply = lambda conn: _deliver_delete_session(conn, payload)
         else:
             logger.error("Unknown operation: %s", op)
             return {"status": "error", "message": f"Unknown operation: {op}"}
 
+        request_id = payload.get("request_id")
+        with db_lock:
+            conn = get_connection(db_file)
+            try:
+                if request_id:
+                    result = _applied_result(conn, request_id)
+                    if result is not None:
+                        return result
+                result = apply(conn)
+                if request_id:
+                    _remember_request(conn, request_id, result)
+                conn.commit()
+                return result
+            finally:
+                conn.close()
+
     return on_deliver
 
 
-def _deliver_store_user(db_file, payload):
-    user_id = payload["user_id"]
-    username = payload["username"]
-    password = payload["password"]
-    name = payload["name"]
-    user_type = payload["user_type"]
+def _applied_result(conn, request_id):
+    row = conn.execute(
+        'SELECT result FROM applied_requests WHERE request_id = ?', (request_id,)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
 
+def _remember_request(conn, request_id, result):
+    cur = conn.execute(
+        'INSERT INTO applied_requests (request_id, result) VALUES (?, ?)',
+        (request_id, json.dumps(result))
+    )
+    # Every replica inserts the same ids in the same order, so they all
+    # forget the same ones
+    if cur.lastrowid % DEDUP_PRUNE_EVERY == 0:
+        conn.execute('DELETE FROM applied_requests WHERE seq <= ?',
+                     (cur.lastrowid - DEDUP_WINDOW,))
+
+
+def applied_result(db_file, request_id):
+    """Result of the write with this request_id if it was delivered here, else None."""
+    if not request_id:
+        return None
     with db_lock:
         conn = get_connection(db_file)
         try:
-            # Check if username already exists
-            existing = conn.execute(
-                'SELECT user_id FROM users WHERE username = ?', (username,)
-            ).fetchone()
-            if existing:
-                return {"status": "error", "message": "Username already exists", "user_id": 0}
-
-            # Check if user_id is already taken (race from another broadcast)
-            existing_id = conn.execute(
-                'SELECT user_id FROM users WHERE user_id = ?', (user_id,)
-            ).fetchone()
-            if existing_id:
-                # Reassign to next available ID
-                row = conn.execute('SELECT MAX(user_id) FROM users').fetchone()
-                user_id = (row[0] or 0) + 1
-
-            conn.execute(
-                'INSERT INTO users (user_id, username, password, name, user_type) VALUES (?, ?, ?, ?, ?)',
-                (user_id, username, password, name, user_type)
-            )
-            conn.commit()
-            return {"status": "success", "message": "User created", "user_id": user_id}
-        except sqlite3.IntegrityError:
-            return {"status": "error", "message": "Username already exists", "user_id": 0}
+            return _applied_result(conn, request_id)
         finally:
             conn.close()
 
 
-def _deliver_store_session(db_file, payload):
-    session_id = payload["session_id"]
+def _deliver_store_user(conn, payload, shard_index=0, shard_count=1):
     user_id = payload["user_id"]
+    username = payload["username"]
+    password = payload["password"]
+    name = payload["name"]
     user_type = payload["user_type"]
-    timestamp = payload["timestamp"]
 
-    with db_lock:
-        conn = get_connection(db_file)
-        try:
-            conn.execute(
-                'INSERT INTO sessions (session_id, user_id, user_type, last_activity) VALUES (?, ?, ?, ?)',
-                (session_id, user_id, user_type, timestamp)
-            )
-            conn.commit()
-            return {"status": "success", "message": "", "session_id": session_id}
-        finally:
-            conn.close()
+    try:
+        # Check if username already exists
+        existing = conn.execute(
+            'SELECT user_id FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        if existing:
+            return {"status": "error", "message": "Username already exists", "user_id": 0}
+
+        # Check if user_id is already taken (race from another broadcast)
+        existing_id = conn.execute(
+            'SELECT user_id FROM users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        if existing_id:
+            # Reassign to next available ID
+            row = conn.execute('SELECT MAX(user_id) FROM users').fetchone()
+            user_id = next_user_id(row[0], shard_index, shard_count)
+
+        conn.execute(
+            'INSERT INTO users (user_id, username, password, name, user_type) VALUES (?, ?, ?, ?, ?)',
+            (user_id, username, password, name, user_type)
+        )
+        return {"status": "success", "message": "User created", "user_id": user_id}
+    except sqlite3.IntegrityError:
+        return {"status": "error", "message": "Username already exists", "user_id": 0}
 
 
-def _deliver_update_session(db_file, payload):
+def _deliver_store_session(conn, payload):
     session_id = payload["session_id"]
+    user_id = payload["user_id"]
+    user_type = payload["user_type"]
     timestamp = payload["timestamp"]
 
-    with db_lock:
-        conn = get_connection(db_file)
-        try:
-            conn.execute(
-                'UPDATE sessions SET last_activity = ? WHERE session_id = ?',
-                (timestamp, session_id)
-            )
-            conn.commit()
-            return {"status": "success", "message": ""}
-        finally:
-            conn.close()
+    conn.execute(
+        'INSERT INTO sessions (session_id, user_id, user_type, last_activity) VALUES (?, ?, ?, ?)',
+        (session_id, user_id, user_type, timestamp)
+    )
+    return {"status": "success", "message": "", "session_id": session_id}
 
 
-def _deliver_delete_session(db_file, payload):
-    session_id = payload["session_id"]
+def _deliver_update_session(conn, payload):
+    conn.execute(
+        'UPDATE sessions SET last_activity = ? WHERE session_id = ?',
+        (payload["timestamp"], payload["session_id"])
+    )
+    return {"status": "success", "message": ""}
 
-    with db_lock:
-        conn = get_connection(db_file)
-        try:
-            conn.execute(
-                'DELETE FROM sessions WHERE session_id = ?', (session_id,)
-            )
-            conn.commit()
-            return {"status": "success", "message": ""}
-        finally:
-            conn.close()
+
+def _deliver_delete_session(conn, payload):
+    conn.execute(
+        'DELETE FROM sessions WHERE session_id = ?', (payload["session_id"],)
+    )
+    return {"status": "success", "message": ""}
 
 
 # -----------------------------------------------------------------------
@@ -356,27 +480,61 @@ def parse_members(members_str):
     return result
 
 
-def serve(node_id, members, grpc_host='0.0.0.0', grpc_port=50051):
-    db_file = f'customer_data_node{node_id}.db'
+async def _serve_aio(servicer, grpc_host, grpc_port, max_concurrency, max_queued, max_queue_age):
+    server = aio_server(max_concurrency, CUSTOMER_DB_PRIORITIES, CUSTOMER_DB_LIMITS,
+                        max_queued, max_queue_age)
+    customer_db_pb2_grpc.add_CustomerDBServicer_to_server(servicer, server)
+    add_health_servicer(server, lambda: servicer.broadcast_node.running, aio=True)
+    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
+    await server.start()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+
+
+def serve(node_id, members, grpc_host='0.0.0.0', grpc_port=50051,
+          shard_index=0, shard_count=1, aio=False, max_concurrency=AIO_MAX_CONCURRENCY,
+          max_queued=MAX_QUEUED, max_queue_age=MAX_QUEUE_AGE):
+    if shard_count > 1:
+        db_file = f'customer_data_shard{shard_index}_node{node_id}.db'
+    else:
+        db_file = f'customer_data_node{node_id}.db'
     init_db(db_file)
 
     # Create atomic broadcast node
-    on_deliver = make_deliver_callback(db_file)
+    on_deliver = make_deliver_callback(db_file, shard_index, shard_count)
     broadcast_node = AtomicBroadcastNode(node_id, members, on_deliver)
     broadcast_node.start()
 
     # Create gRPC server
-    servicer = ReplicatedCustomerDBServicer(db_file, broadcast_node)
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    customer_db_pb2_grpc.add_CustomerDBServicer_to_server(servicer, server)
-    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
-    server.start()
+    servicer_class = AsyncReplicatedCustomerDBServicer if aio else ReplicatedCustomerDBServicer
+    servicer = servicer_class(db_file, broadcast_node, shard_index, shard_count)
 
     logger.info(
-        "Replicated Customer DB node %d | gRPC %s:%d | UDP %s:%d",
-        node_id, grpc_host, grpc_port, *members[node_id]
+        "Replicated Customer DB node %d (shard %d/%d) | gRPC %s:%d (%s) | UDP %s:%d",
+        node_id, shard_index, shard_count, grpc_host, grpc_port,
+        f"aio, max {max_concurrency} RPCs" if aio else f"{GRPC_WORKERS} worker threads",
+        *members[node_id]
     )
 
+    if aio:
+        try:
+            asyncio.run(_serve_aio(servicer, grpc_host, grpc_port, max_concurrency,
+                                   max_queued, max_queue_age))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            broadcast_node.stop()
+        return
+
+    server = threaded_server(GRPC_WORKERS, CUSTOMER_DB_PRIORITIES, CUSTOMER_DB_LIMITS,
+                             max_queued, max_queue_age)
+    customer_db_pb2_grpc.add_CustomerDBServicer_to_server(servicer, server)
+    add_health_servicer(server, lambda: broadcast_node.running)
+    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
+    server.start()
+
     try:
         server.wait_for_termination()
     except KeyboardInterrupt:
@@ -394,7 +552,26 @@ if __name__ == '__main__':
                         help='Comma-separated list of host:udp_port for all members')
     parser.add_argument('--grpc-host', default='0.0.0.0')
     parser.add_argument('--grpc-port', type=int, default=50051)
+    parser.add_argument('--shard-index', type=int, default=0,
+                        help='Index of this broadcast group among the customer DB shards')
+    parser.add_argument('--shard-count', type=int, default=1,
+                        help='Number of customer DB shards (independent broadcast groups)')
+    parser.add_argument('--aio', action='store_true',
+                        help='Serve with grpc.aio: broadcast waits are awaited, not '
+                             f'one worker thread each (default: {GRPC_WORKERS} threads)')
+    parser.add_argument('--max-concurrency', type=int, default=AIO_MAX_CONCURRENCY,
+                        help='With --aio, the most RPCs handled at once (more wait in the '
+                             'admission queue)')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED,
+                        help='Most RPCs waiting for a slot; more are rejected with '
+                             'RESOURCE_EXHAUSTED')
+    parser.add_argument('--max-queue-age', type=float, default=MAX_QUEUE_AGE,
+                        help='Seconds a write may wait for a slot before it is shed (reads '
+                             'get twice as long, session touches half; 0 disables '
+                             'admission control)')
     args = parser.parse_args()
 
     members = parse_members(args.members)
-    serve(args.node_id, members, args.grpc_host, args.grpc_port)
+    serve(args.node_id, members, args.grpc_host, args.grpc_port,
+          args.shard_index, args.shard_count, args.aio, args.max_concurrency,
+          args.max_queued, args.max_queue_age)
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11\x63ustomer_db.proto\x12\ncustomerdb\"W\n\x10StoreUserRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\x11\n\tuser_type\x18\x04 \x01(\t\"E\n\x11StoreUserResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\"\"\n\x0eGetUserRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"\x88\x01\n\x0fGetUserResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x10\n\x08username\x18\x04 \x01(\t\x12\x10\n\x08password\x18\x05 \x01(\t\x12\x0c\n\x04name\x18\x06 \x01(\t\x12\x11\n\tuser_type\x18\x07 \x01(\t\"9\n\x13StoreSessionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\x05\x12\x11\n\tuser_type\x18\x02 \x01(\t\"K\n\x14StoreSessionResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\"\'\n\x11GetSessionRequest\x12\x12\n\nsession_id\x18\x01 \x01(\t\"p\n\x12GetSessionResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x11\n\tuser_type\x18\x04 \x01(\t\x12\x15\n\rlast_activity\x18\x05 \x01(\x01\"$\n\x0eSessionRequest\x12\x12\n\nsession_id\x18\x01 \x01(\t\"1\n\x0eStatusResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t2\xd4\x03\n\nCustomerDB\x12H\n\tStoreUser\x12\x1c.customerdb.StoreUserRequest\x1a\x1d.customerdb.StoreUserResponse\x12\x42\n\x07GetUser\x12\x1a.customerdb.GetUserRequest\x1a\x1b.customerdb.GetUserResponse\x12Q\n\x0cStoreSession\x12\x1f.customerdb.StoreSessionRequest\x1a .customerdb.StoreSessionResponse\x12K\n\nGetSession\x12\x1d.customerdb.GetSessionRequest\x1a\x1e.customerdb.GetSessionResponse\x12O\n\x15UpdateSessionActivity\x12\x1a.customerdb.SessionRequest\x1a\x1a.customerdb.StatusResponse\x12G\n\rDeleteSession\x12\x1a.customerdb.SessionRequest\x1a\x1a.customerdb.StatusResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11\x63ustomer_db.proto\x12\ncustomerdb\"k\n\x10StoreUserRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\x11\n\tuser_type\x18\x04 \x01(\t\x12\x12\n\nrequest_id\x18\x05 \x01(\t\"E\n\x11StoreUserResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\"\"\n\x0eGetUserRequest\x12\x10\n\x08username\x18\x01 \x01(\t\"\x88\x01\n\x0fGetUserResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x10\n\x08username\x18\x04 \x01(\t\x12\x10\n\x08password\x18\x05 \x01(\t\x12\x0c\n\x04name\x18\x06 \x01(\t\x12\x11\n\tuser_type\x18\x07 \x01(\t\"M\n\x13StoreSessionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\x05\x12\x11\n\tuser_type\x18\x02 \x01(\t\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"K\n\x14StoreSessionResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x12\n\nsession_id\x18\x03 \x01(\t\"\'\n\x11GetSessionRequest\x12\x12\n\nsession_id\x18\x01 \x01(\t\"p\n\x12GetSessionResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x11\n\tuser_type\x18\x04 \x01(\t\x12\x15\n\rlast_activity\x18\x05 \x01(\x01\"$\n\x0eSessionRequest\x12\x12\n\nsession_id\x18\x01 \x01(\t\"1\n\x0eStatusResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t2\xd4\x03\n\nCustomerDB\x12H\n\tStoreUser\x12\x1c.customerdb.StoreUserRequest\x1a\x1d.customerdb.StoreUserResponse\x12\x42\n\x07GetUser\x12\x1a.customerdb.GetUserRequest\x1a\x1b.customerdb.GetUserResponse\x12Q\n\x0cStoreSession\x12\x1f.customerdb.StoreSessionRequest\x1a .customerdb.StoreSessionResponse\x12K\n\nGetSession\x12\x1d.customerdb.GetSessionRequest\x1a\x1e.customerdb.GetSessionResponse\x12O\n\x15UpdateSessionActivity\x12\x1a.customerdb.SessionRequest\x1a\x1a.customerdb.StatusResponse\x12G\n\rDeleteSession\x12\x1a.customerdb.SessionRequest\x1a\x1a.customerdb.StatusResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,25 +32,25 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'customer_db_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_STOREUSERREQUEST']._serialized_start=33
-  _globals['_STOREUSERREQUEST']._serialized_end=120
-  _globals['_STOREUSERRESPONSE']._serialized_start=122
-  _globals['_STOREUSERRESPONSE']._serialized_end=191
-  _globals['_GETUSERREQUEST']._serialized_start=193
-  _globals['_GETUSERREQUEST']._serialized_end=227
-  _globals['_GETUSERRESPONSE']._serialized_start=230
-  _globals['_GETUSERRESPONSE']._serialized_end=366
-  _globals['_STORESESSIONREQUEST']._serialized_start=368
-  _globals['_STORESESSIONREQUEST']._serialized_end=425
-  _globals['_STORESESSIONRESPONSE']._serialized_start=427
-  _globals['_STORESESSIONRESPONSE']._serialized_end=502
-  _globals['_GETSESSIONREQUEST']._serialized_start=504
-  _globals['_GETSESSIONREQUEST']._serialized_end=543
-  _globals['_GETSESSIONRESPONSE']._serialized_start=545
-  _globals['_GETSESSIONRESPONSE']._serialized_end=657
-  _globals['_SESSIONREQUEST']._serialized_start=659
-  _globals['_SESSIONREQUEST']._serialized_end=695
-  _globals['_STATUSRESPONSE']._serialized_start=697
-  _globals['_STATUSRESPONSE']._serialized_end=746
-  _globals['_CUSTOMERDB']._serialized_start=749
-  _globals['_CUSTOMERDB']._serialized_end=1217
+  _globals['_STOREUSERREQUEST']._serialized_end=140
+  _globals['_STOREUSERRESPONSE']._serialized_start=142
+  _globals['_STOREUSERRESPONSE']._serialized_end=211
+  _globals['_GETUSERREQUEST']._serialized_start=213
+  _globals['_GETUSERREQUEST']._serialized_end=247
+  _globals['_GETUSERRESPONSE']._serialized_start=250
+  _globals['_GETUSERRESPONSE']._serialized_end=386
+  _globals['_STORESESSIONREQUEST']._serialized_start=388
+  _globals['_STORESESSIONREQUEST']._serialized_end=465
+  _globals['_STORESESSIONRESPONSE']._serialized_start=467
+  _globals['_STORESESSIONRESPONSE']._serialized_end=542
+  _globals['_GETSESSIONREQUEST']._serialized_start=544
+  _globals['_GETSESSIONREQUEST']._serialized_end=583
+  _globals['_GETSESSIONRESPONSE']._serialized_start=585
+  _globals['_GETSESSIONRESPONSE']._serialized_end=697
+  _globals['_SESSIONREQUEST']._serialized_start=699
+  _globals['_SESSIONREQUEST']._serialized_end=735
+  _globals['_STATUSRESPONSE']._serialized_start=737
+  _globals['_STATUSRESPONSE']._serialized_end=786
+  _globals['_CUSTOMERDB']._serialized_start=789
+  _globals['_CUSTOMERDB']._serialized_end=1257
 # @@protoc_insertion_point(module_scope)
@@ -1,17 +1,68 @@
+"""
+Financial Transaction SOAP service.
+
+ProcessPayment charges a card at once. The buyer frontends instead place a
+hold with AuthorizePayment, which answers a hold id (empty if declined),
+and once the purchase is recorded CapturePayment charges it; VoidPayment
+releases a hold for a purchase that failed. A hold that is neither
+captured nor voided lapses after HOLD_TIMEOUT seconds without a charge.
+Holds are kept in memory.
+"""
+
 import random
 import argparse
+import threading
+import time
+import uuid
 from spyne import Application, ServiceBase, Unicode, Boolean, rpc
+from spyne.interface.wsdl import Wsdl11
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
 from wsgiref.simple_server import make_server
 
 
+HOLD_TIMEOUT = 600.0    # seconds an uncaptured hold lasts
+
+_holds = {}             # hold id -> time it lapses
+_holds_lock = threading.Lock()
+
+
+def _approve(card_number):
+    if not card_number or len(card_number.replace(' ', '')) < 12:
+        return False
+    return random.random() < 0.9
+
+
+def _take_hold(hold_id):
+    """Remove an open hold; whether there was one."""
+    now = time.monotonic()
+    with _holds_lock:
+        for lapsed in [h for h, until in _holds.items() if until < now]:
+            del _holds[lapsed]
+        return _holds.pop(hold_id, None) is not None
+
+
 class FinancialTransactionService(ServiceBase):
     @rpc(Unicode, Unicode, Unicode, Unicode, _returns=Boolean)
     def ProcessPayment(ctx, name, card_number, expiration_date, security_code):
-        if not card_number or len(card_number.replace(' ', '')) < 12:
-            return False
-        return random.random() < 0.9
+        return _approve(card_number)
+
+    @rpc(Unicode, Unicode, Unicode, Unicode, _returns=Unicode)
+    def AuthorizePayment(ctx, name, card_number, expiration_date, security_code):
+        if not _approve(card_number):
+            return ''
+        hold_id = uuid.uuid4().hex
+        with _holds_lock:
+            _holds[hold_id] = time.monotonic() + HOLD_TIMEOUT
+        return hold_id
+
+    @rpc(Unicode, _returns=Boolean)
+    def CapturePayment(ctx, hold_id):
+        return _take_hold(hold_id)
+
+    @rpc(Unicode, _returns=Boolean)
+    def VoidPayment(ctx, hold_id):
+        return _take_hold(hold_id)
 
 
 application = Application(
@@ -23,12 +74,28 @@ application = Application(
 
 wsgi_app = WsgiApplication(application)
 
+
+def wsdl_document(url):
+    """This service's WSDL, with its endpoint at url."""
+    wsdl = Wsdl11(application.interface)
+    wsdl.build_interface_document(url)
+    return wsdl.get_interface_document()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Financial Transaction SOAP Service')
     parser.add_argument('--host', default='0.0.0.0')
     parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--write-wsdl', metavar='PATH', default=None,
+                        help='Write the WSDL to PATH and exit (refreshes the copy '
+                             'payment_client.py loads: financial_service.wsdl)')
     args = parser.parse_args()
 
+    if args.write_wsdl:
+        with open(args.write_wsdl, 'wb') as f:
+            f.write(wsdl_document(f'http://localhost:{args.port}/'))
+        raise SystemExit(0)
+
     server = make_server(args.host, args.port, wsgi_app)
     print(f'Financial Service SOAP server on {args.host}:{args.port}')
     print(f'WSDL available at http://{args.host}:{args.port}/?wsdl')
@@ -0,0 +1,36 @@
+"""
+gRPC health checking (grpc.health.v1, proto/health.proto) for the DB servers.
+
+StubPool probes every replica with Health.Check in the background and keeps
+its circuit breaker open while the probe fails or answers NOT_SERVING. Each
+server decides what serving means through is_serving(): the Raft product DB
+while it knows a leader, the customer DB while its broadcast node runs.
+"""
+
+import health_pb2
+import health_pb2_grpc
+from async_rpc import async_servicer
+
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+
+
+class HealthServicer(health_pb2_grpc.HealthServicer):
+    """Health.Check for the whole server ("" or any service name)."""
+
+    def __init__(self, is_serving=None):
+        self.is_serving = is_serving or (lambda: True)
+
+    def Check(self, request, context):
+        return health_pb2.HealthCheckResponse(
+            status=SERVING if self.is_serving() else NOT_SERVING)
+
+
+# Same, for grpc.aio servers
+AsyncHealthServicer = async_servicer(
+    HealthServicer, health_pb2.DESCRIPTOR.services_by_name["Health"])
+
+
+def add_health_servicer(server, is_serving=None, aio=False):
+    servicer_class = AsyncHealthServicer if aio else HealthServicer
+    health_pb2_grpc.add_HealthServicer_to_server(servicer_class(is_serving), server)
@@ -0,0 +1,288 @@
+"""
+Payment client for the buyer frontends.
+
+zeep.Client(wsdl="http://.../?wsdl") fetches the financial service's WSDL
+when the frontend starts, so the frontend cannot start while that service is
+down, and then opens a new HTTP connection for every ProcessPayment call on
+the request thread. PaymentClient instead loads the copy of the WSDL kept
+next to this file (financial_service.wsdl; regenerate it with
+`python financial_service.py --write-wsdl financial_service.wsdl`) and binds
+it to the configured address, so the service is first contacted by the
+first payment. Calls go over a pool of keep-alive connections.
+
+A payment is authorized first: authorize() asks the service for a hold on
+the card and returns a Future of its id, so a view can do its other backend
+calls while the payment is out. The card is only charged by capture(), once
+the purchase is recorded. A payment that will not be captured, whatever
+the reason (no stock, a failed purchase, an exception), is handed to
+release(), which voids its hold:
+
+    payments = PaymentClient("localhost", 8000, concurrency=8, timeout=10)
+    payment = payments.authorize(name, card_number, expiration_date, security_code)
+    bought = False
+    try:
+        ...                         # stock check meanwhile
+        hold = payment.result()     # hold id, None if declined; raises PaymentError
+        ...                         # record the purchase
+        bought = True
+        payments.capture(hold)
+    finally:
+        if not bought:
+            payments.release(payment)
+
+release() never waits: a payment still queued is withdrawn and an answer
+still to come is voided when it arrives. A hold nobody captures or voids
+lapses in the service without a charge.
+
+At most `concurrency` authorizations are in flight; up to `queue` more wait
+for a slot and any beyond that are refused at once with PaymentBusy (the
+views answer 503) rather than piling up behind a slow service.
+AioPaymentClient is the same over httpx for buyer_server_aio.py:
+authorize() and capture() are awaited, and release() takes the task
+running authorize().
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+import zeep
+from requests.adapters import HTTPAdapter
+from zeep.proxy import AsyncServiceProxy
+from zeep.transports import AsyncTransport, Transport
+
+PAYMENT_WSDL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_service.wsdl")
+PAYMENT_CONCURRENCY = 8     # payments in flight to the financial service
+PAYMENT_QUEUE = 64          # payments waiting for a slot before new ones are refused
+PAYMENT_TIMEOUT = 10.0      # seconds for one call to the financial service
+
+_BINDING = "{financial.service}Application"
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentError(Exception):
+    """The financial service could not be asked (unreachable, timed out or failed)."""
+
+
+class PaymentBusy(PaymentError):
+    """Too many payments are already in flight or waiting."""
+
+
+def _address(host, port):
+    return f"http://{host}:{port}/"
+
+
+class _Limits:
+    """In-flight/waiting counts and outcome counters shared by both clients."""
+
+    def __init__(self, concurrency, queue):
+        self.concurrency = concurrency
+        self.queue = queue
+        self._lock = threading.Lock()
+        self.pending = 0        # in flight or waiting
+        self.approved = 0
+        self.declined = 0
+        self.failed = 0
+        self.refused = 0
+        self.captured = 0
+        self.voided = 0
+        self.settle_failed = 0  # captures and voids that did not go through
+
+    def admit(self):
+        with self._lock:
+            if self.pending >= self.concurrency + self.queue:
+                self.refused += 1
+                raise PaymentBusy(f"{self.pending} payments pending")
+            self.pending += 1
+
+    def finish(self, approved=None):
+        """An authorization ended: approved True/False, or None if it failed."""
+        with self._lock:
+            self.pending -= 1
+            if approved is None:
+                self.failed += 1
+            elif approved:
+                self.approved += 1
+            else:
+                self.declined += 1
+
+    def settled(self, outcome, done):
+        """A hold was "captured" or "voided" (outcome), or not (done false)."""
+        with self._lock:
+            if not done:
+                self.settle_failed += 1
+            elif outcome == "captured":
+                self.captured += 1
+            else:
+                self.voided += 1
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self.pending, "concurrency": self.concurrency,
+                    "queue": self.queue, "approved": self.approved,
+                    "declined": self.declined, "failed": self.failed,
+                    "refused": self.refused, "captured": self.captured,
+                    "voided": self.voided, "settle_failed": self.settle_failed}
+
+
+class PaymentClient:
+    """Pooled, bounded payment calls from threads (see module docstring)."""
+
+    def __init__(self, host, port, wsdl=PAYMENT_WSDL, concurrency=PAYMENT_CONCURRENCY,
+                 queue=PAYMENT_QUEUE, timeout=PAYMENT_TIMEOUT):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        client = zeep.Client(wsdl=wsdl, transport=Transport(
+            session=session, timeout=timeout, operation_timeout=timeout))
+        self._service = client.create_service(_BINDING, _address(host, port))
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix="payment")
+        self._limits = _Limits(concurrency, queue)
+
+    def authorize(self, name, card_number, expiration_date, security_code):
+        """
+        Start a payment. Returns a Future of the id of its hold, None if the
+        card was declined, which raises PaymentError if the service could
+        not be asked. Raises PaymentBusy at once if too many payments are
+        pending. The hold is then either capture()d or the Future release()d.
+        """
+        self._limits.admit()
+        future = self._executor.submit(self._authorize, name, card_number,
+                                       expiration_date, security_code)
+        future.add_done_callback(self._cancelled)
+        return future
+
+    def capture(self, hold):
+        """
+        Charge a hold; whether it was charged. A failure is logged with the
+        hold's id rather than raised: the purchase it pays for is recorded.
+        """
+        return self._settle("captured", self._service.CapturePayment, hold)
+
+    def release(self, payment):
+        """
+        Give up a payment from authorize(): withdraw it if it is still
+        queued, else void its hold once it has one. Never waits.
+        """
+        if not payment.cancel():
+            payment.add_done_callback(self._void)
+
+    def process(self, name, card_number, expiration_date, security_code):
+        """Charge a card at once, authorize() then capture(); whether it was charged."""
+        hold = self.authorize(name, card_number, expiration_date, security_code).result()
+        return hold is not None and self.capture(hold)
+
+    def stats(self):
+        return self._limits.stats()
+
+    def _authorize(self, *card):
+        try:
+            hold = self._service.AuthorizePayment(*card) or None
+        except Exception as e:
+            self._limits.finish(None)
+            raise PaymentError(str(e)) from e
+        self._limits.finish(hold is not None)
+        return hold
+
+    def _void(self, payment):
+        if payment.cancelled() or payment.exception() is not None or payment.result() is None:
+            return
+        # Not on the thread that released or answered the payment
+        self._executor.submit(self._settle, "voided", self._service.VoidPayment, payment.result())
+
+    def _settle(self, outcome, call, hold):
+        try:
+            done = bool(call(hold))
+        except Exception as e:
+            done = False
+            logger.error("Payment hold %s not %s: %s", hold, outcome, e)
+        else:
+            if not done:
+                logger.error("Payment hold %s not %s: unknown or lapsed", hold, outcome)
+        self._limits.settled(outcome, done)
+        return done
+
+    def _cancelled(self, future):
+        # _authorize() never ran, so nothing else ends this payment
+        if future.cancelled():
+            self._limits.finish(None)
+
+
+class AioPaymentClient:
+    """PaymentClient for asyncio: one httpx connection pool, an asyncio.Semaphore for slots."""
+
+    def __init__(self, host, port, wsdl=PAYMENT_WSDL, concurrency=PAYMENT_CONCURRENCY,
+                 queue=PAYMENT_QUEUE, timeout=PAYMENT_TIMEOUT):
+        http = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(
+            max_connections=concurrency, max_keepalive_connections=concurrency))
+        self._transport = AsyncTransport(client=http)
+        client = zeep.AsyncClient(wsdl=wsdl, transport=self._transport)
+        # AsyncClient.create_service() would return a blocking proxy
+        self._service = AsyncServiceProxy(client, client.wsdl.bindings[_BINDING],
+                                          address=_address(host, port))
+        self._slots = asyncio.Semaphore(concurrency)
+        self._limits = _Limits(concurrency, queue)
+        self._voids = set()     # VoidPayment tasks, kept until they finish
+
+    async def authorize(self, name, card_number, expiration_date, security_code):
+        """The id of the payment's hold, None if declined; raises PaymentBusy or PaymentError."""
+        self._limits.admit()
+        approved = None
+        try:
+            async with self._slots:
+                hold = await self._service.AuthorizePayment(
+                    name, card_number, expiration_date, security_code) or None
+            approved = hold is not None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise PaymentError(str(e)) from e
+        finally:
+            self._limits.finish(approved)
+        return hold
+
+    async def capture(self, hold):
+        """PaymentClient.capture(), awaited."""
+        return await self._settle("captured", self._service.CapturePayment, hold)
+
+    def release(self, payment):
+        """
+        Give up the payment placed by the task `payment` running
+        authorize(): void its hold once it has one. Never waits.
+        """
+        payment.add_done_callback(self._void)
+
+    def stats(self):
+        return self._limits.stats()
+
+    async def close(self):
+        await self._transport.aclose()
+
+    def _void(self, payment):
+        if payment.cancelled() or payment.exception() is not None or payment.result() is None:
+            return
+        task = asyncio.ensure_future(
+            self._settle("voided", self._service.VoidPayment, payment.result()))
+        self._voids.add(task)
+        task.add_done_callback(self._voids.discard)
+
+    async def _settle(self, outcome, call, hold):
+        try:
+            done = bool(await call(hold))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            done = False
+            logger.error("Payment hold %s not %s: %s", hold, outcome, e)
+        else:
+            if not done:
+                logger.error("Payment hold %s not %s: unknown or lapsed", hold, outcome)
+        self._limits.settled(outcome, done)
+        return done
@@ -0,0 +1,277 @@
+"""
+Pre-fork serving for the buyer and seller frontends.
+
+app.run() serves every client from one process, so the JSON and protobuf
+work of all requests shares one interpreter and its GIL. serve() forks
+`workers` processes instead. Each worker binds the port with SO_REUSEPORT,
+so the kernel spreads new connections across the workers, and runs a
+threaded Werkzeug server of its own. Without SO_REUSEPORT the master binds
+the port once and the workers accept on the socket they inherit.
+
+Each worker calls init() after the fork to build its backend pools. gRPC
+channels and their threads do not survive a fork, so the master must never
+open one.
+
+    prefork.serve(app, "0.0.0.0", 5004, workers=4, init=lambda: init_backends(args))
+
+Signals to the master:
+  SIGHUP          graceful reload: start a new set of workers (new pools and
+                  connections) and stop the old ones once all of them serve
+  SIGTERM/SIGINT  stop all workers and exit
+A stopping worker stops accepting, serves the connections already queued on
+its socket, tells keep-alive clients to close (closing connections left
+idle), finishes the requests it is serving (up to GRACEFUL_TIMEOUT seconds)
+and exits. A worker that dies on its own is replaced.
+"""
+
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+GRACEFUL_TIMEOUT = 30.0   # seconds a stopping worker gets to finish its requests
+IDLE_GRACE = 1.0          # seconds an idle keep-alive connection of a stopping worker is kept
+RESPAWN_DELAY = 1.0       # wait before replacing a worker that died within this long
+BACKLOG = 128
+
+
+def _listen(host, port, reuse_port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+class _Connections:
+    """
+    Open client connections of a worker, each idle (waiting for its next
+    keep-alive request) or serving one. Once draining, responses carry
+    Connection: close, so busy connections end after their current response.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._open = {}     # handler -> monotonic time it went idle, None while serving
+        self._changed = threading.Condition()
+
+    def handler_class(self):
+        connections = self
+
+        class Handler(WSGIRequestHandler):
+            def handle(self):
+                connections._set(self, time.monotonic())
+                try:
+                    super().handle()
+                finally:
+                    with connections._changed:
+                        del connections._open[self]
+                        connections._changed.notify_all()
+
+            def parse_request(self):
+                connections._set(self, None)
+                return super().parse_request()
+
+            def end_headers(self):
+                if connections.draining and not self.close_connection:
+                    self.send_header("Connection", "close")
+                super().end_headers()
+
+            def handle_one_request(self):
+                super().handle_one_request()
+                connections._set(self, time.monotonic())
+
+        return Handler
+
+    def _set(self, handler, idle_since):
+        with self._changed:
+            self._open[handler] = idle_since
+
+    def drain(self, timeout):
+        """
+        Wait for the open connections to end, closing those idle for
+        IDLE_GRACE seconds. A client still using one sends its next request
+        within that time and is told to close; closing it sooner could cut
+        off a request already on its way.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self._open and time.monotonic() < deadline:
+                now = time.monotonic()
+                for handler, idle_since in self._open.items():
+                    if idle_since is not None and now - idle_since >= IDLE_GRACE:
+                        try:
+                            handler.connection.shutdown(socket.SHUT_RDWR)
+                        except OSError:
+                            pass
+                self._changed.wait(0.1)
+            return not self._open
+
+
+def _serve_queued(server, sock):
+    """Serve the connections still queued on listening sock: closing it resets them."""
+    sock.setblocking(False)
+    while True:
+        try:
+            conn, addr = sock.accept()
+        except OSError:
+            return
+        conn.setblocking(True)
+        server.process_request(conn, addr)
+
+
+def _worker(app, host, port, init, shared, ready_w):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl-C reaches the whole process group; the master decides what stops.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    sock = shared if shared is not None else _listen(host, port, reuse_port=True)
+    if shared is None:
+        sock.listen(BACKLOG)
+    init()
+    connections = _Connections()
+    server = make_server(host, port, app, threaded=True,
+                         request_handler=connections.handler_class(), fd=sock.fileno())
+
+    def stop(signum, frame):
+        connections.draining = True
+        # shutdown() waits for serve_forever(), which this (main) thread is running
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    os.write(ready_w, f"{os.getpid()}\n".encode())
+    server.serve_forever()      # closes the server's duplicate of sock
+    if shared is None:
+        # New connections go to the other workers once sock closes; a shared
+        # socket's queue is theirs anyway.
+        _serve_queued(server, sock)
+    sock.close()
+    connections.drain(GRACEFUL_TIMEOUT)
+
+
+class _Master:
+    def __init__(self, app, host, port, workers, init):
+        self.app, self.host, self.port, self.init = app, host, port, init
+        self.size = workers
+        self.shared = None
+        if hasattr(socket, "SO_REUSEPORT"):
+            # Fail here, not in every worker, if the port is taken. A bound
+            # socket that never listens gets no connections.
+            _listen(host, port, reuse_port=True).close()
+        else:
+            self.shared = _listen(host, port, reuse_port=False)
+            self.shared.listen(BACKLOG)
+        self.ready_r, self.ready_w = os.pipe()
+        os.set_blocking(self.ready_r, False)
+        self.generation = 0
+        self.workers = {}       # pid -> (generation, start time)
+        self.ready = set()      # pids serving
+        self.retiring = set()   # pids sent SIGTERM
+        self.signals = []
+        self.stopping = False
+        self.kill_at = None     # SIGKILL workers still stopping by then
+
+    def spawn(self):
+        # Or the worker would print the master's buffered output again
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(self.ready_r)
+                _worker(self.app, self.host, self.port, self.init, self.shared, self.ready_w)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = (self.generation, time.monotonic())
+
+    def run(self):
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self.signals.append(signum))
+        for _ in range(self.size):
+            self.spawn()
+        print(f"Master {os.getpid()}: {self.size} workers")
+        while self.workers:
+            while self.signals:
+                self.handle(self.signals.pop(0))
+            self.read_ready()
+            self.reap()
+            self.retire_old()
+            if self.kill_at is not None and time.monotonic() > self.kill_at:
+                for pid in self.workers:
+                    os.kill(pid, signal.SIGKILL)
+                self.kill_at = None
+
+    def handle(self, signum):
+        if self.stopping:
+            return
+        if signum == signal.SIGHUP:
+            print(f"Master {os.getpid()}: reloading {self.size} workers")
+            self.generation += 1
+            for _ in range(self.size):
+                self.spawn()
+        else:
+            print(f"Master {os.getpid()}: stopping {len(self.workers)} workers")
+            self.stopping = True
+            self.kill_at = time.monotonic() + GRACEFUL_TIMEOUT + 5
+            for pid in self.workers:
+                self.terminate(pid)
+
+    def read_ready(self):
+        if not select.select([self.ready_r], [], [], 0.2)[0]:
+            return
+        try:
+            data = os.read(self.ready_r, 4096)
+        except BlockingIOError:
+            return
+        self.ready.update(int(line) for line in data.split())
+
+    def reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            generation, started = self.workers.pop(pid)
+            self.ready.discard(pid)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            print(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)})")
+            if not self.stopping and generation == self.generation:
+                if time.monotonic() - started < RESPAWN_DELAY:
+                    time.sleep(RESPAWN_DELAY)
+                self.spawn()
+
+    def retire_old(self):
+        """After a reload, stop the old workers once every new one serves."""
+        current = [pid for pid, (gen, _) in self.workers.items() if gen == self.generation]
+        if not all(pid in self.ready for pid in current):
+            return
+        for pid, (gen, _) in list(self.workers.items()):
+            if gen < self.generation and pid not in self.retiring:
+                self.terminate(pid)
+
+    def terminate(self, pid):
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def serve(app, host, port, workers, init):
+    """Serve app on host:port from `workers` forked processes until SIGTERM/SIGINT."""
+    _Master(app, host, port, workers, init).run()
@@ -1,8 +1,7 @@
-import grpc
 import sqlite3
 import threading
+import time
 import argparse
-from concurrent import futures
 from datetime import datetime
 
 import sys
@@ -11,10 +10,26 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 import product_db_pb2
 import product_db_pb2_grpc
+from admission import PRODUCT_DB_LIMITS, PRODUCT_DB_PRIORITIES, threaded_server
+from health import add_health_servicer
 
 DB_FILE = 'product_data.db'
 db_lock = threading.Lock()
 
+# Catalog version (GetCatalogVersion): bumped under db_lock by every item
+# write, which stores the new value as the item's version. One counter for
+# the whole catalog; it starts from the clock so a restarted server never
+# repeats a version an earlier run handed out.
+_catalog_version = time.time_ns() // 1000
+
+
+def _touch_item(conn, category, item_id):
+    """Give a just-modified item a new version."""
+    global _catalog_version
+    _catalog_version += 1
+    conn.execute('UPDATE items SET version = ? WHERE category = ? AND item_id = ?',
+                 (_catalog_version, category, item_id))
+
 
 def get_connection():
     return sqlite3.connect(DB_FILE, check_same_thread=False)
@@ -35,9 +50,12 @@ def init_db():
                 quantity    INTEGER NOT NULL,
                 thumbs_up   INTEGER DEFAULT 0,
                 thumbs_down INTEGER DEFAULT 0,
+                version     INTEGER DEFAULT 0,
                 PRIMARY KEY (category, item_id)
             )
         ''')
+        if 'version' not in [row[1] for row in conn.execute('PRAGMA table_info(items)')]:
+            conn.execute('ALTER TABLE items ADD COLUMN version INTEGER DEFAULT 0')
         conn.execute('''
             CREATE TABLE IF NOT EXISTS item_counter (
                 id      INTEGER PRIMARY KEY,
@@ -82,7 +100,7 @@ def _next_item_id(conn):
 
 
 def _row_to_item(row):
-    cat, iid, seller_id, name, kw_str, condition, price, quantity, thumbs_up, thumbs_down = row
+    cat, iid, seller_id, name, kw_str, condition, price, quantity, thumbs_up, thumbs_down, version = row
     keywords = kw_str.split(',') if kw_str else []
     return product_db_pb2.ItemData(
         item_id=product_db_pb2.ItemId(category=cat, item_id=iid),
@@ -94,8 +112,45 @@ def _row_to_item(row):
         price=price,
         quantity=quantity,
         thumbs_up=thumbs_up,
-        thumbs_down=thumbs_down
+        thumbs_down=thumbs_down,
+        version=version
+    )
+
+
+def _insert_item(conn, request):
+    new_id = _next_item_id(conn)
+    kw_str = ','.join(request.keywords)
+    conn.execute(
+        'INSERT INTO items (category, item_id, seller_id, name, keywords, condition, price, quantity) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (request.category, new_id, request.seller_id, request.name,
+         kw_str, request.condition, request.price, request.quantity)
+    )
+    conn.execute('INSERT OR IGNORE INTO seller_feedback (seller_id) VALUES (?)', (request.seller_id,))
+    _touch_item(conn, request.category, new_id)
+    item_id = product_db_pb2.ItemId(category=request.category, item_id=new_id)
+    return product_db_pb2.RegisterItemResponse(status='success', message='', item_id=item_id)
+
+
+def _add_feedback(conn, request):
+    row = conn.execute(
+        'SELECT seller_id FROM items WHERE category = ? AND item_id = ?',
+        (request.item_id.category, request.item_id.item_id)
+    ).fetchone()
+    if row is None:
+        return product_db_pb2.StatusResponse(status='error', message='Item not found')
+    seller_id = row[0]
+    column = 'thumbs_up' if request.feedback_type == 'thumbs_up' else 'thumbs_down'
+    conn.execute(
+        f'UPDATE items SET {column} = {column} + 1 WHERE category = ? AND item_id = ?',
+        (request.item_id.category, request.item_id.item_id)
+    )
+    _touch_item(conn, request.item_id.category, request.item_id.item_id)
+    conn.execute(
+        f'UPDATE seller_feedback SET {column} = {column} + 1 WHERE seller_id = ?',
+        (seller_id,)
     )
+    return product_db_pb2.StatusResponse(status='success', message='')
 
 
 class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
@@ -104,18 +159,9 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
         with db_lock:
             conn = get_connection()
             try:
-                new_id = _next_item_id(conn)
-                kw_str = ','.join(request.keywords)
-                conn.execute(
-                    'INSERT INTO items (category, item_id, seller_id, name, keywords, condition, price, quantity) '
-                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                    (request.category, new_id, request.seller_id, request.name,
-                     kw_str, request.condition, request.price, request.quantity)
-                )
-                conn.execute('INSERT OR IGNORE INTO seller_feedback (seller_id) VALUES (?)', (request.seller_id,))
+                response = _insert_item(conn, request)
                 conn.commit()
-                item_id = product_db_pb2.ItemId(category=request.category, item_id=new_id)
-                return product_db_pb2.RegisterItemResponse(status='success', message='', item_id=item_id)
+                return response
             finally:
                 conn.close()
 
@@ -125,12 +171,30 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
             try:
                 row = conn.execute(
                     'SELECT category, item_id, seller_id, name, keywords, condition, price, quantity, '
-                    'thumbs_up, thumbs_down FROM items WHERE category = ? AND item_id = ?',
+                    'thumbs_up, thumbs_down, version FROM items WHERE category = ? AND item_id = ?',
                     (request.item_id.category, request.item_id.item_id)
                 ).fetchone()
                 if row is None:
                     return product_db_pb2.GetItemResponse(status='error', message='Item not found')
-                return product_db_pb2.GetItemResponse(status='success', message='', item=_row_to_item(row))
+                return product_db_pb2.GetItemResponse(status='success', message='', item=_row_to_item(row),
+                                                      catalog_version=_catalog_version)
+            finally:
+                conn.close()
+
+    def GetItems(self, request, context):
+        with db_lock:
+            conn = get_connection()
+            try:
+                items = []
+                for item_id in request.item_ids:
+                    row = conn.execute(
+                        'SELECT category, item_id, seller_id, name, keywords, condition, price, quantity, '
+                        'thumbs_up, thumbs_down, version FROM items WHERE category = ? AND item_id = ?',
+                        (item_id.category, item_id.item_id)
+                    ).fetchone()
+                    if row is not None:
+                        items.append(_row_to_item(row))
+                return product_db_pb2.GetItemsResponse(status='success', message='', items=items)
             finally:
                 conn.close()
 
@@ -142,6 +206,7 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
                     'UPDATE items SET price = ? WHERE category = ? AND item_id = ?',
                     (request.price, request.item_id.category, request.item_id.item_id)
                 )
+                _touch_item(conn, request.item_id.category, request.item_id.item_id)
                 conn.commit()
                 return product_db_pb2.StatusResponse(status='success', message='')
             finally:
@@ -155,6 +220,7 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
                     'UPDATE items SET quantity = ? WHERE category = ? AND item_id = ?',
                     (request.quantity, request.item_id.category, request.item_id.item_id)
                 )
+                _touch_item(conn, request.item_id.category, request.item_id.item_id)
                 conn.commit()
                 return product_db_pb2.StatusResponse(status='success', message='')
             finally:
@@ -166,11 +232,12 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
             try:
                 rows = conn.execute(
                     'SELECT category, item_id, seller_id, name, keywords, condition, price, quantity, '
-                    'thumbs_up, thumbs_down FROM items WHERE seller_id = ?',
+                    'thumbs_up, thumbs_down, version FROM items WHERE seller_id = ?',
                     (request.seller_id,)
                 ).fetchall()
                 items = [_row_to_item(r) for r in rows]
-                return product_db_pb2.GetItemsResponse(status='success', message='', items=items)
+                return product_db_pb2.GetItemsResponse(status='success', message='', items=items,
+                                                       catalog_version=_catalog_version)
             finally:
                 conn.close()
 
@@ -180,11 +247,11 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
             try:
                 rows = conn.execute(
                     'SELECT category, item_id, seller_id, name, keywords, condition, price, quantity, '
-                    'thumbs_up, thumbs_down FROM items WHERE quantity > 0'
+                    'thumbs_up, thumbs_down, version FROM items WHERE quantity > 0'
                 ).fetchall()
                 results = []
                 for row in rows:
-                    cat, iid, seller_id, name, kw_str, condition, price, qty, tu, td = row
+                    cat, iid, seller_id, name, kw_str, condition, price, qty, tu, td, version = row
                     if request.has_category and cat != request.category:
                         continue
                     keywords = kw_str.split(',') if kw_str else []
@@ -193,7 +260,8 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
                         if not any(k.lower() in kw_lower for k in request.keywords):
                             continue
                     results.append(_row_to_item(row))
-                return product_db_pb2.GetItemsResponse(status='success', message='', items=results)
+                return product_db_pb2.GetItemsResponse(status='success', message='', items=results,
+                                                       catalog_version=_catalog_version)
             finally:
                 conn.close()
 
@@ -245,33 +313,9 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
         with db_lock:
             conn = get_connection()
             try:
-                row = conn.execute(
-                    'SELECT seller_id FROM items WHERE category = ? AND item_id = ?',
-                    (request.item_id.category, request.item_id.item_id)
-                ).fetchone()
-                if row is None:
-                    return product_db_pb2.StatusResponse(status='error', message='Item not found')
-                seller_id = row[0]
-                if request.feedback_type == 'thumbs_up':
-                    conn.execute(
-                        'UPDATE items SET thumbs_up = thumbs_up + 1 WHERE category = ? AND item_id = ?',
-                        (request.item_id.category, request.item_id.item_id)
-                    )
-                    conn.execute(
-                        'UPDATE seller_feedback SET thumbs_up = thumbs_up + 1 WHERE seller_id = ?',
-                        (seller_id,)
-                    )
-                else:
-                    conn.execute(
-                        'UPDATE items SET thumbs_down = thumbs_down + 1 WHERE category = ? AND item_id = ?',
-                        (request.item_id.category, request.item_id.item_id)
-                    )
-                    conn.execute(
-                        'UPDATE seller_feedback SET thumbs_down = thumbs_down + 1 WHERE seller_id = ?',
-                        (seller_id,)
-                    )
+                response = _add_feedback(conn, request)
                 conn.commit()
-                return product_db_pb2.StatusResponse(status='success', message='')
+                return response
             finally:
                 conn.close()
 
@@ -315,6 +359,7 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
                     (request.buyer_id, request.item_id.category, request.item_id.item_id,
                      request.quantity, timestamp)
                 )
+                _touch_item(conn, request.item_id.category, request.item_id.item_id)
                 conn.commit()
                 return product_db_pb2.StatusResponse(status='success', message='')
             finally:
@@ -342,11 +387,112 @@ class ProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
             finally:
                 conn.close()
 
+    def RegisterItems(self, request, context):
+        with db_lock:
+            conn = get_connection()
+            try:
+                results = [_insert_item(conn, r) for r in request.items]
+                conn.commit()
+                return product_db_pb2.RegisterItemsResponse(status='success', message='', results=results)
+            finally:
+                conn.close()
+
+    def UpdateItems(self, request, context):
+        with db_lock:
+            conn = get_connection()
+            try:
+                results = []
+                for u in request.updates:
+                    key = (u.item_id.category, u.item_id.item_id)
+                    if conn.execute('SELECT 1 FROM items WHERE category = ? AND item_id = ?', key).fetchone() is None:
+                        results.append(product_db_pb2.StatusResponse(status='error', message='Item not found'))
+                        continue
+                    if u.has_price:
+                        conn.execute('UPDATE items SET price = ? WHERE category = ? AND item_id = ?', (u.price,) + key)
+                    if u.has_quantity:
+                        conn.execute('UPDATE items SET quantity = ? WHERE category = ? AND item_id = ?', (u.quantity,) + key)
+                    _touch_item(conn, *key)
+                    results.append(product_db_pb2.StatusResponse(status='success', message=''))
+                conn.commit()
+                return product_db_pb2.BatchStatusResponse(status='success', message='', results=results)
+            finally:
+                conn.close()
+
+    def AddFeedbackBatch(self, request, context):
+        with db_lock:
+            conn = get_connection()
+            try:
+                results = [_add_feedback(conn, f) for f in request.feedback]
+                conn.commit()
+                return product_db_pb2.BatchStatusResponse(status='success', message='', results=results)
+            finally:
+                conn.close()
+
+    def CheckoutCart(self, request, context):
+        with db_lock:
+            conn = get_connection()
+            try:
+                lines = [(ci.item_id.category, ci.item_id.item_id, ci.quantity) for ci in request.items]
+                use_stored = not lines
+                if use_stored:
+                    lines = conn.execute(
+                        'SELECT category, item_id, quantity FROM carts WHERE buyer_id = ?',
+                        (request.buyer_id,)
+                    ).fetchall()
+                if not lines:
+                    return product_db_pb2.CheckoutCartResponse(status='error', message='Cart is empty')
+                wanted = {}
+                for category, item_id, quantity in lines:
+                    wanted[(category, item_id)] = wanted.get((category, item_id), 0) + quantity
+                failed = []
+                prices = {}
+                for key, quantity in wanted.items():
+                    row = conn.execute(
+                        'SELECT quantity, price FROM items WHERE category = ? AND item_id = ?', key
+                    ).fetchone()
+                    if quantity <= 0 or row is None or row[0] < quantity:
+                        failed.append(product_db_pb2.ItemId(category=key[0], item_id=key[1]))
+                    else:
+                        prices[key] = row[1]
+                if failed:
+                    return product_db_pb2.CheckoutCartResponse(
+                        status='error', message='Item not found or not enough stock',
+                        failed_items=failed
+                    )
+                timestamp = datetime.utcnow().isoformat()
+                for key, quantity in wanted.items():
+                    conn.execute(
+                        'UPDATE items SET quantity = quantity - ? WHERE category = ? AND item_id = ?',
+                        (quantity,) + key
+                    )
+                    _touch_item(conn, *key)
+                    conn.execute(
+                        'INSERT INTO purchases (buyer_id, category, item_id, quantity, timestamp) VALUES (?, ?, ?, ?, ?)',
+                        (request.buyer_id,) + key + (quantity, timestamp)
+                    )
+                if use_stored:
+                    conn.execute('DELETE FROM carts WHERE buyer_id = ?', (request.buyer_id,))
+                conn.commit()
+                total = sum(prices[key] * quantity for key, quantity in wanted.items())
+                return product_db_pb2.CheckoutCartResponse(status='success', message='', total=total)
+            finally:
+                conn.close()
+
+    def ReadIndex(self, request, context):
+        # Single SQLite instance: every read is already linearizable
+        return product_db_pb2.ReadIndexResponse(status='success', message='', commit_index=0)
+
+    def GetCatalogVersion(self, request, context):
+        with db_lock:
+            return product_db_pb2.CatalogVersionResponse(status='success', message='',
+                                                          version=_catalog_version)
+
 
 def serve(host='0.0.0.0', port=50052):
     init_db()
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = threaded_server(10, PRODUCT_DB_PRIORITIES, PRODUCT_DB_LIMITS)
     product_db_pb2_grpc.add_ProductDBServicer_to_server(ProductDBServicer(), server)
+    add_health_servicer(server)
     server.add_insecure_port(f'{host}:{port}')
     server.start()
     print(f'Product Database gRPC server listening on {host}:{port}')
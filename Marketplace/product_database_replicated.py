@@ -9,18 +9,34 @@ All state is kept in-memory inside the SyncObj subclass. PySyncObj handles
 leader election, log replication, snapshots, and crash recovery.
 
 Write operations use @replicated methods (go through Raft consensus).
-Read operations go directly to local in-memory state.
+Read operations go directly to local in-memory state, or, for linearizable
+reads, once the replica has caught up with the leader's commit index.
+
+RaftProductDB holds the replicated state and writes compact snapshots and
+the purchase archive; ReplicatedProductDBServicer serves it over gRPC, and
+EscrowSeller sells hot items from stock slices reserved per replica.
 """
 
+import asyncio
+import bisect
+import io
 import grpc
 import threading
 import argparse
 import logging
+import pickle
+import struct
 import time
-from concurrent import futures
-from datetime import datetime
+import traceback
+import zlib
+from collections import OrderedDict, deque
+from functools import wraps
+from operator import itemgetter
+from datetime import datetime, timedelta
 
-from pysyncobj import SyncObj, SyncObjConf, replicated
+from pysyncobj import (FAIL_REASON, SERIALIZER_STATE, SyncObj, SyncObjConf, SyncObjException,
+                       replicated)
+from pysyncobj.serializer import Serializer
 
 import sys
 import os
@@ -28,6 +44,11 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 import product_db_pb2
 import product_db_pb2_grpc
+from admission import (MAX_QUEUE_AGE, MAX_QUEUED, PRODUCT_DB_LIMITS, PRODUCT_DB_PRIORITIES,
+                       aio_server, threaded_server)
+from async_rpc import Call, async_servicer, resolve_future, rpc_handler
+from health import add_health_servicer
+from single_flight import SingleFlight
 
 logging.basicConfig(
     level=logging.INFO,
@@ -35,30 +56,890 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# How long a write RPC waits for a leader before failing with UNAVAILABLE.
+# Roughly one election at the raftMaxTimeout used in serve().
+LEADER_WAIT_TIMEOUT = 1.5
+
+# PySyncObj keeps the leader lease state read_index() needs in private,
+# name-mangled attributes (there is no public accessor). requirements.txt pins
+# the version they were checked against; RaftProductDB refuses to start if
+# they are missing rather than serving reads it cannot vouch for.
+_SYNCOBJ_NOOP_IDX = "_SyncObj__noopIDx"                  # index of the leader's no-op entry
+_SYNCOBJ_RESPONSE_TIMES = "_SyncObj__lastResponseTime"   # follower -> last ack (monotonic)
+# Compact snapshots replace the Serializer PySyncObj builds (see _CompactSnapshots)
+_SYNCOBJ_SERIALIZER = "_SyncObj__serializer"
+
+# Trailing metadata keys carrying the last known leader
+LEADER_RAFT_KEY = "x-raft-leader"
+LEADER_GRPC_KEY = "x-raft-leader-grpc"
+
+# Request metadata selecting the read mode: "local" (default, may be stale)
+# or "linearizable" (ReadIndex: wait until this replica has applied the
+# leader's commit index before reading).
+READ_CONSISTENCY_KEY = "x-read-consistency"
+READ_LOCAL = "local"
+READ_LINEARIZABLE = "linearizable"
+READ_INDEX_TIMEOUT = 2.0
+
+# Purchases older than the horizon (seconds) are moved to the on-disk archive;
+# the leader checks every PURCHASE_ARCHIVE_INTERVAL seconds. A replica missing
+# archive segments (after installing a snapshot) fetches them from its peers.
+DEFAULT_PURCHASE_HORIZON = 30 * 24 * 3600
+PURCHASE_ARCHIVE_INTERVAL = 60.0
+ARCHIVE_FETCH_INTERVAL = 1.0    # seconds between looks for missing segments
+ARCHIVE_FETCH_TIMEOUT = 10.0    # seconds for one GetArchiveSegment call
+
+# Escrow mode (hot items): a replica sells from its own slice of an item's
+# stock, journals the sales locally and settles them in batches.
+ESCROW_SLICE = 50               # units requested per grant
+ESCROW_LOW_WATERMARK = 0.25     # ask for more when the slice drops below this fraction
+ESCROW_IDLE_RELEASE = 30.0      # return a slice unused for this many seconds
+ESCROW_SETTLE_INTERVAL = 0.5    # the settler runs at least this often (seconds)
+ESCROW_SETTLE_BATCH = 5000      # most sales settled by one settle_escrow entry
+ESCROW_MAX_UNSETTLED = 20000    # past this many unsettled sales, sell through the log
+
+# Results of this many recent write request_ids are kept (replicated state,
+# evicted oldest first) to answer retries; at 1000 writes/s that covers
+# retries for almost a minute.
+DEDUP_WINDOW = 50000
+
+# gRPC serving: RPCs run at once by the threaded server, and by the grpc.aio
+# server (--aio), which awaits replication instead of parking a worker thread
+# on it. Either way more RPCs wait in admission.py's priority queue.
+GRPC_WORKERS = 10
+AIO_MAX_CONCURRENCY = 1000
+
+
+# ---------------------------------------------------------------------------
+# Compact snapshot format
+# ---------------------------------------------------------------------------
+#
+# File layout:
+#   header  : magic (8 bytes) + format version (uint16)
+#   records : record type (uint8) + payload length (uint32) + payload, where
+#             payload is a pickled object compressed with zlib at a fast level
+#
+# The first record is always _REC_META (Raft bookkeeping, item counter and
+# the item column names), followed by any number of row-chunk records, and
+# finally _REC_END. Rows are plain tuples rather than dicts, so field names are
+# stored once per file instead of once per item.
+
+SNAPSHOT_MAGIC = b"RPDBSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CHUNK_ROWS = 10000           # rows per record in the snapshot file
+SNAPSHOT_TRANSFER_CHUNK = 1 << 20     # bytes per append_entries when sending a snapshot
+SNAPSHOT_ZLIB_LEVEL = 1               # favour snapshot speed over size
+
+_REC_END = 0
+_REC_META = 1
+_REC_ITEMS = 2
+_REC_CARTS = 3
+_REC_FEEDBACK = 4
+_REC_PURCHASES = 5
+_REC_INDEX = 6
+_REC_REQUESTS = 7
+_REC_SEGMENT = 8
+
+SEGMENT_MAGIC = b"RPDBSEGM"
+ESCROW_JOURNAL_MAGIC = b"RPDBESCJ"
+_TRAILER = struct.Struct(">Q")
+
+_HEADER = struct.Struct(">8sH")
+_RECORD = struct.Struct(">BI")
+
+ITEM_FIELDS = (
+    "seller_id", "name", "category", "keywords", "condition",
+    "price", "quantity", "thumbs_up", "thumbs_down", "version",
+)
+PURCHASE_FIELDS = ("buyer_id", "category", "item_id", "quantity", "timestamp")
+
+
+def _write_record(f, rec_type, payload):
+    data = zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL),
+                         SNAPSHOT_ZLIB_LEVEL)
+    f.write(_RECORD.pack(rec_type, len(data)))
+    f.write(data)
+
+
+def _write_chunked(f, rec_type, rows):
+    """Write an iterable of rows as SNAPSHOT_CHUNK_ROWS sized records."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= SNAPSHOT_CHUNK_ROWS:
+            _write_record(f, rec_type, chunk)
+            chunk = []
+    if chunk:
+        _write_record(f, rec_type, chunk)
+
+
+class _TruncatedRecord(ValueError):
+    """The file ends inside a record (or before the next one)."""
+
+
+def _read_record(f):
+    header = f.read(_RECORD.size)
+    if len(header) < _RECORD.size:
+        raise _TruncatedRecord("Truncated snapshot")
+    rec_type, length = _RECORD.unpack(header)
+    data = f.read(length)
+    if len(data) < length:
+        raise _TruncatedRecord("Truncated snapshot")
+    return rec_type, pickle.loads(zlib.decompress(data))
+
+
+def _read_records(f, magic=SNAPSHOT_MAGIC):
+    """Yield (rec_type, payload) for every record up to and including _REC_END."""
+    file_magic, version = _HEADER.unpack(f.read(_HEADER.size))
+    if file_magic != magic:
+        raise ValueError("Not a product DB snapshot")
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    while True:
+        rec_type, payload = _read_record(f)
+        yield rec_type, payload
+        if rec_type == _REC_END:
+            return
+
+
+# ---------------------------------------------------------------------------
+# Purchase archive (cold tier)
+# ---------------------------------------------------------------------------
+#
+# Purchases older than the horizon leave the replicated state through the
+# archive_purchases command and land in an append-only directory of immutable
+# segment files, one per command (segment-<archive seq>.bin). A segment uses
+# the record format above: one _REC_PURCHASES record per buyer, then a
+# _REC_INDEX record {"fields": ..., "buyers": {buyer_id: record offset}} and
+# _REC_END, followed by a fixed trailer holding the index record's offset.
+# Only the buyer index is kept in memory; rows are read on demand.
+#
+# Segments are not part of snapshots: the replicated state only counts them
+# (_archive_seq), and a replica that installs a snapshot fetches the segments
+# it lacks from its peers (GetArchiveSegment). Snapshots written before that
+# carry _REC_SEGMENT records, (seq, file bytes, None) or (seq, None, rows),
+# which are still installed when loaded.
+
+def _read_index(f):
+    """The _REC_INDEX record of the segment file f."""
+    magic, _ = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != SEGMENT_MAGIC:
+        raise ValueError("Not a purchase archive segment")
+    f.seek(-_TRAILER.size, os.SEEK_END)
+    (offset,) = _TRAILER.unpack(f.read(_TRAILER.size))
+    f.seek(offset)
+    rec_type, index = _read_record(f)
+    if rec_type != _REC_INDEX:
+        raise ValueError("Archive segment has no index")
+    return index
+
+
+class PurchaseArchive:
+    """Append-only, buyer-indexed segment store local to one replica."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}          # buyer_id -> [(seq, offset), ...], oldest first
+        self._fields = {}         # seq -> purchase column names
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("segment-") and name.endswith(".bin"):
+                self._load_index(int(name[len("segment-"):-len(".bin")]))
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"segment-{seq:010d}.bin")
+
+    def _load_index(self, seq):
+        with open(self._path(seq), "rb") as f:
+            self._add_index(seq, _read_index(f))
+
+    def _add_index(self, seq, index):
+        with self._lock:
+            self._fields[seq] = index["fields"]
+            for buyer_id, offset in index["buyers"].items():
+                self._index.setdefault(buyer_id, []).append((seq, offset))
+
+    def has_segment(self, seq):
+        return seq in self._fields
+
+    def write_segment(self, seq, purchases):
+        """Persist purchases as segment seq. A segment that already exists is kept."""
+        if self.has_segment(seq):
+            return False
+        by_buyer = {}
+        for p in purchases:
+            by_buyer.setdefault(p["buyer_id"], []).append(tuple(p[k] for k in PURCHASE_FIELDS))
+        path = self._path(seq)
+        index = {"fields": PURCHASE_FIELDS, "buyers": {}}
+        with open(path + ".tmp", "wb") as f:
+            f.write(_HEADER.pack(SEGMENT_MAGIC, SNAPSHOT_VERSION))
+            for buyer_id, rows in by_buyer.items():
+                index["buyers"][buyer_id] = f.tell()
+                _write_record(f, _REC_PURCHASES, rows)
+            index_offset = f.tell()
+            _write_record(f, _REC_INDEX, index)
+            _write_record(f, _REC_END, None)
+            f.write(_TRAILER.pack(index_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._add_index(seq, index)
+        return True
+
+    def read_segment(self, seq):
+        """The raw bytes of segment seq, for a replica that lacks it."""
+        with open(self._path(seq), "rb") as f:
+            return f.read()
+
+    def install_segment(self, seq, data):
+        """Add segment seq from bytes read_segment() returned on another replica."""
+        if self.has_segment(seq):
+            return False
+        index = _read_index(io.BytesIO(data))    # ValueError if it is not a segment
+        path = self._path(seq)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._add_index(seq, index)
+        return True
+
+    def locate(self, buyer_id):
+        """(where buyer_id's purchases are, the segments indexed so far), read together."""
+        with self._lock:
+            return list(self._index.get(buyer_id, ())), set(self._fields)
+
+    def get(self, buyer_id):
+        """All archived purchases of buyer_id, oldest segment first."""
+        return self.read(self.locate(buyer_id)[0])
+
+    def read(self, locations):
+        """The purchases at locations from locate(), read from the segment files."""
+        purchases = []
+        for seq, offset in locations:
+            with open(self._path(seq), "rb") as f:
+                f.seek(offset)
+                _, rows = _read_record(f)
+            purchases.extend(dict(zip(self._fields[seq], row)) for row in rows)
+        return purchases
+
 
 # ---------------------------------------------------------------------------
 # Raft-replicated product state
 # ---------------------------------------------------------------------------
 
+def _once(method):
+    """
+    Decorator for @replicated writers (under @replicated): takes a
+    request_id keyword and applies the write once per id, returning the
+    remembered result to a retry.
+    """
+    @wraps(method)
+    def apply(self, *args, request_id=""):
+        if not request_id:
+            return method(self, *args)
+        result = self._request_results.get(request_id)
+        if result is None:
+            result = method(self, *args)
+            self._remember_request(request_id, result)
+        return result
+    return apply
+
+
+class _CompactSnapshots(Serializer):
+    """
+    PySyncObj Serializer for RaftProductDB's compact snapshots. With a
+    conf.serializer callback PySyncObj renames filename + ".tmp" over the
+    dump file as soon as the callback returns, before a forked writer has
+    finished; here the writer renames its own file into place and PySyncObj
+    only loads, sends and receives the dump file.
+    """
+
+    def __init__(self, node, conf):
+        super().__init__(conf.fullDumpFile, conf.logCompactionBatchSize, False,
+                         None, node._read_snapshot, None)
+        self._node = node
+        self._id = None
+
+    def serialize(self, data, id):
+        if self._node._snapshot_pid is not None:
+            return
+        self._id = id
+        self._node._start_snapshot(data[1:])
+
+    def checkSerializing(self):
+        state = self._node._snapshot_status()
+        return state, None if state == SERIALIZER_STATE.NOT_SERIALIZING else self._id
+
+    def getTransmissionData(self, transmissionID):
+        if self._node._snapshot_pid is not None:
+            return None     # a snapshot is being written: send the next one
+        return super().getTransmissionData(transmissionID)
+
+
 class RaftProductDB(SyncObj):
     """
     All product data held in-memory, replicated via Raft.
     Write methods are decorated with @replicated so they go through consensus.
     Read methods are plain Python — they read local state directly.
+
+    If conf.fullDumpFile is set, snapshots are written in the compact format
+    above by _write_snapshot and loaded by _read_snapshot. A forked child
+    writes them (see _start_snapshot and _CompactSnapshots), seeing the
+    state copy-on-write as of the snapshot's log index, so the Raft thread
+    only pays for the fork; lagging followers receive them in
+    SNAPSHOT_TRANSFER_CHUNK pieces. Without a dump file PySyncObj falls back
+    to its default in-memory pickle of the object.
+
+    Writes carry a client-generated request_id (StubPool fills it in); the
+    results of the last DEDUP_WINDOW ids are kept in the replicated state,
+    so a write retried on another replica is applied once and answered with
+    the first result. Every item change stamps the item (ItemData.version)
+    and its category with the log index of its entry: catalog_version() and
+    the item versions let frontends cache reads and give them their ETags,
+    and item_bytes() caches each item's encoding per version. Leader changes
+    are tracked on the Raft tick thread (wait_for_leader(), election_stats()).
+
+    If archive_dir and purchase_horizon (seconds) are given, the leader
+    periodically commits archive_purchases, which moves older purchases into
+    the replica-local PurchaseArchive so memory and snapshots stay bounded.
+    _purchases is kept in timestamp order, so the purchases to archive are a
+    prefix of it. The apply thread only hands the prefix to _archive_writer,
+    which writes the segment; until then reads find it in _archive_queue.
+    A replica without an archive directory keeps archived purchases there.
+    Snapshots only count the segments; missing_segments() lists those this
+    replica has to fetch after installing one, and until it has them
+    get_buyer_purchases() answers None rather than a partial history.
     """
 
-    def __init__(self, self_addr, partners, conf=None):
+    def __init__(self, self_addr, partners, conf=None, archive_dir=None,
+                 purchase_horizon=None, archive_interval=PURCHASE_ARCHIVE_INTERVAL):
+        # A snapshot may be loaded by the Raft thread before __init__ returns;
+        # it is parked in _restored_state and applied below.
+        self._snapshot_lock = threading.Lock()
+        self._state_ready = False
+        self._restored_state = None
+        # (category, item_id) -> (item version, encoded ItemData). Derived from
+        # _items, so it is created before SyncObj.__init__ to keep it out of snapshots.
+        self._item_bytes = {}
+        # Leader tracking, updated by _track_leader on every Raft tick
+        self._leader_cond = threading.Condition()
+        self._leader = None
+        self._election_start = time.monotonic()
+        self._election_commit_idx = 0
+        self._election_latencies = deque(maxlen=100)
+        # Apply progress for linearizable reads, updated by _track_applied
+        self._applied_cond = threading.Condition()
+        self._applied = 0
+        self._read_lease = 0.75 * (conf or SyncObjConf()).raftMinTimeout
+        # Cold purchase tier (on disk, outside the pickled state)
+        self._archive = PurchaseArchive(archive_dir) if archive_dir else None
+        self._archive_lock = threading.Lock()   # archive + hot list swap vs. reads
+        self._archive_cond = threading.Condition(self._archive_lock)
+        self._archive_queue = {}        # seq -> purchases waiting for _archive_writer
+        self._segments_held = 0         # segments 1.._segments_held are all here
+        self._purchase_horizon = purchase_horizon
+        self._archive_interval = archive_interval
+        self._next_archive_check = time.monotonic() + archive_interval
+        self._archive_pending = False
+        self._dump_file = None
+        self._snapshot_pid = None       # forked child writing a snapshot
+        self._snapshot_state = SERIALIZER_STATE.NOT_SERIALIZING
+        compact = conf is not None and conf.fullDumpFile and conf.serializer is None
+        if compact:
+            # The dump file is loaded during SyncObj.__init__; snapshots are
+            # only taken later, by the _CompactSnapshots installed below
+            self._dump_file = conf.fullDumpFile
+            conf.serializer = self._write_snapshot
+            conf.deserializer = self._read_snapshot
         super().__init__(self_addr, partners, conf)
+        for attr in (_SYNCOBJ_NOOP_IDX, _SYNCOBJ_RESPONSE_TIMES, _SYNCOBJ_SERIALIZER):
+            if not hasattr(self, attr):
+                raise RuntimeError(f"unsupported PySyncObj version: SyncObj has no {attr} "
+                                   "(see requirements.txt)")
+        if compact:
+            setattr(self, _SYNCOBJ_SERIALIZER, _CompactSnapshots(self, conf))
+        with self._snapshot_lock:
+            self._reset_state()
+            if self._restored_state is not None:
+                self._apply_state(self._restored_state)
+                self._restored_state = None
+            self._state_ready = True
+        self.addOnTickCallback(self._track_leader)
+        self.addOnTickCallback(self._track_applied)
+        if self._archive is not None:
+            threading.Thread(target=self._archive_writer, name="archive-writer",
+                             daemon=True).start()
+        if self._archive is not None and purchase_horizon:
+            self.addOnTickCallback(self._maybe_archive)
+
+    def _reset_state(self):
         self._items = {}           # (category, item_id) -> dict
         self._item_counter = 0
         self._carts = {}           # buyer_id -> [(category, item_id, quantity), ...]
         self._seller_feedback = {} # seller_id -> {"thumbs_up": int, "thumbs_down": int}
-        self._purchases = []       # [{"buyer_id":, "category":, "item_id":, "quantity":, "timestamp":}, ...]
+        self._purchases = []       # [{"buyer_id":, "category":, "item_id":, "quantity":, "timestamp":}, ...] by timestamp
+        self._archive_seq = 0      # archive_purchases commands applied so far
+        self._escrow = {}          # (category, item_id) -> {holder: units reserved for holder}
+        self._escrow_settled = {}  # holder -> seq of its last settled escrow sale
+        self._request_results = OrderedDict()  # request_id -> result, oldest first
+        self._catalog_versions = {}  # category -> log index of its last item change
+        self._catalog_version = 0    # log index of the last item change anywhere
+
+    def _apply_state(self, state):
+        self._items = state["items"]
+        self._item_counter = state["item_counter"]
+        self._carts = state["carts"]
+        self._seller_feedback = state["seller_feedback"]
+        self._purchases = state["purchases"]
+        self._archive_seq = state["archive_seq"]
+        self._escrow = state["escrow"]
+        self._escrow_settled = state["escrow_settled"]
+        self._request_results = state["request_results"]
+        self._catalog_versions = state["catalog_versions"]
+        self._catalog_version = max(self._catalog_versions.values(), default=0)
+        self._item_bytes = {}
+
+    # --- Snapshot serialization (called on the Raft thread) ---
+
+    def _start_snapshot(self, raft_data):
+        """
+        Write the snapshot to the dump file from a forked child, which keeps
+        a copy-on-write view of the state while the Raft thread goes on
+        applying entries. _snapshot_status() reports when the child is done.
+        """
+        part = self._dump_file + ".part"
+        if not hasattr(os, "fork"):
+            self._write_snapshot(part, raft_data)
+            os.replace(part, self._dump_file)
+            self._snapshot_state = SERIALIZER_STATE.SUCCESS
+            return
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._write_snapshot(part, raft_data)
+                os.replace(part, self._dump_file)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self._snapshot_pid = pid
+        self._snapshot_state = SERIALIZER_STATE.SERIALIZING
+
+    def _snapshot_status(self):
+        """State of the snapshot _start_snapshot() began, as PySyncObj expects it."""
+        if self._snapshot_pid is not None:
+            pid, status = os.waitpid(self._snapshot_pid, os.WNOHANG)
+            if pid == 0:
+                return SERIALIZER_STATE.SERIALIZING
+            self._snapshot_pid = None
+            if status == 0:
+                self._snapshot_state = SERIALIZER_STATE.SUCCESS
+            else:
+                logger.error("Snapshot writer exited with status %d", status)
+                self._snapshot_state = SERIALIZER_STATE.FAILED
+        state = self._snapshot_state
+        if state in (SERIALIZER_STATE.SUCCESS, SERIALIZER_STATE.FAILED):
+            self._snapshot_state = SERIALIZER_STATE.NOT_SERIALIZING
+        return state
+
+    def _write_snapshot(self, filename, raft_data):
+        """Write the state plus PySyncObj's raft_data to filename, chunk by chunk."""
+        with open(filename, "wb") as f:
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+            _write_record(f, _REC_META, {
+                "raft": raft_data,
+                "item_counter": self._item_counter,
+                "archive_seq": self._archive_seq,
+                "escrow": self._escrow,
+                "escrow_settled": self._escrow_settled,
+                "catalog_versions": self._catalog_versions,
+                "item_fields": ITEM_FIELDS,
+                "purchase_fields": PURCHASE_FIELDS,
+            })
+            _write_chunked(f, _REC_ITEMS, (
+                (cat, iid) + tuple(item[k] for k in ITEM_FIELDS)
+                for (cat, iid), item in self._items.items()
+            ))
+            _write_chunked(f, _REC_CARTS, self._carts.items())
+            _write_chunked(f, _REC_FEEDBACK, (
+                (sid, fb["thumbs_up"], fb["thumbs_down"])
+                for sid, fb in self._seller_feedback.items()
+            ))
+            _write_chunked(f, _REC_PURCHASES, (
+                tuple(p[k] for k in PURCHASE_FIELDS) for p in self._purchases
+            ))
+            _write_chunked(f, _REC_REQUESTS, self._request_results.items())
+            _write_record(f, _REC_END, None)
+
+    def _read_snapshot(self, filename):
+        """Load a snapshot written by _write_snapshot; returns PySyncObj's raft_data."""
+        state = {"items": {}, "carts": {}, "seller_feedback": {}, "purchases": [],
+                 "request_results": OrderedDict()}
+        segments = []
+        meta = None
+        with open(filename, "rb") as f:
+            for rec_type, payload in _read_records(f):
+                if rec_type == _REC_META:
+                    meta = payload
+                    state["item_counter"] = meta["item_counter"]
+                    state["archive_seq"] = meta.get("archive_seq", 0)
+                    state["escrow"] = meta.get("escrow", {})
+                    state["escrow_settled"] = meta.get("escrow_settled", {})
+                    state["catalog_versions"] = meta.get("catalog_versions", {})
+                    item_fields = meta["item_fields"]
+                    purchase_fields = meta["purchase_fields"]
+                elif rec_type == _REC_ITEMS:
+                    for row in payload:
+                        item = state["items"][(row[0], row[1])] = dict(zip(item_fields, row[2:]))
+                        item.setdefault("version", 0)
+                elif rec_type == _REC_CARTS:
+                    state["carts"].update(payload)
+                elif rec_type == _REC_FEEDBACK:
+                    for sid, up, down in payload:
+                        state["seller_feedback"][sid] = {"thumbs_up": up, "thumbs_down": down}
+                elif rec_type == _REC_PURCHASES:
+                    state["purchases"].extend(dict(zip(purchase_fields, row)) for row in payload)
+                elif rec_type == _REC_REQUESTS:
+                    state["request_results"].update(payload)
+                elif rec_type == _REC_SEGMENT:
+                    segments.append(payload)
+        if meta is None:
+            raise ValueError("Snapshot has no metadata record")
+        # Snapshots written before _purchases was kept in timestamp order
+        state["purchases"].sort(key=itemgetter("timestamp"))
+        self._install_segments(segments, purchase_fields)
+
+        with self._snapshot_lock:
+            if self._state_ready:
+                self._apply_state(state)
+            else:
+                self._restored_state = state
+        return meta["raft"]
+
+    def _install_segments(self, segments, purchase_fields):
+        """Add the archive segments an older snapshot carried that this replica lacks."""
+        if self._archive is None:
+            if segments:
+                logger.warning("No archive directory: ignoring %d archived segments", len(segments))
+            return
+        for seq, data, rows in segments:
+            if data is not None:
+                if self._archive.install_segment(seq, data):
+                    logger.info("Installed archive segment %d from snapshot", seq)
+            elif not self._archive.has_segment(seq):
+                with self._archive_cond:
+                    self._archive_queue[seq] = [dict(zip(purchase_fields, row)) for row in rows]
+                    self._archive_cond.notify_all()
+
+    # --- Purchase archive writer ---
+
+    def _archive_writer(self):
+        """Write the segments archive_purchases queued, oldest first."""
+        while True:
+            with self._archive_cond:
+                self._archive_cond.wait_for(lambda: self._archive_queue)
+                seq = min(self._archive_queue)
+                purchases = self._archive_queue[seq]
+            try:
+                # Idempotent: a replayed command finds its segment already written
+                self._archive.write_segment(seq, purchases)
+            except OSError:
+                logger.exception("Writing archive segment %d failed; retrying", seq)
+                time.sleep(1.0)
+                continue
+            with self._archive_cond:
+                del self._archive_queue[seq]
+                self._archive_cond.notify_all()
+
+    def flush_archive(self, timeout=None):
+        """Block until every archived purchase is in a segment file; False on timeout."""
+        with self._archive_cond:
+            return self._archive_cond.wait_for(lambda: not self._archive_queue, timeout)
+
+    # --- Leader tracking (called on the Raft thread) ---
+
+    def _track_leader(self):
+        leader = self._getLeader()
+        leader = leader.address if leader is not None else None
+        if leader != self._leader:
+            with self._leader_cond:
+                if self._election_start is None:
+                    self._election_start = time.monotonic()
+                self._election_commit_idx = self.raftCommitIndex
+                self._leader = leader
+                self._leader_cond.notify_all()
+        if (self._election_start is not None and self._leader is not None
+                and self.raftCommitIndex > self._election_commit_idx):
+            latency = time.monotonic() - self._election_start
+            self._election_start = None
+            self._election_latencies.append(latency)
+            logger.info("Leader %s: first commit %.3f s after leader change",
+                        self._leader, latency)
+
+    def _track_applied(self):
+        applied = self.raftLastApplied
+        if applied != self._applied:
+            with self._applied_cond:
+                self._applied = applied
+                self._applied_cond.notify_all()
+
+    def has_applied(self, index):
+        return self._applied >= index
+
+    def wait_applied(self, index, timeout):
+        """Block until this replica has applied the log up to index."""
+        with self._applied_cond:
+            return self._applied_cond.wait_for(lambda: self._applied >= index, timeout)
+
+    def read_index(self):
+        """
+        Commit index a linearizable read has to wait for, or None if this node
+        cannot vouch for it. Only the leader can, and only while it holds a
+        lease: a majority acknowledged it within _read_lease (below the minimum
+        election timeout, so no other leader can exist yet) and it has
+        committed the no-op entry of its own term.
+        """
+        if not self._isLeader() or self.raftCommitIndex < getattr(self, _SYNCOBJ_NOOP_IDX):
+            return None
+        deadline = time.monotonic() - self._read_lease
+        acks = list(getattr(self, _SYNCOBJ_RESPONSE_TIMES).values())
+        if 1 + sum(1 for t in acks if t > deadline) <= (len(acks) + 1) / 2:
+            return None
+        return self.raftCommitIndex
+
+    def _maybe_archive(self):
+        """On the leader, commit archive_purchases once purchases pass the horizon."""
+        now = time.monotonic()
+        if now < self._next_archive_check or self._archive_pending or not self._isLeader():
+            return
+        self._next_archive_check = now + self._archive_interval
+        cutoff = (datetime.utcnow() - timedelta(seconds=self._purchase_horizon)).isoformat()
+        if self._purchases and self._purchases[0]["timestamp"] < cutoff:
+            self._archive_pending = True
+            self.archive_purchases(cutoff, callback=self._on_archived)
+
+    def _on_archived(self, result, error):
+        self._archive_pending = False
+        if result is not None:
+            logger.info("Archived %d purchases (segment %d)", result["archived"], self._archive_seq)
+        else:
+            logger.warning("archive_purchases failed: %s", error)
+
+    def wait_for_leader(self, timeout):
+        """Block until a leader is known; returns its Raft address or None."""
+        with self._leader_cond:
+            self._leader_cond.wait_for(lambda: self._leader is not None, timeout)
+            return self._leader
+
+    def leader(self):
+        return self._leader
+
+    def election_stats(self):
+        """Election-to-first-commit latencies (seconds) of recent leader changes."""
+        latencies = list(self._election_latencies)
+        return {
+            "leader": self._leader,
+            "elections": len(latencies),
+            "last_s": latencies[-1] if latencies else None,
+            "max_s": max(latencies) if latencies else None,
+            "mean_s": sum(latencies) / len(latencies) if latencies else None,
+        }
 
     # --- Write operations (Raft-replicated) ---
 
     @replicated
+    @_once
     def register_item(self, seller_id, name, category, keywords, condition, price, quantity):
+        return self._register_item(seller_id, name, category, keywords, condition, price, quantity)
+
+    @replicated
+    @_once
+    def update_item_price(self, category, item_id, price):
+        return self._update_item(category, item_id, price, None)
+
+    @replicated
+    @_once
+    def update_item_quantity(self, category, item_id, quantity):
+        return self._update_item(category, item_id, None, quantity)
+
+    @replicated
+    @_once
+    def store_cart(self, buyer_id, cart_items):
+        # cart_items: list of [category, item_id, quantity]
+        self._carts[buyer_id] = cart_items
+        return {"status": "success"}
+
+    @replicated
+    def clear_cart(self, buyer_id):
+        self._carts.pop(buyer_id, None)
+        return {"status": "success"}
+
+    @replicated
+    @_once
+    def add_item_feedback(self, category, item_id, feedback_type):
+        return self._add_item_feedback(category, item_id, feedback_type)
+
+    @replicated
+    @_once
+    def make_purchase(self, buyer_id, category, item_id, quantity, timestamp):
+        key = (category, item_id)
+        if key not in self._items:
+            return {"status": "error", "message": "Item not found"}
+        if self._items[key]["quantity"] - self._escrowed(key) < quantity:
+            return {"status": "error", "message": "Not enough stock"}
+        self._items[key]["quantity"] -= quantity
+        self._item_changed(key)
+        self._add_purchase(buyer_id, category, item_id, quantity, timestamp)
+        return {"status": "success"}
+
+    @replicated
+    @_once
+    def checkout_cart(self, buyer_id, lines, timestamp):
+        """
+        Buy every cart line or none. lines is a list of (category, item_id,
+        quantity); None checks out the buyer's stored cart and clears it.
+        """
+        use_stored = lines is None
+        if use_stored:
+            lines = self._carts.get(buyer_id, [])
+        if not lines:
+            return {"status": "error", "message": "Cart is empty", "failed": []}
+        wanted = {}
+        for category, item_id, quantity in lines:
+            key = (category, item_id)
+            wanted[key] = wanted.get(key, 0) + quantity
+        failed = [
+            key for key, quantity in wanted.items()
+            if quantity <= 0 or key not in self._items
+            or self._items[key]["quantity"] - self._escrowed(key) < quantity
+        ]
+        if failed:
+            return {"status": "error", "message": "Item not found or not enough stock",
+                    "failed": failed}
+
+        total = 0.0
+        for key, quantity in wanted.items():
+            item = self._items[key]
+            item["quantity"] -= quantity
+            total += item["price"] * quantity
+            self._item_changed(key)
+            self._add_purchase(buyer_id, key[0], key[1], quantity, timestamp)
+        if use_stored:
+            self._carts.pop(buyer_id, None)
+        return {"status": "success", "total": total, "failed": []}
+
+    @replicated
+    def archive_purchases(self, cutoff):
+        """
+        Move purchases with timestamp < cutoff from the replicated state to
+        segment _archive_seq of the archive. Segments are numbered 1, 2, ...
+        with no gaps: a command with nothing to archive makes none.
+        """
+        n = bisect.bisect_left(self._purchases, cutoff, key=itemgetter("timestamp"))
+        if not n:
+            return {"status": "success", "archived": 0}
+        self._archive_seq += 1
+        with self._archive_cond:
+            self._archive_queue[self._archive_seq] = self._purchases[:n]
+            if self._archive is not None:
+                self._archive_cond.notify_all()
+            else:
+                logger.warning("No archive directory: keeping %d archived purchases in memory", n)
+            del self._purchases[:n]
+        return {"status": "success", "archived": n}
+
+    # --- Escrow: per-replica stock slices for hot items ---
+
+    @replicated
+    def grant_escrow(self, category, item_id, holder, amount):
+        """Reserve up to amount units of unreserved stock for holder."""
+        key = (category, item_id)
+        item = self._items.get(key)
+        if item is None:
+            return {"status": "error", "message": "Item not found", "granted": 0}
+        granted = max(0, min(amount, item["quantity"] - self._escrowed(key)))
+        if granted:
+            slices = self._escrow.setdefault(key, {})
+            slices[holder] = slices.get(holder, 0) + granted
+        return {"status": "success", "granted": granted}
+
+    @replicated
+    def release_escrow(self, category, item_id, holder):
+        """Return holder's unsold slice to the unreserved stock."""
+        slices = self._escrow.get((category, item_id), {})
+        released = slices.pop(holder, 0)
+        if not slices:
+            self._escrow.pop((category, item_id), None)
+        return {"status": "success", "released": released}
+
+    @replicated
+    def settle_escrow(self, holder, sales):
+        """
+        Record sales holder already made from its slices. sales is a list of
+        (seq, buyer_id, category, item_id, quantity, timestamp[, request_id])
+        in seq order. The sales were acknowledged before this entry, so none
+        is refused: sales at or below holder's settled seq are replays and
+        skipped, as are sales whose request_id another replica already
+        applied (a retried purchase), and a sale its slice no longer covers
+        (the seller reset the quantity) is still recorded against whatever
+        stock is left.
+        """
+        settled = self._escrow_settled.get(holder, 0)
+        touched = set()
+        for sale in sales:
+            seq, buyer_id, category, item_id, quantity, timestamp = sale[:6]
+            request_id = sale[6] if len(sale) > 6 else ""
+            if seq <= settled:
+                continue
+            settled = seq
+            if request_id:
+                if request_id in self._request_results:
+                    continue
+                self._remember_request(request_id, {"status": "success"})
+            key = (category, item_id)
+            slices = self._escrow.get(key, {})
+            if holder in slices:
+                slices[holder] = max(0, slices[holder] - quantity)
+            item = self._items.get(key)
+            if item is not None:
+                item["quantity"] = max(0, item["quantity"] - quantity)
+                touched.add(key)
+            self._add_purchase(buyer_id, category, item_id, quantity, timestamp)
+        self._escrow_settled[holder] = settled
+        for key in touched:
+            self._item_changed(key)
+        return {"status": "success", "settled": settled}
+
+    # --- Bulk writes: N operations applied as one Raft entry ---
+
+    @replicated
+    @_once
+    def register_items(self, items):
+        # items: list of (seller_id, name, category, keywords, condition, price, quantity)
+        return [self._register_item(*item) for item in items]
+
+    @replicated
+    @_once
+    def update_items(self, updates):
+        # updates: list of (category, item_id, price or None, quantity or None)
+        return [self._update_item(*update) for update in updates]
+
+    @replicated
+    @_once
+    def add_feedback_batch(self, feedback):
+        # feedback: list of (category, item_id, feedback_type)
+        return [self._add_item_feedback(*entry) for entry in feedback]
+
+    # --- Write helpers (only called from @replicated methods) ---
+
+    def _register_item(self, seller_id, name, category, keywords, condition, price, quantity):
         self._item_counter += 1
         item_id = self._item_counter
         self._items[(category, item_id)] = {
@@ -71,40 +952,38 @@ class RaftProductDB(SyncObj):
             "quantity": quantity,
             "thumbs_up": 0,
             "thumbs_down": 0,
+            "version": 0,
         }
+        self._item_changed((category, item_id))
         if seller_id not in self._seller_feedback:
             self._seller_feedback[seller_id] = {"thumbs_up": 0, "thumbs_down": 0}
         return {"status": "success", "category": category, "item_id": item_id}
 
-    @replicated
-    def update_item_price(self, category, item_id, price):
-        key = (category, item_id)
-        if key in self._items:
-            self._items[key]["price"] = price
-            return {"status": "success"}
-        return {"status": "error", "message": "Item not found"}
+    def _add_purchase(self, buyer_id, category, item_id, quantity, timestamp):
+        # Timestamps come from the clients and mostly arrive in order, so this
+        # is nearly always an append.
+        bisect.insort(self._purchases, {
+            "buyer_id": buyer_id,
+            "category": category,
+            "item_id": item_id,
+            "quantity": quantity,
+            "timestamp": timestamp,
+        }, key=itemgetter("timestamp"))
 
-    @replicated
-    def update_item_quantity(self, category, item_id, quantity):
+    def _update_item(self, category, item_id, price, quantity):
         key = (category, item_id)
-        if key in self._items:
+        if key not in self._items:
+            return {"status": "error", "message": "Item not found"}
+        if price is not None:
+            self._items[key]["price"] = price
+        if quantity is not None:
             self._items[key]["quantity"] = quantity
-            return {"status": "success"}
-        return {"status": "error", "message": "Item not found"}
-
-    @replicated
-    def store_cart(self, buyer_id, cart_items):
-        # cart_items: list of [category, item_id, quantity]
-        self._carts[buyer_id] = cart_items
-        return {"status": "success"}
-
-    @replicated
-    def clear_cart(self, buyer_id):
-        self._carts.pop(buyer_id, None)
+            # Slices were carved from the old stock level; holders ask again
+            self._escrow.pop(key, None)
+        self._item_changed(key)
         return {"status": "success"}
 
-    @replicated
-    def add_item_feedback(self, category, item_id, feedback_type):
+    def _add_item_feedback(self, category, item_id, feedback_type):
         key = (category, item_id)
         if key not in self._items:
             return {"status": "error", "message": "Item not found"}
@@ -118,30 +997,51 @@ class RaftProductDB(SyncObj):
             item["thumbs_down"] += 1
             if seller_id in self._seller_feedback:
                 self._seller_feedback[seller_id]["thumbs_down"] += 1
+        self._item_changed(key)
         return {"status": "success"}
 
-    @replicated
-    def make_purchase(self, buyer_id, category, item_id, quantity, timestamp):
-        key = (category, item_id)
-        if key not in self._items:
-            return {"status": "error", "message": "Item not found"}
-        if self._items[key]["quantity"] < quantity:
-            return {"status": "error", "message": "Not enough stock"}
-        self._items[key]["quantity"] -= quantity
-        self._purchases.append({
-            "buyer_id": buyer_id,
-            "category": category,
-            "item_id": item_id,
-            "quantity": quantity,
-            "timestamp": timestamp,
-        })
-        return {"status": "success"}
+    def _remember_request(self, request_id, result):
+        self._request_results[request_id] = result
+        if len(self._request_results) > DEDUP_WINDOW:
+            self._request_results.popitem(last=False)
+
+    def _escrowed(self, key):
+        slices = self._escrow.get(key)
+        return sum(slices.values()) if slices else 0
+
+    def _item_changed(self, key):
+        # Every item change passes through here: stamp the item and the
+        # catalog version with the index of the log entry being applied.
+        # The next read encodes the item again (see item_bytes).
+        index = self.raftLastApplied + 1
+        self._items[key]["version"] = index
+        self._catalog_versions[key[0]] = index
+        self._catalog_version = index
+        self._item_bytes.pop(key, None)
 
     # --- Read operations (local state, no Raft) ---
 
     def get_item(self, category, item_id):
         return self._items.get((category, item_id))
 
+    def item_bytes(self, category, item_id, item):
+        """
+        Encoded ItemData for an item returned by one of the read methods,
+        cached per item version. The version is the log index of the item's
+        last change, so bytes cached for it are current however the item
+        changed since, by a write or by a snapshot install.
+        """
+        key = (category, item_id)
+        version = item["version"]
+        cached = self._item_bytes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        data = _encode_item(category, item_id, item)
+        # Not for an item a snapshot install has replaced meanwhile
+        if self._items.get(key) is item:
+            self._item_bytes[key] = (version, data)
+        return data
+
     def get_seller_items(self, seller_id):
         results = []
         for (cat, iid), item in self._items.items():
@@ -166,11 +1066,73 @@ class RaftProductDB(SyncObj):
     def get_cart(self, buyer_id):
         return self._carts.get(buyer_id, [])
 
+    def catalog_version(self, category=None):
+        """Log index of the last item change in category, or anywhere if None."""
+        if category is None:
+            return self._catalog_version
+        return self._catalog_versions.get(category, 0)
+
     def get_seller_rating(self, seller_id):
         return self._seller_feedback.get(seller_id, {"thumbs_up": 0, "thumbs_down": 0})
 
+    def request_result(self, request_id):
+        """Result of the write with this request_id if it was applied here, else None."""
+        return self._request_results.get(request_id) if request_id else None
+
+    def escrow_slice(self, category, item_id, holder):
+        return self._escrow.get((category, item_id), {}).get(holder, 0)
+
+    def escrow_holdings(self, holder):
+        """{(category, item_id): units} currently reserved for holder."""
+        return {key: s[holder] for key, s in list(self._escrow.items()) if s.get(holder)}
+
     def get_buyer_purchases(self, buyer_id):
-        return [p for p in self._purchases if p["buyer_id"] == buyer_id]
+        """
+        buyer_id's archived and recent purchases, oldest first; None while
+        archive segments are missing (see missing_segments()).
+        """
+        # Only the in-memory parts are read under the lock the apply thread
+        # takes in archive_purchases; segment files are read after it.
+        with self._archive_lock:
+            if self._missing_segments():
+                return None
+            locations, written = (self._archive.locate(buyer_id) if self._archive is not None
+                                  else ([], set()))
+            queued = [p for seq, purchases in sorted(self._archive_queue.items())
+                      if seq not in written for p in purchases if p["buyer_id"] == buyer_id]
+            hot = [p for p in self._purchases if p["buyer_id"] == buyer_id]
+        cold = self._archive.read(locations) if locations else []
+        return cold + queued + hot
+
+    def missing_segments(self):
+        """Archive segments the replicated state counts that this replica does not have."""
+        with self._archive_lock:
+            return self._missing_segments()
+
+    def _missing_segments(self):
+        # Called with _archive_lock held. Segments are never dropped, so the
+        # check starts after the last run of segments found complete.
+        missing = [seq for seq in range(self._segments_held + 1, self._archive_seq + 1)
+                   if seq not in self._archive_queue
+                   and (self._archive is None or not self._archive.has_segment(seq))]
+        self._segments_held = missing[0] - 1 if missing else self._archive_seq
+        return missing
+
+    def has_archive(self):
+        """Whether this replica keeps archived purchases in an archive directory."""
+        return self._archive is not None
+
+    def archive_segment(self, seq):
+        """Segment seq's file bytes for a peer, or None if it is not written here."""
+        if self._archive is None or not self._archive.has_segment(seq):
+            return None
+        return self._archive.read_segment(seq)
+
+    def install_segment(self, seq, data):
+        """Add segment seq fetched from a peer; whether it was new."""
+        if self._archive is None:
+            return False
+        return self._archive.install_segment(seq, data)
 
 
 # ---------------------------------------------------------------------------
@@ -190,39 +1152,541 @@ def _item_dict_to_proto(category, item_id, item):
         quantity=item["quantity"],
         thumbs_up=item["thumbs_up"],
         thumbs_down=item["thumbs_down"],
+        version=item["version"],
     )
 
 
+def _encode_item(category, item_id, item):
+    return _item_dict_to_proto(category, item_id, item).SerializeToString()
+
+
+def _len_field(field_number, data):
+    """Encode one length-delimited protobuf field (tag, length, payload)."""
+    tag = (field_number << 3) | 2
+    length = len(data)
+    out = bytearray([tag])
+    while length > 0x7F:
+        out.append((length & 0x7F) | 0x80)
+        length >>= 7
+    out.append(length)
+    return bytes(out) + data
+
+
+# GetItemResponse / GetItemsResponse: status = 1, message = 2, item(s) = 3
+_STATUS_SUCCESS = _len_field(1, b"success")
+
+
+def _version_field(version):
+    """catalog_version = 4 (varint); omitted when 0, as protobuf would."""
+    if not version:
+        return b""
+    out = bytearray([4 << 3])
+    while version > 0x7F:
+        out.append((version & 0x7F) | 0x80)
+        version >>= 7
+    out.append(version)
+    return bytes(out)
+
+
+def _item_response_bytes(item_bytes, version=0):
+    return _STATUS_SUCCESS + _len_field(3, item_bytes) + _version_field(version)
+
+
+def _items_response_bytes(item_bytes_list, version=0):
+    return (_STATUS_SUCCESS + b"".join(_len_field(3, b) for b in item_bytes_list)
+            + _version_field(version))
+
+
+def _serialize_response(response):
+    # Read RPCs may return already-encoded bytes
+    if isinstance(response, bytes):
+        return response
+    return response.SerializeToString()
+
+
+def add_servicer_to_server(servicer, server):
+    """
+    Register a ReplicatedProductDBServicer with a gRPC server.
+
+    Same as product_db_pb2_grpc.add_ProductDBServicer_to_server, except the
+    response serializer passes pre-encoded bytes through unchanged.
+    """
+    service = product_db_pb2.DESCRIPTOR.services_by_name["ProductDB"]
+    handlers = {
+        method.name: grpc.unary_unary_rpc_method_handler(
+            getattr(servicer, method.name),
+            request_deserializer=getattr(product_db_pb2, method.input_type.name).FromString,
+            response_serializer=_serialize_response,
+        )
+        for method in service.methods
+    }
+    server.add_generic_rpc_handlers((
+        grpc.method_handlers_generic_handler(service.full_name, handlers),
+    ))
+
+
+def _batch_status_response(results):
+    """Convert a list of per-operation result dicts to a BatchStatusResponse."""
+    if results is None:
+        return product_db_pb2.BatchStatusResponse(status='error', message='Raft replication failed')
+    return product_db_pb2.BatchStatusResponse(
+        status='success', message='',
+        results=[
+            product_db_pb2.StatusResponse(status=r["status"], message=r.get("message", ""))
+            for r in results
+        ]
+    )
+
+
+# ---------------------------------------------------------------------------
+# Escrow mode
+# ---------------------------------------------------------------------------
+
+class EscrowSeller:
+    """
+    Sells hot items from this replica's escrow slices.
+
+    A purchase is admitted locally against the slice (no other replica can
+    sell those units) and acknowledged once it is in the local journal:
+    concurrent sales share one write + fsync instead of each waiting for a
+    Raft commit. A settler thread moves journaled sales into the replicated
+    state with settle_escrow, one entry per batch. After a restart the
+    journal is replayed; settle_escrow skips sales already settled, so the
+    replay is idempotent. A purchase retried on another replica before its
+    sale is settled may be sold from both slices, but it is settled once:
+    settle_escrow skips a request_id that is already applied. Slices are
+    refilled with grant_escrow before they run dry and released after
+    ESCROW_IDLE_RELEASE seconds without sales.
+
+    This weakens durability: an acknowledged sale that is not yet settled
+    is on this replica's disk only, so losing the disk loses the sale, and
+    it is in no other replica's purchase history. Settlement runs at least
+    every ESCROW_SETTLE_INTERVAL, in entries of at most ESCROW_SETTLE_BATCH
+    sales. While max_unsettled sales are waiting, try_purchase() declines new
+    ones and they take the Raft path, which bounds that window; stats()
+    reports the backlog. Item quantities in read responses are settled
+    stock: they include units reserved in slices and do not subtract sales
+    that are not settled yet.
+    """
+
+    def __init__(self, raft_node, holder, slice_size=ESCROW_SLICE, journal_file=None,
+                 max_unsettled=ESCROW_MAX_UNSETTLED):
+        self.raft = raft_node
+        self.holder = holder
+        self.slice_size = slice_size
+        self.max_unsettled = max_unsettled
+        self.journal_file = journal_file or f"product_escrow_{holder.replace(':', '_')}.log"
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._pending = {}        # (category, item_id) -> units sold, not yet settled
+        self._admitted = []       # [(sale, event)] waiting for the journal
+        self._journaling = 0      # sales taken from _admitted, being written
+        self._compact_due = False   # all journaled sales settled: start a new journal
+        self._unsettled = []      # journaled sales, seq order
+        self._refilling = set()
+        self._last_sale = {}      # (category, item_id) -> time.monotonic()
+        self._journal_wakeup = threading.Event()
+        self._settle_wakeup = threading.Event()
+        self._settled_sales = 0
+        self._settle_entries = 0
+        self._settle_failures = 0
+        self._declined = 0        # sales sent to the Raft path by the backlog bound
+        self._seq = self._replay_journal()
+        self._journal = open(self.journal_file, "ab")
+        threading.Thread(target=self._journal_loop, daemon=True).start()
+        threading.Thread(target=self._settle_loop, daemon=True).start()
+
+    def try_purchase(self, buyer_id, category, item_id, quantity, timeout=10, request_id=""):
+        """Result dict, or None if the slice cannot cover the sale (use the normal path)."""
+        key = (category, item_id)
+        with self._lock:
+            if self._backlog() >= self.max_unsettled:
+                self._declined += 1
+                return None
+            available = self.raft.escrow_slice(category, item_id, self.holder) - self._pending.get(key, 0)
+            if available < quantity:
+                self._refill(key)
+                return None
+            self._pending[key] = self._pending.get(key, 0) + quantity
+            self._last_sale[key] = time.monotonic()
+            if available - quantity < self.slice_size * ESCROW_LOW_WATERMARK:
+                self._refill(key)
+            self._seq += 1
+            sale = (self._seq, buyer_id, category, item_id, quantity,
+                    datetime.utcnow().isoformat(), request_id)
+            journaled = threading.Event()
+            self._admitted.append((sale, journaled))
+        self._journal_wakeup.set()
+        if not journaled.wait(timeout):
+            return {"status": "error", "message": "Escrow journal timed out"}
+        return {"status": "success"}
+
+    def flush(self, timeout=10):
+        """Wait until every sale made so far is settled; returns False on timeout."""
+        with self._settled:
+            return self._settled.wait_for(lambda: not self._backlog(), timeout)
+
+    def stats(self):
+        """The unsettled backlog and settlement counters."""
+        with self._lock:
+            unsettled = self._backlog()
+            oldest = (self._unsettled[0] if self._unsettled
+                      else self._admitted[0][0] if self._admitted else None)
+            return {
+                "unsettled": unsettled,
+                "oldest_unsettled_s": (
+                    (datetime.utcnow() - datetime.fromisoformat(oldest[5])).total_seconds()
+                    if oldest else None),
+                "max_unsettled": self.max_unsettled,
+                "settled": self._settled_sales,
+                "settle_entries": self._settle_entries,
+                "settle_failures": self._settle_failures,
+                "declined": self._declined,
+            }
+
+    def _backlog(self):
+        """Acknowledged or admitted sales not yet settled (called with _lock held)."""
+        return len(self._admitted) + self._journaling + len(self._unsettled)
+
+    def _refill(self, key):
+        if key in self._refilling:
+            return
+        self._refilling.add(key)
+        self.raft.grant_escrow(key[0], key[1], self.holder, self.slice_size,
+                               callback=lambda result, error: self._refilling.discard(key))
+
+    # --- Journal (local, one group fsync per batch of sales) ---
+
+    def _replay_journal(self):
+        """Queue the sales in an existing journal for settlement; returns the last seq."""
+        last_seq = 0
+        if not os.path.exists(self.journal_file):
+            with open(self.journal_file, "wb") as f:
+                f.write(_HEADER.pack(ESCROW_JOURNAL_MAGIC, SNAPSHOT_VERSION))
+            return last_seq
+        with open(self.journal_file, "r+b") as f:
+            magic, _ = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != ESCROW_JOURNAL_MAGIC:
+                raise ValueError(f"{self.journal_file} is not an escrow journal")
+            while True:
+                end = f.tell()
+                try:
+                    rec_type, payload = _read_record(f)
+                except _TruncatedRecord:
+                    # End of file, or a batch torn by a crash (never
+                    # acknowledged): cut it off so new batches follow the last whole one
+                    f.truncate(end)
+                    break
+                if rec_type == _REC_META:
+                    last_seq = max(last_seq, payload["seq"])
+                elif rec_type == _REC_PURCHASES:
+                    for sale in payload:
+                        self._unsettled.append(sale)
+                        key = (sale[2], sale[3])
+                        self._pending[key] = self._pending.get(key, 0) + sale[4]
+                        last_seq = max(last_seq, sale[0])
+        if self._unsettled:
+            logger.info("Escrow: replaying %d unsettled sales from %s",
+                        len(self._unsettled), self.journal_file)
+        return last_seq
+
+    def _journal_loop(self):
+        # The only thread that touches self._journal: compaction cannot
+        # replace the file under a batch being written.
+        while True:
+            self._journal_wakeup.wait()
+            with self._lock:
+                batch, self._admitted = self._admitted, []
+                self._journal_wakeup.clear()
+                if not batch and self._compact_due and not self._unsettled:
+                    self._compact_journal()
+                self._compact_due = False
+                self._journaling = len(batch)
+            if not batch:
+                continue
+            sales = [sale for sale, _ in batch]
+            _write_record(self._journal, _REC_PURCHASES, sales)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            with self._lock:
+                self._unsettled.extend(sales)
+                self._journaling = 0
+            self._settle_wakeup.set()
+            for _, journaled in batch:
+                journaled.set()
+
+    def _compact_journal(self):
+        """
+        Start a new journal once everything in it is settled (journal
+        thread, _lock held so no sale is admitted meanwhile).
+        """
+        tmp = self.journal_file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(ESCROW_JOURNAL_MAGIC, SNAPSHOT_VERSION))
+            _write_record(f, _REC_META, {"seq": self._seq})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_file)
+        self._journal.close()
+        self._journal = open(self.journal_file, "ab")
+
+    # --- Settlement through the log ---
+
+    def _settle_loop(self):
+        while True:
+            self._settle_wakeup.wait(ESCROW_SETTLE_INTERVAL)
+            with self._lock:
+                batch = self._unsettled[:ESCROW_SETTLE_BATCH]
+                self._settle_wakeup.clear()
+            if not batch:
+                self._release_idle()
+                continue
+            try:
+                self.raft.settle_escrow(self.holder, batch, sync=True, timeout=10)
+            except SyncObjException as e:
+                with self._lock:
+                    self._settle_failures += 1
+                    unsettled = len(self._unsettled)
+                logger.warning("settle_escrow failed (%s), %d sales unsettled", e.errorCode, unsettled)
+                time.sleep(ESCROW_SETTLE_INTERVAL)
+                self._settle_wakeup.set()
+                continue
+            with self._lock:
+                del self._unsettled[:len(batch)]
+                for sale in batch:
+                    self._pending[(sale[2], sale[3])] -= sale[4]
+                self._settled_sales += len(batch)
+                self._settle_entries += 1
+                if self._unsettled:
+                    self._settle_wakeup.set()
+                elif not self._admitted and not self._journaling:
+                    self._compact_due = True
+                    self._journal_wakeup.set()
+                self._settled.notify_all()
+
+    def _release_idle(self):
+        cutoff = time.monotonic() - ESCROW_IDLE_RELEASE
+        for key in self.raft.escrow_holdings(self.holder):
+            with self._lock:
+                idle = self._last_sale.get(key, 0) < cutoff and not self._pending.get(key)
+                if idle:
+                    self._last_sale[key] = time.monotonic()   # at most one release in flight
+            if idle:
+                self.raft.release_escrow(key[0], key[1], self.holder)
+
+
+class _Replicate:
+    """
+    Step (async_rpc.py): call a @replicated method and wait for the commit.
+    Its value is (result, None), or (None, error) if the command failed.
+    """
+
+    def __init__(self, method, args, kwargs=None, timeout=10):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.timeout = timeout
+
+    def run(self):
+        try:
+            return self.method(*self.args, **self.kwargs, sync=True, timeout=self.timeout), None
+        except SyncObjException as e:
+            return None, e.errorCode
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_commit(result, error):   # Raft thread
+            value = (result, None) if error == FAIL_REASON.SUCCESS else (None, error)
+            loop.call_soon_threadsafe(resolve_future, future, value)
+
+        self.method(*self.args, **self.kwargs, callback=on_commit)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return None, 'Timeout'
+
+
 class ReplicatedProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
+    """
+    gRPC front of one RaftProductDB replica. Register it with
+    add_servicer_to_server(), which lets item reads splice cached bytes into
+    their responses.
+
+    Write RPCs wait at most leader_wait for a leader, then fail with
+    UNAVAILABLE; every response carries a leader hint in its trailing
+    metadata for StubPool. Reads are local, and may be stale on a follower,
+    unless the x-read-consistency metadata (or read_consistency) asks for
+    linearizable ones: the replica gets the leader's commit index (ReadIndex,
+    answered under a leader lease) and waits until it has applied it.
+    Identical concurrent local scans share one run (single_flight.py).
+
+    The RPCs are step generators (async_rpc.py), so the same code serves a
+    threaded grpc.server and, with --aio, a grpc.aio server
+    (AsyncReplicatedProductDBServicer). Both queue RPCs by priority and shed
+    those that waited too long (admission.py). With an archive directory and
+    peers, a background thread fetches archive segments a snapshot install
+    left this replica without.
+    """
 
-    def __init__(self, raft_node: RaftProductDB):
+    def __init__(self, raft_node: RaftProductDB, grpc_addrs=None,
+                 leader_wait=LEADER_WAIT_TIMEOUT, read_consistency=READ_LOCAL,
+                 escrow=None):
         self.raft = raft_node
+        self.escrow = escrow                 # EscrowSeller, or None (escrow mode off)
+        self.grpc_addrs = grpc_addrs or {}   # Raft address -> gRPC address
+        self.leader_wait = leader_wait
+        self.read_consistency = read_consistency
+        self._peer_stubs = {}                # gRPC address -> ProductDBStub
+        self.reads = SingleFlight()          # coalesces identical local scans
+        if raft_node.has_archive() and len(self.grpc_addrs) > 1:
+            threading.Thread(target=self._fetch_segments, name="archive-fetch",
+                             daemon=True).start()
+
+    def _set_leader_hint(self, context):
+        """Tell the client which node we think leads (trailing metadata)."""
+        leader = self.raft.leader()
+        metadata = []
+        if leader is not None:
+            metadata.append((LEADER_RAFT_KEY, leader))
+            if leader in self.grpc_addrs:
+                metadata.append((LEADER_GRPC_KEY, self.grpc_addrs[leader]))
+        context.set_trailing_metadata(metadata)
+
+    def _unavailable(self, context, details):
+        """Mark the RPC as retriable, with a leader hint."""
+        self._set_leader_hint(context)
+        context.set_code(grpc.StatusCode.UNAVAILABLE)
+        context.set_details(details)
 
-    def _wait_ready(self, timeout=10):
-        """Wait until the Raft cluster has a leader."""
-        start = time.time()
-        while time.time() - start < timeout:
-            if self.raft._getLeader() is not None:
-                return True
-            time.sleep(0.1)
+    # The helpers below are step generators (see async_rpc.py): handlers call
+    # them with `yield from`.
+
+    def _wait_ready(self, context):
+        """Wait (event-driven) until the Raft cluster has a leader."""
+        if self.raft.leader() is not None:
+            return True
+        if (yield Call(self.raft.wait_for_leader, self.leader_wait)) is not None:
+            return True
+        self._unavailable(context, 'Cluster not ready: no Raft leader')
         return False
 
+    def _replicate(self, context, method, *args, request_id=""):
+        """
+        Run a @replicated method until it commits; None if it did not. With a
+        request_id the write is applied once: a retry of a write this replica
+        has already applied gets the first result back straight away.
+        """
+        result = self.raft.request_result(request_id)
+        if result is not None:
+            self._set_leader_hint(context)
+            return result
+        result, error = yield _Replicate(method, args, {"request_id": request_id} if request_id else None)
+        if error is not None:
+            self._unavailable(context, f'Raft replication failed: {error}')
+            return None
+        self._set_leader_hint(context)
+        return result
+
+    def _peer_stub(self, addr):
+        stub = self._peer_stubs.get(addr)
+        if stub is None:
+            stub = product_db_pb2_grpc.ProductDBStub(grpc.insecure_channel(addr))
+            self._peer_stubs[addr] = stub
+        return stub
+
+    def _peer_read_index(self, addr):
+        """ReadIndexResponse from the peer at addr, or the grpc.RpcError."""
+        try:
+            return self._peer_stub(addr).ReadIndex(
+                product_db_pb2.ReadIndexRequest(), timeout=READ_INDEX_TIMEOUT
+            )
+        except grpc.RpcError as e:
+            return e
+
+    def _fetch_segments(self):
+        """Fetch the archive segments a snapshot install left this replica without."""
+        self_addr = self.raft.selfNode.address
+        peers = [addr for raft_addr, addr in self.grpc_addrs.items() if raft_addr != self_addr]
+        while True:
+            for seq in self.raft.missing_segments():
+                for addr in peers:
+                    try:
+                        resp = self._peer_stub(addr).GetArchiveSegment(
+                            product_db_pb2.ArchiveSegmentRequest(seq=seq),
+                            timeout=ARCHIVE_FETCH_TIMEOUT)
+                    except grpc.RpcError:
+                        continue
+                    if resp.status == 'success':
+                        try:
+                            self.raft.install_segment(seq, resp.data)
+                        except (OSError, ValueError, struct.error):
+                            logger.exception("Installing archive segment %d from %s failed", seq, addr)
+                            continue
+                        logger.info("Fetched archive segment %d from %s", seq, addr)
+                        break
+            time.sleep(ARCHIVE_FETCH_INTERVAL)
+
+    def _read_mode(self, context):
+        return dict(context.invocation_metadata()).get(READ_CONSISTENCY_KEY, self.read_consistency)
+
+    def _shared_read(self, context, label, request, fn, *args):
+        """
+        fn(*args). Local reads of the same request that arrive while one is
+        running wait for it and share its result instead of scanning again.
+        """
+        if self._read_mode(context) == READ_LINEARIZABLE:
+            return fn(*args)
+        key = (label, request.SerializeToString(deterministic=True))
+        return (yield Call(self.reads.do, label, key, fn, *args))
+
+    def _read_barrier(self, context):
+        """
+        For linearizable reads, wait until this replica has applied everything
+        the leader had committed when the read arrived. False (and UNAVAILABLE)
+        if the leader's commit index cannot be confirmed in time.
+        """
+        if self._read_mode(context) != READ_LINEARIZABLE:
+            return True
+        index = self.raft.read_index()
+        if index is None:
+            leader = self.raft.leader()
+            if leader is None:
+                leader = yield Call(self.raft.wait_for_leader, self.leader_wait)
+            addr = self.grpc_addrs.get(leader)
+            if leader is None or leader == self.raft.selfNode.address or addr is None:
+                self._unavailable(context, 'Read index unavailable')
+                return False
+            resp = yield Call(self._peer_read_index, addr)
+            if isinstance(resp, grpc.RpcError):
+                self._unavailable(context, f'Read index from {addr} failed: {resp.code()}')
+                return False
+            index = resp.commit_index
+        if not self.raft.has_applied(index) and \
+                not (yield Call(self.raft.wait_applied, index, READ_INDEX_TIMEOUT)):
+            self._unavailable(context, f'Replica has not applied index {index}')
+            return False
+        return True
+
     def _is_leader(self):
         leader = self.raft._getLeader()
         return leader is not None and leader == self.raft.selfNode
 
     # --- Write operations (go through Raft) ---
 
+    @rpc_handler
     def RegisterItem(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.RegisterItemResponse(
                 status='error', message='Cluster not ready', item_id=product_db_pb2.ItemId()
             )
-        result = self.raft.register_item(
+        result = yield from self._replicate(
+            context, self.raft.register_item,
             request.seller_id, request.name, request.category,
             list(request.keywords), request.condition,
             float(request.price), request.quantity,
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.RegisterItemResponse(
@@ -236,106 +1700,250 @@ class ReplicatedProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
             )
         )
 
+    @rpc_handler
     def UpdateItemPrice(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
-        result = self.raft.update_item_price(
+        result = yield from self._replicate(
+            context, self.raft.update_item_price,
             request.item_id.category, request.item_id.item_id,
             float(request.price),
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message=result.get("message", ""))
 
+    @rpc_handler
     def UpdateItemQuantity(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
-        result = self.raft.update_item_quantity(
+        result = yield from self._replicate(
+            context, self.raft.update_item_quantity,
             request.item_id.category, request.item_id.item_id,
             request.quantity,
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message=result.get("message", ""))
 
+    @rpc_handler
     def StoreCart(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
         cart_items = [
             [ci.item_id.category, ci.item_id.item_id, ci.quantity]
             for ci in request.cart
         ]
-        result = self.raft.store_cart(
+        result = yield from self._replicate(
+            context, self.raft.store_cart,
             request.buyer_id, cart_items,
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message="")
 
+    @rpc_handler
     def ClearCart(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
-        result = self.raft.clear_cart(
+        result = yield from self._replicate(
+            context, self.raft.clear_cart,
             request.buyer_id,
-            sync=True, timeout=10,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message="")
 
+    @rpc_handler
     def AddItemFeedback(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
-        result = self.raft.add_item_feedback(
+        result = yield from self._replicate(
+            context, self.raft.add_item_feedback,
             request.item_id.category, request.item_id.item_id,
             request.feedback_type,
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message=result.get("message", ""))
 
+    @rpc_handler
     def MakePurchase(self, request, context):
-        if not self._wait_ready():
+        if not (yield from self._wait_ready(context)):
             return product_db_pb2.StatusResponse(status='error', message='Cluster not ready')
+        if self.escrow is not None and self.raft.request_result(request.request_id) is None:
+            result = yield Call(
+                self.escrow.try_purchase,
+                request.buyer_id, request.item_id.category, request.item_id.item_id,
+                request.quantity, 10, request.request_id,
+            )
+            if result is not None:
+                return product_db_pb2.StatusResponse(status=result["status"],
+                                                     message=result.get("message", ""))
         timestamp = datetime.utcnow().isoformat()
-        result = self.raft.make_purchase(
+        result = yield from self._replicate(
+            context, self.raft.make_purchase,
             request.buyer_id,
             request.item_id.category, request.item_id.item_id,
             request.quantity, timestamp,
-            sync=True, timeout=10,
+            request_id=request.request_id,
         )
         if result is None:
             return product_db_pb2.StatusResponse(status='error', message='Raft replication failed')
         return product_db_pb2.StatusResponse(status=result["status"], message=result.get("message", ""))
 
+    # --- Bulk write operations (one Raft entry per request) ---
+
+    @rpc_handler
+    def RegisterItems(self, request, context):
+        if not (yield from self._wait_ready(context)):
+            return product_db_pb2.RegisterItemsResponse(status='error', message='Cluster not ready')
+        items = [
+            (r.seller_id, r.name, r.category, list(r.keywords), r.condition,
+             float(r.price), r.quantity)
+            for r in request.items
+        ]
+        results = yield from self._replicate(context, self.raft.register_items, items,
+                                            request_id=request.request_id)
+        if results is None:
+            return product_db_pb2.RegisterItemsResponse(status='error', message='Raft replication failed')
+        return product_db_pb2.RegisterItemsResponse(
+            status='success', message='',
+            results=[
+                product_db_pb2.RegisterItemResponse(
+                    status=r["status"], message='',
+                    item_id=product_db_pb2.ItemId(category=r["category"], item_id=r["item_id"])
+                )
+                for r in results
+            ]
+        )
+
+    @rpc_handler
+    def UpdateItems(self, request, context):
+        if not (yield from self._wait_ready(context)):
+            return product_db_pb2.BatchStatusResponse(status='error', message='Cluster not ready')
+        updates = [
+            (u.item_id.category, u.item_id.item_id,
+             float(u.price) if u.has_price else None,
+             u.quantity if u.has_quantity else None)
+            for u in request.updates
+        ]
+        results = yield from self._replicate(context, self.raft.update_items, updates,
+                                            request_id=request.request_id)
+        return _batch_status_response(results)
+
+    @rpc_handler
+    def AddFeedbackBatch(self, request, context):
+        if not (yield from self._wait_ready(context)):
+            return product_db_pb2.BatchStatusResponse(status='error', message='Cluster not ready')
+        feedback = [
+            (f.item_id.category, f.item_id.item_id, f.feedback_type)
+            for f in request.feedback
+        ]
+        results = yield from self._replicate(context, self.raft.add_feedback_batch, feedback,
+                                            request_id=request.request_id)
+        return _batch_status_response(results)
+
+    @rpc_handler
+    def CheckoutCart(self, request, context):
+        if not (yield from self._wait_ready(context)):
+            return product_db_pb2.CheckoutCartResponse(status='error', message='Cluster not ready')
+        lines = [
+            (ci.item_id.category, ci.item_id.item_id, ci.quantity) for ci in request.items
+        ] or None
+        timestamp = datetime.utcnow().isoformat()
+        result = yield from self._replicate(context, self.raft.checkout_cart, request.buyer_id, lines,
+                                            timestamp, request_id=request.request_id)
+        if result is None:
+            return product_db_pb2.CheckoutCartResponse(status='error', message='Raft replication failed')
+        return product_db_pb2.CheckoutCartResponse(
+            status=result["status"], message=result.get("message", ""),
+            total=result.get("total", 0.0),
+            failed_items=[
+                product_db_pb2.ItemId(category=cat, item_id=iid) for cat, iid in result["failed"]
+            ],
+        )
+
+    # --- ReadIndex (answered by the leader for follower reads) ---
+
+    def ReadIndex(self, request, context):
+        index = self.raft.read_index()
+        if index is None:
+            self._unavailable(context, 'Not the leader or leader lease expired')
+            return product_db_pb2.ReadIndexResponse(status='error', message='Not the leader')
+        return product_db_pb2.ReadIndexResponse(status='success', message='', commit_index=index)
+
+    def GetArchiveSegment(self, request, context):
+        data = self.raft.archive_segment(request.seq)
+        if data is None:
+            return product_db_pb2.ArchiveSegmentResponse(status='error', message='Segment not written here')
+        return product_db_pb2.ArchiveSegmentResponse(status='success', message='', data=data)
+
     # --- Read operations (local state) ---
 
+    @rpc_handler
     def GetItem(self, request, context):
-        item = self.raft.get_item(request.item_id.category, request.item_id.item_id)
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetItemResponse(status='error', message='Read index unavailable')
+        category, item_id = request.item_id.category, request.item_id.item_id
+        # Version first: the item read after it is at least that new
+        version = self.raft.catalog_version(category)
+        item = self.raft.get_item(category, item_id)
         if item is None:
             return product_db_pb2.GetItemResponse(status='error', message='Item not found')
-        return product_db_pb2.GetItemResponse(
-            status='success', message='',
-            item=_item_dict_to_proto(request.item_id.category, request.item_id.item_id, item)
-        )
+        return _item_response_bytes(self.raft.item_bytes(category, item_id, item), version)
+
+    @rpc_handler
+    def GetItems(self, request, context):
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetItemsResponse(status='error', message='Read index unavailable')
+        found = []
+        for item_id in request.item_ids:
+            item = self.raft.get_item(item_id.category, item_id.item_id)
+            if item is not None:
+                found.append(self.raft.item_bytes(item_id.category, item_id.item_id, item))
+        return _items_response_bytes(found)
 
+    @rpc_handler
     def GetSellerItems(self, request, context):
-        results = self.raft.get_seller_items(request.seller_id)
-        items = [_item_dict_to_proto(cat, iid, item) for cat, iid, item in results]
-        return product_db_pb2.GetItemsResponse(status='success', message='', items=items)
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetItemsResponse(status='error', message='Read index unavailable')
+        return (yield from self._shared_read(
+            context, 'GetSellerItems', request, self._seller_items, request.seller_id))
 
+    @rpc_handler
     def SearchItems(self, request, context):
-        results = self.raft.search_items(
-            request.category, request.has_category, list(request.keywords)
-        )
-        items = [_item_dict_to_proto(cat, iid, item) for cat, iid, item in results]
-        return product_db_pb2.GetItemsResponse(status='success', message='', items=items)
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetItemsResponse(status='error', message='Read index unavailable')
+        return (yield from self._shared_read(
+            context, 'SearchItems', request, self._search_items,
+            request.category, request.has_category, list(request.keywords)))
+
+    @rpc_handler
+    def GetCatalogVersion(self, request, context):
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.CatalogVersionResponse(status='error', message='Read index unavailable')
+        version = self.raft.catalog_version(request.category if request.has_category else None)
+        return product_db_pb2.CatalogVersionResponse(status='success', message='', version=version)
 
+    def _seller_items(self, seller_id):
+        version = self.raft.catalog_version()
+        results = self.raft.get_seller_items(seller_id)
+        return _items_response_bytes([self.raft.item_bytes(*r) for r in results], version)
+
+    def _search_items(self, category, has_category, keywords):
+        version = self.raft.catalog_version(category if has_category else None)
+        results = self.raft.search_items(category, has_category, keywords)
+        return _items_response_bytes([self.raft.item_bytes(*r) for r in results], version)
+
+    @rpc_handler
     def GetCart(self, request, context):
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetCartResponse(status='error', message='Read index unavailable')
         cart_items = self.raft.get_cart(request.buyer_id)
         cart = [
             product_db_pb2.CartItem(
@@ -346,15 +1954,24 @@ class ReplicatedProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
         ]
         return product_db_pb2.GetCartResponse(status='success', message='', cart=cart)
 
+    @rpc_handler
     def GetSellerRating(self, request, context):
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetSellerRatingResponse(status='error', message='Read index unavailable')
         rating = self.raft.get_seller_rating(request.seller_id)
         return product_db_pb2.GetSellerRatingResponse(
             status='success', message='',
             thumbs_up=rating["thumbs_up"], thumbs_down=rating["thumbs_down"]
         )
 
+    @rpc_handler
     def GetBuyerPurchases(self, request, context):
+        if not (yield from self._read_barrier(context)):
+            return product_db_pb2.GetBuyerPurchasesResponse(status='error', message='Read index unavailable')
         purchases = self.raft.get_buyer_purchases(request.buyer_id)
+        if purchases is None:
+            self._unavailable(context, 'Purchase archive incomplete: fetching segments')
+            return product_db_pb2.GetBuyerPurchasesResponse(status='error', message='Purchase archive incomplete')
         records = [
             product_db_pb2.PurchaseRecord(
                 item_id=product_db_pb2.ItemId(category=p["category"], item_id=p["item_id"]),
@@ -368,11 +1985,44 @@ class ReplicatedProductDBServicer(product_db_pb2_grpc.ProductDBServicer):
         )
 
 
+# Same RPCs as coroutines, for the grpc.aio server (--aio)
+AsyncReplicatedProductDBServicer = async_servicer(
+    ReplicatedProductDBServicer, product_db_pb2.DESCRIPTOR.services_by_name["ProductDB"]
+)
+
+
 # ---------------------------------------------------------------------------
 # Server entry point
 # ---------------------------------------------------------------------------
 
-def serve(raft_addr, raft_partners, grpc_host='0.0.0.0', grpc_port=50052):
+def _has_leader(raft_node):
+    """Health check: the node serves while it knows a Raft leader."""
+    return lambda: raft_node.leader() is not None
+
+
+async def _serve_aio(servicer, grpc_host, grpc_port, max_concurrency, max_queued, max_queue_age):
+    server = aio_server(max_concurrency, PRODUCT_DB_PRIORITIES, PRODUCT_DB_LIMITS,
+                        max_queued, max_queue_age)
+    add_servicer_to_server(servicer, server)
+    add_health_servicer(server, _has_leader(servicer.raft), aio=True)
+    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
+    await server.start()
+    try:
+        await server.wait_for_termination()
+    finally:
+        await server.stop(0)
+
+
+def serve(raft_addr, raft_partners, grpc_host='0.0.0.0', grpc_port=50052,
+          snapshot_file=None, grpc_peers=None, grpc_advertise=None,
+          read_consistency=READ_LOCAL, archive_dir=None,
+          purchase_horizon=DEFAULT_PURCHASE_HORIZON, escrow_slice=0,
+          aio=False, max_concurrency=AIO_MAX_CONCURRENCY,
+          max_queued=MAX_QUEUED, max_queue_age=MAX_QUEUE_AGE):
+    if archive_dir is None:
+        archive_dir = f"product_archive_{raft_addr.replace(':', '_')}"
+    if snapshot_file is None:
+        snapshot_file = f"product_snapshot_{raft_addr.replace(':', '_')}.bin"
     conf = SyncObjConf(
         autoTick=True,
         appendEntriesUseBatch=True,
@@ -381,21 +2031,43 @@ def serve(raft_addr, raft_partners, grpc_host='0.0.0.0', grpc_port=50052):
         connectionTimeout=5.0,
         raftMinTimeout=0.4,
         raftMaxTimeout=1.4,
+        fullDumpFile=snapshot_file,    # compact snapshot written by RaftProductDB
+        logCompactionBatchSize=SNAPSHOT_TRANSFER_CHUNK,
     )
 
-    raft_node = RaftProductDB(raft_addr, raft_partners, conf)
+    raft_node = RaftProductDB(raft_addr, raft_partners, conf,
+                              archive_dir=archive_dir, purchase_horizon=purchase_horizon)
 
-    servicer = ReplicatedProductDBServicer(raft_node)
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    product_db_pb2_grpc.add_ProductDBServicer_to_server(servicer, server)
-    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
-    server.start()
+    # Raft address -> gRPC address of every node, for leader hints
+    grpc_addrs = dict(zip(raft_partners, grpc_peers or []))
+    grpc_addrs[raft_addr] = grpc_advertise or f"{raft_addr.rsplit(':', 1)[0]}:{grpc_port}"
+
+    escrow = EscrowSeller(raft_node, raft_addr, escrow_slice) if escrow_slice > 0 else None
+    servicer_class = AsyncReplicatedProductDBServicer if aio else ReplicatedProductDBServicer
+    servicer = servicer_class(raft_node, grpc_addrs,
+                              read_consistency=read_consistency, escrow=escrow)
 
     logger.info(
-        "Replicated Product DB | Raft %s | Partners %s | gRPC %s:%d",
+        "Replicated Product DB | Raft %s | Partners %s | gRPC %s:%d (%s)",
         raft_addr, raft_partners, grpc_host, grpc_port,
+        f"aio, max {max_concurrency} RPCs" if aio else f"{GRPC_WORKERS} worker threads",
     )
 
+    if aio:
+        try:
+            asyncio.run(_serve_aio(servicer, grpc_host, grpc_port, max_concurrency,
+                                   max_queued, max_queue_age))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    server = threaded_server(GRPC_WORKERS, PRODUCT_DB_PRIORITIES, PRODUCT_DB_LIMITS,
+                             max_queued, max_queue_age)
+    add_servicer_to_server(servicer, server)
+    add_health_servicer(server, _has_leader(raft_node))
+    server.add_insecure_port(f'{grpc_host}:{grpc_port}')
+    server.start()
+
     try:
         server.wait_for_termination()
     except KeyboardInterrupt:
@@ -412,7 +2084,47 @@ if __name__ == '__main__':
                         help='Comma-separated Raft addresses of partner nodes')
     parser.add_argument('--grpc-host', default='0.0.0.0')
     parser.add_argument('--grpc-port', type=int, default=50052)
+    parser.add_argument('--snapshot-file', type=str, default=None,
+                        help='Write Raft snapshots to this file in the compact format '
+                             '(default: product_snapshot_<raft-addr>.bin)')
+    parser.add_argument('--grpc-peers', type=str, default='',
+                        help='Comma-separated gRPC addresses of the partner nodes, '
+                             'in --raft-partners order (used for leader hints)')
+    parser.add_argument('--grpc-advertise', type=str, default=None,
+                        help='gRPC address clients use for this node '
+                             '(default: <raft-host>:<grpc-port>)')
+    parser.add_argument('--read-consistency', choices=[READ_LOCAL, READ_LINEARIZABLE],
+                        default=READ_LOCAL,
+                        help='Default read mode when the request does not set '
+                             f'{READ_CONSISTENCY_KEY} metadata')
+    parser.add_argument('--archive-dir', type=str, default=None,
+                        help='Purchase archive directory (default: product_archive_<raft-addr>)')
+    parser.add_argument('--purchase-horizon', type=float, default=DEFAULT_PURCHASE_HORIZON,
+                        help='Archive purchases older than this many seconds (0 disables)')
+    parser.add_argument('--escrow-slice', type=int, default=0,
+                        help='Escrow mode: sell from per-replica stock slices of this many '
+                             f'units (0 disables; {ESCROW_SLICE} is a reasonable start). A sale '
+                             'is acknowledged once fsynced to this replica\'s journal, before '
+                             'it is replicated, so it is lost with this disk until settled '
+                             f'(at least every {ESCROW_SETTLE_INTERVAL} s). Item quantities '
+                             'shown to buyers are settled stock and include reserved slices')
+    parser.add_argument('--aio', action='store_true',
+                        help='Serve with grpc.aio: replication waits are awaited, not '
+                             f'one worker thread each (default: {GRPC_WORKERS} threads)')
+    parser.add_argument('--max-concurrency', type=int, default=AIO_MAX_CONCURRENCY,
+                        help='With --aio, the most RPCs handled at once (more wait in the '
+                             'admission queue)')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED,
+                        help='Most RPCs waiting for a slot; more are rejected with '
+                             'RESOURCE_EXHAUSTED')
+    parser.add_argument('--max-queue-age', type=float, default=MAX_QUEUE_AGE,
+                        help='Seconds a write may wait for a slot before it is shed (reads '
+                             'and purchases get twice as long; 0 disables admission control)')
     args = parser.parse_args()
 
     partners = [p.strip() for p in args.raft_partners.split(",")]
-    serve(args.raft_addr, partners, args.grpc_host, args.grpc_port)
+    grpc_peers = [p.strip() for p in args.grpc_peers.split(",") if p.strip()]
+    serve(args.raft_addr, partners, args.grpc_host, args.grpc_port, args.snapshot_file,
+          grpc_peers, args.grpc_advertise, args.read_consistency,
+          args.archive_dir, args.purchase_horizon, args.escrow_slice,
+          args.aio, args.max_concurrency, args.max_queued, args.max_queue_age)
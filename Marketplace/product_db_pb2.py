@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10product_db.proto\x12\tproductdb\"+\n\x06ItemId\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\x05\x12\x0f\n\x07item_id\x18\x02 \x01(\x05\"\xcf\x01\n\x08ItemData\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x11\n\tseller_id\x18\x02 \x01(\x05\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x04 \x01(\x05\x12\x10\n\x08keywords\x18\x05 \x03(\t\x12\x11\n\tcondition\x18\x06 \x01(\t\x12\r\n\x05price\x18\x07 \x01(\x02\x12\x10\n\x08quantity\x18\x08 \x01(\x05\x12\x11\n\tthumbs_up\x18\t \x01(\x05\x12\x13\n\x0bthumbs_down\x18\n \x01(\x05\"@\n\x08\x43\x61rtItem\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"Y\n\x0ePurchaseRecord\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\x12\x11\n\ttimestamp\x18\x03 \x01(\t\"\x8e\x01\n\x13RegisterItemRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\x05\x12\x10\n\x08keywords\x18\x04 \x03(\t\x12\x11\n\tcondition\x18\x05 \x01(\t\x12\r\n\x05price\x18\x06 \x01(\x02\x12\x10\n\x08quantity\x18\x07 \x01(\x05\"[\n\x14RegisterItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\"\n\x07item_id\x18\x03 \x01(\x0b\x32\x11.productdb.ItemId\"3\n\rItemIdRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\"U\n\x0fGetItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12!\n\x04item\x18\x03 \x01(\x0b\x32\x13.productdb.ItemData\"K\n\x16UpdateItemPriceRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\r\n\x05price\x18\x02 \x01(\x02\"Q\n\x19UpdateItemQuantityRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"*\n\x15GetSellerItemsRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\"W\n\x10GetItemsResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\"\n\x05items\x18\x03 \x03(\x0b\x32\x13.productdb.ItemData\"N\n\x12SearchItemsRequest\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\x05\x12\x14\n\x0chas_category\x18\x02 \x01(\x08\x12\x10\n\x08keywords\x18\x03 \x03(\t\"G\n\x10StoreCartRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\x12!\n\x04\x63\x61rt\x18\x02 \x03(\x0b\x32\x13.productdb.CartItem\"\"\n\x0e\x42uyerIdRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\"U\n\x0fGetCartResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12!\n\x04\x63\x61rt\x18\x03 \x03(\x0b\x32\x13.productdb.CartItem\"S\n\x16\x41\x64\x64ItemFeedbackRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x15\n\rfeedback_type\x18\x02 \x01(\t\"+\n\x16GetSellerRatingRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\"b\n\x17GetSellerRatingResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\tthumbs_up\x18\x03 \x01(\x05\x12\x13\n\x0bthumbs_down\x18\x04 \x01(\x05\"]\n\x13MakePurchaseRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\x12\"\n\x07item_id\x18\x02 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x03 \x01(\x05\"j\n\x19GetBuyerPurchasesResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12,\n\tpurchases\x18\x03 \x03(\x0b\x32\x19.productdb.PurchaseRecord\"1\n\x0eStatusResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t2\xf7\x07\n\tProductDB\x12O\n\x0cRegisterItem\x12\x1e.productdb.RegisterItemRequest\x1a\x1f.productdb.RegisterItemResponse\x12?\n\x07GetItem\x12\x18.productdb.ItemIdRequest\x1a\x1a.productdb.GetItemResponse\x12O\n\x0fUpdateItemPrice\x12!.productdb.UpdateItemPriceRequest\x1a\x19.productdb.StatusResponse\x12U\n\x12UpdateItemQuantity\x12$.productdb.UpdateItemQuantityRequest\x1a\x19.productdb.StatusResponse\x12O\n\x0eGetSellerItems\x12 .productdb.GetSellerItemsRequest\x1a\x1b.productdb.GetItemsResponse\x12I\n\x0bSearchItems\x12\x1d.productdb.SearchItemsRequest\x1a\x1b.productdb.GetItemsResponse\x12\x43\n\tStoreCart\x12\x1b.productdb.StoreCartRequest\x1a\x19.productdb.StatusResponse\x12@\n\x07GetCart\x12\x19.productdb.BuyerIdRequest\x1a\x1a.productdb.GetCartResponse\x12\x41\n\tClearCart\x12\x19.productdb.BuyerIdRequest\x1a\x19.productdb.StatusResponse\x12O\n\x0f\x41\x64\x64ItemFeedback\x12!.productdb.AddItemFeedbackRequest\x1a\x19.productdb.StatusResponse\x12X\n\x0fGetSellerRating\x12!.productdb.GetSellerRatingRequest\x1a\".productdb.GetSellerRatingResponse\x12I\n\x0cMakePurchase\x12\x1e.productdb.MakePurchaseRequest\x1a\x19.productdb.StatusResponse\x12T\n\x11GetBuyerPurchases\x12\x19.productdb.BuyerIdRequest\x1a$.productdb.GetBuyerPurchasesResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10product_db.proto\x12\tproductdb\"+\n\x06ItemId\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\x05\x12\x0f\n\x07item_id\x18\x02 \x01(\x05\"\xe0\x01\n\x08ItemData\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x11\n\tseller_id\x18\x02 \x01(\x05\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x04 \x01(\x05\x12\x10\n\x08keywords\x18\x05 \x03(\t\x12\x11\n\tcondition\x18\x06 \x01(\t\x12\r\n\x05price\x18\x07 \x01(\x02\x12\x10\n\x08quantity\x18\x08 \x01(\x05\x12\x11\n\tthumbs_up\x18\t \x01(\x05\x12\x13\n\x0bthumbs_down\x18\n \x01(\x05\x12\x0f\n\x07version\x18\x0b \x01(\x03\"@\n\x08\x43\x61rtItem\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"Y\n\x0ePurchaseRecord\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\x12\x11\n\ttimestamp\x18\x03 \x01(\t\"\xa2\x01\n\x13RegisterItemRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x03 \x01(\x05\x12\x10\n\x08keywords\x18\x04 \x03(\t\x12\x11\n\tcondition\x18\x05 \x01(\t\x12\r\n\x05price\x18\x06 \x01(\x02\x12\x10\n\x08quantity\x18\x07 \x01(\x05\x12\x12\n\nrequest_id\x18\x08 \x01(\t\"[\n\x14RegisterItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\"\n\x07item_id\x18\x03 \x01(\x0b\x32\x11.productdb.ItemId\"3\n\rItemIdRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\"5\n\x0eItemIdsRequest\x12#\n\x08item_ids\x18\x01 \x03(\x0b\x32\x11.productdb.ItemId\"n\n\x0fGetItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12!\n\x04item\x18\x03 \x01(\x0b\x32\x13.productdb.ItemData\x12\x17\n\x0f\x63\x61talog_version\x18\x04 \x01(\x03\"_\n\x16UpdateItemPriceRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\r\n\x05price\x18\x02 \x01(\x02\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"e\n\x19UpdateItemQuantityRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x02 \x01(\x05\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"*\n\x15GetSellerItemsRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\"p\n\x10GetItemsResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\"\n\x05items\x18\x03 \x03(\x0b\x32\x13.productdb.ItemData\x12\x17\n\x0f\x63\x61talog_version\x18\x04 \x01(\x03\"N\n\x12SearchItemsRequest\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\x05\x12\x14\n\x0chas_category\x18\x02 \x01(\x08\x12\x10\n\x08keywords\x18\x03 \x03(\t\"[\n\x10StoreCartRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\x12!\n\x04\x63\x61rt\x18\x02 \x03(\x0b\x32\x13.productdb.CartItem\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"\"\n\x0e\x42uyerIdRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\"U\n\x0fGetCartResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12!\n\x04\x63\x61rt\x18\x03 \x03(\x0b\x32\x13.productdb.CartItem\"g\n\x16\x41\x64\x64ItemFeedbackRequest\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x15\n\rfeedback_type\x18\x02 \x01(\t\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"+\n\x16GetSellerRatingRequest\x12\x11\n\tseller_id\x18\x01 \x01(\x05\"b\n\x17GetSellerRatingResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x11\n\tthumbs_up\x18\x03 \x01(\x05\x12\x13\n\x0bthumbs_down\x18\x04 \x01(\x05\"q\n\x13MakePurchaseRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\x12\"\n\x07item_id\x18\x02 \x01(\x0b\x32\x11.productdb.ItemId\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x12\n\nrequest_id\x18\x04 \x01(\t\"j\n\x19GetBuyerPurchasesResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12,\n\tpurchases\x18\x03 \x03(\x0b\x32\x19.productdb.PurchaseRecord\"1\n\x0eStatusResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"Y\n\x14RegisterItemsRequest\x12-\n\x05items\x18\x01 \x03(\x0b\x32\x1e.productdb.RegisterItemRequest\x12\x12\n\nrequest_id\x18\x02 \x01(\t\"j\n\x15RegisterItemsResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x30\n\x07results\x18\x03 \x03(\x0b\x32\x1f.productdb.RegisterItemResponse\"z\n\nItemUpdate\x12\"\n\x07item_id\x18\x01 \x01(\x0b\x32\x11.productdb.ItemId\x12\x11\n\thas_price\x18\x02 \x01(\x08\x12\r\n\x05price\x18\x03 \x01(\x02\x12\x14\n\x0chas_quantity\x18\x04 \x01(\x08\x12\x10\n\x08quantity\x18\x05 \x01(\x05\"P\n\x12UpdateItemsRequest\x12&\n\x07updates\x18\x01 \x03(\x0b\x32\x15.productdb.ItemUpdate\x12\x12\n\nrequest_id\x18\x02 \x01(\t\"b\n\x17\x41\x64\x64\x46\x65\x65\x64\x62\x61\x63kBatchRequest\x12\x33\n\x08\x66\x65\x65\x64\x62\x61\x63k\x18\x01 \x03(\x0b\x32!.productdb.AddItemFeedbackRequest\x12\x12\n\nrequest_id\x18\x02 \x01(\t\"b\n\x13\x42\x61tchStatusResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12*\n\x07results\x18\x03 \x03(\x0b\x32\x19.productdb.StatusResponse\"\x12\n\x10ReadIndexRequest\"J\n\x11ReadIndexResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x14\n\x0c\x63ommit_index\x18\x03 \x01(\x03\"_\n\x13\x43heckoutCartRequest\x12\x10\n\x08\x62uyer_id\x18\x01 \x01(\x05\x12\"\n\x05items\x18\x02 \x03(\x0b\x32\x13.productdb.CartItem\x12\x12\n\nrequest_id\x18\x03 \x01(\t\"o\n\x14\x43heckoutCartResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\r\n\x05total\x18\x03 \x01(\x02\x12\'\n\x0c\x66\x61iled_items\x18\x04 \x03(\x0b\x32\x11.productdb.ItemId\"?\n\x15\x43\x61talogVersionRequest\x12\x10\n\x08\x63\x61tegory\x18\x01 \x01(\x05\x12\x14\n\x0chas_category\x18\x02 \x01(\x08\"J\n\x16\x43\x61talogVersionResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0f\n\x07version\x18\x03 \x01(\x03\"$\n\x15\x41rchiveSegmentRequest\x12\x0b\n\x03seq\x18\x01 \x01(\x03\"G\n\x16\x41rchiveSegmentResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\x0c\x32\x82\r\n\tProductDB\x12O\n\x0cRegisterItem\x12\x1e.productdb.RegisterItemRequest\x1a\x1f.productdb.RegisterItemResponse\x12?\n\x07GetItem\x12\x18.productdb.ItemIdRequest\x1a\x1a.productdb.GetItemResponse\x12\x42\n\x08GetItems\x12\x19.productdb.ItemIdsRequest\x1a\x1b.productdb.GetItemsResponse\x12O\n\x0fUpdateItemPrice\x12!.productdb.UpdateItemPriceRequest\x1a\x19.productdb.StatusResponse\x12U\n\x12UpdateItemQuantity\x12$.productdb.UpdateItemQuantityRequest\x1a\x19.productdb.StatusResponse\x12O\n\x0eGetSellerItems\x12 .productdb.GetSellerItemsRequest\x1a\x1b.productdb.GetItemsResponse\x12I\n\x0bSearchItems\x12\x1d.productdb.SearchItemsRequest\x1a\x1b.productdb.GetItemsResponse\x12\x43\n\tStoreCart\x12\x1b.productdb.StoreCartRequest\x1a\x19.productdb.StatusResponse\x12@\n\x07GetCart\x12\x19.productdb.BuyerIdRequest\x1a\x1a.productdb.GetCartResponse\x12\x41\n\tClearCart\x12\x19.productdb.BuyerIdRequest\x1a\x19.productdb.StatusResponse\x12O\n\x0f\x41\x64\x64ItemFeedback\x12!.productdb.AddItemFeedbackRequest\x1a\x19.productdb.StatusResponse\x12X\n\x0fGetSellerRating\x12!.productdb.GetSellerRatingRequest\x1a\".productdb.GetSellerRatingResponse\x12I\n\x0cMakePurchase\x12\x1e.productdb.MakePurchaseRequest\x1a\x19.productdb.StatusResponse\x12T\n\x11GetBuyerPurchases\x12\x19.productdb.BuyerIdRequest\x1a$.productdb.GetBuyerPurchasesResponse\x12R\n\rRegisterItems\x12\x1f.productdb.RegisterItemsRequest\x1a .productdb.RegisterItemsResponse\x12L\n\x0bUpdateItems\x12\x1d.productdb.UpdateItemsRequest\x1a\x1e.productdb.BatchStatusResponse\x12V\n\x10\x41\x64\x64\x46\x65\x65\x64\x62\x61\x63kBatch\x12\".productdb.AddFeedbackBatchRequest\x1a\x1e.productdb.BatchStatusResponse\x12\x46\n\tReadIndex\x12\x1b.productdb.ReadIndexRequest\x1a\x1c.productdb.ReadIndexResponse\x12O\n\x0c\x43heckoutCart\x12\x1e.productdb.CheckoutCartRequest\x1a\x1f.productdb.CheckoutCartResponse\x12X\n\x11GetCatalogVersion\x12 .productdb.CatalogVersionRequest\x1a!.productdb.CatalogVersionResponse\x12X\n\x11GetArchiveSegment\x12 .productdb.ArchiveSegmentRequest\x1a!.productdb.ArchiveSegmentResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -34,47 +34,77 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_ITEMID']._serialized_start=31
   _globals['_ITEMID']._serialized_end=74
   _globals['_ITEMDATA']._serialized_start=77
-  _globals['_ITEMDATA']._serialized_end=284
-  _globals['_CARTITEM']._serialized_start=286
-  _globals['_CARTITEM']._serialized_end=350
-  _globals['_PURCHASERECORD']._serialized_start=352
-  _globals['_PURCHASERECORD']._serialized_end=441
-  _globals['_REGISTERITEMREQUEST']._serialized_start=444
-  _globals['_REGISTERITEMREQUEST']._serialized_end=586
-  _globals['_REGISTERITEMRESPONSE']._serialized_start=588
-  _globals['_REGISTERITEMRESPONSE']._serialized_end=679
-  _globals['_ITEMIDREQUEST']._serialized_start=681
-  _globals['_ITEMIDREQUEST']._serialized_end=732
-  _globals['_GETITEMRESPONSE']._serialized_start=734
-  _globals['_GETITEMRESPONSE']._serialized_end=819
-  _globals['_UPDATEITEMPRICEREQUEST']._serialized_start=821
-  _globals['_UPDATEITEMPRICEREQUEST']._serialized_end=896
-  _globals['_UPDATEITEMQUANTITYREQUEST']._serialized_start=898
-  _globals['_UPDATEITEMQUANTITYREQUEST']._serialized_end=979
-  _globals['_GETSELLERITEMSREQUEST']._serialized_start=981
-  _globals['_GETSELLERITEMSREQUEST']._serialized_end=1023
-  _globals['_GETITEMSRESPONSE']._serialized_start=1025
-  _globals['_GETITEMSRESPONSE']._serialized_end=1112
-  _globals['_SEARCHITEMSREQUEST']._serialized_start=1114
-  _globals['_SEARCHITEMSREQUEST']._serialized_end=1192
-  _globals['_STORECARTREQUEST']._serialized_start=1194
-  _globals['_STORECARTREQUEST']._serialized_end=1265
-  _globals['_BUYERIDREQUEST']._serialized_start=1267
-  _globals['_BUYERIDREQUEST']._serialized_end=1301
-  _globals['_GETCARTRESPONSE']._serialized_start=1303
-  _globals['_GETCARTRESPONSE']._serialized_end=1388
-  _globals['_ADDITEMFEEDBACKREQUEST']._serialized_start=1390
-  _globals['_ADDITEMFEEDBACKREQUEST']._serialized_end=1473
-  _globals['_GETSELLERRATINGREQUEST']._serialized_start=1475
-  _globals['_GETSELLERRATINGREQUEST']._serialized_end=1518
-  _globals['_GETSELLERRATINGRESPONSE']._serialized_start=1520
-  _globals['_GETSELLERRATINGRESPONSE']._serialized_end=1618
-  _globals['_MAKEPURCHASEREQUEST']._serialized_start=1620
-  _globals['_MAKEPURCHASEREQUEST']._serialized_end=1713
-  _globals['_GETBUYERPURCHASESRESPONSE']._serialized_start=1715
-  _globals['_GETBUYERPURCHASESRESPONSE']._serialized_end=1821
-  _globals['_STATUSRESPONSE']._serialized_start=1823
-  _globals['_STATUSRESPONSE']._serialized_end=1872
-  _globals['_PRODUCTDB']._serialized_start=1875
-  _globals['_PRODUCTDB']._serialized_end=2890
+  _globals['_ITEMDATA']._serialized_end=301
+  _globals['_CARTITEM']._serialized_start=303
+  _globals['_CARTITEM']._serialized_end=367
+  _globals['_PURCHASERECORD']._serialized_start=369
+  _globals['_PURCHASERECORD']._serialized_end=458
+  _globals['_REGISTERITEMREQUEST']._serialized_start=461
+  _globals['_REGISTERITEMREQUEST']._serialized_end=623
+  _globals['_REGISTERITEMRESPONSE']._serialized_start=625
+  _globals['_REGISTERITEMRESPONSE']._serialized_end=716
+  _globals['_ITEMIDREQUEST']._serialized_start=718
+  _globals['_ITEMIDREQUEST']._serialized_end=769
+  _globals['_ITEMIDSREQUEST']._serialized_start=771
+  _globals['_ITEMIDSREQUEST']._serialized_end=824
+  _globals['_GETITEMRESPONSE']._serialized_start=826
+  _globals['_GETITEMRESPONSE']._serialized_end=936
+  _globals['_UPDATEITEMPRICEREQUEST']._serialized_start=938
+  _globals['_UPDATEITEMPRICEREQUEST']._serialized_end=1033
+  _globals['_UPDATEITEMQUANTITYREQUEST']._serialized_start=1035
+  _globals['_UPDATEITEMQUANTITYREQUEST']._serialized_end=1136
+  _globals['_GETSELLERITEMSREQUEST']._serialized_start=1138
+  _globals['_GETSELLERITEMSREQUEST']._serialized_end=1180
+  _globals['_GETITEMSRESPONSE']._serialized_start=1182
+  _globals['_GETITEMSRESPONSE']._serialized_end=1294
+  _globals['_SEARCHITEMSREQUEST']._serialized_start=1296
+  _globals['_SEARCHITEMSREQUEST']._serialized_end=1374
+  _globals['_STORECARTREQUEST']._serialized_start=1376
+  _globals['_STORECARTREQUEST']._serialized_end=1467
+  _globals['_BUYERIDREQUEST']._serialized_start=1469
+  _globals['_BUYERIDREQUEST']._serialized_end=1503
+  _globals['_GETCARTRESPONSE']._serialized_start=1505
+  _globals['_GETCARTRESPONSE']._serialized_end=1590
+  _globals['_ADDITEMFEEDBACKREQUEST']._serialized_start=1592
+  _globals['_ADDITEMFEEDBACKREQUEST']._serialized_end=1695
+  _globals['_GETSELLERRATINGREQUEST']._serialized_start=1697
+  _globals['_GETSELLERRATINGREQUEST']._serialized_end=1740
+  _globals['_GETSELLERRATINGRESPONSE']._serialized_start=1742
+  _globals['_GETSELLERRATINGRESPONSE']._serialized_end=1840
+  _globals['_MAKEPURCHASEREQUEST']._serialized_start=1842
+  _globals['_MAKEPURCHASEREQUEST']._serialized_end=1955
+  _globals['_GETBUYERPURCHASESRESPONSE']._serialized_start=1957
+  _globals['_GETBUYERPURCHASESRESPONSE']._serialized_end=2063
+  _globals['_STATUSRESPONSE']._serialized_start=2065
+  _globals['_STATUSRESPONSE']._serialized_end=2114
+  _globals['_REGISTERITEMSREQUEST']._serialized_start=2116
+  _globals['_REGISTERITEMSREQUEST']._serialized_end=2205
+  _globals['_REGISTERITEMSRESPONSE']._serialized_start=2207
+  _globals['_REGISTERITEMSRESPONSE']._serialized_end=2313
+  _globals['_ITEMUPDATE']._serialized_start=2315
+  _globals['_ITEMUPDATE']._serialized_end=2437
+  _globals['_UPDATEITEMSREQUEST']._serialized_start=2439
+  _globals['_UPDATEITEMSREQUEST']._serialized_end=2519
+  _globals['_ADDFEEDBACKBATCHREQUEST']._serialized_start=2521
+  _globals['_ADDFEEDBACKBATCHREQUEST']._serialized_end=2619
+  _globals['_BATCHSTATUSRESPONSE']._serialized_start=2621
+  _globals['_BATCHSTATUSRESPONSE']._serialized_end=2719
+  _globals['_READINDEXREQUEST']._serialized_start=2721
+  _globals['_READINDEXREQUEST']._serialized_end=2739
+  _globals['_READINDEXRESPONSE']._serialized_start=2741
+  _globals['_READINDEXRESPONSE']._serialized_end=2815
+  _globals['_CHECKOUTCARTREQUEST']._serialized_start=2817
+  _globals['_CHECKOUTCARTREQUEST']._serialized_end=2912
+  _globals['_CHECKOUTCARTRESPONSE']._serialized_start=2914
+  _globals['_CHECKOUTCARTRESPONSE']._serialized_end=3025
+  _globals['_CATALOGVERSIONREQUEST']._serialized_start=3027
+  _globals['_CATALOGVERSIONREQUEST']._serialized_end=3090
+  _globals['_CATALOGVERSIONRESPONSE']._serialized_start=3092
+  _globals['_CATALOGVERSIONRESPONSE']._serialized_end=3166
+  _globals['_ARCHIVESEGMENTREQUEST']._serialized_start=3168
+  _globals['_ARCHIVESEGMENTREQUEST']._serialized_end=3204
+  _globals['_ARCHIVESEGMENTRESPONSE']._serialized_start=3206
+  _globals['_ARCHIVESEGMENTRESPONSE']._serialized_end=3277
+  _globals['_PRODUCTDB']._serialized_start=3280
+  _globals['_PRODUCTDB']._serialized_end=4946
 # @@protoc_insertion_point(module_scope)
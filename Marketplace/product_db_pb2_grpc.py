@@ -44,6 +44,11 @@ class ProductDBStub(object):
                 request_serializer=product__db__pb2.ItemIdRequest.SerializeToString,
                 response_deserializer=product__db__pb2.GetItemResponse.FromString,
                 _registered_method=True)
+        self.GetItems = channel.unary_unary(
+                '/productdb.ProductDB/GetItems',
+                request_serializer=product__db__pb2.ItemIdsRequest.SerializeToString,
+                response_deserializer=product__db__pb2.GetItemsResponse.FromString,
+                _registered_method=True)
         self.UpdateItemPrice = channel.unary_unary(
                 '/productdb.ProductDB/UpdateItemPrice',
                 request_serializer=product__db__pb2.UpdateItemPriceRequest.SerializeToString,
@@ -99,6 +104,41 @@ class ProductDBStub(object):
                 request_serializer=product__db__pb2.BuyerIdRequest.SerializeToString,
                 response_deserializer=product__db__pb2.GetBuyerPurchasesResponse.FromString,
                 _registered_method=True)
+        self.RegisterItems = channel.unary_unary(
+                '/productdb.ProductDB/RegisterItems',
+                request_serializer=product__db__pb2.RegisterItemsRequest.SerializeToString,
+                response_deserializer=product__db__pb2.RegisterItemsResponse.FromString,
+                _registered_method=True)
+        self.UpdateItems = channel.unary_unary(
+                '/productdb.ProductDB/UpdateItems',
+                request_serializer=product__db__pb2.UpdateItemsRequest.SerializeToString,
+                response_deserializer=product__db__pb2.BatchStatusResponse.FromString,
+                _registered_method=True)
+        self.AddFeedbackBatch = channel.unary_unary(
+                '/productdb.ProductDB/AddFeedbackBatch',
+                request_serializer=product__db__pb2.AddFeedbackBatchRequest.SerializeToString,
+                response_deserializer=product__db__pb2.BatchStatusResponse.FromString,
+                _registered_method=True)
+        self.ReadIndex = channel.unary_unary(
+                '/productdb.ProductDB/ReadIndex',
+                request_serializer=product__db__pb2.ReadIndexRequest.SerializeToString,
+                response_deserializer=product__db__pb2.ReadIndexResponse.FromString,
+                _registered_method=True)
+        self.CheckoutCart = channel.unary_unary(
+                '/productdb.ProductDB/CheckoutCart',
+                request_serializer=product__db__pb2.CheckoutCartRequest.SerializeToString,
+                response_deserializer=product__db__pb2.CheckoutCartResponse.FromString,
+                _registered_method=True)
+        self.GetCatalogVersion = channel.unary_unary(
+                '/productdb.ProductDB/GetCatalogVersion',
+                request_serializer=product__db__pb2.CatalogVersionRequest.SerializeToString,
+                response_deserializer=product__db__pb2.CatalogVersionResponse.FromString,
+                _registered_method=True)
+        self.GetArchiveSegment = channel.unary_unary(
+                '/productdb.ProductDB/GetArchiveSegment',
+                request_serializer=product__db__pb2.ArchiveSegmentRequest.SerializeToString,
+                response_deserializer=product__db__pb2.ArchiveSegmentResponse.FromString,
+                _registered_method=True)
 
 
 class ProductDBServicer(object):
@@ -116,6 +156,12 @@ class ProductDBServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def UpdateItemPrice(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -182,6 +228,48 @@ class ProductDBServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RegisterItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UpdateItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AddFeedbackBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ReadIndex(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CheckoutCart(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetCatalogVersion(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetArchiveSegment(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ProductDBServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -195,6 +283,11 @@ def add_ProductDBServicer_to_server(servicer, server):
                     request_deserializer=product__db__pb2.ItemIdRequest.FromString,
                     response_serializer=product__db__pb2.GetItemResponse.SerializeToString,
             ),
+            'GetItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetItems,
+                    request_deserializer=product__db__pb2.ItemIdsRequest.FromString,
+                    response_serializer=product__db__pb2.GetItemsResponse.SerializeToString,
+            ),
             'UpdateItemPrice': grpc.unary_unary_rpc_method_handler(
                     servicer.UpdateItemPrice,
                     request_deserializer=product__db__pb2.UpdateItemPriceRequest.FromString,
@@ -250,6 +343,41 @@ def add_ProductDBServicer_to_server(servicer, server):
                     request_deserializer=product__db__pb2.BuyerIdRequest.FromString,
                     response_serializer=product__db__pb2.GetBuyerPurchasesResponse.SerializeToString,
             ),
+            'RegisterItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.RegisterItems,
+                    request_deserializer=product__db__pb2.RegisterItemsRequest.FromString,
+                    response_serializer=product__db__pb2.RegisterItemsResponse.SerializeToString,
+            ),
+            'UpdateItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpdateItems,
+                    request_deserializer=product__db__pb2.UpdateItemsRequest.FromString,
+                    response_serializer=product__db__pb2.BatchStatusResponse.SerializeToString,
+            ),
+            'AddFeedbackBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.AddFeedbackBatch,
+                    request_deserializer=product__db__pb2.AddFeedbackBatchRequest.FromString,
+                    response_serializer=product__db__pb2.BatchStatusResponse.SerializeToString,
+            ),
+            'ReadIndex': grpc.unary_unary_rpc_method_handler(
+                    servicer.ReadIndex,
+                    request_deserializer=product__db__pb2.ReadIndexRequest.FromString,
+                    response_serializer=product__db__pb2.ReadIndexResponse.SerializeToString,
+            ),
+            'CheckoutCart': grpc.unary_unary_rpc_method_handler(
+                    servicer.CheckoutCart,
+                    request_deserializer=product__db__pb2.CheckoutCartRequest.FromString,
+                    response_serializer=product__db__pb2.CheckoutCartResponse.SerializeToString,
+            ),
+            'GetCatalogVersion': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetCatalogVersion,
+                    request_deserializer=product__db__pb2.CatalogVersionRequest.FromString,
+                    response_serializer=product__db__pb2.CatalogVersionResponse.SerializeToString,
+            ),
+            'GetArchiveSegment': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetArchiveSegment,
+                    request_deserializer=product__db__pb2.ArchiveSegmentRequest.FromString,
+                    response_serializer=product__db__pb2.ArchiveSegmentResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'productdb.ProductDB', rpc_method_handlers)
@@ -315,6 +443,33 @@ class ProductDB(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GetItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/GetItems',
+            product__db__pb2.ItemIdsRequest.SerializeToString,
+            product__db__pb2.GetItemsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def UpdateItemPrice(request,
             target,
@@ -611,3 +766,192 @@ class ProductDB(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def RegisterItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/RegisterItems',
+            product__db__pb2.RegisterItemsRequest.SerializeToString,
+            product__db__pb2.RegisterItemsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def UpdateItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/UpdateItems',
+            product__db__pb2.UpdateItemsRequest.SerializeToString,
+            product__db__pb2.BatchStatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AddFeedbackBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/AddFeedbackBatch',
+            product__db__pb2.AddFeedbackBatchRequest.SerializeToString,
+            product__db__pb2.BatchStatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ReadIndex(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/ReadIndex',
+            product__db__pb2.ReadIndexRequest.SerializeToString,
+            product__db__pb2.ReadIndexResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CheckoutCart(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/CheckoutCart',
+            product__db__pb2.CheckoutCartRequest.SerializeToString,
+            product__db__pb2.CheckoutCartResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetCatalogVersion(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/GetCatalogVersion',
+            product__db__pb2.CatalogVersionRequest.SerializeToString,
+            product__db__pb2.CatalogVersionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetArchiveSegment(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/productdb.ProductDB/GetArchiveSegment',
+            product__db__pb2.ArchiveSegmentRequest.SerializeToString,
+            product__db__pb2.ArchiveSegmentResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,78 @@
+"""
+Batch REST endpoint shared by the buyer and seller servers.
+
+POST <prefix>/batch runs several of the server's own requests in one round
+trip. The session is validated once for the whole batch and the requests
+run concurrently, each through the normal Flask view, so they must not
+depend on each other. Results come back in request order:
+
+    POST /buyer/batch
+    {"requests": [{"method": "GET", "path": "/buyer/items/1/2",
+                   "headers": {"If-None-Match": "\"1.2.40\""}},
+                  {"method": "GET", "path": "/buyer/seller/7/rating"},
+                  {"method": "POST", "path": "/buyer/cart/validate",
+                   "body": {"item_id": [1, 2], "quantity": 1}}]}
+
+    {"status": "success", "results": [{"status_code": 200, "body": {...}}, ...]}
+
+A request may carry its own "params" (query string) and "headers", but
+not an X-Session-ID: the batch's is passed on to all of them, and a batch
+with a request that sets its own is refused with 400. A request that fails
+gets status_code 500 without failing the others. Views call
+batch_session() from validate_session to pick up the session the batch
+already checked.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, jsonify, request
+
+MAX_BATCH_REQUESTS = 50     # requests in one batch
+BATCH_WORKERS = 16          # requests of all batches running at once
+SESSION_HEADER = "X-Session-ID"
+
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+
+def batch_session():
+    """Session validated by the enclosing batch request, or None."""
+    return g.get("batch_session")
+
+
+def add_batch_route(app, prefix, validate_session):
+    """Register POST <prefix>/batch on app (see module docstring)."""
+    batch_path = f"{prefix}/batch"
+
+    def run(sub, session_id, session_resp):
+        headers = dict(sub.get("headers", {}), **{SESSION_HEADER: session_id})
+        with app.test_request_context(
+                sub["path"], method=sub.get("method", "GET"), json=sub.get("body"),
+                query_string=sub.get("params"), headers=headers):
+            g.batch_session = session_resp
+            try:
+                resp = app.full_dispatch_request()
+            except Exception as e:
+                return {"status_code": 500, "body": {"status": "error", "message": str(e)}}
+            return {"status_code": resp.status_code,
+                    "body": resp.get_json(silent=True) if resp.data else None}
+
+    def batch():
+        session_resp, err = validate_session(request)
+        if err:
+            return jsonify({'status': 'error', 'message': err[0]}), err[1]
+        subs = request.json.get('requests', [])
+        if len(subs) > MAX_BATCH_REQUESTS:
+            return jsonify({'status': 'error',
+                            'message': f'At most {MAX_BATCH_REQUESTS} requests per batch'}), 400
+        for sub in subs:
+            path = sub.get('path', '')
+            if not path.startswith(prefix + '/') or path.split('?')[0] == batch_path:
+                return jsonify({'status': 'error', 'message': f'Cannot batch {path!r}'}), 400
+            if any(name.lower() == SESSION_HEADER.lower() for name in sub.get('headers', {})):
+                return jsonify({'status': 'error',
+                                'message': f'{path!r} sets its own {SESSION_HEADER}'}), 400
+        session_id = request.headers.get(SESSION_HEADER, '')
+        futures = [_executor.submit(run, sub, session_id, session_resp) for sub in subs]
+        return jsonify({'status': 'success', 'results': [f.result() for f in futures]})
+
+    app.add_url_rule(batch_path, f"{prefix.strip('/')}_batch", batch, methods=['POST'])
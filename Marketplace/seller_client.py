@@ -6,6 +6,11 @@ import argparse
 SERVER_ADDRS = [('localhost', 5003)]
 current_server = 0
 
+# GET responses the server tagged with an ETag, revalidated with If-None-Match:
+# (path, params, session) -> (etag, result). Oldest dropped beyond the limit.
+ETAG_CACHE_SIZE = 200
+_etag_cache = {}
+
 session_id = None
 seller_id = None
 
@@ -13,6 +18,10 @@ seller_id = None
 def send(method, path, data=None, params=None):
     global session_id, seller_id, current_server
     headers = {'X-Session-ID': session_id} if session_id else {}
+    cache_key = (path, tuple(sorted((params or {}).items())), session_id)
+    cached = _etag_cache.get(cache_key) if method == 'GET' else None
+    if cached is not None:
+        headers['If-None-Match'] = cached[0]
 
     for i in range(len(SERVER_ADDRS)):
         idx = (current_server + i) % len(SERVER_ADDRS)
@@ -27,7 +36,16 @@ def send(method, path, data=None, params=None):
                 resp = requests.put(url, headers=headers, json=data, timeout=5)
             elif method == 'DELETE':
                 resp = requests.delete(url, headers=headers, timeout=5)
-            result = resp.json()
+            if resp.status_code == 304 and cached is not None:
+                result = cached[1]
+            else:
+                result = resp.json()
+                etag = resp.headers.get('ETag')
+                if method == 'GET' and etag and result.get('status') == 'success':
+                    _etag_cache.pop(cache_key, None)
+                    _etag_cache[cache_key] = (etag, result)
+                    if len(_etag_cache) > ETAG_CACHE_SIZE:
+                        del _etag_cache[next(iter(_etag_cache))]
 
             current_server = idx  # sticky to working server
 
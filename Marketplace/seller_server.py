@@ -9,7 +9,13 @@ import customer_db_pb2
 import customer_db_pb2_grpc
 import product_db_pb2
 import product_db_pb2_grpc
-from stub_pool import StubPool
+from stub_pool import (StubPool, ShardedStubPool, UserShardedStubPool,
+                        PRODUCT_DB_WRITE_METHODS, LINEARIZABLE_READS,
+                        parse_groups, parse_shard_spec)
+from single_flight import PRODUCT_DB_SHARED_READS, CoalescingPool
+from rest_batch import add_batch_route, batch_session
+import prefork
+from catalog_cache import items_etag
 
 app = Flask(__name__)
 
@@ -18,6 +24,9 @@ _product_pool = None    # StubPool for product DB replicas
 
 
 def validate_session(req):
+    batched = batch_session()
+    if batched is not None:
+        return batched, None
     session_id = req.headers.get('X-Session-ID', '')
     if not session_id:
         return None, ('Missing session', 401)
@@ -28,6 +37,19 @@ def validate_session(req):
     return resp, None
 
 
+def _etag_response(etag, body):
+    """
+    JSON response from body() tagged with etag, or an empty 304 if the
+    client's If-None-Match already names it (body() is then never built).
+    """
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(body())
+    resp.set_etag(etag)
+    return resp
+
+
 @app.route('/seller/account', methods=['POST'])
 def create_account():
     data = request.json
@@ -102,6 +124,57 @@ def register_item():
     return jsonify({'status': 'success', 'item_id': [resp.item_id.category, resp.item_id.item_id]})
 
 
+@app.route('/seller/items/bulk', methods=['POST'])
+def register_items_bulk():
+    session_resp, err = validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    seller_id = session_resp.user_id
+    data = request.json
+    resp = _product_pool.call('RegisterItems', product_db_pb2.RegisterItemsRequest(items=[
+        product_db_pb2.RegisterItemRequest(
+            seller_id=seller_id,
+            name=item['name'],
+            category=item['category'],
+            keywords=item.get('keywords', []),
+            condition=item['condition'],
+            price=item['price'],
+            quantity=item['quantity']
+        )
+        for item in data.get('items', [])
+    ]))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    results = [
+        {'status': r.status, 'item_id': [r.item_id.category, r.item_id.item_id]}
+        for r in resp.results
+    ]
+    return jsonify({'status': 'success', 'results': results})
+
+
+@app.route('/seller/items/bulk', methods=['PUT'])
+def update_items_bulk():
+    session_resp, err = validate_session(request)
+    if err:
+        return jsonify({'status': 'error', 'message': err[0]}), err[1]
+    data = request.json
+    updates = []
+    for u in data.get('updates', []):
+        cat, iid = u['item_id']
+        updates.append(product_db_pb2.ItemUpdate(
+            item_id=product_db_pb2.ItemId(category=cat, item_id=iid),
+            has_price='price' in u,
+            price=u.get('price', 0),
+            has_quantity='quantity' in u,
+            quantity=u.get('quantity', 0)
+        ))
+    resp = _product_pool.call('UpdateItems', product_db_pb2.UpdateItemsRequest(updates=updates))
+    if resp.status != 'success':
+        return jsonify({'status': 'error', 'message': resp.message}), 400
+    results = [{'status': r.status, 'message': r.message} for r in resp.results]
+    return jsonify({'status': 'success', 'results': results})
+
+
 @app.route('/seller/items/<int:cat>/<int:iid>/price', methods=['PUT'])
 def change_price(cat, iid):
     session_resp, err = validate_session(request)
@@ -131,20 +204,60 @@ def display_items():
         return jsonify({'status': 'error', 'message': err[0]}), err[1]
     seller_id = session_resp.user_id
     resp = _product_pool.call('GetSellerItems', product_db_pb2.GetSellerItemsRequest(seller_id=seller_id))
-    items = []
-    for item in resp.items:
-        items.append({
-            'item_id': [item.item_id.category, item.item_id.item_id],
-            'name': item.name,
-            'category': item.category,
-            'keywords': list(item.keywords),
-            'condition': item.condition,
-            'price': item.price,
-            'quantity': item.quantity,
-            'thumbs_up': item.thumbs_up,
-            'thumbs_down': item.thumbs_down
-        })
-    return jsonify({'status': 'success', 'items': items})
+
+    def body():
+        items = []
+        for item in resp.items:
+            items.append({
+                'item_id': [item.item_id.category, item.item_id.item_id],
+                'name': item.name,
+                'category': item.category,
+                'keywords': list(item.keywords),
+                'condition': item.condition,
+                'price': item.price,
+                'quantity': item.quantity,
+                'thumbs_up': item.thumbs_up,
+                'thumbs_down': item.thumbs_down
+            })
+        return {'status': 'success', 'items': items}
+    return _etag_response(items_etag(resp.items), body)
+
+
+@app.route('/seller/backends', methods=['GET'])
+def backend_stats():
+    """Per-replica in-flight calls and latency, as seen by this frontend."""
+    return jsonify({'status': 'success', 'customer_db': _customer_pool.stats(),
+                    'product_db': _product_pool.stats(),
+                    'coalesced_reads': _product_pool.flight.stats()})
+
+
+add_batch_route(app, '/seller', validate_session)
+
+
+def init_backends(args, customer_addrs, product_addrs):
+    """
+    Connect to the backends named on the command line. With --workers each
+    worker process calls this after the fork: gRPC channels do not survive one.
+    """
+    global _customer_pool, _product_pool
+    if args.customer_db_shards:
+        _customer_pool = UserShardedStubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
+    else:
+        _customer_pool = StubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
+    read_metadata = LINEARIZABLE_READS if args.linearizable_reads else None
+    if args.product_db_shards:
+        product_pool = ShardedStubPool(product_addrs, product_db_pb2_grpc.ProductDBStub,
+                                       write_methods=PRODUCT_DB_WRITE_METHODS,
+                                       read_metadata=read_metadata)
+    else:
+        product_pool = StubPool(product_addrs, product_db_pb2_grpc.ProductDBStub,
+                                write_methods=PRODUCT_DB_WRITE_METHODS,
+                                read_metadata=read_metadata)
+    # Identical concurrent catalog reads share one RPC. Not with linearizable
+    # reads: a read joining a call already in flight could miss a write that
+    # finished before it arrived.
+    _product_pool = CoalescingPool(
+        product_pool, () if args.linearizable_reads else PRODUCT_DB_SHARED_READS)
 
 
 if __name__ == '__main__':
@@ -153,17 +266,36 @@ if __name__ == '__main__':
     parser.add_argument('--port', type=int, default=5003)
     parser.add_argument('--customer-db-addrs', type=str, default='localhost:50051',
                         help='Comma-separated customer DB replica addresses (host:port)')
+    parser.add_argument('--customer-db-shards', type=str, default=None,
+                        help='Hash-sharded customer DB: "host:port,...;host:port,..." with the '
+                             'groups in --shard-index order (overrides --customer-db-addrs)')
     parser.add_argument('--product-db-addrs', type=str, default='localhost:50052',
                         help='Comma-separated product DB replica addresses (host:port)')
+    parser.add_argument('--product-db-shards', type=str, default=None,
+                        help='Category-sharded product DB: "first_category=host:port,...;'
+                             'first_category=host:port,..." (overrides --product-db-addrs)')
+    parser.add_argument('--linearizable-reads', action='store_true',
+                        help='Ask the product DB for linearizable (ReadIndex) reads')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Serve from this many forked worker processes sharing the port '
+                             '(SIGHUP reloads them gracefully)')
     args = parser.parse_args()
 
     customer_addrs = [a.strip() for a in args.customer_db_addrs.split(',')]
     product_addrs = [a.strip() for a in args.product_db_addrs.split(',')]
 
-    _customer_pool = StubPool(customer_addrs, customer_db_pb2_grpc.CustomerDBStub)
-    _product_pool = StubPool(product_addrs, product_db_pb2_grpc.ProductDBStub)
+    if args.customer_db_shards:
+        customer_addrs = parse_groups(args.customer_db_shards)
+    if args.product_db_shards:
+        product_addrs = parse_shard_spec(args.product_db_shards)
 
     print(f'Seller REST server on {args.host}:{args.port}')
     print(f'  Customer DB replicas: {customer_addrs}')
     print(f'  Product DB replicas: {product_addrs}')
-    app.run(host=args.host, port=args.port)
+    if args.workers > 1:
+        print(f'  Workers: {args.workers}')
+        prefork.serve(app, args.host, args.port, args.workers,
+                      lambda: init_backends(args, customer_addrs, product_addrs))
+    else:
+        init_backends(args, customer_addrs, product_addrs)
+        app.run(host=args.host, port=args.port)
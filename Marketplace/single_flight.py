@@ -0,0 +1,136 @@
+"""
+Request coalescing (single-flight) for identical concurrent reads.
+
+When many clients ask for the same thing at the same moment (a popular
+search during a traffic spike), only the first caller does the work; the
+others wait for it and get the same result, or the same exception. Nothing
+is cached: once the call returns, the next identical request runs again.
+
+    flight = SingleFlight()
+    resp = flight.do("SearchItems", key, pool.call, "SearchItems", request)
+    flight.stats()  # {"SearchItems": {"calls": 120, "shared": 95, "executed": 25}}
+
+The frontends wrap their product DB pool in a CoalescingPool (an
+AioCoalescingPool in buyer_server_aio.py); the replicated product DB servicer
+coalesces its full-scan reads the same way. Callers share one response object
+and must not modify it.
+"""
+
+import asyncio
+import threading
+from collections import Counter
+
+# Product DB reads the frontends coalesce: catalog reads that many buyers
+# make with the same arguments. Per-buyer reads (GetCart, GetBuyerPurchases)
+# are left alone so a buyer always sees their own latest writes.
+PRODUCT_DB_SHARED_READS = frozenset({
+    "GetItem", "SearchItems", "GetSellerItems", "GetSellerRating", "GetCatalogVersion",
+})
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs fn once per key among concurrent callers (see module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}          # key -> _Flight in progress
+        self.calls = Counter()      # label -> calls
+        self.shared = Counter()     # label -> calls answered by another caller's flight
+
+    def do(self, label, key, fn, *args):
+        """fn(*args), or the result of the identical call already in flight."""
+        with self._lock:
+            self.calls[label] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.shared[label] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn(*args)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        """Per label: calls, calls that shared another's flight, and flights executed."""
+        with self._lock:
+            return {
+                label: {"calls": n, "shared": self.shared[label],
+                        "executed": n - self.shared[label]}
+                for label, n in self.calls.items()
+            }
+
+
+class CoalescingPool:
+    """
+    A StubPool (or sharded pool) whose identical concurrent calls to methods
+    share one RPC; every other call goes straight through.
+
+        pool = CoalescingPool(StubPool(addrs, ProductDBStub, ...), PRODUCT_DB_SHARED_READS)
+    """
+
+    def __init__(self, pool, methods):
+        self.pool = pool
+        self.methods = frozenset(methods)
+        self.flight = SingleFlight()
+
+    def call(self, method_name: str, request, timeout=10):
+        if method_name not in self.methods:
+            return self.pool.call(method_name, request, timeout)
+        key = (method_name, request.SerializeToString(deterministic=True))
+        return self.flight.do(method_name, key, self.pool.call, method_name, request, timeout)
+
+    def stats(self):
+        return self.pool.stats()
+
+
+class AioSingleFlight(SingleFlight):
+    """SingleFlight for coroutines: callers on one event loop share one task."""
+
+    async def do(self, label, key, fn, *args):
+        """await fn(*args), or the result of the identical call already in flight."""
+        with self._lock:
+            self.calls[label] += 1
+            task = self._flights.get(key)
+            if task is None:
+                task = self._flights[key] = asyncio.ensure_future(fn(*args))
+                task.add_done_callback(lambda _: self._flights.pop(key, None))
+            else:
+                self.shared[label] += 1
+        # One caller giving up (its request cancelled) must not cancel the others'
+        return await asyncio.shield(task)
+
+
+class AioCoalescingPool(CoalescingPool):
+    """CoalescingPool over an asyncio pool (stub_pool.aio_pool())."""
+
+    def __init__(self, pool, methods):
+        super().__init__(pool, methods)
+        self.flight = AioSingleFlight()
+
+    async def call(self, method_name: str, request, timeout=10):
+        if method_name not in self.methods:
+            return await self.pool.call(method_name, request, timeout)
+        key = (method_name, request.SerializeToString(deterministic=True))
+        return await self.flight.do(method_name, key, self.pool.call, method_name, request, timeout)
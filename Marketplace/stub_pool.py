@@ -5,39 +5,261 @@ Used by seller_server.py and buyer_server.py to connect to multiple
 replicas of the customer DB and product DB backends.
 
 On a gRPC error (unavailable, deadline exceeded, etc.), the pool
-automatically tries the next replica in the list.
+automatically tries the next replica in the list. StubPool also sends Raft
+writes to the leader, balances and hedges reads, and keeps a circuit breaker
+per replica. ShardedStubPool and UserShardedStubPool spread the product and
+customer DBs over several groups, and AioStubPool (aio_pool()) makes the
+same calls from asyncio code.
 """
 
+import asyncio
+import bisect
 import grpc
 import logging
+import math
+import queue
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import health_pb2
+import health_pb2_grpc
+import product_db_pb2
 
 logger = logging.getLogger(__name__)
 
+# Trailing metadata key holding the leader's gRPC address
+# (LEADER_GRPC_KEY in product_database_replicated.py).
+LEADER_HINT_KEY = "x-raft-leader-grpc"
+
+# Request metadata asking the Raft product DB for linearizable reads
+# (READ_CONSISTENCY_KEY / READ_LINEARIZABLE in product_database_replicated.py)
+LINEARIZABLE_READS = (("x-read-consistency", "linearizable"),)
+
+# Product DB RPCs that go through Raft consensus
+PRODUCT_DB_WRITE_METHODS = frozenset({
+    "RegisterItem", "UpdateItemPrice", "UpdateItemQuantity",
+    "StoreCart", "ClearCart", "AddItemFeedback", "MakePurchase",
+    "RegisterItems", "UpdateItems", "AddFeedbackBatch", "CheckoutCart",
+})
+
+# Read balancing: weight of the newest latency sample in a replica's EWMA,
+# how fast the EWMA of an idle replica decays (seconds per factor e), so a
+# replica that was slow once gets tried again, and the latency recorded for
+# a failed call.
+EWMA_ALPHA = 0.3
+EWMA_DECAY = 10.0
+FAILURE_PENALTY = 1.0
+
+# Read hedging: delay before the second copy (a percentile of the method's
+# last HEDGE_WINDOW read latencies, once there are HEDGE_MIN_SAMPLES, taken
+# again after every HEDGE_REFRESH new ones), and the extra copies allowed
+# per read, with bursts of up to HEDGE_BURST.
+HEDGE_PERCENTILE = 0.95
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_REFRESH = 20
+HEDGE_BUDGET = 0.1
+HEDGE_BURST = 10
+
+# Circuit breakers: failures that open one, how often (and how patiently) the
+# background probe checks every replica, and, for a pool without probes, how
+# long an open breaker waits before letting a trial call through.
+BREAKER_CODES = frozenset({grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED})
+PROBE_INTERVAL = 0.5
+PROBE_TIMEOUT = 0.5
+BREAKER_COOLDOWN = 5.0
+
+# Reconnect to a restarted replica within a second, not gRPC's default
+# backoff of up to two minutes.
+CHANNEL_OPTIONS = [
+    ("grpc.initial_reconnect_backoff_ms", 100),
+    ("grpc.min_reconnect_backoff_ms", 100),
+    ("grpc.max_reconnect_backoff_ms", 1000),
+]
+
+
+def _leader_hint(call):
+    try:
+        metadata = call.trailing_metadata()
+    except Exception:
+        return None
+    return _hint_in(metadata)
+
+
+def _hint_in(metadata):
+    for key, value in metadata or ():
+        if key == LEADER_HINT_KEY:
+            return value
+    return None
+
+
+def _with_request_id(request):
+    """Copy of a write request with a new request_id, shared by all its retries."""
+    tagged = type(request)()
+    tagged.CopyFrom(request)
+    tagged.request_id = uuid.uuid4().hex
+    return tagged
+
+
+def _wait(call, timeout=None):
+    """Wait for a call future to finish, however it ends; False on timeout."""
+    try:
+        call.exception(timeout=timeout)
+    except grpc.FutureTimeoutError:
+        return False
+    except grpc.FutureCancelledError:
+        pass
+    return True
+
+
+class _Abandoned(grpc.RpcError):
+    """A read cancelled because the health probe opened its replica's breaker."""
+
+    def __init__(self, address):
+        super().__init__(f"{address} failed its health probe")
+        self.address = address
+
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+    def details(self):
+        return str(self)
+
+
+class ReplicaStats:
+    """One replica's in-flight calls, latency EWMA and circuit breaker, as seen by one StubPool."""
+
+    def __init__(self, address):
+        self.address = address
+        self.inflight = 0
+        self.calls = 0
+        self.errors = 0
+        self.breaker_open = False
+        self._retry_at = 0.0
+        self.reads = set()          # in-flight reads (futures) the probe may abandon
+        self.abandoned = set()      # reads cancelled by the probe
+        self._ewma = 0.0
+        self._stamp = time.monotonic()
+
+    def ewma(self, now):
+        """Latency EWMA in seconds, decayed over the time since the last sample."""
+        return self._ewma * math.exp(-(now - self._stamp) / EWMA_DECAY)
+
+    def cost(self, now):
+        return self.ewma(now) * (self.inflight + 1)
+
+    def record(self, latency, now):
+        ewma = self.ewma(now)
+        self._ewma = ewma + EWMA_ALPHA * (latency - ewma)
+        self._stamp = now
+
+    def allows(self, now):
+        """Breaker closed, or open and due a trial call (one per BREAKER_COOLDOWN)."""
+        return not self.breaker_open or now >= self._retry_at
+
+    def claim_trial(self, now):
+        """A call goes to this replica: if its open breaker was due a trial, this is it."""
+        if self.breaker_open and now >= self._retry_at:
+            self._retry_at = now + BREAKER_COOLDOWN
+
+    def trip(self, now):
+        self.breaker_open = True
+        self._retry_at = now + BREAKER_COOLDOWN
+
+    def recover(self, now):
+        """Close the breaker and forget the latency of the outage, so reads find the replica again."""
+        self.breaker_open = False
+        self._ewma = 0.0
+        self._stamp = now
+
 
 class StubPool:
     """
     Maintains gRPC stubs to multiple replicas and provides failover.
 
+    Given a set of write methods (the Raft product DB), the pool sends writes
+    straight to the leader named by the hint in the DB's trailing metadata,
+    saving the follower-to-leader hop, and balances reads by power of two
+    choices: of two random replicas the read goes to the one with the lower
+    latency EWMA x (in-flight calls + 1) (ReplicaStats, see stats()). Two
+    random candidates rather than the cheapest keep concurrent callers from
+    all piling onto one replica. Without write methods (the customer DB,
+    where a session written through one replica may not be delivered on
+    another yet) every call stays on one sticky replica.
+
+    Balanced reads are hedged: a read the chosen replica has not answered
+    within the HEDGE_PERCENTILE of the method's recent read latencies goes
+    to the next replica too, and the first answer wins. The loser is left
+    to finish so its replica's EWMA gets its real latency, but it is kept
+    out of the hedge delay's samples, which are the times callers waited. A
+    token bucket holds the extra copies to hedge_budget of the reads.
+
+    Each replica has a circuit breaker, opened by a call failing with
+    UNAVAILABLE or DEADLINE_EXCEEDED or by the health probe (Health.Check,
+    health.py, every probe_interval), and closed by a passing probe. Calls
+    skip replicas whose breaker is open unless every one is; balanced reads
+    waiting on a replica whose probe fails move on at once, writes are left
+    to their deadline since the replica may still apply them.
+
+    Write requests with a request_id field get a fresh one (on a copy)
+    unless the caller set it, so every retry carries the same id and the DB
+    applies the write once. read_metadata goes with every read, e.g.
+    LINEARIZABLE_READS.
+
     Usage:
         pool = StubPool(["host1:50051", "host2:50051"], CustomerDBStub)
         result = pool.call("GetUser", request)
+
+        # Raft-backed service: writes to the leader, reads balanced
+        pool = StubPool(addrs, ProductDBStub, write_methods=PRODUCT_DB_WRITE_METHODS)
+        pool.stats()   # per-replica in-flight calls and latency
     """
 
-    def __init__(self, addresses: list, stub_class):
+    def __init__(self, addresses: list, stub_class, write_methods=None, read_metadata=None,
+                 hedge_budget=HEDGE_BUDGET, probe_interval=PROBE_INTERVAL):
         self.addresses = addresses
         self.stub_class = stub_class
+        self.write_methods = frozenset(write_methods or ())
+        self.read_metadata = read_metadata
         self.channels = []
         self.stubs = []
         self.current = 0
+        self.leader = None        # index of the last hinted leader
+        self.replica_stats = [ReplicaStats(addr) for addr in addresses]
+        self._stats_lock = threading.Lock()
+        self.hedge_budget = hedge_budget    # 0 disables hedging
+        self.hedges = 0                     # hedged reads sent
+        self._hedge_tokens = HEDGE_BURST
+        self._read_latencies = defaultdict(lambda: deque(maxlen=HEDGE_WINDOW))
+        self._hedge_delays = {}             # method -> (samples taken since, delay)
+        self._health_stubs = []
+        self._closed = threading.Event()
 
         for addr in addresses:
-            channel = grpc.insecure_channel(addr)
+            channel = grpc.insecure_channel(addr, options=CHANNEL_OPTIONS)
             self.channels.append(channel)
             self.stubs.append(stub_class(channel))
+            self._health_stubs.append(health_pb2_grpc.HealthStub(channel))
+
+        self.probe_interval = probe_interval    # 0 disables the health probe
+        if probe_interval > 0:
+            threading.Thread(target=self._probe_loop, daemon=True,
+                             name=f"probe-{stub_class.__name__}").start()
 
         logger.info("StubPool created for %s with %d replicas: %s",
                      stub_class.__name__, len(addresses), addresses)
 
+    def close(self):
+        """Stop the health probe and close the channels."""
+        self._closed.set()
+        for channel in self.channels:
+            channel.close()
+
     def call(self, method_name: str, request, timeout=10):
         """
         Call a gRPC method, trying each replica on failure.
@@ -45,21 +267,685 @@ class StubPool:
         Returns the gRPC response on success.
         Raises the last exception if all replicas fail.
         """
+        if "request_id" in request.DESCRIPTOR.fields_by_name and not request.request_id:
+            request = _with_request_id(request)
+        if method_name in self.write_methods:
+            return self._call_leader(method_name, request, timeout)
+        if not self.write_methods:
+            return self._call_sticky(method_name, request, timeout, self.read_metadata)
+        return self._call_spread(method_name, request, timeout)
+
+    def _call_sticky(self, method_name, request, timeout, metadata=None):
         last_error = None
-        for i in range(len(self.stubs)):
-            idx = (self.current + i) % len(self.stubs)
+        for idx in self._sticky_order():
             try:
-                method = getattr(self.stubs[idx], method_name)
-                result = method(request, timeout=timeout)
+                result = self._invoke(idx, method_name, request, timeout, metadata)
                 self.current = idx  # sticky to working replica
                 return result
             except grpc.RpcError as e:
                 last_error = e
-                logger.warning(
-                    "StubPool: %s failed on %s, trying next replica. Error: %s",
-                    method_name, self.addresses[idx], e.code() if hasattr(e, 'code') else e,
-                )
+                self._log_failure(method_name, idx, e)
+                continue
+
+        logger.error("StubPool: all %d replicas failed for %s", len(self.stubs), method_name)
+        raise last_error
+
+    def _call_leader(self, method_name, request, timeout):
+        """Send a write to the hinted leader, following new hints on failure."""
+        order = self._leader_order()
+        last_error = None
+        tried = set()
+        while order:
+            idx = order.pop(0)
+            if idx in tried:
+                continue
+            tried.add(idx)
+            try:
+                result, call = self._invoke(idx, method_name, request, timeout, with_call=True)
+                self._update_leader(_leader_hint(call))
+                return result
+            except grpc.RpcError as e:
+                last_error = e
+                self._log_failure(method_name, idx, e)
+                if self.leader == idx:
+                    self.leader = None
+                if self._update_leader(_leader_hint(e)):
+                    order.insert(0, self.leader)
+                continue
+
+        logger.error("StubPool: all %d replicas failed for %s", len(self.stubs), method_name)
+        raise last_error
+
+    def _call_spread(self, method_name, request, timeout):
+        """Send a read to the cheaper of two random replicas, then the others by cost."""
+        order = self._balanced_order()
+        last_error = None
+        delay = self._hedge_delay(method_name) if len(order) > 1 else None
+        if delay is not None:
+            result, last_error, tried = self._call_hedged(method_name, request, timeout,
+                                                          order, delay)
+            if last_error is None:
+                return result
+            order = order[tried:]
+        for idx in order:
+            call, start = self._start_read(idx, method_name, request, timeout)
+            _wait(call)
+            result, last_error = self._end_read(idx, method_name, start, call)
+            if last_error is None:
+                return result
+
+        logger.error("StubPool: all %d replicas failed for %s", len(self.stubs), method_name)
+        raise last_error
+
+    def _sticky_order(self):
+        n = len(self.stubs)
+        return self._skip_open([(self.current + i) % n for i in range(n)])
+
+    def _leader_order(self):
+        leader = self.leader
+        order = list(range(len(self.stubs)))
+        if leader is not None:
+            order.remove(leader)
+            order.insert(0, leader)
+        return self._skip_open(order)
+
+    def _skip_open(self, order):
+        """order without the replicas whose breaker is open (all of it if every one is)."""
+        now = time.monotonic()
+        with self._stats_lock:
+            usable = [idx for idx in order if self.replica_stats[idx].allows(now)]
+        return usable or order
+
+    def _balanced_order(self):
+        now = time.monotonic()
+        with self._stats_lock:
+            costs = [s.cost(now) for s in self.replica_stats]
+        order = sorted(self._skip_open(range(len(costs))), key=costs.__getitem__)
+        if len(order) > 1:
+            a, b = random.sample(order, 2)
+            first = a if costs[a] <= costs[b] else b
+            order.remove(first)
+            order.insert(0, first)
+        return order
+
+    def _call_hedged(self, method_name, request, timeout, order, delay):
+        """
+        Read from order[0]; if it has not answered after delay seconds and the
+        budget allows, from order[1] too. Returns (result, error, replicas
+        tried): the first success, or the last error once every copy failed.
+        """
+        idx = order[0]
+        call, start = self._start_read(idx, method_name, request, timeout)
+        if _wait(call, delay):
+            result, error = self._end_read(idx, method_name, start, call)
+            return result, error, 1
+
+        # Slow: race a second copy, if the budget allows one
+        finished = queue.SimpleQueue()
+        answered = threading.Event()
+        calls = {idx: call}
+        self._watch(call, idx, method_name, start, finished, answered)
+        if self._take_hedge_token():
+            hedge, hedge_start = self._start_read(order[1], method_name, request, timeout)
+            calls[order[1]] = hedge
+            self._watch(hedge, order[1], method_name, hedge_start, finished, answered)
+        for pending in range(len(calls) - 1, -1, -1):
+            call, result, error = finished.get()
+            if error is not None:
+                if not pending:
+                    return None, error, len(calls)
+                continue
+            answered.set()      # the loser finishes on its own (see the class docstring)
+            return result, None, len(calls)
+
+    def _watch(self, call, idx, method_name, start, finished, answered):
+        """Record call's outcome when it ends and put (call, result, error) on finished."""
+
+        def done(call):
+            outcome = self._end_read(idx, method_name, start, call, sample=not answered.is_set())
+            finished.put((call,) + outcome)
+
+        call.add_done_callback(done)
+
+    def _start_read(self, idx, method_name, request, timeout):
+        """Send a read to replica idx that the health probe may abandon; returns (call, start)."""
+        start = self._begin(idx)
+        call = getattr(self.stubs[idx], method_name).future(
+            request, timeout=timeout, metadata=self.read_metadata)
+        with self._stats_lock:
+            self.replica_stats[idx].reads.add(call)
+        return call, start
+
+    def _end_read(self, idx, method_name, start, call, sample=True):
+        """
+        Record a finished read from _start_read(); returns (result, error).
+        sample=False keeps its latency out of the hedge delay's samples.
+        """
+        stats = self.replica_stats[idx]
+        with self._stats_lock:
+            stats.reads.discard(call)
+            abandoned = call in stats.abandoned
+            stats.abandoned.discard(call)
+        if call.cancelled():
+            if not abandoned:
+                # Cancelled by close(): cut short, its latency means nothing
+                self._forget(idx)
+                return None, None
+            error = _Abandoned(stats.address)
+        else:
+            error = call.exception()
+        self._end(idx, method_name, start, error, sample)
+        if error is not None:
+            self._log_failure(method_name, idx, error)
+            return None, error
+        return call.result(), None
+
+    def _hedge_delay(self, method_name):
+        """Hedge delay for a read of method_name, or None to send it once."""
+        if self.hedge_budget <= 0:
+            return None
+        with self._stats_lock:
+            self._hedge_tokens = min(HEDGE_BURST, self._hedge_tokens + self.hedge_budget)
+            fresh, delay = self._hedge_delays.get(method_name, (HEDGE_REFRESH, None))
+            if fresh < HEDGE_REFRESH:
+                return delay
+            samples = self._read_latencies[method_name]
+            if len(samples) < HEDGE_MIN_SAMPLES:
+                return None
+            delay = sorted(samples)[int(HEDGE_PERCENTILE * (len(samples) - 1))]
+            self._hedge_delays[method_name] = (0, delay)
+            return delay
+
+    def _take_hedge_token(self):
+        with self._stats_lock:
+            if self._hedge_tokens < 1:
+                return False
+            self._hedge_tokens -= 1
+            self.hedges += 1
+            return True
+
+    def _invoke(self, idx, method_name, request, timeout, metadata=None, with_call=False):
+        """Call method_name on replica idx, recording its in-flight count and latency."""
+        method = getattr(self.stubs[idx], method_name)
+        if with_call:
+            method = method.with_call
+        start = self._begin(idx)
+        try:
+            result = method(request, timeout=timeout, metadata=metadata)
+        except grpc.RpcError as e:
+            self._end(idx, method_name, start, e)
+            raise
+        self._end(idx, method_name, start)
+        return result
+
+    def _begin(self, idx):
+        now = time.monotonic()
+        with self._stats_lock:
+            stats = self.replica_stats[idx]
+            stats.inflight += 1
+            stats.claim_trial(now)
+        return now
+
+    def _forget(self, idx):
+        """End a call on replica idx without recording its latency or outcome."""
+        with self._stats_lock:
+            self.replica_stats[idx].inflight -= 1
+
+    def _end(self, idx, method_name, start, error=None, sample=True):
+        """
+        Record the end of a call on replica idx, failed with error or
+        successful. A successful read is a hedge delay sample if sample is set.
+        """
+        now = time.monotonic()
+        stats = self.replica_stats[idx]
+        with self._stats_lock:
+            stats.inflight -= 1
+            stats.calls += 1
+            if error is not None:
+                stats.errors += 1
+                stats.record(max(now - start, FAILURE_PENALTY), now)
+                if error.code() in BREAKER_CODES and not stats.breaker_open:
+                    stats.trip(now)
+                    logger.warning("StubPool: breaker for %s opened (%s)",
+                                   stats.address, error.code())
+                return
+            stats.breaker_open = False
+            if stats.calls > 1:     # the first call also paid for connecting
+                stats.record(now - start, now)
+                if sample and self.write_methods and method_name not in self.write_methods:
+                    self._read_latencies[method_name].append(now - start)
+                    fresh, delay = self._hedge_delays.get(method_name, (0, None))
+                    self._hedge_delays[method_name] = (fresh + 1, delay)
+
+    def probe(self):
+        """Health-check every replica once, opening or closing its breaker."""
+        calls = [stub.Check.future(health_pb2.HealthCheckRequest(), timeout=PROBE_TIMEOUT)
+                 for stub in self._health_stubs]
+        for stats, call in zip(self.replica_stats, calls):
+            try:
+                healthy = call.result().status == health_pb2.HealthCheckResponse.SERVING
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    healthy = True      # up, but without the health service
+                elif e.code() in BREAKER_CODES:
+                    healthy = False
+                else:
+                    continue            # e.g. shed by admission control: no news
+            with self._stats_lock:
+                if healthy != stats.breaker_open:
+                    continue
+                if healthy:
+                    stats.recover(time.monotonic())
+                    abandoned = ()
+                else:
+                    stats.trip(time.monotonic())
+                    abandoned = list(stats.reads)
+                    stats.abandoned.update(abandoned)
+            logger.info("StubPool: health probe %s breaker for %s",
+                        "closed" if healthy else "opened", stats.address)
+            # Reads stuck on a failed replica fail over now, not at their deadline
+            for call in abandoned:
+                if not call.cancel():
+                    with self._stats_lock:
+                        stats.abandoned.discard(call)
+
+    def _probe_loop(self):
+        while not self._closed.wait(self.probe_interval):
+            try:
+                self.probe()
+            except ValueError:      # channels closed under us
+                return
+            except Exception:
+                logger.exception("StubPool: health probe failed")
+
+    def stats(self):
+        """Per-replica load as seen by this pool: in-flight calls, latency EWMA, totals, breaker."""
+        now = time.monotonic()
+        with self._stats_lock:
+            return [
+                {
+                    "address": s.address,
+                    "inflight": s.inflight,
+                    "ewma_ms": round(s.ewma(now) * 1000, 2),
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "breaker": "open" if s.breaker_open else "closed",
+                    "leader": i == self.leader,
+                }
+                for i, s in enumerate(self.replica_stats)
+            ]
+
+    def _update_leader(self, hint):
+        """Record a leader hint; returns True if it named a replica in the pool."""
+        if hint is None or hint not in self.addresses:
+            return False
+        idx = self.addresses.index(hint)
+        if idx != self.leader:
+            logger.info("StubPool: %s leader is now %s", self.stub_class.__name__, hint)
+            self.leader = idx
+        return True
+
+    def _log_failure(self, method_name, idx, e):
+        logger.warning(
+            "StubPool: %s failed on %s, trying next replica. Error: %s",
+            method_name, self.addresses[idx], e.code() if hasattr(e, 'code') else e,
+        )
+
+
+def parse_shard_spec(spec):
+    """
+    Parse "first_category=addr,addr;first_category=addr,..." into
+    [(first_category, [addr, ...])]. Each shard owns the categories from its
+    first category up to the next shard's.
+    """
+    shards = []
+    for part in spec.split(';'):
+        if not part.strip():
+            continue
+        first, addrs = part.split('=', 1)
+        shards.append((int(first), [a.strip() for a in addrs.split(',')]))
+    return shards
+
+
+class ShardedStubPool:
+    """
+    Routes product DB calls over category-sharded Raft groups, one StubPool
+    per group. Calls keyed by category go to the owning group; searches
+    without a category and seller and buyer lookups fan out to every group
+    in parallel and the results are merged.
+
+    Usage:
+        pool = ShardedStubPool([(0, ["h1:50052", "h2:50052"]), (5, ["h3:50052"])],
+                               ProductDBStub, write_methods=PRODUCT_DB_WRITE_METHODS)
+        result = pool.call("GetItem", request)   # same interface as StubPool
+
+    Carts are keyed by buyer and live on the first shard. CheckoutCart is
+    atomic within one shard only, so a cart spanning shards is refused.
+    """
+
+    # Calls whose request names the category directly or through item_id
+    _BY_CATEGORY = {
+        "RegisterItem": lambda r: r.category,
+        "GetItem": lambda r: r.item_id.category,
+        "UpdateItemPrice": lambda r: r.item_id.category,
+        "UpdateItemQuantity": lambda r: r.item_id.category,
+        "AddItemFeedback": lambda r: r.item_id.category,
+        "MakePurchase": lambda r: r.item_id.category,
+    }
+    _CART_METHODS = frozenset({"StoreCart", "GetCart", "ClearCart"})
+
+    def __init__(self, shards, stub_class, write_methods=None, read_metadata=None):
+        shards = sorted(shards)
+        self.starts = [first for first, _ in shards]
+        self.pools = [StubPool(addrs, stub_class, write_methods, read_metadata)
+                      for _, addrs in shards]
+        self._fanout = ThreadPoolExecutor(max_workers=4 * len(self.pools))
+
+        logger.info("ShardedStubPool created for %s with %d shards starting at categories %s",
+                    stub_class.__name__, len(self.pools), self.starts)
+
+    def shard_for(self, category):
+        """Index of the shard owning category."""
+        return max(bisect.bisect_right(self.starts, category) - 1, 0)
+
+    def call(self, method_name: str, request, timeout=10):
+        if method_name in self._BY_CATEGORY:
+            shard = self.shard_for(self._BY_CATEGORY[method_name](request))
+            return self.pools[shard].call(method_name, request, timeout)
+        if method_name in self._CART_METHODS:
+            return self.pools[0].call(method_name, request, timeout)
+        if method_name in ("SearchItems", "GetCatalogVersion") and request.has_category:
+            return self.pools[self.shard_for(request.category)].call(method_name, request, timeout)
+        # Each shard's catalog version only grows, so their sum changes
+        # whenever any shard's does.
+        if method_name in ("SearchItems", "GetSellerItems"):
+            responses = self._fan_out(method_name, [request] * len(self.pools), timeout)
+            merged = product_db_pb2.GetItemsResponse(status='success', message='')
+            for resp in responses:
+                if resp.status != 'success':
+                    return resp
+                merged.items.extend(resp.items)
+                merged.catalog_version += resp.catalog_version
+            return merged
+        if method_name == "GetCatalogVersion":
+            responses = self._fan_out(method_name, [request] * len(self.pools), timeout)
+            merged = product_db_pb2.CatalogVersionResponse(status='success', message='')
+            for resp in responses:
+                if resp.status != 'success':
+                    return resp
+                merged.version += resp.version
+            return merged
+        if method_name == "GetItems":
+            positions = [[] for _ in self.pools]
+            for item_id in request.item_ids:
+                positions[self.shard_for(item_id.category)].append(item_id)
+            requests = [product_db_pb2.ItemIdsRequest(item_ids=ids) if ids else None
+                        for ids in positions]
+            merged = product_db_pb2.GetItemsResponse(status='success', message='')
+            for resp in self._fan_out(method_name, requests, timeout):
+                if resp.status != 'success':
+                    return resp
+                merged.items.extend(resp.items)
+            return merged
+        if method_name == "GetSellerRating":
+            # Seller feedback is counted on the shard of the rated item
+            responses = self._fan_out(method_name, [request] * len(self.pools), timeout)
+            merged = product_db_pb2.GetSellerRatingResponse(status='success', message='')
+            for resp in responses:
+                if resp.status != 'success':
+                    return resp
+                merged.thumbs_up += resp.thumbs_up
+                merged.thumbs_down += resp.thumbs_down
+            return merged
+        if method_name == "GetBuyerPurchases":
+            responses = self._fan_out(method_name, [request] * len(self.pools), timeout)
+            purchases = []
+            for resp in responses:
+                if resp.status != 'success':
+                    return resp
+                purchases.extend(resp.purchases)
+            purchases.sort(key=lambda p: p.timestamp)
+            return product_db_pb2.GetBuyerPurchasesResponse(
+                status='success', message='', purchases=purchases)
+        if method_name == "RegisterItems":
+            return self._split_batch(method_name, request, "items", lambda r: r.category,
+                                     product_db_pb2.RegisterItemsResponse,
+                                     product_db_pb2.RegisterItemResponse, timeout)
+        if method_name == "UpdateItems":
+            return self._split_batch(method_name, request, "updates", lambda u: u.item_id.category,
+                                     product_db_pb2.BatchStatusResponse,
+                                     product_db_pb2.StatusResponse, timeout)
+        if method_name == "AddFeedbackBatch":
+            return self._split_batch(method_name, request, "feedback", lambda f: f.item_id.category,
+                                     product_db_pb2.BatchStatusResponse,
+                                     product_db_pb2.StatusResponse, timeout)
+        if method_name == "CheckoutCart":
+            return self._checkout_cart(request, timeout)
+        raise ValueError(f"ShardedStubPool cannot route {method_name}")
+
+    def stats(self):
+        """StubPool.stats() of every shard's replicas, tagged with the shard index."""
+        return [dict(entry, shard=i) for i, pool in enumerate(self.pools) for entry in pool.stats()]
+
+    def _fan_out(self, method_name, requests, timeout):
+        """Send requests[i] to shard i in parallel; returns the responses in shard order."""
+        calls = [self._fanout.submit(pool.call, method_name, req, timeout)
+                 for pool, req in zip(self.pools, requests) if req is not None]
+        return [c.result() for c in calls]
+
+    def _split_batch(self, method_name, request, field, category_of, response_class,
+                     result_class, timeout):
+        """Split a batch request by shard and reassemble the results in request order."""
+        entries = getattr(request, field)
+        positions = [[] for _ in self.pools]
+        for i, entry in enumerate(entries):
+            positions[self.shard_for(category_of(entry))].append(i)
+        # A caller's request_id carries over to every shard's part of the batch
+        requests = [
+            type(request)(**{field: [entries[i] for i in idxs]},
+                          request_id=f"{request.request_id}/{shard}" if request.request_id else "")
+            if idxs else None
+            for shard, idxs in enumerate(positions)
+        ]
+        shards = [s for s, idxs in enumerate(positions) if idxs]
+        responses = self._fan_out(method_name, requests, timeout)
+
+        results = [None] * len(entries)
+        merged = response_class(status='success', message='')
+        for shard, resp in zip(shards, responses):
+            if resp.status != 'success':
+                merged.status, merged.message = resp.status, resp.message
+                for i in positions[shard]:
+                    results[i] = result_class(status=resp.status, message=resp.message)
+                continue
+            for i, result in zip(positions[shard], resp.results):
+                results[i] = result
+        merged.results.extend(results)
+        return merged
+
+    def _checkout_cart(self, request, timeout):
+        items = list(request.items)
+        use_stored = not items
+        if use_stored:
+            cart = self.pools[0].call("GetCart", product_db_pb2.BuyerIdRequest(
+                buyer_id=request.buyer_id), timeout)
+            items = list(cart.cart)
+            if not items:
+                return product_db_pb2.CheckoutCartResponse(status='error', message='Cart is empty')
+        shards = {self.shard_for(ci.item_id.category) for ci in items}
+        if len(shards) > 1:
+            return product_db_pb2.CheckoutCartResponse(
+                status='error',
+                message='Cart spans several product DB shards; check out one shard at a time',
+                failed_items=[ci.item_id for ci in items
+                              if self.shard_for(ci.item_id.category) != min(shards)],
+            )
+        shard = shards.pop()
+        if use_stored and shard == 0:
+            # Cart and items on one shard: check out and clear in one command
+            return self.pools[0].call("CheckoutCart", request, timeout)
+        resp = self.pools[shard].call("CheckoutCart", product_db_pb2.CheckoutCartRequest(
+            buyer_id=request.buyer_id, items=items, request_id=request.request_id), timeout)
+        if resp.status == 'success' and use_stored:
+            self.pools[0].call("ClearCart", product_db_pb2.BuyerIdRequest(
+                buyer_id=request.buyer_id), timeout)
+        return resp
+
+
+def parse_groups(spec):
+    """Parse "addr,addr;addr,addr" into [[addr, addr], [addr, addr]] (one list per group)."""
+    return [[a.strip() for a in group.split(',')] for group in spec.split(';') if group.strip()]
+
+
+class UserShardedStubPool:
+    """
+    Routes customer DB calls over hash-sharded broadcast groups.
+
+    Usage:
+        pool = UserShardedStubPool([["h1:50051", "h2:50051"], ["h3:50051"]], CustomerDBStub)
+        result = pool.call("GetSession", request)   # same interface as StubPool
+
+    Group i must run with --shard-index i --shard-count len(groups). A user
+    lives on the group chosen by a crc32 of the username; the user's sessions
+    are created on the group owning the user id and tagged with its index.
+    """
+
+    def __init__(self, groups, stub_class):
+        self.pools = [StubPool(addrs, stub_class) for addrs in groups]
+
+        logger.info("UserShardedStubPool created for %s with %d groups",
+                    stub_class.__name__, len(self.pools))
+
+    def shard_for_username(self, username):
+        return zlib.crc32(username.encode()) % len(self.pools)
+
+    def shard_for_user_id(self, user_id):
+        return user_id % len(self.pools)
+
+    def shard_for_session(self, session_id):
+        tag, sep, _ = session_id.partition(':')
+        if sep and tag.isdigit() and int(tag) < len(self.pools):
+            return int(tag)
+        return 0
+
+    def call(self, method_name: str, request, timeout=10):
+        if method_name in ("StoreUser", "GetUser"):
+            shard = self.shard_for_username(request.username)
+        elif method_name == "StoreSession":
+            shard = self.shard_for_user_id(request.user_id)
+        elif method_name in ("GetSession", "UpdateSessionActivity", "DeleteSession"):
+            shard = self.shard_for_session(request.session_id)
+        else:
+            raise ValueError(f"UserShardedStubPool cannot route {method_name}")
+        return self.pools[shard].call(method_name, request, timeout)
+
+    def stats(self):
+        """StubPool.stats() of every group's replicas, tagged with the group index."""
+        return [dict(entry, shard=i) for i, pool in enumerate(self.pools) for entry in pool.stats()]
+
+
+class AioStubPool:
+    """
+    asyncio front for a StubPool, for frontends serving on an event loop.
+
+    Calls go over grpc.aio channels to the same replicas, so a call in flight
+    holds no thread. Where they go (writes to the leader, reads sticky or
+    balanced), the breakers and the stats are the wrapped pool's, kept
+    current by its health probe. Reads are not hedged, and a read waiting on
+    a replica whose probe fails waits for its deadline.
+
+    Usage (on the loop that will make the calls; aio channels belong to it):
+        pool = AioStubPool(StubPool(addrs, ProductDBStub, write_methods=...))
+        result = await pool.call("GetItem", request)
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.channels = [grpc.aio.insecure_channel(addr, options=CHANNEL_OPTIONS)
+                         for addr in pool.addresses]
+        self.stubs = [pool.stub_class(channel) for channel in self.channels]
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+        self.pool.close()
+
+    async def call(self, method_name: str, request, timeout=10):
+        """StubPool.call(), awaited."""
+        pool = self.pool
+        if "request_id" in request.DESCRIPTOR.fields_by_name and not request.request_id:
+            request = _with_request_id(request)
+        write = method_name in pool.write_methods
+        metadata = None if write else pool.read_metadata
+        if write:
+            order = pool._leader_order()
+        elif not pool.write_methods:
+            order = pool._sticky_order()
+        else:
+            order = pool._balanced_order()
+        last_error = None
+        tried = set()
+        while order:
+            idx = order.pop(0)
+            if idx in tried:
+                continue
+            tried.add(idx)
+            start = pool._begin(idx)
+            call = getattr(self.stubs[idx], method_name)(request, timeout=timeout,
+                                                         metadata=metadata)
+            try:
+                result = await call
+            except grpc.RpcError as e:
+                pool._end(idx, method_name, start, e)
+                last_error = e
+                pool._log_failure(method_name, idx, e)
+                if write:
+                    if pool.leader == idx:
+                        pool.leader = None
+                    if pool._update_leader(_leader_hint(e)):
+                        order.insert(0, pool.leader)
                 continue
+            except asyncio.CancelledError:
+                # The caller went away: the call is cancelled with it, and
+                # says nothing about the replica
+                pool._forget(idx)
+                raise
+            pool._end(idx, method_name, start)
+            if write:
+                pool._update_leader(_hint_in(await call.trailing_metadata()))
+            elif not pool.write_methods:
+                pool.current = idx
+            return result
 
         logger.error("StubPool: all %d replicas failed for %s", len(self.stubs), method_name)
         raise last_error
+
+    def stats(self):
+        return self.pool.stats()
+
+
+class _ExecutorPool:
+    """asyncio front for a pool without one of its own: blocking calls in the loop's executor."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def close(self):
+        pass
+
+    async def call(self, method_name: str, request, timeout=10):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.pool.call, method_name, request, timeout)
+
+    def stats(self):
+        return self.pool.stats()
+
+
+def aio_pool(pool):
+    """
+    asyncio front for pool: an AioStubPool for a StubPool. A sharded pool's
+    calls (routing, fan-out, merging) still run on executor threads.
+    """
+    if isinstance(pool, StubPool):
+        return AioStubPool(pool)
+    return _ExecutorPool(pool)
@@ -0,0 +1,392 @@
+"""
+Endpoint tests for the buyer frontend (buyer_server.py).
+
+The app is driven through Flask's test client. Its gRPC pools are replaced
+by InProcessPool, which calls the single-node SQLite servicers
+(product_database.py, customer_database.py) directly, and payments by
+FakePayments. Verifies:
+1. POST /buyer/feedback/batch applies every entry in one AddFeedbackBatch
+   call and answers one result per entry.
+2. POST /buyer/checkout charges the card only for a cart the stock can
+   fill, given in the body or saved.
+3. Item and search reads carry an ETag and answer an If-None-Match that
+   still names it with an empty 304, until an item in the answer changes.
+4. POST /buyer/cart/validate checks one line, or a list of lines with one
+   GetItems call and one result per line.
+5. POST /buyer/batch runs its requests under the batch's session, passes
+   on their other headers and refuses a request with its own session.
+6. A purchase or checkout only captures its payment once it is recorded;
+   one that fails after the card was authorized, or raises, voids it.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import customer_database
+import product_database
+import product_db_pb2
+import buyer_server
+from catalog_cache import CatalogCache
+from single_flight import PRODUCT_DB_SHARED_READS, CoalescingPool
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+CARD = {"name": "Ann", "card_number": "4111 1111 1111 1111",
+        "expiration_date": "12/30", "security_code": "123"}
+DECLINED_CARD = dict(CARD, card_number="0000")
+
+
+class InProcessPool:
+    """Stands in for a StubPool: calls the servicer's methods directly, no gRPC."""
+
+    def __init__(self, servicer):
+        self.servicer = servicer
+        self.calls = Counter()      # method name -> calls
+        self.hooks = {}             # method name -> callable run before each call
+
+    def call(self, method_name, request, timeout=10):
+        self.calls[method_name] += 1
+        if method_name in self.hooks:
+            self.hooks[method_name]()
+        return getattr(self.servicer, method_name)(request, None)
+
+    def stats(self):
+        return []
+
+
+class FakePayments:
+    """
+    Stands in for PaymentClient: declines DECLINED_CARD, holds any other
+    card, and charges a hold when it is captured.
+    """
+
+    def __init__(self):
+        self.holds = {}             # hold id -> card number
+        self.charged = []           # card numbers of captured holds
+        self.voided = []            # card numbers of voided holds
+
+    def authorize(self, name, card_number, expiration_date, security_code):
+        future = Future()
+        future.set_result(self._hold(card_number))
+        return future
+
+    def capture(self, hold):
+        self.charged.append(self.holds.pop(hold))
+        return True
+
+    def release(self, payment):
+        hold = payment.result()
+        if hold is not None:
+            self.voided.append(self.holds.pop(hold))
+
+    def stats(self):
+        return {"held": len(self.holds), "charged": len(self.charged),
+                "voided": len(self.voided)}
+
+    def _hold(self, card_number):
+        if card_number == DECLINED_CARD["card_number"]:
+            return None
+        hold = f"hold-{len(self.holds) + len(self.charged) + len(self.voided)}"
+        self.holds[hold] = card_number
+        return hold
+
+
+def sqlite_pools(tmpdir):
+    """InProcessPools over fresh SQLite backends in tmpdir: (customer pool, product pool)."""
+    customer_database.DB_FILE = os.path.join(tmpdir, "customer_data.db")
+    product_database.DB_FILE = os.path.join(tmpdir, "product_data.db")
+    customer_database.init_db()
+    product_database.init_db()
+    return (InProcessPool(customer_database.CustomerDBServicer()),
+            InProcessPool(product_database.ProductDBServicer()))
+
+
+def init_backends(server, tmpdir):
+    """
+    Point buyer_server's pools at fresh SQLite backends in tmpdir. Returns
+    the InProcessPools underneath: (customer pool, product pool).
+    """
+    customer_pool, product_pool = sqlite_pools(tmpdir)
+    server._customer_pool = customer_pool
+    server._product_pool = CoalescingPool(product_pool, PRODUCT_DB_SHARED_READS)
+    server._catalog = CatalogCache(server._product_pool, staleness=0)
+    server._payments = FakePayments()
+    return customer_pool, product_pool
+
+
+def register_item(product_pool, name, quantity, price=5.0, category=1):
+    """Register an item straight in the product DB; returns its [category, item_id]."""
+    resp = product_pool.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+        seller_id=7, name=name, category=category, keywords=[name.lower()],
+        condition="new", price=price, quantity=quantity))
+    return [resp.item_id.category, resp.item_id.item_id]
+
+
+def _client():
+    """A test client of buyer_server.app over fresh backends: (client, product pool)."""
+    _, product_pool = init_backends(buyer_server, tempfile.mkdtemp())
+    return buyer_server.app.test_client(), product_pool
+
+
+def _login(client, username="ann"):
+    """Create a buyer account and log in; returns the session headers."""
+    client.post("/buyer/account", json={"username": username, "password": "pw", "name": "Ann"})
+    resp = client.post("/buyer/login", json={"username": username, "password": "pw"})
+    assert resp.status_code == 200, resp.get_json()
+    return {"X-Session-ID": resp.get_json()["session_id"]}
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Batched feedback
+# ---------------------------------------------------------------------------
+def test_feedback_batch():
+    logger.info("=== Test: POST /buyer/feedback/batch ===")
+    client, product_pool = _client()
+    headers = _login(client)
+    mug = register_item(product_pool, "Mug", 5)
+    pen = register_item(product_pool, "Pen", 5)
+
+    resp = client.post("/buyer/feedback/batch", headers=headers, json={"feedback": [
+        {"item_id": mug, "feedback_type": "thumbs_up"},
+        {"item_id": pen, "feedback_type": "thumbs_down"},
+        {"item_id": [1, 999], "feedback_type": "thumbs_up"},
+    ]})
+    assert resp.status_code == 200, resp.get_json()
+    assert [r["status"] for r in resp.get_json()["results"]] == ["success", "success", "error"]
+    assert product_pool.calls["AddFeedbackBatch"] == 1
+    assert product_pool.calls["AddItemFeedback"] == 0
+
+    rating = client.get("/buyer/seller/7/rating", headers=headers).get_json()
+    assert (rating["thumbs_up"], rating["thumbs_down"]) == (1, 1), rating
+    assert client.post("/buyer/feedback/batch", json={"feedback": []}).status_code == 401
+    logger.info("PASSED: three feedback entries in one AddFeedbackBatch call")
+
+
+# ---------------------------------------------------------------------------
+# Test 2: Checkout
+# ---------------------------------------------------------------------------
+def test_checkout():
+    logger.info("=== Test: POST /buyer/checkout ===")
+    client, product_pool = _client()
+    headers = _login(client)
+    mug = register_item(product_pool, "Mug", 5, price=4.0)
+    pen = register_item(product_pool, "Pen", 1, price=1.5)
+
+    def stock():
+        return [client.get(f"/buyer/items/{i[0]}/{i[1]}", headers=headers).get_json()["item"]["quantity"]
+                for i in (mug, pen)]
+
+    # A line the stock cannot fill fails the cart before the card is charged
+    resp = client.post("/buyer/checkout", headers=headers, json=dict(CARD, cart=[
+        {"item_id": mug, "quantity": 2}, {"item_id": pen, "quantity": 2}]))
+    assert resp.status_code == 400
+    assert resp.get_json()["failed_items"] == [pen], resp.get_json()
+    # Repeated lines add up, as in CheckoutCart
+    resp = client.post("/buyer/checkout", headers=headers, json=dict(CARD, cart=[
+        {"item_id": pen, "quantity": 1}, {"item_id": pen, "quantity": 1}]))
+    assert resp.status_code == 400
+    # So does the saved cart, which is kept
+    client.put("/buyer/cart", headers=headers, json={"cart": [
+        {"item_id": mug, "quantity": 1}, {"item_id": [1, 999], "quantity": 1}]})
+    resp = client.post("/buyer/checkout", headers=headers, json=CARD)
+    assert resp.status_code == 400
+    assert resp.get_json()["failed_items"] == [[1, 999]], resp.get_json()
+    assert len(client.get("/buyer/cart", headers=headers).get_json()["cart"]) == 2
+    assert buyer_server._payments.charged == []
+    assert product_pool.calls["CheckoutCart"] == 0
+    assert stock() == [5, 1]
+
+    # A declined card buys nothing; a cart that fits is charged once and bought
+    client.put("/buyer/cart", headers=headers, json={"cart": [
+        {"item_id": mug, "quantity": 2}, {"item_id": pen, "quantity": 1}]})
+    assert client.post("/buyer/checkout", headers=headers, json=DECLINED_CARD).status_code == 402
+    assert stock() == [5, 1]
+    resp = client.post("/buyer/checkout", headers=headers, json=CARD)
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["total"] == 9.5
+    assert buyer_server._payments.charged == [CARD["card_number"]]
+    assert stock() == [3, 0]
+    assert client.get("/buyer/cart", headers=headers).get_json()["cart"] == []
+    resp = client.post("/buyer/checkout", headers=headers, json=CARD)
+    assert resp.status_code == 400 and resp.get_json()["message"] == "Cart is empty"
+    logger.info("PASSED: no charge for a cart the stock cannot fill")
+
+
+# ---------------------------------------------------------------------------
+# Test 3: Conditional GETs
+# ---------------------------------------------------------------------------
+def test_etags():
+    logger.info("=== Test: ETags and 304s on item and search reads ===")
+    client, product_pool = _client()
+    headers = _login(client)
+    mug = register_item(product_pool, "Mug", 5, category=1)
+    lamp = register_item(product_pool, "Lamp", 5, category=2)
+    item_path = f"/buyer/items/{mug[0]}/{mug[1]}"
+    search_path = "/buyer/items?category=1"
+
+    def get(path, etag=None):
+        return client.get(path, headers=dict(headers, **({"If-None-Match": etag} if etag else {})))
+
+    item_etag = get(item_path).headers["ETag"]
+    search_etag = get(search_path).headers["ETag"]
+    for path, etag in ((item_path, item_etag), (search_path, search_etag)):
+        resp = get(path, etag)
+        assert resp.status_code == 304 and resp.data == b"", (path, resp.status_code)
+        assert resp.headers["ETag"] == etag
+        assert get(path, '"stale"').status_code == 200
+
+    # A change elsewhere in the catalog leaves both answers current
+    product_pool.call("UpdateItemPrice", product_db_pb2.UpdateItemPriceRequest(
+        item_id=product_db_pb2.ItemId(category=lamp[0], item_id=lamp[1]), price=9.0))
+    assert get(item_path, item_etag).status_code == 304
+    assert get(search_path, search_etag).status_code == 304
+
+    # A change to the item itself sends both again
+    product_pool.call("UpdateItemPrice", product_db_pb2.UpdateItemPriceRequest(
+        item_id=product_db_pb2.ItemId(category=mug[0], item_id=mug[1]), price=6.0))
+    resp = get(item_path, item_etag)
+    assert resp.status_code == 200 and resp.get_json()["item"]["price"] == 6.0
+    assert resp.headers["ETag"] != item_etag
+    resp = get(search_path, search_etag)
+    assert resp.status_code == 200 and resp.headers["ETag"] != search_etag
+    logger.info("PASSED: 304 until the answer changes")
+
+
+# ---------------------------------------------------------------------------
+# Test 4: Cart validation
+# ---------------------------------------------------------------------------
+def test_validate_cart():
+    logger.info("=== Test: POST /buyer/cart/validate ===")
+    client, product_pool = _client()
+    headers = _login(client)
+    mug = register_item(product_pool, "Mug", 5)
+    pen = register_item(product_pool, "Pen", 1)
+
+    def validate(body):
+        return client.post("/buyer/cart/validate", headers=headers, json=body)
+
+    # One line
+    assert validate({"item_id": mug, "quantity": 5}).status_code == 200
+    assert validate({"item_id": pen, "quantity": 2}).status_code == 400
+    assert validate({"item_id": [1, 999], "quantity": 1}).status_code == 404
+
+    # A whole cart: one GetItems call, one result per line
+    product_pool.calls.clear()
+    resp = validate({"items": [{"item_id": mug, "quantity": 5}, {"item_id": pen, "quantity": 2},
+                               {"item_id": [1, 999], "quantity": 1}]})
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["results"] == [
+        {"status": "success", "message": ""},
+        {"status": "error", "message": "Not enough stock"},
+        {"status": "error", "message": "Item not found"}]
+    assert dict(product_pool.calls) == {"GetItems": 1}, product_pool.calls
+    assert validate({"items": []}).get_json()["results"] == []
+    assert client.post("/buyer/cart/validate", json={"items": []}).status_code == 401
+    logger.info("PASSED: single line and whole cart")
+
+
+# ---------------------------------------------------------------------------
+# Test 5: Batched requests
+# ---------------------------------------------------------------------------
+def test_batch():
+    logger.info("=== Test: POST /buyer/batch ===")
+    client, product_pool = _client()
+    ann = _login(client, "ann")
+    bob = _login(client, "bob")
+    mug = register_item(product_pool, "Mug", 5)
+    client.put("/buyer/cart", headers=bob, json={"cart": [{"item_id": mug, "quantity": 1}]})
+    etag = client.get(f"/buyer/items/{mug[0]}/{mug[1]}", headers=ann).headers["ETag"]
+
+    def batch(headers, requests):
+        return client.post("/buyer/batch", headers=headers, json={"requests": requests})
+
+    resp = batch(ann, [
+        {"method": "GET", "path": f"/buyer/items/{mug[0]}/{mug[1]}", "headers": {"If-None-Match": etag}},
+        {"method": "GET", "path": "/buyer/cart"},
+        {"method": "POST", "path": "/buyer/cart/validate", "body": {"item_id": mug, "quantity": 9}},
+    ])
+    assert resp.status_code == 200, resp.get_json()
+    results = resp.get_json()["results"]
+    assert [r["status_code"] for r in results] == [304, 200, 400], results
+    assert results[1]["body"]["cart"] == []     # ann's cart, not bob's
+
+    # A request may not name another session, in any spelling
+    for name in ("X-Session-ID", "x-session-id"):
+        resp = batch(ann, [{"method": "GET", "path": "/buyer/cart", "headers": {name: bob["X-Session-ID"]}}])
+        assert resp.status_code == 400, resp.get_json()
+    assert batch({}, [{"method": "GET", "path": "/buyer/cart"}]).status_code == 401
+    assert batch(ann, [{"method": "POST", "path": "/buyer/batch"}]).status_code == 400
+    logger.info("PASSED: sub-requests run under the batch's session only")
+
+
+# ---------------------------------------------------------------------------
+# Test 6: Payments voided
+# ---------------------------------------------------------------------------
+def test_payment_void():
+    logger.info("=== Test: failed purchases void their payment ===")
+    client, product_pool = _client()
+    headers = _login(client)
+    mug = register_item(product_pool, "Mug", 1)
+    payments = buyer_server._payments
+
+    def purchase(quantity=1):
+        return client.post("/buyer/purchase", headers=headers,
+                           json=dict(CARD, item_id=mug, quantity=quantity))
+
+    def take_last_mug():
+        # Another buyer gets there between the stock check and the purchase
+        product_pool.servicer.MakePurchase(product_db_pb2.MakePurchaseRequest(
+            buyer_id=99, item_id=product_db_pb2.ItemId(category=mug[0], item_id=mug[1]),
+            quantity=1), None)
+
+    def backend_down():
+        raise RuntimeError("product DB unavailable")
+
+    # Not enough stock: the payment authorized meanwhile is voided
+    assert purchase(quantity=2).status_code == 400
+    assert (payments.charged, payments.voided) == ([], [CARD["card_number"]])
+
+    # The purchase fails, or raises, once the card is held
+    product_pool.hooks["MakePurchase"] = backend_down
+    assert purchase().status_code == 500
+    product_pool.hooks["MakePurchase"] = take_last_mug
+    assert purchase().status_code == 400
+    assert payments.charged == [] and len(payments.voided) == 3
+    del product_pool.hooks["MakePurchase"]
+
+    # So does a checkout whose cart is sold out after the stock check
+    product_pool.servicer.UpdateItemQuantity(product_db_pb2.UpdateItemQuantityRequest(
+        item_id=product_db_pb2.ItemId(category=mug[0], item_id=mug[1]), quantity=1), None)
+    product_pool.hooks["CheckoutCart"] = take_last_mug
+    resp = client.post("/buyer/checkout", headers=headers,
+                       json=dict(CARD, cart=[{"item_id": mug, "quantity": 1}]))
+    assert resp.status_code == 400 and resp.get_json()["failed_items"] == [mug]
+    assert payments.charged == [] and len(payments.voided) == 4
+    assert not payments.holds, payments.holds
+    logger.info("PASSED: four holds voided, nothing charged")
+
+
+if __name__ == "__main__":
+    test_feedback_batch()
+    print()
+    test_checkout()
+    print()
+    test_etags()
+    print()
+    test_validate_cart()
+    print()
+    test_batch()
+    print()
+    test_payment_void()
+    print()
+    print("ALL BUYER SERVER TESTS PASSED")
@@ -0,0 +1,226 @@
+"""
+Endpoint tests for the asyncio buyer frontend (buyer_server_aio.py).
+
+The app is driven through Quart's test client over the same in-process
+SQLite backends as test_buyer_server.py, awaited through AioInProcessPool,
+and payments by AioFakePayments. Verifies:
+1. A read is not sent to the product DB until the session is valid.
+2. The routes answer as buyer_server.py's do: search and item reads with
+   ETags and 304s, cart, feedback, purchase and checkout.
+3. A purchase that fails once the card is authorized voids the payment,
+   also when the request is cancelled while the authorization is out.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import buyer_server_aio
+from catalog_cache import CatalogCache
+from single_flight import PRODUCT_DB_SHARED_READS, AioCoalescingPool
+from test_buyer_server import CARD, DECLINED_CARD, FakePayments, register_item, sqlite_pools
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+
+class AioInProcessPool:
+    """Stands in for an AioStubPool: an InProcessPool's calls, awaited."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def call(self, method_name, request, timeout=10):
+        return self.pool.call(method_name, request, timeout)
+
+    def stats(self):
+        return self.pool.stats()
+
+
+class AioFakePayments(FakePayments):
+    """Stands in for AioPaymentClient: FakePayments, awaited."""
+
+    async def authorize(self, name, card_number, expiration_date, security_code):
+        return self._hold(card_number)
+
+    async def capture(self, hold):
+        return FakePayments.capture(self, hold)
+
+    def release(self, payment):
+        payment.add_done_callback(lambda task: FakePayments.release(self, task))
+
+
+def _client():
+    """
+    A test client of buyer_server_aio.app over fresh backends:
+    (client, product pool underneath).
+    """
+    customer_pool, product_pool = sqlite_pools(tempfile.mkdtemp())
+    buyer_server_aio._customer_pool = AioInProcessPool(customer_pool)
+    buyer_server_aio._product_pool = AioCoalescingPool(AioInProcessPool(product_pool),
+                                                       PRODUCT_DB_SHARED_READS)
+    buyer_server_aio._catalog = CatalogCache(buyer_server_aio._product_pool, staleness=0)
+    buyer_server_aio._payments = AioFakePayments()
+    return buyer_server_aio.app.test_client(), product_pool
+
+
+async def _login(client, username="ann"):
+    """Create a buyer account and log in; returns the session headers."""
+    await client.post("/buyer/account", json={"username": username, "password": "pw", "name": "Ann"})
+    resp = await client.post("/buyer/login", json={"username": username, "password": "pw"})
+    assert resp.status_code == 200, await resp.get_json()
+    return {"X-Session-ID": (await resp.get_json())["session_id"]}
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Session checked before the read
+# ---------------------------------------------------------------------------
+def test_session_before_read():
+    logger.info("=== Test: reads wait for a valid session ===")
+
+    async def run():
+        client, product_pool = _client()
+        mug = register_item(product_pool, "Mug", 5)
+        product_pool.calls.clear()
+        for headers in ({}, {"X-Session-ID": "no-such-session"}):
+            assert (await client.get("/buyer/items?category=1", headers=headers)).status_code == 401
+            assert (await client.get(f"/buyer/items/{mug[0]}/{mug[1]}",
+                                     headers=headers)).status_code == 401
+            assert (await client.get("/buyer/seller/7/rating", headers=headers)).status_code == 401
+        assert not product_pool.calls, product_pool.calls
+
+        headers = await _login(client)
+        resp = await client.get(f"/buyer/items/{mug[0]}/{mug[1]}", headers=headers)
+        assert resp.status_code == 200
+        assert product_pool.calls["GetItem"] == 1
+
+    asyncio.run(run())
+    logger.info("PASSED: no product DB call without a valid session")
+
+
+# ---------------------------------------------------------------------------
+# Test 2: Buyer routes
+# ---------------------------------------------------------------------------
+def test_routes():
+    logger.info("=== Test: buyer routes on the event loop ===")
+
+    async def run():
+        client, product_pool = _client()
+        headers = await _login(client)
+        mug = register_item(product_pool, "Mug", 5, price=4.0)
+        pen = register_item(product_pool, "Pen", 1, price=1.5)
+
+        # Reads carry an ETag; asking again with it gets an empty 304
+        resp = await client.get("/buyer/items?category=1&keywords=mug", headers=headers)
+        body = await resp.get_json()
+        assert [item["name"] for item in body["items"]] == ["Mug"], body
+        etag = resp.headers["ETag"]
+        resp = await client.get("/buyer/items?category=1&keywords=mug",
+                                headers=dict(headers, **{"If-None-Match": etag}))
+        assert resp.status_code == 304 and not await resp.get_data()
+        resp = await client.get(f"/buyer/items/{mug[0]}/{mug[1]}", headers=headers)
+        assert (await resp.get_json())["item"]["price"] == 4.0
+        assert (await client.get("/buyer/items/1/999", headers=headers)).status_code == 404
+
+        # Cart
+        resp = await client.post("/buyer/cart/validate", headers=headers,
+                                 json={"item_id": pen, "quantity": 2})
+        assert resp.status_code == 400
+        resp = await client.post("/buyer/cart/validate", headers=headers, json={"items": [
+            {"item_id": mug, "quantity": 2}, {"item_id": pen, "quantity": 2}]})
+        assert [r["status"] for r in (await resp.get_json())["results"]] == ["success", "error"]
+        await client.put("/buyer/cart", headers=headers, json={"cart": [{"item_id": mug, "quantity": 2}]})
+        cart = (await (await client.get("/buyer/cart", headers=headers)).get_json())["cart"]
+        assert cart == [{"item_id": mug, "quantity": 2}], cart
+
+        # Feedback
+        resp = await client.post("/buyer/feedback/batch", headers=headers, json={"feedback": [
+            {"item_id": mug, "feedback_type": "thumbs_up"}]})
+        assert [r["status"] for r in (await resp.get_json())["results"]] == ["success"]
+        rating = await (await client.get("/buyer/seller/7/rating", headers=headers)).get_json()
+        assert rating["thumbs_up"] == 1, rating
+
+        # Purchase and checkout
+        resp = await client.post("/buyer/purchase", headers=headers,
+                                 json=dict(DECLINED_CARD, item_id=pen, quantity=1))
+        assert resp.status_code == 402
+        resp = await client.post("/buyer/purchase", headers=headers,
+                                 json=dict(CARD, item_id=pen, quantity=1))
+        assert resp.status_code == 200, await resp.get_json()
+        charged = len(buyer_server_aio._payments.charged)
+        resp = await client.post("/buyer/checkout", headers=headers,
+                                 json=dict(CARD, cart=[{"item_id": pen, "quantity": 1}]))
+        assert (await resp.get_json())["failed_items"] == [pen]
+        assert len(buyer_server_aio._payments.charged) == charged
+        resp = await client.post("/buyer/checkout", headers=headers, json=CARD)
+        assert (await resp.get_json())["total"] == 8.0
+        purchases = (await (await client.get("/buyer/purchases", headers=headers)).get_json())["purchases"]
+        assert sorted((p["item_id"], p["quantity"]) for p in purchases) == sorted([(pen, 1), (mug, 2)])
+        assert (await (await client.get("/buyer/cart", headers=headers)).get_json())["cart"] == []
+
+    asyncio.run(run())
+    logger.info("PASSED: search, items, cart, feedback, purchase and checkout")
+
+
+# ---------------------------------------------------------------------------
+# Test 3: Payments voided
+# ---------------------------------------------------------------------------
+def test_payment_void():
+    logger.info("=== Test: failed purchases void their payment ===")
+
+    class SlowPayments(AioFakePayments):
+        async def authorize(self, *card):
+            await asyncio.sleep(0.2)
+            return await AioFakePayments.authorize(self, *card)
+
+    async def run():
+        client, product_pool = _client()
+        headers = await _login(client)
+        mug = register_item(product_pool, "Mug", 1)
+        payments = buyer_server_aio._payments = SlowPayments()
+
+        def backend_down():
+            raise RuntimeError("product DB unavailable")
+
+        # Not enough stock, and a purchase that raises once the card is held
+        resp = await client.post("/buyer/purchase", headers=headers,
+                                 json=dict(CARD, item_id=mug, quantity=2))
+        assert resp.status_code == 400
+        product_pool.hooks["MakePurchase"] = backend_down
+        resp = await client.post("/buyer/purchase", headers=headers,
+                                 json=dict(CARD, item_id=mug, quantity=1))
+        assert resp.status_code == 500
+        del product_pool.hooks["MakePurchase"]
+
+        # A request cancelled (the client went away) while the
+        # authorization is out
+        async with buyer_server_aio.app.test_request_context(
+                "/buyer/purchase", method="POST", headers=headers,
+                json=dict(CARD, item_id=mug, quantity=1)):
+            view = asyncio.ensure_future(buyer_server_aio.make_purchase())
+            await asyncio.sleep(0.1)
+            view.cancel()
+        await asyncio.sleep(0.3)
+        assert view.cancelled()
+        assert payments.charged == [] and len(payments.voided) == 3, payments.stats()
+        assert not payments.holds, payments.holds
+
+    asyncio.run(run())
+    logger.info("PASSED: three holds voided, nothing charged")
+
+
+if __name__ == "__main__":
+    test_session_before_read()
+    print()
+    test_routes()
+    print()
+    test_payment_void()
+    print()
+    print("ALL ASYNCIO BUYER SERVER TESTS PASSED")
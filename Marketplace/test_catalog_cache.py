@@ -0,0 +1,118 @@
+"""
+Tests for the frontend catalog cache (catalog_cache.py).
+
+Over an in-memory product DB pool with per-category catalog versions
+(VersionedCatalog), verifies:
+1. CatalogCache serves repeated searches and item reads from memory until
+   the version of their scope moves, skips even the version check within
+   the staleness window, and stays within its memory cap.
+"""
+
+import logging
+import sys
+import os
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import product_db_pb2
+from catalog_cache import CatalogCache
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+
+class VersionedCatalog:
+    """
+    Stands in for a product DB pool: SearchItems, GetItem and
+    GetCatalogVersion over items kept in memory, versioned per category the
+    way the replicated product DB does it.
+    """
+
+    def __init__(self):
+        self.items = {}             # (category, item_id) -> ItemData
+        self.version = 0            # latest version anywhere
+        self.versions = Counter()   # category -> version of its last change
+        self.calls = Counter()      # method name -> calls
+
+    def put(self, category, item_id, name, price):
+        """Add or change an item, moving its category's version."""
+        self.version += 1
+        self.versions[category] = self.version
+        self.items[(category, item_id)] = product_db_pb2.ItemData(
+            item_id=product_db_pb2.ItemId(category=category, item_id=item_id),
+            name=name, category=category, keywords=["home", name.lower()],
+            price=price, quantity=5, version=self.version)
+
+    def _scope_version(self, category, has_category):
+        return self.versions[category] if has_category else self.version
+
+    def call(self, method_name, request, timeout=10):
+        self.calls[method_name] += 1
+        if method_name == "GetCatalogVersion":
+            return product_db_pb2.CatalogVersionResponse(
+                status="success", version=self._scope_version(request.category, request.has_category))
+        if method_name == "SearchItems":
+            items = [item for (category, _), item in sorted(self.items.items())
+                     if (not request.has_category or category == request.category)
+                     and (not request.keywords or set(request.keywords) & set(item.keywords))]
+            return product_db_pb2.GetItemsResponse(
+                status="success", items=items,
+                catalog_version=self._scope_version(request.category, request.has_category))
+        if method_name == "GetItem":
+            key = (request.item_id.category, request.item_id.item_id)
+            if key not in self.items:
+                return product_db_pb2.GetItemResponse(status="error", message="Item not found")
+            return product_db_pb2.GetItemResponse(
+                status="success", item=self.items[key],
+                catalog_version=self.versions[key[0]])
+        raise ValueError(method_name)
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Version-checked catalog cache
+# ---------------------------------------------------------------------------
+def test_catalog_cache():
+    logger.info("=== Test: Version-checked catalog cache ===")
+    catalog = VersionedCatalog()
+    catalog.put(1, 1, "Lamp", 10.0)
+    catalog.put(2, 2, "Chair", 10.0)
+    search = product_db_pb2.SearchItemsRequest(category=1, has_category=True)
+
+    # Repeated reads are served from the cache until their scope changes
+    cache = CatalogCache(catalog, staleness=0)
+    assert cache.call("SearchItems", search).items[0].price == 10.0
+    assert cache.call("SearchItems", search).items[0].price == 10.0
+    catalog.put(2, 2, "Chair", 13.0)
+    assert cache.call("SearchItems", search).items[0].price == 10.0
+    assert cache.stats()["hits"] == 2
+    assert catalog.calls["SearchItems"] == 1
+    catalog.put(1, 1, "Lamp", 11.0)
+    assert cache.call("SearchItems", search).items[0].price == 11.0
+    assert cache.stats()["misses"] == 2
+
+    # Inside the staleness window not even the version is checked
+    cache = CatalogCache(catalog, staleness=60)
+    request = product_db_pb2.ItemIdRequest(item_id=product_db_pb2.ItemId(category=1, item_id=1))
+    cache.call("GetItem", request)
+    catalog.put(1, 1, "Lamp", 14.0)
+    assert cache.call("GetItem", request).item.price == 11.0
+    assert cache.stats()["version_checks"] == 1
+
+    # The memory cap evicts the least recently used entries
+    cache = CatalogCache(catalog, max_bytes=1000, staleness=0)
+    for keyword in ("home", "lamp", "chair", "desk", "sofa", "rug"):
+        cache.call("SearchItems", product_db_pb2.SearchItemsRequest(keywords=[keyword]))
+    stats = cache.stats()
+    assert stats["evictions"] > 0 and stats["bytes"] <= 1000, stats
+
+    logger.info("PASSED: %s", stats)
+
+
+if __name__ == "__main__":
+    test_catalog_cache()
+    print()
+    print("ALL CATALOG CACHE TESTS PASSED")
@@ -5,8 +5,15 @@ Spins up 5 replicas on localhost, issues gRPC calls, and verifies:
 1. User creation replicates to all nodes.
 2. Session create/get/update/delete work across replicas.
 3. Concurrent user registrations from different replicas succeed.
+4. Two hash-sharded groups behind UserShardedStubPool keep user ids unique
+   and route sessions by their group tag.
+5. The grpc.aio servicer handles concurrent session writes.
+6. Admission control sheds session touches, not reads, under overload.
+7. StoreUser/StoreSession retried with the same request_id on another
+   replica are applied once and return the first result.
 """
 
+import asyncio
 import grpc
 import time
 import threading
@@ -21,10 +28,18 @@ import customer_db_pb2
 import customer_db_pb2_grpc
 from atomic_broadcast import AtomicBroadcastNode
 from customer_database_replicated import (
+    AsyncReplicatedCustomerDBServicer,
     ReplicatedCustomerDBServicer,
     make_deliver_callback,
     init_db,
 )
+from admission import (
+    CUSTOMER_DB_LIMITS,
+    CUSTOMER_DB_PRIORITIES,
+    AdmissionController,
+    threaded_server,
+)
+from stub_pool import UserShardedStubPool
 from concurrent import futures
 
 logging.basicConfig(
@@ -39,31 +54,34 @@ N = 5
 
 
 def cleanup_dbs():
-    for f in glob.glob("customer_data_node*.db"):
+    for f in glob.glob("customer_data_node*.db") + glob.glob("customer_data_shard*.db"):
         os.remove(f)
 
 
-def setup_cluster():
-    """Create 5 replicated customer DB nodes and return (nodes, servers, channels, stubs)."""
-    members = [("127.0.0.1", UDP_BASE + i) for i in range(N)]
+def setup_cluster(n=N, udp_base=UDP_BASE, grpc_base=GRPC_BASE, shard_index=0, shard_count=1):
+    """Create n replicated customer DB nodes and return (nodes, servers, channels, stubs)."""
+    members = [("127.0.0.1", udp_base + i) for i in range(n)]
     broadcast_nodes = []
     servers = []
     stubs = []
     channels = []
 
-    for i in range(N):
-        db_file = f"customer_data_node{i}.db"
+    for i in range(n):
+        if shard_count > 1:
+            db_file = f"customer_data_shard{shard_index}_node{i}.db"
+        else:
+            db_file = f"customer_data_node{i}.db"
         init_db(db_file)
 
-        on_deliver = make_deliver_callback(db_file)
+        on_deliver = make_deliver_callback(db_file, shard_index, shard_count)
         bnode = AtomicBroadcastNode(i, members, on_deliver)
         bnode.start()
         broadcast_nodes.append(bnode)
 
-        servicer = ReplicatedCustomerDBServicer(db_file, bnode)
+        servicer = ReplicatedCustomerDBServicer(db_file, bnode, shard_index, shard_count)
         server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
         customer_db_pb2_grpc.add_CustomerDBServicer_to_server(servicer, server)
-        port = GRPC_BASE + i
+        port = grpc_base + i
         server.add_insecure_port(f"127.0.0.1:{port}")
         server.start()
         servers.append(server)
@@ -242,6 +260,247 @@ def test_concurrent_registrations():
         teardown_cluster(bnodes, servers, channels)
 
 
+def test_sharded_groups():
+    logger.info("=== Test: Hash-sharded customer DB groups ===")
+    cleanup_dbs()
+    groups = [setup_cluster(3, UDP_BASE + 10 * (g + 1), GRPC_BASE + 10 * (g + 1), g, 2)
+              for g in range(2)]
+    pool = UserShardedStubPool(
+        [[f"127.0.0.1:{GRPC_BASE + 10 * (g + 1) + i}" for i in range(3)] for g in range(2)],
+        customer_db_pb2_grpc.CustomerDBStub,
+    )
+
+    try:
+        users = {}
+        for k in range(8):
+            username = f"shard_user_{k}"
+            resp = pool.call("StoreUser", customer_db_pb2.StoreUserRequest(
+                username=username, password="pw", name=username, user_type="buyer"
+            ))
+            assert resp.status == "success", resp.message
+            shard = pool.shard_for_username(username)
+            assert resp.user_id % 2 == shard, "user id outside its group's range"
+            users[username] = resp.user_id
+        assert len(set(users.values())) == len(users), f"Non-unique user_ids: {users}"
+        assert len({pool.shard_for_username(u) for u in users}) == 2, "all users hashed to one group"
+
+        time.sleep(1)
+        for username, user_id in users.items():
+            # Only the owning group knows the user
+            shard = pool.shard_for_username(username)
+            other = groups[1 - shard][3][0]
+            assert other.GetUser(customer_db_pb2.GetUserRequest(username=username)).status == "error"
+            assert pool.call("GetUser", customer_db_pb2.GetUserRequest(
+                username=username)).user_id == user_id
+
+            sess = pool.call("StoreSession", customer_db_pb2.StoreSessionRequest(
+                user_id=user_id, user_type="buyer"))
+            assert sess.session_id.startswith(f"{shard}:")
+            time.sleep(0.3)
+            get_resp = pool.call("GetSession", customer_db_pb2.GetSessionRequest(
+                session_id=sess.session_id))
+            assert get_resp.status == "success" and get_resp.user_id == user_id
+            assert pool.call("DeleteSession", customer_db_pb2.SessionRequest(
+                session_id=sess.session_id)).status == "success"
+
+        logger.info("PASSED: %d users over 2 groups, sessions routed by tag", len(users))
+    finally:
+        for bnodes, servers, channels, _ in groups:
+            teardown_cluster(bnodes, servers, channels)
+
+
+def test_aio_servicer():
+    logger.info("=== Test: grpc.aio serving mode ===")
+    cleanup_dbs()
+    members = [("127.0.0.1", UDP_BASE + 50 + i) for i in range(3)]
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    bnodes, servers, channels, stubs = [], [], [], []
+
+    async def start_server(db_file, bnode, port):
+        server = grpc.aio.server(maximum_concurrent_rpcs=100)
+        customer_db_pb2_grpc.add_CustomerDBServicer_to_server(
+            AsyncReplicatedCustomerDBServicer(db_file, bnode), server)
+        server.add_insecure_port(f"127.0.0.1:{port}")
+        await server.start()
+        return server
+
+    try:
+        for i in range(3):
+            db_file = f"customer_data_node{i}.db"
+            init_db(db_file)
+            bnode = AtomicBroadcastNode(i, members, make_deliver_callback(db_file))
+            bnode.start()
+            bnodes.append(bnode)
+            servers.append(asyncio.run_coroutine_threadsafe(
+                start_server(db_file, bnode, GRPC_BASE + 50 + i), loop).result(10))
+            channels.append(grpc.insecure_channel(f"127.0.0.1:{GRPC_BASE + 50 + i}"))
+            stubs.append(customer_db_pb2_grpc.CustomerDBStub(channels[-1]))
+
+        resp = stubs[0].StoreUser(customer_db_pb2.StoreUserRequest(
+            username="carol", password="pw", name="Carol", user_type="buyer"
+        ))
+        assert resp.status == "success", resp.message
+
+        # More concurrent writes than the threaded server has workers
+        sessions = [None] * 30
+
+        def login(k):
+            sessions[k] = stubs[k % 3].StoreSession(customer_db_pb2.StoreSessionRequest(
+                user_id=resp.user_id, user_type="buyer"), timeout=30)
+
+        threads = [threading.Thread(target=login, args=(k,)) for k in range(30)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(s.status == "success" for s in sessions)
+
+        time.sleep(1)
+        for k, sess in enumerate(sessions):
+            get_resp = stubs[(k + 1) % 3].GetSession(customer_db_pb2.GetSessionRequest(
+                session_id=sess.session_id))
+            assert get_resp.status == "success" and get_resp.user_id == resp.user_id
+
+        logger.info("PASSED: 30 concurrent session writes through the aio servicer")
+    finally:
+        for ch in channels:
+            ch.close()
+        for server in servers:
+            asyncio.run_coroutine_threadsafe(server.stop(0), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        for bn in bnodes:
+            bn.stop()
+        time.sleep(0.3)
+        cleanup_dbs()
+
+
+def test_admission_control():
+    logger.info("=== Test: admission control and load shedding ===")
+
+    # Controller alone: one slot, one queue place
+    controller = AdmissionController(1, CUSTOMER_DB_PRIORITIES, max_queued=1, max_queue_age=0.2)
+    assert controller.acquire("StoreSession")
+    touched = []
+    toucher = threading.Thread(
+        target=lambda: touched.append(controller.acquire("UpdateSessionActivity")))
+    toucher.start()
+    time.sleep(0.05)
+    # A read bumps the queued session touch, then is shed itself after 2 x 0.2 s
+    t0 = time.perf_counter()
+    assert not controller.acquire("GetSession")
+    assert 0.35 < time.perf_counter() - t0 < 1.0
+    toucher.join()
+    assert touched == [False]
+    controller.release("StoreSession")
+    assert controller.acquire("GetSession", time_remaining=1.0)
+    controller.release("GetSession")
+    assert controller.shed == {"UpdateSessionActivity": 1, "GetSession": 1}
+
+    # Server: more session touches than it has slots and queue places, plus reads
+    cleanup_dbs()
+    init_db("customer_data_node0.db")
+    bnode = AtomicBroadcastNode(0, [("127.0.0.1", UDP_BASE + 60)],
+                                make_deliver_callback("customer_data_node0.db"))
+    bnode.start()
+    server = threaded_server(4, CUSTOMER_DB_PRIORITIES, CUSTOMER_DB_LIMITS,
+                             max_queued=10, max_queue_age=0.2)
+    customer_db_pb2_grpc.add_CustomerDBServicer_to_server(
+        ReplicatedCustomerDBServicer("customer_data_node0.db", bnode), server)
+    server.add_insecure_port(f"127.0.0.1:{GRPC_BASE + 60}")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{GRPC_BASE + 60}")
+    stub = customer_db_pb2_grpc.CustomerDBStub(channel)
+    try:
+        user = stub.StoreUser(customer_db_pb2.StoreUserRequest(
+            username="dave", password="pw", name="Dave", user_type="buyer"))
+        sess = stub.StoreSession(customer_db_pb2.StoreSessionRequest(
+            user_id=user.user_id, user_type="buyer"))
+        assert sess.status == "success", sess.message
+
+        stop = time.perf_counter() + 3
+        outcomes = {"touch_ok": 0, "touch_shed": 0, "read_ok": 0, "errors": []}
+        lock = threading.Lock()
+
+        def toucher():
+            while time.perf_counter() < stop:
+                try:
+                    stub.UpdateSessionActivity(customer_db_pb2.SessionRequest(
+                        session_id=sess.session_id), timeout=10)
+                    key = "touch_ok"
+                except grpc.RpcError as e:
+                    if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED:
+                        with lock:
+                            outcomes["errors"].append(e.code())
+                    key = "touch_shed"
+                with lock:
+                    outcomes[key] += 1
+
+        def reader():
+            while time.perf_counter() < stop:
+                try:
+                    resp = stub.GetSession(customer_db_pb2.GetSessionRequest(
+                        session_id=sess.session_id), timeout=10)
+                    assert resp.status == "success"
+                    with lock:
+                        outcomes["read_ok"] += 1
+                except grpc.RpcError as e:
+                    with lock:
+                        outcomes["errors"].append(e.code())
+                time.sleep(0.01)
+
+        threads = ([threading.Thread(target=toucher) for _ in range(14)]
+                   + [threading.Thread(target=reader) for _ in range(3)])
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        logger.info("Admission outcomes: %s", outcomes)
+        assert not outcomes["errors"], outcomes["errors"]
+        assert outcomes["touch_ok"] > 0 and outcomes["touch_shed"] > 0
+        assert outcomes["read_ok"] > 50
+
+        logger.info("PASSED: session touches shed with RESOURCE_EXHAUSTED, every read served")
+    finally:
+        channel.close()
+        server.stop(0)
+        bnode.stop()
+        time.sleep(0.3)
+        cleanup_dbs()
+
+
+def test_idempotent_writes():
+    logger.info("=== Test: Retried writes are applied once ===")
+    cleanup_dbs()
+    bnodes, servers, channels, stubs = setup_cluster()
+
+    try:
+        # A registration retried through another replica gets the same user back
+        request = customer_db_pb2.StoreUserRequest(
+            username="carol", password="pw", name="Carol", user_type="buyer",
+            request_id="user-carol")
+        first = stubs[0].StoreUser(request)
+        retry = stubs[3].StoreUser(request)
+        assert first.status == "success", first.message
+        assert retry.status == "success", f"Retry was applied again: {retry.message}"
+        assert retry.user_id == first.user_id
+
+        # A retried login gets the same session, not a second one
+        request = customer_db_pb2.StoreSessionRequest(
+            user_id=first.user_id, user_type="buyer", request_id="login-carol")
+        sessions = {stubs[i].StoreSession(request).session_id for i in (1, 2, 4)}
+        assert len(sessions) == 1, sessions
+
+        # Without a request_id every call is a new write
+        request = customer_db_pb2.StoreSessionRequest(user_id=first.user_id, user_type="buyer")
+        assert stubs[1].StoreSession(request).session_id != stubs[1].StoreSession(request).session_id
+
+        logger.info("PASSED: Retried writes applied once")
+    finally:
+        teardown_cluster(bnodes, servers, channels)
+
+
 if __name__ == "__main__":
     test_user_replication()
     print()
@@ -249,4 +508,12 @@ if __name__ == "__main__":
     print()
     test_concurrent_registrations()
     print()
+    test_sharded_groups()
+    print()
+    test_aio_servicer()
+    print()
+    test_admission_control()
+    print()
+    test_idempotent_writes()
+    print()
     print("ALL CUSTOMER DB REPLICATION TESTS PASSED")
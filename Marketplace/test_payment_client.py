@@ -0,0 +1,177 @@
+"""
+Tests for the payment clients (payment_client.py).
+
+Runs financial_service.py in a thread and verifies:
+1. The payment clients start without the financial service (bundled WSDL),
+   call it once it is up, and refuse payments beyond their limits.
+2. A hold is charged by one capture only; a released payment's hold is
+   voided, and one still queued is withdrawn without a call.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import wait
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import financial_service
+from payment_client import AioPaymentClient, PaymentBusy, PaymentClient, PaymentError
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+GRPC_BASE_PORT = 51100
+HOST = "127.0.0.1"
+PORT = GRPC_BASE_PORT + 160
+CARD = ("Ann", "4111 1111 1111 1111", "12/30", "123")
+SHORT_CARD = ("Ann", "4111", "12/30", "123")
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_service():
+    server = make_server(HOST, PORT, financial_service.wsgi_app, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _stop_service(server):
+    server.shutdown()
+    server.server_close()
+
+
+def _hold(payments):
+    """A hold on CARD (the service declines one card in ten at random)."""
+    for _ in range(20):
+        hold = payments.authorize(*CARD).result()
+        if hold is not None:
+            return hold
+    raise AssertionError("CARD declined 20 times")
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Payment clients and their limits
+# ---------------------------------------------------------------------------
+def test_payment_client():
+    logger.info("=== Test: PaymentClient and AioPaymentClient ===")
+
+    # Built from the bundled WSDL: the service need not be up yet
+    payments = PaymentClient(HOST, PORT, concurrency=2, queue=0, timeout=5)
+    server = _start_service()
+    # Nothing listens here until the socket is bound: calls hang until the timeout
+    stalled = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    stalled.bind((HOST, GRPC_BASE_PORT + 161))
+    stalled.listen(8)
+    try:
+        assert payments.process(*SHORT_CARD) is False
+        assert all(f.result() is None or isinstance(f.result(), str)
+                   for f in [payments.authorize(*CARD) for _ in range(2)])
+        assert payments.stats()["pending"] == 0
+
+        # One in flight, one waiting, the next refused; cancelling the waiting one withdraws it
+        slow = PaymentClient(HOST, GRPC_BASE_PORT + 161, concurrency=1, queue=1, timeout=1)
+        first = slow.authorize(*CARD)
+        second = slow.authorize(*CARD)
+        try:
+            slow.authorize(*CARD)
+            assert False, "Third payment was not refused"
+        except PaymentBusy:
+            pass
+        assert second.cancel()
+        try:
+            first.result()
+            assert False, "Stalled payment did not time out"
+        except PaymentError:
+            pass
+        stats = slow.stats()
+        assert (stats["pending"], stats["failed"], stats["refused"]) == (0, 2, 1), stats
+
+        async def run():
+            aio = AioPaymentClient(HOST, PORT, concurrency=2, queue=0, timeout=5)
+            try:
+                return await asyncio.gather(aio.authorize(*SHORT_CARD), aio.authorize(*CARD),
+                                            aio.authorize(*CARD), return_exceptions=True)
+            finally:
+                await aio.close()
+
+        declined, approved, refused = asyncio.run(run())
+        assert declined is None and (approved is None or isinstance(approved, str)), (declined, approved)
+        assert isinstance(refused, PaymentBusy), refused
+        logger.info("PASSED: %s", payments.stats())
+    finally:
+        stalled.close()
+        _stop_service(server)
+
+
+# ---------------------------------------------------------------------------
+# Test 2: Capture and void
+# ---------------------------------------------------------------------------
+def test_capture_void():
+    logger.info("=== Test: holds captured or voided ===")
+    payments = PaymentClient(HOST, PORT, concurrency=1, queue=4, timeout=5)
+    server = _start_service()
+    try:
+        # A hold is charged once; a second capture finds no hold
+        hold = _hold(payments)
+        assert payments.capture(hold) is True
+        assert payments.capture(hold) is False
+
+        # A released payment's hold is voided and can no longer be captured
+        payment = payments.authorize(*CARD)
+        hold = payment.result()
+        payments.release(payment)
+        if hold is not None:
+            deadline = time.monotonic() + 5
+            while payments.stats()["voided"] == 0:
+                assert time.monotonic() < deadline, payments.stats()
+                time.sleep(0.05)
+            assert payments.capture(hold) is False
+
+        # Released while queued behind another: withdrawn, never authorized
+        first = payments.authorize(*CARD)
+        second = payments.authorize(*CARD)
+        payments.release(second)
+        payments.release(first)
+        assert second.cancelled()
+        wait([first])
+
+        async def run():
+            aio = AioPaymentClient(HOST, PORT, concurrency=2, queue=0, timeout=5)
+            try:
+                payment = asyncio.ensure_future(aio.authorize(*CARD))
+                aio.release(payment)
+                hold = await payment
+                while aio._voids:
+                    await asyncio.sleep(0.05)
+                captured = await aio.capture(hold) if hold else False
+                return hold, captured, aio.stats()
+            finally:
+                await aio.close()
+
+        hold, captured, stats = asyncio.run(run())
+        assert captured is False, hold
+        assert stats["voided"] == (1 if hold else 0), stats
+        assert payments.stats()["pending"] == 0
+        logger.info("PASSED: %s", payments.stats())
+    finally:
+        _stop_service(server)
+
+
+if __name__ == "__main__":
+    test_payment_client()
+    print()
+    test_capture_void()
+    print()
+    print("ALL PAYMENT CLIENT TESTS PASSED")
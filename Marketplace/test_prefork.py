@@ -0,0 +1,181 @@
+"""
+Tests for pre-fork serving (prefork.py).
+
+Runs prefork.serve() on a small Flask app in a child process and talks to it
+over HTTP. Verifies:
+1. The workers share the port, each builds its backends after the fork,
+   and a worker that dies is replaced.
+2. SIGHUP replaces every worker without failing a request in flight.
+3. SIGTERM lets the workers finish the requests they serve, then the
+   master exits.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import requests
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import prefork
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+GRPC_BASE_PORT = 51100
+HOST = "127.0.0.1"
+PORT = GRPC_BASE_PORT + 170
+URL = f"http://{HOST}:{PORT}"
+
+app = Flask(__name__)
+_init_pid = None    # process that ran init(): the worker itself, after the fork
+
+
+def _init():
+    global _init_pid
+    _init_pid = os.getpid()
+
+
+@app.route("/pid")
+def pid():
+    return jsonify({"pid": os.getpid(), "init_pid": _init_pid})
+
+
+@app.route("/slow")
+def slow():
+    time.sleep(float(request.args.get("seconds", "1")))
+    return jsonify({"pid": os.getpid()})
+
+
+def _start_master(workers=2):
+    """prefork.serve() in a forked child; returns it once a worker answers."""
+    master = multiprocessing.get_context("fork").Process(
+        target=prefork.serve, args=(app, HOST, PORT, workers, _init), daemon=True)
+    master.start()
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            _get("/pid")
+            return master
+        except requests.ConnectionError:
+            assert time.monotonic() < deadline, "no worker answered"
+            time.sleep(0.1)
+
+
+def _get(path, timeout=5):
+    # A new connection each time, so the kernel picks a worker each time
+    resp = requests.get(URL + path, headers={"Connection": "close"}, timeout=timeout)
+    assert resp.status_code == 200, resp.status_code
+    return resp.json()
+
+
+def _worker_pids(count=40):
+    return {_get("/pid")["pid"] for _ in range(count)}
+
+
+def _stop(master):
+    if master.is_alive():
+        os.kill(master.pid, signal.SIGTERM)
+        master.join(prefork.GRACEFUL_TIMEOUT + 10)
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Workers share the port
+# ---------------------------------------------------------------------------
+def test_workers():
+    logger.info("=== Test: pre-forked workers ===")
+    master = _start_master(workers=2)
+    try:
+        answers = [_get("/pid") for _ in range(40)]
+        pids = {a["pid"] for a in answers}
+        assert len(pids) == 2 and master.pid not in pids, pids
+        assert all(a["init_pid"] == a["pid"] for a in answers), answers
+
+        # A worker that dies is replaced. Connections already queued on its
+        # socket die with it.
+        victim = min(pids)
+        os.kill(victim, signal.SIGKILL)
+        deadline = time.monotonic() + 10
+        current = set()
+        while len(current) != 2 or victim in current:
+            assert time.monotonic() < deadline, current
+            time.sleep(0.2)
+            try:
+                current = _worker_pids()
+            except requests.ConnectionError:
+                pass
+        logger.info("PASSED: workers %s, %d replaced by %s", sorted(pids), victim,
+                    sorted(current - pids))
+    finally:
+        _stop(master)
+
+
+# ---------------------------------------------------------------------------
+# Test 2: Graceful reload
+# ---------------------------------------------------------------------------
+def test_reload():
+    logger.info("=== Test: SIGHUP reloads the workers ===")
+    master = _start_master(workers=2)
+    try:
+        old = _worker_pids()
+        slow = {}
+        request_thread = threading.Thread(target=lambda: slow.update(_get("/slow?seconds=2")))
+        request_thread.start()
+        time.sleep(0.3)
+        os.kill(master.pid, signal.SIGHUP)
+
+        deadline = time.monotonic() + 10
+        while True:
+            current = _worker_pids()
+            if len(current) == 2 and not current & old:
+                break
+            assert time.monotonic() < deadline, (old, current)
+            time.sleep(0.2)
+        request_thread.join(10)
+        assert slow.get("pid") in old, slow
+        logger.info("PASSED: %s replaced by %s", sorted(old), sorted(current))
+    finally:
+        _stop(master)
+
+
+# ---------------------------------------------------------------------------
+# Test 3: Graceful stop
+# ---------------------------------------------------------------------------
+def test_stop():
+    logger.info("=== Test: SIGTERM stops the workers gracefully ===")
+    master = _start_master(workers=2)
+    slow = {}
+    request_thread = threading.Thread(target=lambda: slow.update(_get("/slow?seconds=1")))
+    request_thread.start()
+    time.sleep(0.3)
+    t0 = time.monotonic()
+    os.kill(master.pid, signal.SIGTERM)
+    master.join(prefork.GRACEFUL_TIMEOUT + 10)
+    request_thread.join(10)
+    assert not master.is_alive() and master.exitcode == 0, master.exitcode
+    assert "pid" in slow, "the request in flight was cut off"
+    try:
+        _get("/pid", timeout=1)
+        raise AssertionError("still serving after SIGTERM")
+    except requests.ConnectionError:
+        pass
+    logger.info("PASSED: stopped in %.2fs after finishing its request", time.monotonic() - t0)
+
+
+if __name__ == "__main__":
+    test_workers()
+    print()
+    test_reload()
+    print()
+    test_stop()
+    print()
+    print("ALL PREFORK TESTS PASSED")
@@ -5,20 +5,62 @@ Spins up 5 Raft replicas on localhost, issues gRPC calls, and verifies:
 1. Item registration replicates to all nodes (reads from any node).
 2. Cart, feedback, purchase operations work.
 3. Leader failover: kill the leader, writes still succeed on a new leader.
+4. Compact snapshots: a node restarted from its snapshot file has the same state.
+5. Bulk writes apply N operations as a single Raft entry.
+6. Without a leader, writes fail fast with UNAVAILABLE; the election-to-first-
+   commit latency is recorded once a leader commits.
+7. StubPool learns the leader from the write hint and routes writes to it.
+8. StubPool balances reads over the replicas, away from one that is down.
+9. Linearizable reads on a follower see a write acknowledged by the leader.
+10. Old purchases are archived to disk and still returned per buyer, also by
+    a replica rebuilt from a peer's snapshot once it has fetched the archive
+    segments from the peer.
+11. CheckoutCart buys every cart line in one Raft entry, or none of them.
+12. Escrow mode never oversells a hot item, settles sales in batches,
+    replays an unsettled journal exactly once and bounds its backlog.
+13. ShardedStubPool routes by category over two Raft groups, merges
+    fan-out reads and splits GetItems batches by shard.
+14. The grpc.aio servicer serves many concurrent writes and reads.
+15. A write retried with the same request_id on another replica is applied
+    once and answered with the first result; the ids survive a snapshot.
+16. Item and catalog versions move only with the items in their scope (the
+    frontends' ETags and CatalogCache depend on it).
+17. GetItem's cached item bytes match a fresh encoding of the item after
+    every kind of write and after a snapshot restore.
 """
 
+import asyncio
 import grpc
 import time
 import threading
 import logging
 import sys
 import os
+import shutil
+import tempfile
+import zlib
+from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(__file__))
 
 import product_db_pb2
 import product_db_pb2_grpc
-from product_database_replicated import RaftProductDB, ReplicatedProductDBServicer
+from product_database_replicated import (
+    AsyncReplicatedProductDBServicer,
+    RaftProductDB,
+    ReplicatedProductDBServicer,
+    EscrowSeller,
+    ESCROW_JOURNAL_MAGIC,
+    SNAPSHOT_VERSION,
+    _HEADER,
+    _RECORD,
+    _REC_PURCHASES,
+    _encode_item,
+    _write_record,
+    add_servicer_to_server,
+)
+from catalog_cache import item_etag, items_etag
+from stub_pool import StubPool, ShardedStubPool, PRODUCT_DB_WRITE_METHODS, LINEARIZABLE_READS
 from pysyncobj import SyncObjConf
 from concurrent import futures
 
@@ -55,9 +97,10 @@ def setup_cluster():
         raft_node = RaftProductDB(raft_addrs[i], partners, conf)
         raft_nodes.append(raft_node)
 
-        servicer = ReplicatedProductDBServicer(raft_node)
+        grpc_addrs = {a: f"127.0.0.1:{GRPC_BASE_PORT + j}" for j, a in enumerate(raft_addrs)}
+        servicer = ReplicatedProductDBServicer(raft_node, grpc_addrs)
         server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
-        product_db_pb2_grpc.add_ProductDBServicer_to_server(servicer, server)
+        add_servicer_to_server(servicer, server)
         grpc_port = GRPC_BASE_PORT + i
         server.add_insecure_port(f"127.0.0.1:{grpc_port}")
         server.start()
@@ -261,6 +304,914 @@ def test_seller_items():
         teardown_cluster(raft_nodes, servers, channels)
 
 
+# ---------------------------------------------------------------------------
+# Test 4: Compact snapshot written and restored
+# ---------------------------------------------------------------------------
+def _single_node(addr, dump_file, **kwargs):
+    conf = SyncObjConf(
+        autoTick=True,
+        dynamicMembershipChange=False,
+        commandsWaitLeader=True,
+        fullDumpFile=dump_file,
+    )
+    return RaftProductDB(addr, [], conf, **kwargs)
+
+
+def test_snapshot_restore():
+    logger.info("=== Test: Compact snapshot restore ===")
+    dump_file = os.path.join(tempfile.mkdtemp(), "product_snapshot.bin")
+    addr = f"127.0.0.1:{RAFT_BASE_PORT + 50}"
+
+    node = _single_node(addr, dump_file)
+    try:
+        for idx in range(25):
+            node.register_item(7, f"Lamp-{idx}", 3, ["lamp", "light"], "new",
+                               12.5, 10, sync=True, timeout=10)
+        node.store_cart(200, [[3, 1, 2]], sync=True, timeout=10)
+        node.add_item_feedback(3, 2, "thumbs_up", sync=True, timeout=10)
+        node.make_purchase(200, 3, 1, 4, "2026-01-01T00:00:00",
+                           request_id="snap-buy", sync=True, timeout=10)
+
+        # PySyncObj's own temporary file is never renamed over the snapshot
+        with open(dump_file + ".tmp", "wb") as f:
+            f.write(b"junk")
+        node._forceLogCompaction()
+        deadline = time.time() + 10
+        while not os.path.isfile(dump_file) and time.time() < deadline:
+            time.sleep(0.1)
+        assert os.path.isfile(dump_file), "Snapshot file was not written"
+        assert os.path.isfile(dump_file + ".tmp")
+        catalog_version = node.catalog_version(3)
+        assert catalog_version > 0
+    finally:
+        node.destroy()
+        time.sleep(0.5)
+
+    restored = _single_node(addr, dump_file)
+    try:
+        deadline = time.time() + 10
+        while len(restored._items) < 25 and time.time() < deadline:
+            time.sleep(0.1)
+        assert len(restored._items) == 25
+        assert restored.get_item(3, 1)["quantity"] == 6
+        assert restored.request_result("snap-buy") == {"status": "success"}
+        assert restored.get_item(3, 2)["keywords"] == ["lamp", "light"]
+        assert restored.get_cart(200) == [[3, 1, 2]]
+        assert restored.get_seller_rating(7) == {"thumbs_up": 1, "thumbs_down": 0}
+        assert len(restored.get_buyer_purchases(200)) == 1
+        assert restored.catalog_version(3) == restored.catalog_version() == catalog_version
+
+        # The item counter is restored too, so new IDs do not collide
+        result = restored.register_item(7, "Lamp-new", 3, [], "new", 1.0, 1,
+                                        sync=True, timeout=10)
+        assert result["item_id"] == 26
+        assert restored.catalog_version(3) > catalog_version
+
+        logger.info("PASSED: State restored from compact snapshot")
+    finally:
+        restored.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 5: Bulk writes commit as one Raft entry
+# ---------------------------------------------------------------------------
+def test_bulk_writes():
+    logger.info("=== Test: Bulk RegisterItems / UpdateItems / AddFeedbackBatch ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+
+    try:
+        applied_before = raft_nodes[0].raftLastApplied
+        resp = stubs[1].RegisterItems(product_db_pb2.RegisterItemsRequest(items=[
+            product_db_pb2.RegisterItemRequest(
+                seller_id=9, name=f"Bulk-{idx}", category=4,
+                keywords=["bulk"], condition="new", price=1.0 + idx, quantity=5,
+            )
+            for idx in range(50)
+        ]), timeout=15)
+        assert resp.status == "success", f"RegisterItems failed: {resp.message}"
+        assert len(resp.results) == 50
+        item_ids = [r.item_id.item_id for r in resp.results]
+        assert len(set(item_ids)) == 50
+
+        time.sleep(1)
+        assert raft_nodes[0].raftLastApplied - applied_before == 1, "Expected a single Raft entry"
+
+        upd = stubs[2].UpdateItems(product_db_pb2.UpdateItemsRequest(updates=[
+            product_db_pb2.ItemUpdate(
+                item_id=product_db_pb2.ItemId(category=4, item_id=item_ids[0]),
+                has_price=True, price=99.0,
+            ),
+            product_db_pb2.ItemUpdate(
+                item_id=product_db_pb2.ItemId(category=4, item_id=item_ids[1]),
+                has_quantity=True, quantity=0,
+            ),
+            product_db_pb2.ItemUpdate(
+                item_id=product_db_pb2.ItemId(category=4, item_id=999999),
+                has_price=True, price=1.0,
+            ),
+        ]), timeout=15)
+        assert upd.status == "success"
+        assert [r.status for r in upd.results] == ["success", "success", "error"]
+
+        fb = stubs[3].AddFeedbackBatch(product_db_pb2.AddFeedbackBatchRequest(feedback=[
+            product_db_pb2.AddItemFeedbackRequest(
+                item_id=product_db_pb2.ItemId(category=4, item_id=iid),
+                feedback_type="thumbs_up",
+            )
+            for iid in item_ids[:3]
+        ]), timeout=15)
+        assert fb.status == "success"
+        assert all(r.status == "success" for r in fb.results)
+
+        time.sleep(1)
+
+        first = stubs[4].GetItem(product_db_pb2.ItemIdRequest(
+            item_id=product_db_pb2.ItemId(category=4, item_id=item_ids[0])
+        ), timeout=10)
+        assert abs(first.item.price - 99.0) < 1e-6
+        assert first.item.quantity == 5
+        assert first.item.thumbs_up == 1
+        second = stubs[4].GetItem(product_db_pb2.ItemIdRequest(
+            item_id=product_db_pb2.ItemId(category=4, item_id=item_ids[1])
+        ), timeout=10)
+        assert second.item.quantity == 0
+        rating = stubs[0].GetSellerRating(product_db_pb2.GetSellerRatingRequest(
+            seller_id=9
+        ), timeout=10)
+        assert rating.thumbs_up == 3
+
+        logger.info("PASSED: Bulk writes replicated as single entries")
+    finally:
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 6: Writes fail fast without a leader
+# ---------------------------------------------------------------------------
+def test_leader_readiness():
+    logger.info("=== Test: Fail fast without a leader, election metric ===")
+    raft_addrs = [f"127.0.0.1:{RAFT_BASE_PORT + 60 + i}" for i in range(3)]
+    grpc_port = GRPC_BASE_PORT + 60
+
+    def start(i):
+        conf = SyncObjConf(
+            autoTick=True,
+            dynamicMembershipChange=False,
+            commandsWaitLeader=True,
+            raftMinTimeout=0.4,
+            raftMaxTimeout=1.4,
+        )
+        return RaftProductDB(raft_addrs[i], [a for a in raft_addrs if a != raft_addrs[i]], conf)
+
+    # Only one of three nodes is up: no quorum, so no leader
+    raft_nodes = [start(0)]
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
+    add_servicer_to_server(ReplicatedProductDBServicer(raft_nodes[0], leader_wait=0.5), server)
+    server.add_insecure_port(f"127.0.0.1:{grpc_port}")
+    server.start()
+    channel = grpc.insecure_channel(f"127.0.0.1:{grpc_port}")
+    stub = product_db_pb2_grpc.ProductDBStub(channel)
+    request = product_db_pb2.RegisterItemRequest(
+        seller_id=1, name="Kettle", category=2, keywords=["kitchen"],
+        condition="new", price=20.0, quantity=3,
+    )
+
+    try:
+        t0 = time.time()
+        try:
+            stub.RegisterItem(request, timeout=10)
+            assert False, "RegisterItem should fail without a leader"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.UNAVAILABLE, e.code()
+        assert time.time() - t0 < 2, "Write did not fail fast"
+        assert raft_nodes[0].election_stats()["elections"] == 0
+
+        raft_nodes += [start(1), start(2)]
+        assert raft_nodes[0].wait_for_leader(15) is not None, "No leader elected"
+        resp = stub.RegisterItem(request, timeout=15)
+        assert resp.status == "success", resp.message
+
+        deadline = time.time() + 5
+        while raft_nodes[0].election_stats()["elections"] == 0 and time.time() < deadline:
+            time.sleep(0.1)
+        stats = raft_nodes[0].election_stats()
+        assert stats["elections"] == 1 and stats["last_s"] > 0, stats
+        assert stats["leader"] in raft_addrs
+
+        logger.info("PASSED: Fail-fast writes, election took %.3f s to first commit",
+                    stats["last_s"])
+    finally:
+        channel.close()
+        server.stop(0)
+        for rn in raft_nodes:
+            rn.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 7: Leader-aware StubPool routing
+# ---------------------------------------------------------------------------
+def test_leader_routing():
+    logger.info("=== Test: StubPool routes writes to the Raft leader ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + i}" for i in range(N)]
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS)
+
+    try:
+        leader = next(i for i, rn in enumerate(raft_nodes) if rn._isLeader())
+        assert pool.leader is None
+
+        resp = pool.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+            seller_id=3, name="Router", category=5, keywords=["net"],
+            condition="new", price=45.0, quantity=4,
+        ))
+        assert resp.status == "success"
+        assert pool.leader == leader, f"Expected leader {leader}, pool has {pool.leader}"
+
+        resp = pool.call("MakePurchase", product_db_pb2.MakePurchaseRequest(
+            buyer_id=11, item_id=resp.item_id, quantity=1,
+        ))
+        assert resp.status == "success"
+        assert pool.leader == leader
+        assert pool.stats()[leader]["leader"]
+
+        logger.info("PASSED: Writes routed to leader %s", addrs[leader])
+    finally:
+        for ch in pool.channels:
+            ch.close()
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 8: Balanced StubPool reads
+# ---------------------------------------------------------------------------
+def _read_concurrently(pool, request, readers=10):
+    """readers threads each reading N times through pool; returns every response."""
+    with futures.ThreadPoolExecutor(max_workers=readers) as executor:
+        jobs = [executor.submit(lambda: [pool.call("SearchItems", request) for _ in range(N)])
+                for _ in range(readers)]
+        return [got for job in jobs for got in job.result()]
+
+
+def test_read_balancing():
+    logger.info("=== Test: StubPool balances reads over the replicas ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + i}" for i in range(N)]
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS)
+
+    try:
+        leader = next(i for i, rn in enumerate(raft_nodes) if rn._isLeader())
+        resp = stubs[leader].RegisterItem(product_db_pb2.RegisterItemRequest(
+            seller_id=3, name="Switch", category=5, keywords=["net"],
+            condition="new", price=30.0, quantity=3,
+        ), timeout=15)
+        assert resp.status == "success"
+        time.sleep(1)
+        search = product_db_pb2.SearchItemsRequest(category=5, has_category=True, keywords=["net"])
+
+        # Concurrent reads are spread over the replicas
+        results = _read_concurrently(pool, search)
+        assert all(len(got.items) == 1 and got.items[0].quantity == 3 for got in results)
+        stats = pool.stats()
+        assert sum(s["calls"] for s in stats) == 10 * N
+        assert sum(1 for s in stats if s["calls"] >= 3) >= 3, stats
+        assert all(s["inflight"] == 0 for s in stats)
+
+        # A replica that fails is charged a penalty and then avoided
+        down = (leader + 1) % N
+        servers[down].stop(0)
+        results = _read_concurrently(pool, search)
+        assert all(len(got.items) == 1 for got in results)
+        stats = pool.stats()
+        assert stats[down]["errors"] <= 3, stats
+        if stats[down]["errors"]:
+            assert stats[down]["ewma_ms"] > max(
+                s["ewma_ms"] for i, s in enumerate(stats) if i != down), stats
+
+        logger.info("PASSED: Reads balanced: %s", [s["calls"] for s in stats])
+    finally:
+        for ch in pool.channels:
+            ch.close()
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 9: Linearizable follower reads (ReadIndex)
+# ---------------------------------------------------------------------------
+def test_linearizable_reads():
+    logger.info("=== Test: ReadIndex reads on followers ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+
+    try:
+        leader = next(i for i, rn in enumerate(raft_nodes) if rn._isLeader())
+        followers = [i for i in range(N) if i != leader]
+
+        # Only the leader answers ReadIndex
+        idx = stubs[leader].ReadIndex(product_db_pb2.ReadIndexRequest(), timeout=5)
+        assert idx.status == "success" and idx.commit_index > 0
+        try:
+            stubs[followers[0]].ReadIndex(product_db_pb2.ReadIndexRequest(), timeout=5)
+            assert False, "Follower should not answer ReadIndex"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.UNAVAILABLE
+
+        resp = stubs[leader].RegisterItem(product_db_pb2.RegisterItemRequest(
+            seller_id=4, name="Desk", category=6, keywords=["office"],
+            condition="new", price=120.0, quantity=8,
+        ), timeout=15)
+        item_id = resp.item_id
+        for qty in (7, 6, 5):
+            upd = stubs[leader].UpdateItemQuantity(product_db_pb2.UpdateItemQuantityRequest(
+                item_id=item_id, quantity=qty,
+            ), timeout=15)
+            assert upd.status == "success"
+            # No sleep: every follower must already reflect the acknowledged write
+            for f in followers:
+                got = stubs[f].GetItem(product_db_pb2.ItemIdRequest(item_id=item_id),
+                                       timeout=10, metadata=LINEARIZABLE_READS)
+                assert got.status == "success" and got.item.quantity == qty, \
+                    f"Node {f}: stale read {got.item.quantity} != {qty}"
+
+        logger.info("PASSED: Linearizable reads served by every follower")
+    finally:
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 10: Purchase archival tiering
+# ---------------------------------------------------------------------------
+def test_purchase_archive():
+    logger.info("=== Test: Purchase archival to on-disk segments ===")
+    tmp = tempfile.mkdtemp()
+    dump_file = os.path.join(tmp, "product_snapshot.bin")
+    archive_dir = os.path.join(tmp, "archive")
+    addr = f"127.0.0.1:{RAFT_BASE_PORT + 70}"
+
+    node = _single_node(addr, dump_file, archive_dir=archive_dir)
+    try:
+        node.register_item(5, "Mug", 1, ["kitchen"], "new", 6.0, 100, sync=True, timeout=10)
+        for day in (1, 2, 3):
+            node.make_purchase(300, 1, 1, 1, f"2020-01-0{day}T00:00:00", sync=True, timeout=10)
+        node.make_purchase(301, 1, 1, 2, "2020-01-04T00:00:00", sync=True, timeout=10)
+        for _ in range(2):
+            node.make_purchase(300, 1, 1, 1, datetime.utcnow().isoformat(), sync=True, timeout=10)
+
+        result = node.archive_purchases("2021-01-01T00:00:00", sync=True, timeout=10)
+        assert result["archived"] == 4
+        assert len(node._purchases) == 2
+        assert node.flush_archive(10)
+        assert len(os.listdir(archive_dir)) == 1
+
+        history = node.get_buyer_purchases(300)
+        assert len(history) == 5
+        assert [p["timestamp"][:10] for p in history[:3]] == ["2020-01-01", "2020-01-02", "2020-01-03"]
+        assert node.get_buyer_purchases(301)[0]["quantity"] == 2
+
+        node._forceLogCompaction()
+        deadline = time.time() + 10
+        while not os.path.isfile(dump_file) and time.time() < deadline:
+            time.sleep(0.1)
+        shutil.copy(dump_file, os.path.join(tmp, "peer_snapshot.bin"))
+    finally:
+        node.destroy()
+        time.sleep(0.5)
+
+    # Restart with automatic archiving (horizon of one hour)
+    restored = _single_node(addr, dump_file, archive_dir=archive_dir,
+                            purchase_horizon=3600, archive_interval=0.2)
+    try:
+        deadline = time.time() + 10
+        while len(restored._items) < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert len(restored._purchases) == 2
+        assert restored._archive_seq == 1
+        assert len(restored.get_buyer_purchases(300)) == 5
+        # Replaying the archive command must not duplicate the segment
+        assert not restored._archive.write_segment(1, [])
+
+        restored.make_purchase(300, 1, 1, 1, "2020-02-01T00:00:00", sync=True, timeout=10)
+        deadline = time.time() + 10
+        while len(restored._purchases) > 2 and time.time() < deadline:
+            time.sleep(0.1)
+        assert len(restored._purchases) == 2, "Leader did not archive old purchase"
+        assert restored.flush_archive(10)
+        assert len(os.listdir(archive_dir)) == 2
+        assert len(restored.get_buyer_purchases(300)) == 6
+    finally:
+        restored.destroy()
+        time.sleep(0.5)
+
+    # A replica rebuilt from a peer's snapshot, with an empty archive directory:
+    # the snapshot only counts the segments, which it fetches from the peer
+    peer_addr = f"127.0.0.1:{RAFT_BASE_PORT + 71}"
+    grpc_addrs = {addr: f"127.0.0.1:{GRPC_BASE_PORT + 70}",
+                  peer_addr: f"127.0.0.1:{GRPC_BASE_PORT + 71}"}
+    peer = _single_node(peer_addr, dump_file, archive_dir=archive_dir)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    add_servicer_to_server(ReplicatedProductDBServicer(peer), server)
+    server.add_insecure_port(grpc_addrs[peer_addr])
+    server.start()
+    rebuilt_dir = os.path.join(tmp, "rebuilt_archive")
+    rebuilt = _single_node(addr, os.path.join(tmp, "peer_snapshot.bin"), archive_dir=rebuilt_dir)
+    try:
+        deadline = time.time() + 10
+        while len(rebuilt._items) < 1 and time.time() < deadline:
+            time.sleep(0.1)
+        assert rebuilt.missing_segments() == [1]
+        assert rebuilt.get_buyer_purchases(300) is None, "Served history without its archive"
+
+        ReplicatedProductDBServicer(rebuilt, grpc_addrs)
+        deadline = time.time() + 10
+        while rebuilt.get_buyer_purchases(300) is None and time.time() < deadline:
+            time.sleep(0.1)
+        assert os.listdir(rebuilt_dir) == ["segment-0000000001.bin"]
+        assert len(rebuilt.get_buyer_purchases(300)) == 5
+        assert rebuilt.get_buyer_purchases(301)[0]["quantity"] == 2
+
+        logger.info("PASSED: Purchases archived, merged with the hot tail and fetched by rebuilt replicas")
+    finally:
+        rebuilt.destroy()
+        server.stop(0)
+        peer.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 11: Atomic cart checkout
+# ---------------------------------------------------------------------------
+def test_checkout_cart():
+    logger.info("=== Test: CheckoutCart is all-or-nothing ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+
+    def item(iid):
+        return product_db_pb2.ItemId(category=8, item_id=iid)
+
+    try:
+        reg = stubs[0].RegisterItems(product_db_pb2.RegisterItemsRequest(items=[
+            product_db_pb2.RegisterItemRequest(
+                seller_id=2, name=name, category=8, keywords=["desk"],
+                condition="new", price=price, quantity=qty,
+            )
+            for name, price, qty in (("Pen", 2.0, 10), ("Pad", 5.0, 3), ("Ink", 8.0, 1))
+        ]), timeout=15)
+        pen, pad, ink = [r.item_id.item_id for r in reg.results]
+
+        # One line short on stock: nothing is bought
+        resp = stubs[1].CheckoutCart(product_db_pb2.CheckoutCartRequest(buyer_id=70, items=[
+            product_db_pb2.CartItem(item_id=item(pen), quantity=2),
+            product_db_pb2.CartItem(item_id=item(ink), quantity=2),
+        ]), timeout=15)
+        assert resp.status == "error"
+        assert [i.item_id for i in resp.failed_items] == [ink]
+
+        # Stored cart: all lines bought in one entry, cart cleared
+        stubs[0].StoreCart(product_db_pb2.StoreCartRequest(buyer_id=70, cart=[
+            product_db_pb2.CartItem(item_id=item(pen), quantity=2),
+            product_db_pb2.CartItem(item_id=item(pad), quantity=3),
+            product_db_pb2.CartItem(item_id=item(pen), quantity=1),
+        ]), timeout=15)
+        time.sleep(1)
+        applied_before = raft_nodes[2].raftLastApplied
+        resp = stubs[2].CheckoutCart(product_db_pb2.CheckoutCartRequest(buyer_id=70), timeout=15)
+        assert resp.status == "success", resp.message
+        assert abs(resp.total - (3 * 2.0 + 3 * 5.0)) < 1e-6
+
+        time.sleep(1)
+        assert raft_nodes[2].raftLastApplied - applied_before == 1, "Expected a single Raft entry"
+        for i in range(N):
+            assert stubs[i].GetItem(product_db_pb2.ItemIdRequest(item_id=item(pen)),
+                                    timeout=10).item.quantity == 7
+            assert stubs[i].GetItem(product_db_pb2.ItemIdRequest(item_id=item(pad)),
+                                    timeout=10).item.quantity == 0
+            assert stubs[i].GetItem(product_db_pb2.ItemIdRequest(item_id=item(ink)),
+                                    timeout=10).item.quantity == 1
+        assert len(stubs[3].GetCart(product_db_pb2.BuyerIdRequest(buyer_id=70), timeout=10).cart) == 0
+        purchases = stubs[4].GetBuyerPurchases(product_db_pb2.BuyerIdRequest(buyer_id=70), timeout=10)
+        assert sorted((p.item_id.item_id, p.quantity) for p in purchases.purchases) == [(pen, 3), (pad, 3)]
+
+        logger.info("PASSED: Cart checked out atomically")
+    finally:
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 12: Escrow mode for a hot item
+# ---------------------------------------------------------------------------
+def test_escrow_purchases():
+    logger.info("=== Test: Escrow slices on a hot item ===")
+    tmpdir = tempfile.mkdtemp()
+    node = _single_node(f"127.0.0.1:{RAFT_BASE_PORT + 80}", os.path.join(tmpdir, "product_snapshot.bin"))
+    sellers = [EscrowSeller(node, "replica-a", 20, os.path.join(tmpdir, "escrow_a.log")),
+               EscrowSeller(node, "replica-b", 20, os.path.join(tmpdir, "escrow_b.log"))]
+
+    try:
+        node.register_item(6, "Console", 9, ["game"], "new", 299.0, 100, sync=True, timeout=10)
+        applied_before = node.raftLastApplied
+        outcomes = []
+        lock = threading.Lock()
+
+        def buyer(n):
+            seller = sellers[n % 2]
+            for _ in range(8):
+                result = seller.try_purchase(n, 9, 1, 1)
+                if result is None:   # no slice yet: normal path
+                    result = node.make_purchase(n, 9, 1, 1, datetime.utcnow().isoformat(),
+                                                sync=True, timeout=10)
+                with lock:
+                    outcomes.append(result["status"])
+
+        threads = [threading.Thread(target=buyer, args=(n,)) for n in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(seller.flush(10) for seller in sellers), "escrow sales not settled"
+
+        assert len(outcomes) == 128
+        assert outcomes.count("success") == 100, f"{outcomes.count('success')} sales for 100 units"
+        assert node.get_item(9, 1)["quantity"] == 0
+        assert len(node._purchases) == 100
+        entries = node.raftLastApplied - applied_before
+        assert entries < 100, f"{entries} Raft entries for 100 sales"
+        stats = [seller.stats() for seller in sellers]
+        assert [st["unsettled"] for st in stats] == [0, 0]
+        assert 0 < sum(st["settled"] for st in stats) <= 100   # the rest went through the log
+
+        # A journal left by a crash is settled once on restart, even if some
+        # of its sales were already settled before the crash
+        node.update_item_quantity(9, 1, 10, sync=True, timeout=10)
+        node.grant_escrow(9, 1, "replica-c", 5, sync=True, timeout=10)
+        journal = os.path.join(tmpdir, "escrow_c.log")
+        sales = [(seq, 42, 9, 1, 1, datetime.utcnow().isoformat()) for seq in (1, 2, 3)]
+        node.settle_escrow("replica-c", sales[:1], sync=True, timeout=10)
+        with open(journal, "wb") as f:
+            f.write(_HEADER.pack(ESCROW_JOURNAL_MAGIC, SNAPSHOT_VERSION))
+            _write_record(f, _REC_PURCHASES, sales)
+        # A batch torn by the crash was never acknowledged: replay stops there
+        with open(journal, "ab") as f:
+            f.write(_RECORD.pack(_REC_PURCHASES, 100) + b"torn")
+        recovered = EscrowSeller(node, "replica-c", 5, journal)
+        with open(journal, "rb") as f:
+            assert not f.read().endswith(b"torn"), "new sales would follow the torn batch"
+        assert recovered.flush(10)
+        assert node.get_item(9, 1)["quantity"] == 7
+        assert node.escrow_slice(9, 1, "replica-c") == 2
+        assert len(node.get_buyer_purchases(42)) == 3
+        assert recovered.try_purchase(43, 9, 1, 1) == {"status": "success"}
+        assert recovered.flush(10) and node.get_item(9, 1)["quantity"] == 6
+
+        # A corrupt record is an error, not the end of the journal
+        corrupt = os.path.join(tmpdir, "escrow_d.log")
+        with open(corrupt, "wb") as f:
+            f.write(_HEADER.pack(ESCROW_JOURNAL_MAGIC, SNAPSHOT_VERSION))
+            f.write(_RECORD.pack(_REC_PURCHASES, 4) + b"junk")
+        try:
+            EscrowSeller(node, "replica-d", 5, corrupt)
+            assert False, "corrupt journal replayed"
+        except zlib.error:
+            pass
+
+        # A full backlog sends new sales down the normal Raft path
+        recovered.max_unsettled = 0
+        assert recovered.try_purchase(43, 9, 1, 1) is None
+        assert recovered.stats()["declined"] == 1
+
+        logger.info("PASSED: 100/128 purchases succeeded in %d Raft entries; journal replayed", entries)
+    finally:
+        node.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 13: Category-sharded pool over two Raft groups
+# ---------------------------------------------------------------------------
+def test_sharded_pool():
+    logger.info("=== Test: Category-sharded product DB ===")
+    tmpdir = tempfile.mkdtemp()
+    nodes, servers, addrs = [], [], []
+    for i in range(2):
+        node = _single_node(f"127.0.0.1:{RAFT_BASE_PORT + 90 + i}",
+                            os.path.join(tmpdir, f"shard{i}.bin"))
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        add_servicer_to_server(ReplicatedProductDBServicer(node), server)
+        addrs.append(f"127.0.0.1:{GRPC_BASE_PORT + 90 + i}")
+        server.add_insecure_port(addrs[-1])
+        server.start()
+        nodes.append(node)
+        servers.append(server)
+    # Shard 0 owns categories 0-4, shard 1 owns 5 and up
+    pool = ShardedStubPool([(5, [addrs[1]]), (0, [addrs[0]])],
+                           product_db_pb2_grpc.ProductDBStub,
+                           write_methods=PRODUCT_DB_WRITE_METHODS)
+
+    def item_id(cat, iid):
+        return product_db_pb2.ItemId(category=cat, item_id=iid)
+
+    try:
+        for node in nodes:
+            assert node.wait_for_leader(10) is not None
+        reg = pool.call("RegisterItems", product_db_pb2.RegisterItemsRequest(items=[
+            product_db_pb2.RegisterItemRequest(
+                seller_id=3, name=name, category=cat, keywords=["gadget"],
+                condition="new", price=10.0, quantity=5,
+            )
+            for name, cat in (("Radio", 1), ("Drone", 7), ("Clock", 2))
+        ]))
+        assert reg.status == "success"
+        ids = [(r.item_id.category, r.item_id.item_id) for r in reg.results]
+        assert [c for c, _ in ids] == [1, 7, 2], "results must keep request order"
+        assert nodes[0].get_item(*ids[0]) is not None and nodes[0].get_item(*ids[1]) is None
+        assert nodes[1].get_item(*ids[1]) is not None
+
+        search = pool.call("SearchItems", product_db_pb2.SearchItemsRequest(keywords=["gadget"]))
+        assert sorted(i.name for i in search.items) == ["Clock", "Drone", "Radio"]
+        assert len(pool.call("GetSellerItems",
+                             product_db_pb2.GetSellerItemsRequest(seller_id=3)).items) == 3
+        batch = pool.call("GetItems", product_db_pb2.ItemIdsRequest(
+            item_ids=[item_id(*ids[1]), item_id(1, 999), item_id(*ids[0])]))
+        assert batch.status == "success"
+        assert sorted((i.item_id.category, i.item_id.item_id) for i in batch.items) == sorted(ids[:2])
+
+        for cat, iid in ids[:2]:
+            pool.call("AddItemFeedback", product_db_pb2.AddItemFeedbackRequest(
+                item_id=item_id(cat, iid), feedback_type="thumbs_up"))
+        rating = pool.call("GetSellerRating", product_db_pb2.GetSellerRatingRequest(seller_id=3))
+        assert rating.thumbs_up == 2
+
+        # A cart spanning both shards cannot be checked out atomically
+        pool.call("StoreCart", product_db_pb2.StoreCartRequest(buyer_id=90, cart=[
+            product_db_pb2.CartItem(item_id=item_id(*ids[0]), quantity=1),
+            product_db_pb2.CartItem(item_id=item_id(*ids[1]), quantity=1),
+        ]))
+        resp = pool.call("CheckoutCart", product_db_pb2.CheckoutCartRequest(buyer_id=90))
+        assert resp.status == "error"
+        assert [(i.category, i.item_id) for i in resp.failed_items] == [ids[1]]
+
+        # A cart on shard 1 is bought there and cleared on shard 0
+        pool.call("StoreCart", product_db_pb2.StoreCartRequest(buyer_id=90, cart=[
+            product_db_pb2.CartItem(item_id=item_id(*ids[1]), quantity=2),
+        ]))
+        resp = pool.call("CheckoutCart", product_db_pb2.CheckoutCartRequest(buyer_id=90))
+        assert resp.status == "success", resp.message
+        assert nodes[1].get_item(*ids[1])["quantity"] == 3
+        assert nodes[0].get_cart(90) == []
+
+        pool.call("MakePurchase", product_db_pb2.MakePurchaseRequest(
+            buyer_id=90, item_id=item_id(*ids[2]), quantity=1))
+        purchases = pool.call("GetBuyerPurchases", product_db_pb2.BuyerIdRequest(buyer_id=90))
+        assert sorted((p.item_id.category, p.quantity) for p in purchases.purchases) == [(2, 1), (7, 2)]
+
+        logger.info("PASSED: routing by category, fan-out reads merged")
+    finally:
+        for server in servers:
+            server.stop(0)
+        for node in nodes:
+            node.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 14: grpc.aio servicer
+# ---------------------------------------------------------------------------
+def test_aio_servicer():
+    logger.info("=== Test: grpc.aio serving mode ===")
+    node = _single_node(f"127.0.0.1:{RAFT_BASE_PORT + 100}",
+                        os.path.join(tempfile.mkdtemp(), "product_snapshot.bin"))
+    addr = f"127.0.0.1:{GRPC_BASE_PORT + 100}"
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def start_server():
+        server = grpc.aio.server(maximum_concurrent_rpcs=200)
+        add_servicer_to_server(AsyncReplicatedProductDBServicer(node), server)
+        server.add_insecure_port(addr)
+        await server.start()
+        return server
+
+    server = asyncio.run_coroutine_threadsafe(start_server(), loop).result(10)
+    channel = grpc.insecure_channel(addr)
+    stub = product_db_pb2_grpc.ProductDBStub(channel)
+
+    try:
+        reg = stub.RegisterItem(product_db_pb2.RegisterItemRequest(
+            seller_id=4, name="Kettle", category=2, keywords=["tea"],
+            condition="new", price=20.0, quantity=500,
+        ), timeout=15)
+        assert reg.status == "success"
+
+        # More concurrent writes than the threaded server has workers
+        statuses = []
+        lock = threading.Lock()
+
+        def buyer(b):
+            resp = stub.MakePurchase(product_db_pb2.MakePurchaseRequest(
+                buyer_id=b, item_id=reg.item_id, quantity=1), timeout=15)
+            with lock:
+                statuses.append(resp.status)
+
+        threads = [threading.Thread(target=buyer, args=(b,)) for b in range(64)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert statuses == ["success"] * 64, statuses
+
+        item = stub.GetItem(product_db_pb2.ItemIdRequest(item_id=reg.item_id), timeout=15).item
+        assert item.quantity == 500 - 64
+        resp = stub.GetItem(product_db_pb2.ItemIdRequest(item_id=reg.item_id), timeout=15,
+                            metadata=LINEARIZABLE_READS)
+        assert resp.status == "success" and resp.item.quantity == 500 - 64
+
+        logger.info("PASSED: 64 concurrent writes through the aio servicer")
+    finally:
+        channel.close()
+        asyncio.run_coroutine_threadsafe(server.stop(0), loop).result(10)
+        loop.call_soon_threadsafe(loop.stop)
+        node.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 15: Idempotent writes (request ids)
+# ---------------------------------------------------------------------------
+def test_idempotent_writes():
+    logger.info("=== Test: Retried writes are applied once ===")
+    raft_nodes, servers, channels, stubs = setup_cluster()
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + i}" for i in range(N)]
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS, probe_interval=0)
+
+    try:
+        # A registration retried on another replica returns the same item
+        request = product_db_pb2.RegisterItemRequest(
+            seller_id=5, name="Kettle", category=6, keywords=["kitchen"],
+            condition="new", price=30.0, quantity=10, request_id="reg-kettle")
+        first = stubs[0].RegisterItem(request, timeout=15)
+        retry = stubs[1].RegisterItem(request, timeout=15)
+        assert first.status == retry.status == "success"
+        assert retry.item_id == first.item_id
+        kettle = first.item_id
+
+        # Same for a purchase: stock goes down once, one purchase recorded
+        buy = product_db_pb2.MakePurchaseRequest(buyer_id=90, item_id=kettle, quantity=2,
+                                                 request_id="buy-kettle")
+        for i in (2, 3, 4):
+            assert stubs[i].MakePurchase(buy, timeout=15).status == "success"
+        time.sleep(1)
+        for i in range(N):
+            assert stubs[i].GetItem(product_db_pb2.ItemIdRequest(item_id=kettle),
+                                    timeout=10).item.quantity == 8
+        purchases = stubs[0].GetBuyerPurchases(product_db_pb2.BuyerIdRequest(buyer_id=90),
+                                               timeout=10)
+        assert len(purchases.purchases) == 1
+
+        # The pool gives each write its own id, without touching the caller's message
+        request = product_db_pb2.RegisterItemRequest(
+            seller_id=5, name="Toaster", category=6, keywords=["kitchen"],
+            condition="new", price=25.0, quantity=5)
+        ids = {pool.call("RegisterItem", request).item_id.item_id for _ in range(2)}
+        assert len(ids) == 2 and not request.request_id
+
+        logger.info("PASSED: Retried writes applied once")
+    finally:
+        pool.close()
+        teardown_cluster(raft_nodes, servers, channels)
+
+
+# ---------------------------------------------------------------------------
+# Test 16: Catalog and item versions
+# ---------------------------------------------------------------------------
+def test_catalog_versions():
+    logger.info("=== Test: Catalog and item versions ===")
+    node = _single_node(f"127.0.0.1:{RAFT_BASE_PORT + 130}",
+                        os.path.join(tempfile.mkdtemp(), "product_snapshot.bin"))
+    addr = f"127.0.0.1:{GRPC_BASE_PORT + 140}"
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    add_servicer_to_server(ReplicatedProductDBServicer(node), server)
+    server.add_insecure_port(addr)
+    server.start()
+    pool = StubPool([addr], product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS)
+
+    def version(category=None):
+        return pool.call("GetCatalogVersion", product_db_pb2.CatalogVersionRequest(
+            category=category or 0, has_category=category is not None)).version
+
+    def set_price(item_id, price):
+        assert pool.call("UpdateItemPrice", product_db_pb2.UpdateItemPriceRequest(
+            item_id=item_id, price=price)).status == "success"
+
+    try:
+        lamp, chair = (pool.call("RegisterItem", product_db_pb2.RegisterItemRequest(
+            seller_id=9, name=name, category=category, keywords=["home"],
+            condition="new", price=10.0, quantity=5)).item_id
+            for name, category in (("Lamp", 1), ("Chair", 2)))
+
+        # A change in category 2 moves its version and the catalog's, not category 1's
+        before = (version(1), version(2), version())
+        set_price(chair, 12.0)
+        assert version(1) == before[0]
+        assert version(2) > before[1] and version() > before[2]
+        search = product_db_pb2.SearchItemsRequest(category=1, has_category=True)
+        assert pool.call("SearchItems", search).catalog_version == version(1)
+
+        # Item versions (and so ETags) change with the item only
+        def get(item_id):
+            return pool.call("GetItem", product_db_pb2.ItemIdRequest(item_id=item_id)).item
+        lamp_tag, chair_tag = item_etag(get(lamp)), item_etag(get(chair))
+        search_tag = items_etag(pool.call("SearchItems", search).items)
+        assert get(chair).version == version(2)
+        set_price(chair, 12.5)
+        assert item_etag(get(lamp)) == lamp_tag and item_etag(get(chair)) != chair_tag
+        assert items_etag(pool.call("SearchItems", search).items) == search_tag
+
+        logger.info("PASSED: item and catalog versions follow their scope")
+    finally:
+        pool.close()
+        server.stop(0)
+        node.destroy()
+        time.sleep(0.5)
+
+
+# ---------------------------------------------------------------------------
+# Test 17: Cached item bytes
+# ---------------------------------------------------------------------------
+def test_item_bytes():
+    logger.info("=== Test: GetItem's cached bytes follow the item ===")
+    dump_file = os.path.join(tempfile.mkdtemp(), "product_snapshot.bin")
+    raft_addr = f"127.0.0.1:{RAFT_BASE_PORT + 140}"
+    addr = f"127.0.0.1:{GRPC_BASE_PORT + 180}"
+
+    def start():
+        node = _single_node(raft_addr, dump_file)
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
+        add_servicer_to_server(ReplicatedProductDBServicer(node), server)
+        server.add_insecure_port(addr)
+        server.start()
+        return node, server
+
+    def check(node, stub, item_id):
+        """GetItem's item, after checking it is the current item encoded afresh."""
+        for _ in range(2):      # encoded, then served from the cache
+            got = stub.GetItem(product_db_pb2.ItemIdRequest(item_id=item_id), timeout=10)
+            assert got.status == "success", got.message
+            item = node.get_item(item_id.category, item_id.item_id)
+            assert got.item.SerializeToString() == _encode_item(
+                item_id.category, item_id.item_id, item)
+        return got.item
+
+    node, server = start()
+    channel = grpc.insecure_channel(addr)
+    stub = product_db_pb2_grpc.ProductDBStub(channel)
+    try:
+        assert node.wait_for_leader(10) is not None
+        item_id = stub.RegisterItem(product_db_pb2.RegisterItemRequest(
+            seller_id=2, name="Kettle", category=8, keywords=["kitchen"],
+            condition="new", price=20.0, quantity=5), timeout=10).item_id
+        assert check(node, stub, item_id).quantity == 5
+
+        assert stub.UpdateItemPrice(product_db_pb2.UpdateItemPriceRequest(
+            item_id=item_id, price=17.5), timeout=10).status == "success"
+        assert check(node, stub, item_id).price == 17.5
+
+        assert stub.MakePurchase(product_db_pb2.MakePurchaseRequest(
+            buyer_id=6, item_id=item_id, quantity=2), timeout=10).status == "success"
+        assert check(node, stub, item_id).quantity == 3
+
+        # Bytes cached for an older version of the item are not served
+        key = (item_id.category, item_id.item_id)
+        node._item_bytes[key] = (0, b"stale")
+        check(node, stub, item_id)
+
+        node._forceLogCompaction()
+        deadline = time.time() + 10
+        while not os.path.isfile(dump_file) and time.time() < deadline:
+            time.sleep(0.1)
+        assert os.path.isfile(dump_file), "Snapshot file was not written"
+    finally:
+        server.stop(0)
+        node.destroy()
+        time.sleep(0.5)
+
+    node, server = start()
+    try:
+        deadline = time.time() + 10
+        while node.get_item(item_id.category, item_id.item_id) is None and time.time() < deadline:
+            time.sleep(0.1)
+        item = check(node, stub, item_id)
+        assert (item.price, item.quantity) == (17.5, 3)
+
+        logger.info("PASSED: cached item bytes match a fresh encoding")
+    finally:
+        channel.close()
+        server.stop(0)
+        node.destroy()
+        time.sleep(0.5)
+
+
 if __name__ == "__main__":
     test_item_registration()
     print()
@@ -268,4 +1219,32 @@ if __name__ == "__main__":
     print()
     test_seller_items()
     print()
+    test_snapshot_restore()
+    print()
+    test_bulk_writes()
+    print()
+    test_leader_readiness()
+    print()
+    test_leader_routing()
+    print()
+    test_read_balancing()
+    print()
+    test_linearizable_reads()
+    print()
+    test_purchase_archive()
+    print()
+    test_checkout_cart()
+    print()
+    test_escrow_purchases()
+    print()
+    test_sharded_pool()
+    print()
+    test_aio_servicer()
+    print()
+    test_idempotent_writes()
+    print()
+    test_catalog_versions()
+    print()
+    test_item_bytes()
+    print()
     print("ALL PRODUCT DB REPLICATION TESTS PASSED")
@@ -0,0 +1,99 @@
+"""
+Tests for request coalescing (single_flight.py).
+
+Against a stand-in product DB replica (test_stub_pool.FixedItemServicer),
+verifies:
+1. CoalescingPool sends identical concurrent catalog reads as one RPC and
+   shares its result (or error) with every waiting caller.
+"""
+
+import grpc
+import time
+import threading
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import product_db_pb2
+import product_db_pb2_grpc
+from single_flight import PRODUCT_DB_SHARED_READS, CoalescingPool
+from stub_pool import StubPool, PRODUCT_DB_WRITE_METHODS
+from test_stub_pool import FixedItemServicer, fixed_item_server
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+GRPC_BASE_PORT = 51100
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Coalesced concurrent reads
+# ---------------------------------------------------------------------------
+def test_coalesced_reads():
+    logger.info("=== Test: Identical concurrent reads share one RPC ===")
+    addr = f"127.0.0.1:{GRPC_BASE_PORT + 130}"
+    replica = FixedItemServicer()
+    replica.delay = 0.5
+    server = fixed_item_server(addr, replica)
+    pool = CoalescingPool(StubPool([addr], product_db_pb2_grpc.ProductDBStub,
+                                   write_methods=PRODUCT_DB_WRITE_METHODS),
+                          PRODUCT_DB_SHARED_READS)
+
+    def concurrent_reads(item_ids):
+        results = [None] * len(item_ids)
+
+        def read(i):
+            request = product_db_pb2.ItemIdRequest(
+                item_id=product_db_pb2.ItemId(category=1, item_id=item_ids[i]))
+            try:
+                results[i] = pool.call("GetItem", request)
+            except grpc.RpcError as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(len(item_ids))]
+        for t in threads:
+            t.start()
+            time.sleep(0.01)
+        for t in threads:
+            t.join()
+        return results
+
+    try:
+        # Ten readers of one item: one RPC, the same response for all
+        results = concurrent_reads([1] * 10)
+        assert replica.calls == 1, replica.calls
+        assert all(r is results[0] and r.status == "success" for r in results)
+
+        # Different items are not merged
+        replica.calls = 0
+        concurrent_reads([1, 2, 3])
+        assert replica.calls == 3, replica.calls
+
+        # A failed flight fails every caller that joined it
+        replica.calls = 0
+        results = concurrent_reads([-1] * 5)
+        assert replica.calls == 1, replica.calls
+        assert all(isinstance(r, grpc.RpcError) and r.code() == grpc.StatusCode.NOT_FOUND
+                   for r in results)
+
+        # Nothing is cached: the next read after a flight runs again
+        replica.calls = 0
+        concurrent_reads([1])
+        assert replica.calls == 1
+        stats = pool.flight.stats()["GetItem"]
+        assert stats["shared"] == 9 + 4, stats
+        logger.info("PASSED: %s", stats)
+    finally:
+        pool.pool.close()
+        server.stop(0)
+
+
+if __name__ == "__main__":
+    test_coalesced_reads()
+    print()
+    print("ALL SINGLE FLIGHT TESTS PASSED")
@@ -0,0 +1,278 @@
+"""
+Tests for StubPool (stub_pool.py) against stand-in product DB replicas.
+
+Starts gRPC servers that only answer GetItem (FixedItemServicer), and verifies:
+1. StubPool hedges reads stuck on a slow replica, within its hedge budget.
+2. StubPool's circuit breakers skip a dead or NOT_SERVING replica at once and
+   the health probe brings it back into rotation when it recovers; without
+   probes, only the call sent to a replica takes its breaker's trial.
+3. AioStubPool keeps many reads in flight on one event loop, balanced and
+   failing over like StubPool, and a cancelled call leaves no in-flight
+   count behind; AioCoalescingPool shares identical reads.
+"""
+
+import asyncio
+import grpc
+import time
+import logging
+import sys
+import os
+from concurrent import futures
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import product_db_pb2
+import product_db_pb2_grpc
+from health import add_health_servicer
+from single_flight import PRODUCT_DB_SHARED_READS, AioCoalescingPool
+from stub_pool import BREAKER_COOLDOWN, StubPool, PRODUCT_DB_WRITE_METHODS, aio_pool
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+)
+logger = logging.getLogger("test")
+
+GRPC_BASE_PORT = 51100
+
+
+# ---------------------------------------------------------------------------
+# Test 1: Hedged reads
+# ---------------------------------------------------------------------------
+class FixedItemServicer(product_db_pb2_grpc.ProductDBServicer):
+    """GetItem only, taking `delay` seconds: a stand-in replica."""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.calls = 0
+
+    def GetItem(self, request, context):
+        self.calls += 1
+        time.sleep(self.delay)
+        if request.item_id.item_id < 0:
+            context.abort(grpc.StatusCode.NOT_FOUND, "no such item")
+        return product_db_pb2.GetItemResponse(status="success", item=product_db_pb2.ItemData(
+            item_id=request.item_id, name="Hedge", quantity=1))
+
+
+def test_hedged_reads():
+    logger.info("=== Test: StubPool hedges slow reads ===")
+    replicas, servers = [], []
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + 110 + i}" for i in range(3)]
+    for addr in addrs:
+        replicas.append(FixedItemServicer())
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        product_db_pb2_grpc.add_ProductDBServicer_to_server(replicas[-1], server)
+        server.add_insecure_port(addr)
+        server.start()
+        servers.append(server)
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS)
+    request = product_db_pb2.ItemIdRequest(item_id=product_db_pb2.ItemId(category=1, item_id=1))
+
+    try:
+        # Learn the usual read latency, then stall the replica the pool favours
+        for _ in range(40):
+            assert pool.call("GetItem", request).status == "success"
+        favoured = min(range(3), key=lambda i: pool.stats()[i]["ewma_ms"])
+        replicas[favoured].delay = 1.0
+
+        latencies = []
+        for _ in range(40):
+            t0 = time.perf_counter()
+            assert pool.call("GetItem", request).status == "success"
+            latencies.append(time.perf_counter() - t0)
+        assert pool.hedges >= 1
+        assert max(latencies) < 0.5, f"A read waited for the slow replica: {max(latencies):.3f}s"
+        # Losing copies finish on their own: their latency reaches the slow
+        # replica's EWMA but not the samples the hedge delay is taken from
+        time.sleep(1.2)
+        stats = pool.stats()
+        assert all(st["inflight"] == 0 for st in stats)
+        assert stats[favoured]["ewma_ms"] == max(st["ewma_ms"] for st in stats)
+        assert max(pool._read_latencies["GetItem"]) < 0.5
+
+        # Every replica slow: hedges stop at the budget instead of doubling the load
+        for r in replicas:
+            r.delay = 0.02
+        before = pool.hedges
+        for _ in range(100):
+            assert pool.call("GetItem", request).status == "success"
+        assert pool.hedges - before <= 10 + 0.1 * 100, pool.hedges - before
+
+        logger.info("PASSED: %d hedged reads, slowest read %.0f ms",
+                    pool.hedges, max(latencies) * 1000)
+    finally:
+        for ch in pool.channels:
+            ch.close()
+        for server in servers:
+            server.stop(0)
+
+
+# ---------------------------------------------------------------------------
+# Test 2: Circuit breakers and health probes
+# ---------------------------------------------------------------------------
+def fixed_item_server(addr, servicer, is_serving=None):
+    """Serve servicer and the health service (is_serving, see health.py) on addr."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    product_db_pb2_grpc.add_ProductDBServicer_to_server(servicer, server)
+    add_health_servicer(server, is_serving)
+    server.add_insecure_port(addr)
+    server.start()
+    return server
+
+
+def _wait_for_breaker(pool, idx, state, timeout=5):
+    deadline = time.time() + timeout
+    while pool.stats()[idx]["breaker"] != state:
+        assert time.time() < deadline, f"breaker of replica {idx} never {state}"
+        time.sleep(0.05)
+
+
+def test_circuit_breaker():
+    logger.info("=== Test: StubPool circuit breakers and health probes ===")
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + 120 + i}" for i in range(3)]
+    serving = [True] * 3
+    servers = [fixed_item_server(addr, FixedItemServicer(), lambda i=i: serving[i])
+               for i, addr in enumerate(addrs)]
+    pool = StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                    write_methods=PRODUCT_DB_WRITE_METHODS, probe_interval=0.1)
+    request = product_db_pb2.ItemIdRequest(item_id=product_db_pb2.ItemId(category=1, item_id=1))
+
+    def timed_reads(n):
+        slowest = 0.0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            assert pool.call("GetItem", request).status == "success"
+            slowest = max(slowest, time.perf_counter() - t0)
+        return slowest
+
+    try:
+        timed_reads(30)
+
+        # Replica 0 dies: the probe opens its breaker and reads skip it
+        servers[0].stop(0)
+        _wait_for_breaker(pool, 0, "open")
+        calls = pool.stats()[0]["calls"]
+        slowest = timed_reads(50)
+        assert pool.stats()[0]["calls"] == calls, "A read went to the dead replica"
+        assert slowest < 0.5, f"A read waited on the dead replica: {slowest:.3f}s"
+
+        # Replica 1 reports NOT_SERVING: skipped as well
+        serving[1] = False
+        _wait_for_breaker(pool, 1, "open")
+        calls = pool.stats()[1]["calls"]
+        timed_reads(20)
+        assert pool.stats()[1]["calls"] == calls, "A read went to the NOT_SERVING replica"
+
+        # Both recover: their breakers close and they serve reads again
+        serving[1] = True
+        servers[0] = fixed_item_server(addrs[0], FixedItemServicer())
+        _wait_for_breaker(pool, 0, "closed")
+        _wait_for_breaker(pool, 1, "closed")
+        before = [s["calls"] for s in pool.stats()]
+        timed_reads(100)
+        after = [s["calls"] for s in pool.stats()]
+        assert after[0] > before[0] and after[1] > before[1], (before, after)
+
+        # Without probes an open breaker lets one trial call through per
+        # cooldown, claimed only by the call that goes to the replica
+        trial = StubPool(addrs, product_db_pb2_grpc.ProductDBStub, probe_interval=0)
+        trial.replica_stats[0].trip(time.monotonic() - BREAKER_COOLDOWN)
+        for _ in range(10):
+            assert trial._balanced_order()[0] in range(3) and 0 in trial._sticky_order()
+        trial._begin(0)
+        trial._forget(0)
+        assert 0 not in trial._sticky_order(), "Two trial calls in one cooldown"
+        trial.replica_stats[0].trip(time.monotonic() - BREAKER_COOLDOWN)
+        assert trial.call("GetItem", request).status == "success"
+        assert trial.stats()[0]["breaker"] == "closed" and trial.stats()[0]["calls"] == 1
+        trial.close()
+
+        logger.info("PASSED: reads per replica %s", after)
+    finally:
+        pool.close()
+        for server in servers:
+            server.stop(0)
+
+
+
+# ---------------------------------------------------------------------------
+# Test 3: asyncio pools (buyer_server_aio.py)
+# ---------------------------------------------------------------------------
+def test_aio_pools():
+    logger.info("=== Test: AioStubPool and AioCoalescingPool ===")
+    addrs = [f"127.0.0.1:{GRPC_BASE_PORT + 150 + i}" for i in range(2)]
+    replicas = [FixedItemServicer() for _ in addrs]
+    servers = [fixed_item_server(addr, r) for addr, r in zip(addrs, replicas)]
+    for r in replicas:
+        r.delay = 0.3
+
+    def get_item(item_id):
+        return product_db_pb2.ItemIdRequest(
+            item_id=product_db_pb2.ItemId(category=1, item_id=item_id))
+
+    async def run():
+        pool = AioCoalescingPool(
+            aio_pool(StubPool(addrs, product_db_pb2_grpc.ProductDBStub,
+                              write_methods=PRODUCT_DB_WRITE_METHODS)),
+            PRODUCT_DB_SHARED_READS)
+        try:
+            # Twenty different reads at once: in flight together, over both replicas
+            t0 = time.perf_counter()
+            results = await asyncio.gather(*(pool.call("GetItem", get_item(i))
+                                             for i in range(1, 21)))
+            elapsed = time.perf_counter() - t0
+            assert [r.item.item_id.item_id for r in results] == list(range(1, 21))
+            assert elapsed < 1.5, f"Reads waited for each other: {elapsed:.2f}s"
+            assert sum(s["calls"] for s in pool.stats()) == 20
+            assert all(s["calls"] > 0 for s in pool.stats()), pool.stats()
+
+            # Ten identical reads: one RPC, one response; an error reaches every caller
+            calls = sum(r.calls for r in replicas)
+            results = await asyncio.gather(*(pool.call("GetItem", get_item(1))
+                                             for _ in range(10)))
+            assert sum(r.calls for r in replicas) == calls + 1
+            assert all(r is results[0] for r in results)
+            errors = await asyncio.gather(*(pool.call("GetItem", get_item(-1))
+                                            for _ in range(3)), return_exceptions=True)
+            assert all(isinstance(e, grpc.RpcError) and e.code() == grpc.StatusCode.NOT_FOUND
+                       for e in errors), errors
+
+            # A caller that goes away takes its call off the replica's in-flight count
+            read = asyncio.ensure_future(pool.pool.call("GetItem", get_item(50)))
+            await asyncio.sleep(0.1)
+            read.cancel()
+            try:
+                await read
+            except asyncio.CancelledError:
+                pass
+            assert all(s["inflight"] == 0 for s in pool.stats()), pool.stats()
+
+            # A replica goes down: reads fail over to the other one
+            servers[0].stop(0)
+            for r in replicas:
+                r.delay = 0.0
+            results = await asyncio.gather(*(pool.call("GetItem", get_item(i))
+                                             for i in range(30, 40)))
+            assert all(r.status == "success" for r in results)
+            return pool.flight.stats()["GetItem"]
+        finally:
+            await pool.pool.close()
+
+    try:
+        stats = asyncio.run(run())
+        assert stats["shared"] == 9 + 2, stats
+        logger.info("PASSED: %s", stats)
+    finally:
+        for server in servers:
+            server.stop(0)
+
+if __name__ == "__main__":
+    test_hedged_reads()
+    print()
+    test_circuit_breaker()
+    print()
+    test_aio_pools()
+    print()
+    print("ALL STUB POOL TESTS PASSED")